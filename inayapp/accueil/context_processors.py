@@ -1,37 +1,46 @@
 # accueil/context_processors.py
+"""
+Processeurs de contexte du menu et des badges.
 
+Les valeurs sont paresseuses (callables résolus par le moteur de gabarits à
+la première utilisation) et proviennent du cache versionné de
+`accueil.navigation` : aucune requête tant que rien n'a changé.
+"""
+from functools import lru_cache
 
-from django.db import models
-from django.db.models import ExpressionWrapper, F, Q, Sum, Value
-from django.db.models.functions import Coalesce
-from django.urls import Resolver404, resolve, reverse
-from finance.models import Decharges
-from helpdesk.models import Helpdesk
-from rh.models import LeaveRequest, SalaryAdvanceRequest
-from django.urls import resolve, reverse
+from django.urls import resolve
 
-from .models import MenuItem, NavbarItem
+from .navigation import (
+    attach_permissions,
+    find_menu_item,
+    get_menu_tree,
+    get_notifications,
+)
 
-from .models import MenuGroup, MenuItem, NavbarItem
+
+def lazy(func):
+    """Callable mémoïsé : évalué une seule fois, et seulement s'il est utilisé."""
+    return lru_cache(maxsize=None)(func)
 
 
 def get_menu_groups(request):
-    groups = MenuGroup.objects.prefetch_related("items").all()
-    return {"menu_groups": groups}
+    # Les has_perm du menu (et de la vue) sont servis par le cache partagé
+    attach_permissions(request.user)
+    return {"menu_groups": lazy(get_menu_tree)}
 
 
 def get_menu_items(request):
-    items = MenuItem.objects.all().order_by("order")
-    filtered_items = []
-
-    for item in items:
-        if item.permission:
-            if request.user.is_authenticated and request.user.has_perm(item.permission):
-                filtered_items.append(item)
-        else:
-            filtered_items.append(item)
+    def menu_items():
+        user = request.user
+        return [
+            item
+            for group in get_menu_tree()
+            for item in group.items.all()
+            if not item.permission
+            or (user.is_authenticated and user.has_perm(item.permission))
+        ]
 
-    return {"menu_items": filtered_items}
+    return {"menu_items": lazy(menu_items)}
 
 
 def navbar_context(request):
@@ -41,33 +50,12 @@ def navbar_context(request):
     except Exception:
         current_url_name = None
 
-    # 2) MenuItem actif
-    active_item = (
-        MenuItem.objects.filter(route=f"/{current_url_name}").first()
-        if current_url_name
-        else None
-    )
-
-    # 3) charger tous les NavbarItem et permissions
-    if active_item:
-        qs = (
-            NavbarItem.objects.filter(menu_item=active_item)
-            .select_related("menu_item")
-            .order_by("order")
-        )
-    else:
-        qs = NavbarItem.objects.none()
-
-    user_perms = request.user.get_all_permissions() if request.user.is_authenticated else set()
-    
-    # 4) Filtrer par permissions
-    user_perms = (
-        request.user.get_all_permissions() if request.user.is_authenticated else set()
-    )
-
+    # 2) MenuItem actif (lu dans le menu en cache)
+    def active_menu_item():
+        return find_menu_item(f"/{current_url_name}") if current_url_name else None
 
     return {
-        "active_menu_item": active_item,
+        "active_menu_item": lazy(active_menu_item),
         "current_url_name": current_url_name,
     }
 
@@ -75,80 +63,18 @@ def navbar_context(request):
 def notification(request):
     user = request.user
 
-    nembre_notification_hd = 0
-    pending_salary = 0
-    pending_leave = 0
-    pending_decharges = 0
-    
-    if user.is_authenticated:
-        id_personnel = user.id
-
-        # Conditions Helpdesk
-        condition = Q(name=id_personnel) & Q(time_terminee__isnull=True)
-
-        if user.has_perm("helpdesk.ACCES_AU_DEPARTEMENT_IT"):
-            condition |= Q(type="it") & Q(time_terminee__isnull=True)
-        if user.has_perm("helpdesk.ACCES_AU_DEPARTEMENT_TECHNIQUE"):
-            condition |= Q(type="tech") & Q(time_terminee__isnull=True)
-        if user.has_perm("helpdesk.ACCES_AU_DEPARTEMENT_APPROVISIONNEMENT"):
-            condition |= Q(type="appro") & Q(time_terminee__isnull=True)
-
-        demandes = Helpdesk.objects.filter(condition)
-        nembre_notification_hd = demandes.count()
-
-        # RH - Gestion des demandes
-        if user.has_perm("rh.process_salaryadvance_request") or user.has_perm(
-            "rh.process_leave_request"
-        ):
-            pending_salary = SalaryAdvanceRequest.objects.filter(
-                status=SalaryAdvanceRequest.RequestStatus.PENDING
-            ).count()
-            pending_leave = LeaveRequest.objects.filter(
-                status=LeaveRequest.RequestStatus.PENDING
-            ).count()
-        else:
-            if hasattr(user, "personnel"):
-                salary_requests = SalaryAdvanceRequest.objects.filter(
-                    personnel=user.personnel
-                ).order_by("-created_at")
-
-                leave_requests = LeaveRequest.objects.filter(
-                    personnel=user.personnel
-                ).order_by("-created_at")
-
-                pending_salary = salary_requests.filter(
-                    status=SalaryAdvanceRequest.RequestStatus.PENDING
-                ).count()
-
-                pending_leave = leave_requests.filter(
-                    status=LeaveRequest.RequestStatus.PENDING
-                ).count()
-
-        # finance - Gestion des decharges
-        if user.has_perm("finance.process_expense_request"):
-            pending_decharges = (
-                Decharges.objects.annotate(
-                    total_payments=Coalesce(
-                        Sum("payments__payment"),
-                        Value(0, output_field=models.DecimalField()),
-                        output_field=models.DecimalField(),
-                    )
-                )
-                .annotate(
-                    balance=ExpressionWrapper(
-                        F("amount") - F("total_payments"),
-                        output_field=models.DecimalField(
-                            max_digits=10, decimal_places=2
-                        ),
-                    )
-                )
-                .filter(balance__gt=0)
-            ).count()
-        else:
-            pending_decharges = ''
+    def compute():
+        if not user.is_authenticated:
+            return {
+                "nembre_notification_hd": 0,
+                "nembre_notification_rh": 0,
+                "nembre_notification_decharge": 0,
+            }
+        return get_notifications(user)
 
+    counts = lazy(compute)
     return {
-        "nembre_notification_hd": nembre_notification_hd,
-        "nembre_notification_rh": pending_salary + pending_leave,
-        "nembre_notification_decharge": pending_decharges,
+        "nembre_notification_hd": lambda: counts()["nembre_notification_hd"],
+        "nembre_notification_rh": lambda: counts()["nembre_notification_rh"],
+        "nembre_notification_decharge": lambda: counts()["nembre_notification_decharge"],
     }
@@ -0,0 +1,134 @@
+# accueil/management/commands/benchmark_sessions.py
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from django.contrib.sessions.backends import cache as cache_sessions
+from django.contrib.sessions.backends import cached_db, signed_cookies
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, transaction
+from inayapp.benchmarks import Rollback
+from inayapp.caching import build_cache, redis_available
+
+SESSION_DATA = {
+    "_auth_user_id": "1",
+    "_auth_user_backend": "django.contrib.auth.backends.ModelBackend",
+    "_auth_user_hash": "x" * 64,
+    "filters": {"service": 3, "start": "2025-01-01", "end": "2025-01-31"},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure le temps de chargement et d'écriture d'une session selon le "
+        "moteur (cache en base historique, fichiers, Redis, cached_db, cookie "
+        "signé), avec un cache déjà rempli de sessions"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=2000)
+        parser.add_argument(
+            "--sessions",
+            type=int,
+            default=5000,
+            help="Sessions déjà présentes dans le cache (FileBasedCache liste "
+            "tout son répertoire à chaque écriture)",
+        )
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        tmpdir = tempfile.mkdtemp(prefix="inaya-sessions-")
+        try:
+            with transaction.atomic():
+                for label, make_store in self.engines(tmpdir):
+                    try:
+                        self.fill(make_store, options["sessions"])
+                        lectures, ecritures = self.measure(make_store, iterations)
+                    except DatabaseError as e:
+                        self.stdout.write(f"{label:<32}: indisponible ({e})")
+                        continue
+                    self.stdout.write(
+                        f"{label:<32}: lecture {self.summary(lectures)} | "
+                        f"écriture {self.summary(ecritures)}"
+                    )
+                raise Rollback()
+        except Rollback:
+            pass
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    def engines(self, tmpdir):
+        def cache_store(backend):
+            def make(session_key=None):
+                store = cache_sessions.SessionStore(session_key)
+                store._cache = backend
+                return store
+
+            return make
+
+        def cached_db_store(backend):
+            def make(session_key=None):
+                store = cached_db.SessionStore(session_key)
+                store._cache = backend
+                return store
+
+            return make
+
+        session_alias = build_cache("session", "file", tmpdir)
+        yield "cache / DatabaseCache (avant)", cache_store(
+            DatabaseCache("cache_table_sessions", {"OPTIONS": {"MAX_ENTRIES": 20000}})
+        )
+        yield "cache / FileBasedCache (avant)", cache_store(
+            FileBasedCache(
+                os.path.join(tmpdir, "session"), {"OPTIONS": {"MAX_ENTRIES": 20000}}
+            )
+        )
+        yield "cache / LocMemCache", cache_store(LocMemCache("bench-sessions", {}))
+        if redis_available():
+            from django.core.cache.backends.redis import RedisCache
+
+            url = os.environ.get("INAYA_REDIS_URL", "redis://127.0.0.1:6379/1")
+            yield "cache / RedisCache", cache_store(RedisCache(url, {}))
+        yield "cached_db / FileBasedCache", cached_db_store(
+            FileBasedCache(os.path.join(tmpdir, "cached_db"), session_alias)
+        )
+        yield "signed_cookies", signed_cookies.SessionStore
+
+    def fill(self, make_store, count):
+        for _ in range(count):
+            store = make_store()
+            store.update(SESSION_DATA)
+            store.save()
+
+    def measure(self, make_store, iterations):
+        store = make_store()
+        store.update(SESSION_DATA)
+        store.save()
+        # Le moteur signed_cookies transporte toute la session dans la clé
+        session_key = store.session_key
+
+        lectures = []
+        ecritures = []
+        for numero in range(iterations):
+            started = time.perf_counter()
+            store = make_store(session_key)
+            loaded = store.load()
+            lectures.append(time.perf_counter() - started)
+
+            # Session modifiée (filtres) : réécrite en fin de requête
+            store["filters"] = {**SESSION_DATA["filters"], "page": numero}
+            started = time.perf_counter()
+            store.save()
+            ecritures.append(time.perf_counter() - started)
+            session_key = store.session_key
+        assert loaded.get("_auth_user_id") == "1", "session non relue"
+        return lectures, ecritures
+
+    def summary(self, timings):
+        p95 = sorted(timings)[int(len(timings) * 0.95)]
+        return f"médiane {statistics.median(timings) * 1e6:8.1f} µs, p95 {p95 * 1e6:8.1f} µs"
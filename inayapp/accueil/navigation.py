@@ -0,0 +1,170 @@
+# accueil/navigation.py
+"""
+Données communes à toutes les pages (menu, permissions, notifications).
+
+Tout est mis en cache et versionné : une clé de version par famille
+(`menu`, `permissions`, `notifications`) est changée par les signaux de
+`accueil.signals` dès qu'un modèle sous-jacent est modifié. Une page
+ordinaire n'exécute ainsi aucune requête pour le menu ni les badges.
+"""
+from django.db import models
+from django.db.models import ExpressionWrapper, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from inayapp import caching
+from inayapp.caching import cache_aside
+
+CACHE_TIMEOUT = 60 * 30
+VERSION_KEY = "navigation:version:{}"
+
+
+def get_version(name):
+    return caching.get_version(VERSION_KEY.format(name))
+
+
+def bump_version(name):
+    """Invalide toutes les entrées de la famille `name`."""
+    caching.bump_version(VERSION_KEY.format(name))
+
+
+def bump_version_on_commit(name):
+    """`bump_version` au commit : l'état d'avant ne peut plus être remis en cache."""
+    caching.bump_version_on_commit(VERSION_KEY.format(name))
+
+
+def cached(key, compute, timeout=CACHE_TIMEOUT):
+    return cache_aside(key, compute, timeout)
+
+
+# --------------------------------------------------------------------------- #
+# Menu
+# --------------------------------------------------------------------------- #
+
+
+def get_menu_tree():
+    """Groupes de menu avec leurs éléments préchargés (`group.items.all`)."""
+    from .models import MenuGroup
+
+    return cached(
+        f"navigation:menu:{get_version('menu')}",
+        lambda: list(MenuGroup.objects.prefetch_related("items")),
+    )
+
+
+def find_menu_item(route):
+    """Premier élément de menu dont la route vaut `route` (ordre du menu)."""
+    items = [
+        item for group in get_menu_tree() for item in group.items.all() if item.route == route
+    ]
+    return min(items, key=lambda item: (item.order, item.pk), default=None)
+
+
+# --------------------------------------------------------------------------- #
+# Permissions
+# --------------------------------------------------------------------------- #
+
+
+def _permissions_key(user):
+    return (
+        f"navigation:permissions:{user.pk}:{int(user.is_superuser)}:"
+        f"{get_version('permissions')}"
+    )
+
+
+def attach_permissions(user):
+    """
+    Renseigne le cache de permissions de `ModelBackend` depuis le cache partagé.
+
+    Tous les `has_perm` de la requête (menu, badges, vues) sont ensuite
+    résolus sans requête.
+    """
+    if not user.is_authenticated or not user.is_active:
+        return
+    if hasattr(user, "_perm_cache"):
+        return
+    user._perm_cache = cached(_permissions_key(user), user.get_all_permissions)
+
+
+# --------------------------------------------------------------------------- #
+# Notifications
+# --------------------------------------------------------------------------- #
+
+
+def get_notifications(user):
+    """Compteurs des badges du menu pour `user`."""
+    key = (
+        f"navigation:notifications:{user.pk}:{get_version('notifications')}:"
+        f"{get_version('permissions')}"
+    )
+    return cached(key, lambda: compute_notifications(user))
+
+
+def compute_notifications(user):
+    from finance.models import Decharges
+    from helpdesk.models import Helpdesk
+    from rh.models import LeaveRequest, SalaryAdvanceRequest
+
+    nembre_notification_hd = 0
+    pending_salary = 0
+    pending_leave = 0
+    pending_decharges = 0
+
+    id_personnel = user.id
+
+    # Conditions Helpdesk
+    condition = Q(name=id_personnel) & Q(time_terminee__isnull=True)
+
+    if user.has_perm("helpdesk.ACCES_AU_DEPARTEMENT_IT"):
+        condition |= Q(type="it") & Q(time_terminee__isnull=True)
+    if user.has_perm("helpdesk.ACCES_AU_DEPARTEMENT_TECHNIQUE"):
+        condition |= Q(type="tech") & Q(time_terminee__isnull=True)
+    if user.has_perm("helpdesk.ACCES_AU_DEPARTEMENT_APPROVISIONNEMENT"):
+        condition |= Q(type="appro") & Q(time_terminee__isnull=True)
+
+    nembre_notification_hd = Helpdesk.objects.filter(condition).count()
+
+    # RH - Gestion des demandes
+    if user.has_perm("rh.process_salaryadvance_request") or user.has_perm(
+        "rh.process_leave_request"
+    ):
+        pending_salary = SalaryAdvanceRequest.objects.filter(
+            status=SalaryAdvanceRequest.RequestStatus.PENDING
+        ).count()
+        pending_leave = LeaveRequest.objects.filter(
+            status=LeaveRequest.RequestStatus.PENDING
+        ).count()
+    elif hasattr(user, "personnel"):
+        pending_salary = SalaryAdvanceRequest.objects.filter(
+            personnel=user.personnel,
+            status=SalaryAdvanceRequest.RequestStatus.PENDING,
+        ).count()
+        pending_leave = LeaveRequest.objects.filter(
+            personnel=user.personnel,
+            status=LeaveRequest.RequestStatus.PENDING,
+        ).count()
+
+    # finance - Gestion des decharges
+    if user.has_perm("finance.process_expense_request"):
+        pending_decharges = (
+            Decharges.objects.annotate(
+                total_payments=Coalesce(
+                    Sum("payments__payment"),
+                    Value(0, output_field=models.DecimalField()),
+                    output_field=models.DecimalField(),
+                )
+            )
+            .annotate(
+                balance=ExpressionWrapper(
+                    F("amount") - F("total_payments"),
+                    output_field=models.DecimalField(max_digits=10, decimal_places=2),
+                )
+            )
+            .filter(balance__gt=0)
+        ).count()
+    else:
+        pending_decharges = ""
+
+    return {
+        "nembre_notification_hd": nembre_notification_hd,
+        "nembre_notification_rh": pending_salary + pending_leave,
+        "nembre_notification_decharge": pending_decharges,
+    }
@@ -14,3 +14,47 @@ def create_theme_profile(sender, instance, created, **kwargs):
 @receiver(post_save, sender=User)
 def save_theme_profile(sender, instance, **kwargs):
     instance.theme.save()
+
+
+# --------------------------------------------------------------------------- #
+# Invalidation du menu, des permissions et des badges (accueil.navigation)
+# --------------------------------------------------------------------------- #
+from django.contrib.auth.models import Group, Permission
+from django.db.models.signals import m2m_changed, post_delete
+from finance.models import Decharges, Payments
+from helpdesk.models import Helpdesk
+from rh.models import LeaveRequest, Personnel, SalaryAdvanceRequest
+
+from .models import MenuGroup, MenuItem, NavbarItem
+from .navigation import bump_version_on_commit
+
+
+def _bump_on_change(family, *models):
+    def handler(sender, **kwargs):
+        bump_version_on_commit(family)
+
+    for model in models:
+        post_save.connect(handler, sender=model, weak=False)
+        post_delete.connect(handler, sender=model, weak=False)
+    return handler
+
+
+_bump_on_change("menu", MenuGroup, MenuItem, NavbarItem)
+_bump_on_change("permissions", Group, Permission)
+_bump_on_change(
+    "notifications",
+    Helpdesk,
+    SalaryAdvanceRequest,
+    LeaveRequest,
+    Decharges,
+    Payments,
+    Personnel,
+)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_permissions(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        bump_version_on_commit("permissions")
@@ -1,3 +1,36 @@
-from django.test import TestCase
+from django.contrib.auth.models import Group, User
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from inayapp.caching import build_caches
 
-# Create your tests here.
+from .navigation import get_version
+
+
+@override_settings(CACHES=build_caches("", environ={"INAYA_CACHE_BACKEND": "locmem"}))
+class AccueilRequetesTests(TestCase):
+    """Le menu, les permissions et les badges ne coûtent aucune requête une fois en cache"""
+
+    # Session (lue dans le cache : aucune) et utilisateur connecté
+    MAX_REQUETES = 1
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.user = User.objects.create_superuser("accueil", "accueil@example.com", None)
+        self.client.force_login(self.user)
+
+    def test_accueil_caches_chauds(self):
+        url = reverse("home")
+        # Premier passage : remplit les caches (menu, permissions, badges)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with self.assertNumQueries(self.MAX_REQUETES):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_invalidation_au_commit(self):
+        avant = get_version("permissions")
+        with self.captureOnCommitCallbacks(execute=True):
+            Group.objects.create(name="Invalidation")
+            # Avant le commit, une autre requête relirait l'ancien état
+            self.assertEqual(get_version("permissions"), avant)
+        self.assertNotEqual(get_version("permissions"), avant)
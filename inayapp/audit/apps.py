@@ -9,4 +9,4 @@ class AuditConfig(AppConfig):
 
     def ready(self):
         # Importer les signaux
-        from . import middleware
+        from . import middleware, signals
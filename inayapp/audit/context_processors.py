@@ -1,25 +1,40 @@
 # audit/context_processors.py
+from functools import lru_cache
+
+from django.core.cache import cache
+
+# Les compteurs d'une heure entamée bougent peu : une minute de retard suffit
+STATS_TIMEOUT = 60
+
+
 def audit_stats(request):
     """Processeur de contexte pour afficher des stats d'audit"""
     if not request.user.is_authenticated or not request.user.is_staff:
         return {}
 
-    from .models import AuditLog
-    from django.utils import timezone
-    from datetime import timedelta
+    @lru_cache(maxsize=None)
+    def stats():
+        key = f"audit:stats:{request.user.pk}"
+        data = cache.get(key)
+        if data is None:
+            data = compute_stats(request.user)
+            cache.set(key, data, STATS_TIMEOUT)
+        return data
+
+    return {"audit_stats": stats}
+
+
+def compute_stats(user):
+    from django.db.models import Q, Sum
+    from .counters import counters_since
 
-    # Stats des dernières 24h
-    last_24h = timezone.now() - timedelta(hours=24)
+    # Stats des dernières 24h, lues dans les compteurs horaires
+    totals = counters_since(24).aggregate(
+        logs_today=Sum("count"),
+        user_actions_today=Sum("count", filter=Q(username=user.username)),
+    )
 
     return {
-        "audit_stats": {
-            "logs_today": AuditLog.objects.filter(timestamp__gte=last_24h).count(),
-            "user_actions_today": (
-                AuditLog.objects.filter(
-                    timestamp__gte=last_24h, user=request.user
-                ).count()
-                if request.user.is_authenticated
-                else 0
-            ),
-        }
+        "logs_today": totals["logs_today"] or 0,
+        "user_actions_today": totals["user_actions_today"] or 0,
     }
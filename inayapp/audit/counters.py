@@ -0,0 +1,84 @@
+# audit/counters.py
+"""
+Compteurs horaires des logs d'audit.
+
+Chaque lot écrit par `audit.writer` incrémente `AuditCounter` par
+(heure, action, utilisateur) ; les statistiques des tableaux de bord se lisent
+dans cette petite table au lieu de compter les lignes du journal.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import AuditCounter, AuditLog
+
+
+def hour_bucket(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def increment_counters(logs):
+    """Ajoute les logs (instances `AuditLog`) aux compteurs horaires."""
+    totals = Counter(
+        (hour_bucket(log.timestamp), log.action, log.username or "") for log in logs
+    )
+    for (hour, action, username), count in totals.items():
+        _add(hour, action, username, count)
+
+
+def _add(hour, action, username, count):
+    lookup = {"hour": hour, "action": action, "username": username}
+    if AuditCounter.objects.filter(**lookup).update(count=F("count") + count):
+        return
+    try:
+        with transaction.atomic():
+            AuditCounter.objects.create(count=count, **lookup)
+    except IntegrityError:
+        # Créé entre-temps par un autre processus
+        AuditCounter.objects.filter(**lookup).update(count=F("count") + count)
+
+
+def rebuild_counters(since=None):
+    """Recalcule les compteurs depuis le journal (à partir de `since` si fourni)."""
+    logs = AuditLog.objects.all()
+    counters = AuditCounter.objects.all()
+    if since is not None:
+        since = hour_bucket(since)
+        logs = logs.filter(timestamp__gte=since)
+        counters = counters.filter(hour__gte=since)
+
+    rows = (
+        logs.annotate(hour=TruncHour("timestamp"))
+        .values("hour", "action", "username")
+        .annotate(total=Count("id"))
+        .order_by()
+    )
+    with transaction.atomic():
+        counters.delete()
+        AuditCounter.objects.bulk_create(
+            (
+                AuditCounter(
+                    hour=row["hour"],
+                    action=row["action"],
+                    username=row["username"] or "",
+                    count=row["total"],
+                )
+                for row in rows.iterator()
+            ),
+            batch_size=1000,
+        )
+    return AuditCounter.objects.count()
+
+
+def counters_since(hours=24):
+    """Compteurs des dernières `hours` heures (heure entamée comprise)."""
+    since = hour_bucket(timezone.now() - timedelta(hours=hours))
+    return AuditCounter.objects.filter(hour__gte=since)
+
+
+def total(queryset):
+    return queryset.aggregate(total=Sum("count"))["total"] or 0
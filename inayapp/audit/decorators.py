@@ -41,18 +41,21 @@ def audit_view(view_func):
         # Créer un log d'audit pour la vue
         from .models import AuditLog
         from .utils import get_client_ip, get_user_agent
+        from .writer import record
 
         if request.user.is_authenticated:
-            AuditLog.objects.create(
-                user=request.user,
-                username=request.user.username,
-                action="VIEW",
-                url=request.get_full_path(),
-                method=request.method,
-                status_code=getattr(response, "status_code", 200),
-                ip_address=get_client_ip(request),
-                user_agent=get_user_agent(request),
-                object_repr=f"Vue: {view_func.__name__}",
+            record(
+                AuditLog(
+                    user=request.user,
+                    username=request.user.username,
+                    action="VIEW",
+                    url=request.get_full_path(),
+                    method=request.method,
+                    status_code=getattr(response, "status_code", 200),
+                    ip_address=get_client_ip(request),
+                    user_agent=get_user_agent(request),
+                    object_repr=f"Vue: {view_func.__name__}",
+                )
             )
 
         return response
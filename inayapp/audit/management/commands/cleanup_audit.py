@@ -1,12 +1,33 @@
 # audit/management/commands/cleanup_audit.py
+import gzip
+import json
+import os
+import time
+from datetime import timedelta
+
 from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
-from datetime import timedelta
-from audit.models import AuditLog, LoginAttempt
+from audit.models import AuditCounter, AuditLog, LoginAttempt
+
+
+def month_bounds(month):
+    """(début, fin) du mois contenant `month` (date), en datetimes conscients."""
+    start = timezone.make_aware(
+        timezone.datetime(month.year, month.month, 1), timezone.get_default_timezone()
+    )
+    if month.month == 12:
+        end = start.replace(year=month.year + 1, month=1)
+    else:
+        end = start.replace(month=month.month + 1)
+    return start, end
 
 
 class Command(BaseCommand):
-    help = "Nettoie les anciens logs d'audit"
+    help = (
+        "Nettoie les anciens logs d'audit, mois par mois et par lots bornés, "
+        "avec archivage optionnel en JSONL compressé"
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -20,33 +41,104 @@ class Command(BaseCommand):
             action="store_true",
             help="Affiche ce qui serait supprimé sans supprimer",
         )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Nombre maximal de lignes supprimées par requête",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.1,
+            help="Pause (secondes) entre deux lots pour laisser passer les écritures",
+        )
+        parser.add_argument(
+            "--archive-dir",
+            type=str,
+            help="Exporte chaque mois expiré en <modèle>-AAAA-MM.jsonl.gz avant suppression",
+        )
 
     def handle(self, *args, **options):
         cutoff_date = timezone.now() - timedelta(days=options["days"])
 
-        # Compter les logs à supprimer
-        audit_logs_count = AuditLog.objects.filter(timestamp__lt=cutoff_date).count()
+        totals = {}
+        for model in (AuditLog, LoginAttempt):
+            totals[model] = 0
+            # Une « partition » par mois : archivée puis supprimée par lots
+            months = model.objects.filter(timestamp__lt=cutoff_date).dates(
+                "timestamp", "month"
+            )
+            for month in months:
+                start, end = month_bounds(month)
+                partition = model.objects.filter(
+                    timestamp__gte=start, timestamp__lt=min(end, cutoff_date)
+                )
+
+                if options["dry_run"]:
+                    count = partition.count()
+                    self.stdout.write(
+                        f"{model._meta.verbose_name} {month:%Y-%m} : {count} à supprimer"
+                    )
+                    totals[model] += count
+                    continue
 
-        login_attempts_count = LoginAttempt.objects.filter(
-            timestamp__lt=cutoff_date
-        ).count()
+                if options["archive_dir"]:
+                    path = self.archive_path(model, month, options["archive_dir"])
+                    # Mode ajout : une archive partielle (mois coupé par --days,
+                    # purge interrompue) est complétée
+                    with gzip.open(path, "at", encoding="utf-8") as archive:
+                        deleted = self.purge(
+                            partition, options["batch_size"], options["pause"], archive
+                        )
+                    self.stdout.write(f"Archivé {month:%Y-%m} dans {path}")
+                else:
+                    deleted = self.purge(partition, options["batch_size"], options["pause"])
+                totals[model] += deleted
+                self.stdout.write(
+                    f"{model._meta.verbose_name} {month:%Y-%m} : {deleted} supprimés"
+                )
 
         if options["dry_run"]:
-            self.stdout.write(f"Logs d'audit à supprimer: {audit_logs_count}")
+            self.stdout.write(f"Logs d'audit à supprimer: {totals[AuditLog]}")
             self.stdout.write(
-                f"Tentatives de connexion à supprimer: {login_attempts_count}"
+                f"Tentatives de connexion à supprimer: {totals[LoginAttempt]}"
             )
             self.stdout.write(
                 self.style.WARNING("Mode dry-run: aucune suppression effectuée")
             )
-        else:
-            # Supprimer les logs
-            AuditLog.objects.filter(timestamp__lt=cutoff_date).delete()
-            LoginAttempt.objects.filter(timestamp__lt=cutoff_date).delete()
+            return
 
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f"Supprimé {audit_logs_count} logs d'audit et "
-                    f"{login_attempts_count} tentatives de connexion"
-                )
+        AuditCounter.objects.filter(hour__lt=cutoff_date).delete()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Supprimé {totals[AuditLog]} logs d'audit et "
+                f"{totals[LoginAttempt]} tentatives de connexion"
             )
+        )
+
+    def archive_path(self, model, month, archive_dir):
+        """Chemin de l'archive JSONL compressée du mois."""
+        os.makedirs(archive_dir, exist_ok=True)
+        return os.path.join(archive_dir, f"{model._meta.model_name}-{month:%Y-%m}.jsonl.gz")
+
+    def purge(self, queryset, batch_size, pause, archive=None):
+        """
+        Supprime `queryset` par lots de clés primaires, sans verrou long.
+
+        Avec `archive`, chaque lot y est écrit juste avant sa suppression :
+        une purge interrompue puis relancée n'archive que les lignes restantes.
+        """
+        manager = queryset.model.objects
+        deleted = 0
+        while True:
+            pks = list(queryset.order_by("pk").values_list("pk", flat=True)[:batch_size])
+            if not pks:
+                return deleted
+            if archive is not None:
+                for row in manager.filter(pk__in=pks).order_by("pk").values():
+                    archive.write(json.dumps(row, cls=DjangoJSONEncoder) + "\n")
+                archive.flush()
+            deleted += manager.filter(pk__in=pks).delete()[0]
+            if pause:
+                time.sleep(pause)
@@ -0,0 +1,24 @@
+# audit/management/commands/rebuild_audit_counters.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from audit.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = "Recalcule les compteurs horaires d'audit à partir du journal"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            help="Ne recalcule que les X derniers jours (tout le journal par défaut)",
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options["days"]:
+            since = timezone.now() - timedelta(days=options["days"])
+        count = rebuild_counters(since)
+        self.stdout.write(self.style.SUCCESS(f"{count} compteurs d'audit recalculés"))
@@ -7,11 +7,9 @@ from django.contrib.auth.signals import (
 )
 from django.dispatch import receiver
 from .models import AuditLog, LoginAttempt
-from .utils import get_client_ip, get_user_agent
-import threading
-
-# Thread local pour stocker les informations de la requête
-_thread_local = threading.local()
+from .registry import registry
+from .utils import _thread_local, get_client_ip, get_user_agent
+from .writer import record
 
 
 class AuditMiddleware(MiddlewareMixin):
@@ -19,22 +17,26 @@ class AuditMiddleware(MiddlewareMixin):
 
     def process_request(self, request):
         _thread_local.request = request
+        # Branche les récepteurs de suppression avant toute écriture
+        registry.ensure_loaded()
         return None
 
     def process_response(self, request, response):
         # Enregistrer l'accès à la page si configuré
         if hasattr(request, "user") and request.user.is_authenticated:
             if self.should_audit_view(request):
-                AuditLog.objects.create(
-                    user=request.user,
-                    username=request.user.username,
-                    action="VIEW",
-                    url=request.get_full_path(),
-                    method=request.method,
-                    status_code=response.status_code,
-                    ip_address=get_client_ip(request),
-                    user_agent=get_user_agent(request),
-                    session_key=request.session.session_key,
+                record(
+                    AuditLog(
+                        user=request.user,
+                        username=request.user.username,
+                        action="VIEW",
+                        url=request.get_full_path(),
+                        method=request.method,
+                        status_code=response.status_code,
+                        ip_address=get_client_ip(request),
+                        user_agent=get_user_agent(request),
+                        session_key=request.session.session_key,
+                    )
                 )
 
         return response
@@ -56,33 +58,39 @@ class AuditMiddleware(MiddlewareMixin):
 # Signaux pour les connexions/déconnexions
 @receiver(user_logged_in)
 def log_user_login(sender, request, user, **kwargs):
-    LoginAttempt.objects.create(
-        username=user.username,
-        ip_address=get_client_ip(request),
-        user_agent=get_user_agent(request),
-        successful=True,
+    record(
+        LoginAttempt(
+            username=user.username,
+            ip_address=get_client_ip(request),
+            user_agent=get_user_agent(request),
+            successful=True,
+        )
     )
 
-    AuditLog.objects.create(
-        user=user,
-        username=user.username,
-        action="LOGIN",
-        ip_address=get_client_ip(request),
-        user_agent=get_user_agent(request),
-        session_key=request.session.session_key,
+    record(
+        AuditLog(
+            user=user,
+            username=user.username,
+            action="LOGIN",
+            ip_address=get_client_ip(request),
+            user_agent=get_user_agent(request),
+            session_key=request.session.session_key,
+        )
     )
 
 
 @receiver(user_logged_out)
 def log_user_logout(sender, request, user, **kwargs):
     if user:
-        AuditLog.objects.create(
-            user=user,
-            username=user.username,
-            action="LOGOUT",
-            ip_address=get_client_ip(request),
-            user_agent=get_user_agent(request),
-            session_key=request.session.session_key,
+        record(
+            AuditLog(
+                user=user,
+                username=user.username,
+                action="LOGOUT",
+                ip_address=get_client_ip(request),
+                user_agent=get_user_agent(request),
+                session_key=request.session.session_key,
+            )
         )
 
 
@@ -90,17 +98,21 @@ def log_user_logout(sender, request, user, **kwargs):
 def log_failed_login(sender, credentials, request, **kwargs):
     username = credentials.get("username", "")
 
-    LoginAttempt.objects.create(
-        username=username,
-        ip_address=get_client_ip(request),
-        user_agent=get_user_agent(request),
-        successful=False,
-        failure_reason="Identifiants invalides",
+    record(
+        LoginAttempt(
+            username=username,
+            ip_address=get_client_ip(request),
+            user_agent=get_user_agent(request),
+            successful=False,
+            failure_reason="Identifiants invalides",
+        )
     )
 
-    AuditLog.objects.create(
-        username=username,
-        action="FAILED_LOGIN",
-        ip_address=get_client_ip(request),
-        user_agent=get_user_agent(request),
+    record(
+        AuditLog(
+            username=username,
+            action="FAILED_LOGIN",
+            ip_address=get_client_ip(request),
+            user_agent=get_user_agent(request),
+        )
     )
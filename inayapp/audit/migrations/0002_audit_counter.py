@@ -0,0 +1,58 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:35
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+
+
+def remplir_compteurs(apps, schema_editor):
+    """Compteurs horaires du journal existant (comme rebuild_audit_counters)"""
+    alias = schema_editor.connection.alias
+    AuditLog = apps.get_model("audit", "AuditLog")
+    AuditCounter = apps.get_model("audit", "AuditCounter")
+    rows = (
+        AuditLog.objects.using(alias)
+        .annotate(hour=TruncHour("timestamp"))
+        .values("hour", "action", "username")
+        .annotate(total=Count("id"))
+        .order_by()
+    )
+    AuditCounter.objects.using(alias).bulk_create(
+        (
+            AuditCounter(
+                hour=row["hour"],
+                action=row["action"],
+                username=row["username"] or "",
+                count=row["total"],
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('action', models.CharField(max_length=20)),
+                ('username', models.CharField(blank=True, max_length=150)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': "Compteur d'audit",
+                'verbose_name_plural': "Compteurs d'audit",
+                'indexes': [models.Index(fields=['username', 'hour'], name='audit_audit_usernam_94aebe_idx')],
+                'unique_together': {('hour', 'action', 'username')},
+            },
+        ),
+        migrations.RunPython(remplir_compteurs, migrations.RunPython.noop),
+    ]
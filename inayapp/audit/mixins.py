@@ -1,11 +1,10 @@
 # audit/mixins.py
-from django.db import models
-from django.contrib.contenttypes.models import ContentType
+from .registry import registry
+from .tracking import FieldTrackerMixin
 from .utils import create_audit_log, get_model_changes
-from .models import AuditConfiguration
 
 
-class AuditMixin(models.Model):
+class AuditMixin(FieldTrackerMixin):
     """Mixin pour ajouter l'audit automatique aux modèles"""
 
     class Meta:
@@ -13,11 +12,12 @@ class AuditMixin(models.Model):
 
     def save(self, *args, **kwargs):
         # Déterminer si c'est une création ou une mise à jour
-        is_create = self.pk is None
+        is_create = self._state.adding
 
-        # Pour les mises à jour, obtenir l'ancienne version
+        # Valeurs d'origine mémorisées au chargement (pas de relecture en base)
+        original = self.get_original_values()
         old_instance = None
-        if not is_create:
+        if not is_create and original is None:
             try:
                 old_instance = self.__class__.objects.get(pk=self.pk)
             except self.__class__.DoesNotExist:
@@ -31,14 +31,13 @@ class AuditMixin(models.Model):
             create_audit_log(self, "CREATE")
         else:
             # Obtenir la configuration d'audit
-            content_type = ContentType.objects.get_for_model(self)
-            try:
-                config = AuditConfiguration.objects.get(content_type=content_type)
-                excluded_fields = config.excluded_fields
-            except AuditConfiguration.DoesNotExist:
-                excluded_fields = []
+            config = registry.get(type(self))
+            excluded_fields = config.excluded_fields if config else []
 
-            changes = get_model_changes(old_instance, self, excluded_fields)
+            if old_instance is not None:
+                changes = get_model_changes(old_instance, self, excluded_fields)
+            else:
+                changes = self.get_changes(excluded_fields, original=original)
             if changes:  # Ne log que s'il y a des changements
                 create_audit_log(self, "UPDATE", changes)
 
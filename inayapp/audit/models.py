@@ -71,6 +71,24 @@ class AuditLog(models.Model):
         return f"{self.username} - {self.action} - {self.timestamp}"
 
 
+class AuditCounter(models.Model):
+    """Compteur horaire des logs d'audit (tableaux de bord sans parcours du journal)"""
+
+    hour = models.DateTimeField()
+    action = models.CharField(max_length=20)
+    username = models.CharField(max_length=150, blank=True)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Compteur d'audit"
+        verbose_name_plural = "Compteurs d'audit"
+        unique_together = ["hour", "action", "username"]
+        indexes = [models.Index(fields=["username", "hour"])]
+
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H}h - {self.action} - {self.username}: {self.count}"
+
+
 class LoginAttempt(models.Model):
     """Modèle pour traquer les tentatives de connexion"""
 
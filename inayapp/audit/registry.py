@@ -0,0 +1,163 @@
+# audit/registry.py
+"""
+Registre en mémoire des `AuditConfiguration`.
+
+Toutes les configurations sont chargées en une requête puis gardées dans le
+processus, indexées par modèle. Une clé de version dans le cache partagé
+(`database`) est changée à chaque modification : les autres workers la
+relisent au plus toutes les `VERSION_CHECK_INTERVAL` secondes et rechargent
+le registre si elle a changé. Les modèles sans configuration ne coûtent donc
+aucune requête aux récepteurs d'audit.
+
+Le récepteur `post_delete` n'est branché que sur les modèles dont la
+suppression est tracée, à chaque chargement : un récepteur global empêcherait
+Django de supprimer en une requête (`Collector.can_fast_delete`) les lignes de
+tous les autres modèles. Le middleware d'audit charge le registre à chaque
+requête, avant toute suppression.
+"""
+import threading
+import time
+
+from inayapp.caching import bump_version, get_version
+
+VERSION_CACHE = "database"
+VERSION_KEY = "audit:configuration_version"
+VERSION_CHECK_INTERVAL = 30
+
+ACTION_FLAGS = {
+    "CREATE": "track_create",
+    "UPDATE": "track_update",
+    "DELETE": "track_delete",
+    "VIEW": "track_view",
+}
+
+
+def _model_key(model):
+    # Les modèles proxy partagent le ContentType de leur modèle concret
+    return model._meta.concrete_model._meta.label_lower
+
+
+def _delete_uid(model):
+    return f"audit_model_delete:{model._meta.label_lower}"
+
+
+def _is_installed(model):
+    from django.apps import apps
+
+    opts = model._meta
+    try:
+        return apps.get_registered_model(opts.app_label, opts.model_name) is model
+    except LookupError:
+        return False
+
+
+class AuditRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._configs = None
+        self._version = None
+        self._checked_at = 0.0
+        self._delete_senders = set()
+
+    def _read_version(self):
+        try:
+            return get_version(VERSION_KEY, VERSION_CACHE)
+        except Exception:
+            return None
+
+    def _load(self):
+        from .models import AuditConfiguration
+
+        configs = {
+            f"{config.content_type.app_label}.{config.content_type.model}": config
+            for config in AuditConfiguration.objects.select_related("content_type")
+        }
+        self._configs = configs
+        self._version = self._read_version()
+        self._checked_at = time.monotonic()
+        self._connect_deletes(configs)
+
+    def _connect_deletes(self, configs):
+        from django.apps import apps
+        from django.db.models.signals import post_delete
+
+        from .signals import audit_model_delete
+
+        keys = {
+            key
+            for key, config in configs.items()
+            if config.is_active and config.track_delete
+        }
+        senders = {
+            model
+            for model in apps.get_models()
+            if model._meta.app_label != "audit" and _model_key(model) in keys
+        }
+        for model in self._delete_senders - senders:
+            post_delete.disconnect(sender=model, dispatch_uid=_delete_uid(model))
+        for model in senders - self._delete_senders:
+            post_delete.connect(
+                audit_model_delete, sender=model, dispatch_uid=_delete_uid(model)
+            )
+        self._delete_senders = senders
+
+    def ensure_loaded(self):
+        """Charge le registre, ou le recharge si un autre worker l'a modifié."""
+        self._ensure_loaded()
+
+    def _ensure_loaded(self):
+        if self._configs is None:
+            with self._lock:
+                if self._configs is None:
+                    self._load()
+            return
+
+        if time.monotonic() - self._checked_at < VERSION_CHECK_INTERVAL:
+            return
+        with self._lock:
+            if time.monotonic() - self._checked_at < VERSION_CHECK_INTERVAL:
+                return
+            if self._read_version() != self._version:
+                self._load()
+            else:
+                self._checked_at = time.monotonic()
+
+    def get(self, model):
+        """Configuration du modèle (active ou non), ou None."""
+        if model._meta.app_label == "audit":
+            return None
+        # Modèles des migrations (historiques, MigrationRecorder) : hors du
+        # registre d'applications, et la table de configuration peut manquer
+        if not _is_installed(model):
+            return None
+        self._ensure_loaded()
+        return self._configs.get(_model_key(model))
+
+    def tracked(self, model, action):
+        """Configuration active si `action` est tracée pour le modèle, sinon None.
+
+        Les actions personnalisées (hors CREATE/UPDATE/DELETE/VIEW) sont
+        tracées dès que la configuration est active.
+        """
+        config = self.get(model)
+        if config is None or not config.is_active:
+            return None
+        flag = ACTION_FLAGS.get(action)
+        if flag is not None and not getattr(config, flag):
+            return None
+        return config
+
+    def clear(self):
+        with self._lock:
+            self._configs = None
+
+    def invalidate(self):
+        """Vide le registre local et signale la modification aux autres workers."""
+        try:
+            bump_version(VERSION_KEY, alias=VERSION_CACHE)
+        except Exception:
+            pass
+        self.clear()
+
+
+registry = AuditRegistry()
@@ -1,12 +1,16 @@
 # audit/signals.py
+from django.db import transaction
 from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
-from django.contrib.contenttypes.models import ContentType
 from .models import AuditConfiguration
+from .registry import registry
 from .utils import create_audit_log, get_model_changes
 
-# Dictionnaire pour stocker les instances avant modification
-_pre_save_instances = {}
+
+def _has_tracked_values(instance):
+    """Vrai si l'instance connaît ses valeurs d'origine (FieldTrackerMixin)"""
+    get_original_values = getattr(instance, "get_original_values", None)
+    return get_original_values is not None and get_original_values() is not None
 
 
 @receiver(pre_save)
@@ -16,18 +20,16 @@ def capture_pre_save_instance(sender, instance, **kwargs):
         return  # Nouvelle instance, pas besoin de capturer
 
     # Vérifier si l'audit est configuré pour ce modèle
-    content_type = ContentType.objects.get_for_model(sender)
-    try:
-        config = AuditConfiguration.objects.get(content_type=content_type)
-        if not config.is_active or not config.track_update:
-            return
-    except AuditConfiguration.DoesNotExist:
+    if registry.tracked(sender, "UPDATE") is None:
         return
 
-    # Capturer l'instance actuelle
+    # Les modèles suivis connaissent déjà leurs valeurs d'origine
+    if _has_tracked_values(instance):
+        return
+
+    # Sinon, relire la ligne ; l'ancienne version est gardée sur l'instance
     try:
-        old_instance = sender.objects.get(pk=instance.pk)
-        _pre_save_instances[f"{sender.__name__}_{instance.pk}"] = old_instance
+        instance._audit_old_instance = sender.objects.get(pk=instance.pk)
     except sender.DoesNotExist:
         pass
 
@@ -35,54 +37,38 @@ def capture_pre_save_instance(sender, instance, **kwargs):
 @receiver(post_save)
 def audit_model_save(sender, instance, created, **kwargs):
     """Audit automatique lors de la sauvegarde d'un modèle"""
-    # Éviter les modèles d'audit
-    if sender._meta.app_label == "audit":
-        return
-
-    # Vérifier si l'audit est configuré
-    content_type = ContentType.objects.get_for_model(sender)
-    try:
-        config = AuditConfiguration.objects.get(content_type=content_type)
-        if not config.is_active:
-            return
-
-        if created and not config.track_create:
-            return
-        elif not created and not config.track_update:
-            return
-    except AuditConfiguration.DoesNotExist:
+    # Vérifier si l'audit est configuré (les modèles d'audit sont exclus)
+    config = registry.tracked(sender, "CREATE" if created else "UPDATE")
+    if config is None:
         return
 
     if created:
         create_audit_log(instance, "CREATE")
-    else:
-        # Récupérer l'ancienne instance
-        key = f"{sender.__name__}_{instance.pk}"
-        old_instance = _pre_save_instances.get(key)
+        return
 
-        if old_instance:
-            changes = get_model_changes(old_instance, instance, config.excluded_fields)
-            if changes:
-                create_audit_log(instance, "UPDATE", changes)
+    if _has_tracked_values(instance):
+        changes = instance.get_changes(config.excluded_fields)
+    else:
+        old_instance = instance.__dict__.pop("_audit_old_instance", None)
+        if old_instance is None:
+            return
+        changes = get_model_changes(old_instance, instance, config.excluded_fields)
 
-            # Nettoyer
-            del _pre_save_instances[key]
+    if changes:
+        create_audit_log(instance, "UPDATE", changes)
 
 
-@receiver(post_delete)
 def audit_model_delete(sender, instance, **kwargs):
-    """Audit automatique lors de la suppression d'un modèle"""
-    # Éviter les modèles d'audit
-    if sender._meta.app_label == "audit":
-        return
-
-    # Vérifier si l'audit est configuré
-    content_type = ContentType.objects.get_for_model(sender)
-    try:
-        config = AuditConfiguration.objects.get(content_type=content_type)
-        if not config.is_active or not config.track_delete:
-            return
-    except AuditConfiguration.DoesNotExist:
+    """Audit automatique lors de la suppression d'un modèle (branché par le registre)"""
+    # Vérifier si l'audit est configuré (les modèles d'audit sont exclus)
+    if registry.tracked(sender, "DELETE") is None:
         return
 
     create_audit_log(instance, "DELETE")
+
+
+@receiver(post_save, sender=AuditConfiguration)
+@receiver(post_delete, sender=AuditConfiguration)
+def invalidate_audit_registry(sender, **kwargs):
+    """Recharge le registre des configurations dans tous les workers"""
+    transaction.on_commit(registry.invalidate)
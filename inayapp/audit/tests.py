@@ -1,3 +1,54 @@
+from unittest import mock
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.deletion import Collector
 from django.test import TestCase
+from django.utils import timezone
+from pharmacies.models import AlerteStock, Produit
+
+from .models import AuditConfiguration
+from .registry import registry
+
+
+class SuppressionAuditTests(TestCase):
+    """Le récepteur post_delete n'est branché que sur les modèles tracés"""
+
+    def setUp(self):
+        registry.clear()
+
+    def tearDown(self):
+        registry.clear()
+
+    def _suppression_rapide(self, model):
+        registry.ensure_loaded()
+        return Collector(using="default").can_fast_delete(model.objects.all())
+
+    def test_modele_non_trace(self):
+        self.assertTrue(self._suppression_rapide(AlerteStock))
+
+    def test_modele_trace_puis_retire(self):
+        config = AuditConfiguration.objects.create(
+            content_type=ContentType.objects.get_for_model(AlerteStock)
+        )
+        self.assertFalse(self._suppression_rapide(AlerteStock))
+        produit = Produit.objects.create(
+            nom="Produit audit suppression",
+            code_produit="AUDIT-DEL",
+            type_produit=Produit._meta.get_field("type_produit").choices[0][0],
+            prix_achat=1,
+            prix_vente=2,
+        )
+        alerte = AlerteStock.objects.create(
+            produit=produit,
+            type_alerte=AlerteStock.RUPTURE,
+            calculee_le=timezone.now(),
+        )
+        with mock.patch("audit.utils.record") as record:
+            alerte.delete()
+        self.assertEqual(
+            [appel.args[0].action for appel in record.call_args_list], ["DELETE"]
+        )
 
-# Create your tests here.
+        config.delete()
+        registry.clear()
+        self.assertTrue(self._suppression_rapide(AlerteStock))
@@ -0,0 +1,66 @@
+# audit/tracking.py
+"""
+Suivi des valeurs d'origine des champs, sans relecture en base.
+
+`FieldTrackerMixin` mémorise sur l'instance les valeurs chargées par
+`from_db` ; les changements se calculent ensuite par simple comparaison.
+Le module ne dépend d'aucun modèle : il peut être hérité par les modèles des
+autres applications sans import circulaire.
+"""
+from django.db import models
+
+
+def _is_expression(value):
+    # F("quantite") - 1, etc. : la valeur réelle n'est connue qu'en base
+    return hasattr(value, "resolve_expression")
+
+
+class FieldTrackerMixin(models.Model):
+    """Mémorise les valeurs d'origine des champs concrets de l'instance"""
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # `field_names` contient les attname (ex. "service_id") des champs chargés
+        instance._original_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.reset_tracking()
+
+    def reset_tracking(self):
+        """Prend les valeurs actuelles comme nouvelles valeurs d'origine."""
+        deferred = self.get_deferred_fields()
+        self._original_values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+            if field.attname not in deferred
+            and not _is_expression(getattr(self, field.attname))
+        }
+
+    def get_original_values(self):
+        """{attname: valeur d'origine}, ou None pour une instance non chargée."""
+        return getattr(self, "_original_values", None)
+
+    def get_changes(self, excluded_fields=None, original=None):
+        """Changements depuis le chargement, au format de `get_model_changes`."""
+        if original is None:
+            original = self.get_original_values() or {}
+        excluded_fields = excluded_fields or []
+        changes = {}
+
+        for field in self._meta.concrete_fields:
+            if field.name in excluded_fields or field.attname not in original:
+                continue
+            old_value = original[field.attname]
+            new_value = getattr(self, field.attname)
+            if old_value != new_value:
+                changes[field.name] = {
+                    "old": str(old_value) if old_value is not None else None,
+                    "new": str(new_value) if new_value is not None else None,
+                }
+        return changes
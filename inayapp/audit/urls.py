@@ -7,4 +7,5 @@ app_name = "audit"
 urlpatterns = [
     path("dashboard/", views.audit_dashboard, name="dashboard"),
     path("api/stats/", views.audit_api_stats, name="api_stats"),
+    path("api/writer/", views.audit_writer_metrics, name="writer_metrics"),
 ]
@@ -1,6 +1,8 @@
 # audit/utils.py
 from django.contrib.contenttypes.models import ContentType
-from .models import AuditLog, AuditConfiguration
+from .models import AuditLog
+from .registry import registry
+from .writer import record
 import threading
 
 _thread_local = threading.local()
@@ -42,23 +44,10 @@ def create_audit_log(instance, action, changes=None):
     content_type = ContentType.objects.get_for_model(instance)
 
     # Vérifier si l'audit est activé pour ce modèle
-    try:
-        config = AuditConfiguration.objects.get(content_type=content_type)
-        if not config.is_active:
-            return
-
-        # Vérifier si cette action spécifique est trackée
-        if action == "CREATE" and not config.track_create:
-            return
-        elif action == "UPDATE" and not config.track_update:
-            return
-        elif action == "DELETE" and not config.track_delete:
-            return
-        elif action == "VIEW" and not config.track_view:
-            return
-    except AuditConfiguration.DoesNotExist:
-        # Si pas de configuration, on audit par défaut
-        pass
+    # (sans configuration, on audite par défaut)
+    config = registry.get(type(instance))
+    if config is not None and registry.tracked(type(instance), action) is None:
+        return
 
     audit_data = {
         "user": user,
@@ -83,7 +72,33 @@ def create_audit_log(instance, action, changes=None):
             }
         )
 
-    AuditLog.objects.create(**audit_data)
+    record(AuditLog(**audit_data))
+
+
+def create_bulk_audit_logs(instances, action):
+    """Journalise des instances écrites par bulk_create / bulk_update
+
+    Les écritures en bloc n'émettent pas les signaux post_save : l'appelant
+    journalise ici, avec les mêmes règles que `audit_model_save`.
+    """
+    instances = list(instances)
+    if not instances:
+        return
+    config = registry.tracked(type(instances[0]), action)
+    if config is None:
+        return
+
+    for instance in instances:
+        if action != "UPDATE":
+            create_audit_log(instance, action)
+            continue
+        # Sans valeurs d'origine (FieldTrackerMixin), pas de changements connus
+        if getattr(instance, "get_original_values", lambda: None)() is None:
+            continue
+        changes = instance.get_changes(config.excluded_fields)
+        instance.reset_tracking()
+        if changes:
+            create_audit_log(instance, "UPDATE", changes)
 
 
 def get_model_changes(old_instance, new_instance, excluded_fields=None):
@@ -1,10 +1,13 @@
 # audit/views.py
 from django.shortcuts import render
 from django.contrib.admin.views.decorators import staff_member_required
-from django.db.models import Count, Q
+from django.db.models import Q, Sum
+from inayapp.timeseries import serie
 from django.utils import timezone
 from datetime import timedelta
-from .models import AuditLog, LoginAttempt
+from .counters import counters_since, total
+from .models import AuditCounter, AuditLog, LoginAttempt
+from .writer import get_writer
 from django.http import JsonResponse
 import json
 
@@ -15,13 +18,13 @@ def audit_dashboard(request):
     # Statistiques des dernières 24h
     last_24h = timezone.now() - timedelta(hours=24)
 
+    # Les comptages viennent des compteurs horaires (audit.counters)
+    recent_counters = counters_since(24)
+
     stats = {
-        "total_logs": AuditLog.objects.count(),
-        "logs_24h": AuditLog.objects.filter(timestamp__gte=last_24h).count(),
-        "unique_users_24h": AuditLog.objects.filter(timestamp__gte=last_24h)
-        .values("user")
-        .distinct()
-        .count(),
+        "total_logs": total(AuditCounter.objects.all()),
+        "logs_24h": total(recent_counters),
+        "unique_users_24h": recent_counters.values("username").distinct().count(),
         "failed_logins_24h": LoginAttempt.objects.filter(
             timestamp__gte=last_24h, successful=False
         ).count(),
@@ -29,16 +32,15 @@ def audit_dashboard(request):
 
     # Actions les plus fréquentes
     top_actions = (
-        AuditLog.objects.values("action")
-        .annotate(count=Count("id"))
+        AuditCounter.objects.values("action")
+        .annotate(count=Sum("count"))
         .order_by("-count")[:10]
     )
 
     # Utilisateurs les plus actifs
     top_users = (
-        AuditLog.objects.filter(timestamp__gte=last_24h)
-        .values("username")
-        .annotate(count=Count("id"))
+        recent_counters.values("username")
+        .annotate(count=Sum("count"))
         .order_by("-count")[:10]
     )
 
@@ -63,25 +65,24 @@ def audit_api_stats(request):
     days = int(request.GET.get("days", 7))
     start_date = timezone.now() - timedelta(days=days)
 
-    # Logs par jour
-    logs_by_day = []
-    for i in range(days):
-        date = start_date + timedelta(days=i)
-        date_start = date.replace(hour=0, minute=0, second=0, microsecond=0)
-        date_end = date_start + timedelta(days=1)
-
-        count = AuditLog.objects.filter(
-            timestamp__gte=date_start, timestamp__lt=date_end
-        ).count()
-
-        logs_by_day.append({"date": date.strftime("%Y-%m-%d"), "count": count})
+    # Logs par jour (une requête groupée sur les compteurs horaires)
+    counters = AuditCounter.objects.filter(
+        hour__gte=start_date.replace(minute=0, second=0, microsecond=0)
+    )
+    logs_by_day = [
+        {"date": jour["date"].strftime("%Y-%m-%d"), "count": jour["count"]}
+        for jour in serie(
+            counters,
+            "hour",
+            start_date,
+            start_date + timedelta(days=days - 1),
+            valeurs={"count": Sum("count")},
+        )
+    ]
 
     # Actions par type
     actions_by_type = list(
-        AuditLog.objects.filter(timestamp__gte=start_date)
-        .values("action")
-        .annotate(count=Count("id"))
-        .order_by("-count")
+        counters.values("action").annotate(count=Sum("count")).order_by("-count")
     )
 
     return JsonResponse(
@@ -90,3 +91,9 @@ def audit_api_stats(request):
             "actions_by_type": actions_by_type,
         }
     )
+
+
+@staff_member_required
+def audit_writer_metrics(request):
+    """Compteurs de la file d'écriture différée des journaux d'audit"""
+    return JsonResponse(get_writer().metrics())
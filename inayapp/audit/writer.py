@@ -0,0 +1,253 @@
+# audit/writer.py
+"""
+Écriture différée et groupée des journaux d'audit.
+
+Les événements (instances `AuditLog` / `LoginAttempt` non sauvegardées) sont
+placés dans une file bornée en mémoire puis insérés par lots avec
+`bulk_create` depuis un thread d'arrière-plan : la requête HTTP ne paie plus
+l'aller-retour d'insertion. Un événement émis dans une transaction n'est mis
+en file qu'au commit, comme l'écriture synchrone qu'il remplace.
+
+Réglages (`AUDIT_SETTINGS["WRITER"]`) :
+    MODE           "thread" (défaut) ou "sync" (écriture immédiate)
+    MAX_QUEUE_SIZE taille maximale de la file
+    BATCH_SIZE     nombre d'événements par `bulk_create`
+    FLUSH_INTERVAL délai maximal (s) avant écriture d'un lot incomplet
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+from .counters import increment_counters
+from .models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "MODE": "thread",
+    "MAX_QUEUE_SIZE": 10000,
+    "BATCH_SIZE": 200,
+    "FLUSH_INTERVAL": 2.0,
+}
+
+
+def get_writer_settings():
+    options = dict(DEFAULTS)
+    options.update(getattr(settings, "AUDIT_SETTINGS", {}).get("WRITER", {}))
+    return options
+
+
+class AuditWriter:
+    """
+    File bornée d'événements d'audit vidée par lots.
+
+    Contre-pression : si la file est pleine, l'appelant écrit lui-même un lot
+    avant d'ajouter son événement (rien n'est perdu, la requête ralentit).
+    Les compteurs de `metrics()` permettent de surveiller ce cas.
+    """
+
+    def __init__(self, max_queue_size=10000, batch_size=200, flush_interval=2.0, mode="thread"):
+        self.mode = mode
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max(1, max_queue_size))
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.stats = {
+            "enqueued": 0,
+            "written": 0,
+            "failed": 0,
+            "batches": 0,
+            "backpressure_flushes": 0,
+            "high_water": 0,
+            "last_flush_seconds": 0.0,
+        }
+
+    # ------------------------------------------------------------------ #
+    # Alimentation
+    # ------------------------------------------------------------------ #
+
+    def record(self, instance):
+        """Enregistre un événement (au commit si une transaction est ouverte)."""
+        if self.mode == "sync":
+            instance.save()
+            self._count([instance])
+            return
+        if connection.in_atomic_block:
+            transaction.on_commit(lambda: self.put(instance))
+        else:
+            self.put(instance)
+
+    def put(self, instance):
+        self._ensure_thread()
+        while True:
+            try:
+                self.queue.put_nowait(instance)
+                break
+            except queue.Full:
+                # File pleine : l'appelant vide un lot lui-même
+                self._increment("backpressure_flushes")
+                self.flush(max_items=self.batch_size)
+
+        depth = self.queue.qsize()
+        with self._lock:
+            self.stats["enqueued"] += 1
+            if depth > self.stats["high_water"]:
+                self.stats["high_water"] = depth
+        if depth >= self.batch_size:
+            self._wakeup.set()
+
+    # ------------------------------------------------------------------ #
+    # Écriture
+    # ------------------------------------------------------------------ #
+
+    def flush(self, max_items=None):
+        """Écrit les événements en file (au plus `max_items`) ; retourne le nombre écrit."""
+        written = 0
+        with self._flush_lock:
+            while max_items is None or written < max_items:
+                limit = self.batch_size
+                if max_items is not None:
+                    limit = min(limit, max_items - written)
+                batch = self._drain(limit)
+                if not batch:
+                    break
+                self._write(batch)
+                written += len(batch)
+        return written
+
+    def _drain(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        started = time.perf_counter()
+        by_model = defaultdict(list)
+        for instance in batch:
+            by_model[type(instance)].append(instance)
+        for model, instances in by_model.items():
+            try:
+                model.objects.bulk_create(instances)
+            except Exception:
+                self._increment("failed", len(instances))
+                logger.exception(
+                    "Échec de l'écriture de %s événements d'audit (%s)",
+                    len(instances),
+                    model.__name__,
+                )
+            else:
+                self._increment("written", len(instances))
+                self._count(instances)
+        with self._lock:
+            self.stats["batches"] += 1
+            self.stats["last_flush_seconds"] = time.perf_counter() - started
+
+    def _count(self, instances):
+        # Compteurs horaires des tableaux de bord (audit.counters)
+        logs = [instance for instance in instances if isinstance(instance, AuditLog)]
+        if not logs:
+            return
+        try:
+            increment_counters(logs)
+        except Exception:
+            logger.exception("Échec de la mise à jour des compteurs d'audit")
+
+    def _increment(self, key, value=1):
+        with self._lock:
+            self.stats[key] += value
+
+    # ------------------------------------------------------------------ #
+    # Thread d'arrière-plan
+    # ------------------------------------------------------------------ #
+
+    def _ensure_thread(self):
+        # Un thread par processus (les workers forkés repartent de zéro)
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="audit-writer", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception:
+                logger.exception("Erreur du thread d'écriture de l'audit")
+        connection.close()
+
+    def shutdown(self, timeout=10):
+        """Arrête le thread et écrit tout ce qui reste en file."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        self.flush()
+
+    def metrics(self):
+        with self._lock:
+            data = dict(self.stats)
+        data.update(
+            {
+                "mode": self.mode,
+                "queue_size": self.queue.qsize(),
+                "max_queue_size": self.queue.maxsize,
+                "batch_size": self.batch_size,
+                "thread_alive": bool(self._thread and self._thread.is_alive()),
+            }
+        )
+        return data
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                options = get_writer_settings()
+                _writer = AuditWriter(
+                    max_queue_size=options["MAX_QUEUE_SIZE"],
+                    batch_size=options["BATCH_SIZE"],
+                    flush_interval=options["FLUSH_INTERVAL"],
+                    mode=options["MODE"],
+                )
+                atexit.register(_writer.shutdown)
+    return _writer
+
+
+def record(instance):
+    """Point d'entrée : enregistre une instance d'audit non sauvegardée."""
+    get_writer().record(instance)
+
+
+def flush():
+    return get_writer().flush()
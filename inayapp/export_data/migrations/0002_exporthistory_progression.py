@@ -0,0 +1,70 @@
+from django.db import migrations, models
+from django.db.models import F
+
+
+def exports_termines(apps, schema_editor):
+    ExportHistory = apps.get_model("export_data", "ExportHistory")
+    ExportHistory.objects.update(exported_count=F("records_count"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("export_data", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="exporthistory",
+            name="export_format",
+            field=models.CharField(
+                choices=[
+                    ("csv", "CSV"),
+                    ("excel", "Excel"),
+                    ("json", "JSON"),
+                    ("jsonl", "JSON Lines"),
+                ],
+                max_length=10,
+            ),
+        ),
+        # Les exports déjà enregistrés sont terminés
+        migrations.AddField(
+            model_name="exporthistory",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("running", "En cours"),
+                    ("completed", "Terminé"),
+                    ("failed", "Échec"),
+                    ("interrupted", "Interrompu"),
+                ],
+                default="completed",
+                max_length=12,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="exporthistory",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("running", "En cours"),
+                    ("completed", "Terminé"),
+                    ("failed", "Échec"),
+                    ("interrupted", "Interrompu"),
+                ],
+                default="running",
+                max_length=12,
+            ),
+        ),
+        migrations.AddField(
+            model_name="exporthistory",
+            name="exported_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="exporthistory",
+            name="finished_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(exports_termines, migrations.RunPython.noop),
+    ]
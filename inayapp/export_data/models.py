@@ -5,19 +5,38 @@ from django.contrib.auth.models import User
 class ExportHistory(models.Model):
     """Historique des exports effectués"""
 
+    STATUS_CHOICES = [
+        ("running", "En cours"),
+        ("completed", "Terminé"),
+        ("failed", "Échec"),
+        ("interrupted", "Interrompu"),
+    ]
+
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     exported_models = models.TextField(help_text="Modèles exportés (JSON)")
     export_format = models.CharField(
-        max_length=10, choices=[("csv", "CSV"), ("excel", "Excel"), ("json", "JSON")]
+        max_length=10,
+        choices=[("csv", "CSV"), ("excel", "Excel"), ("json", "JSON"), ("jsonl", "JSON Lines")],
     )
     file_path = models.CharField(max_length=500)
     created_at = models.DateTimeField(auto_now_add=True)
     records_count = models.IntegerField(default=0)
+    # Avancement, mis à jour à chaque lot pendant l'export
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default="running")
+    exported_count = models.IntegerField(default=0)
+    finished_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ["-created_at"]
         verbose_name = "Historique d'export"
         verbose_name_plural = "Historiques d'exports"
 
+    @property
+    def progress(self):
+        """Pourcentage des enregistrements déjà exportés"""
+        if not self.records_count:
+            return 100 if self.status == "completed" else 0
+        return min(100, round(self.exported_count * 100 / self.records_count))
+
     def __str__(self):
         return f"Export {self.export_format} - {self.created_at.strftime('%d/%m/%Y %H:%M')}"
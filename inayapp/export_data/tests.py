@@ -1,3 +1,49 @@
+import json
+
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-# Create your tests here.
+from .models import ExportHistory
+from .utils import DataExporter
+
+
+class ExportFluxTests(TestCase):
+    """L'issue d'un export en flux est enregistrée, même sans téléchargement"""
+
+    def setUp(self):
+        self.user = User.objects.create_user("export", "export@example.com", "x")
+
+    def _exporter(self, export_format):
+        exporter = DataExporter()
+        exporter.prepare_data({"auth": ["user", "group"]})
+        exporter.history = ExportHistory.objects.create(
+            user=self.user,
+            exported_models="{}",
+            export_format=export_format,
+            file_path="export_test",
+            records_count=exporter.total_records,
+        )
+        return exporter
+
+    def _fermer(self, response):
+        # Fermetures du flux seules : close() émet aussi request_finished
+        for fermer in response._resource_closers:
+            fermer()
+
+    def test_json_complet(self):
+        exporter = self._exporter("json")
+        response = DataExporter.export_to_json(exporter)
+        donnees = json.loads(b"".join(response.streaming_content))
+        self._fermer(response)
+        self.assertEqual(donnees["total_records"], 1)
+        self.assertEqual(donnees["models"]["auth.group"], {"verbose_name": "groupes", "data": [], "count": 0})
+        exporter.history.refresh_from_db()
+        self.assertEqual(exporter.history.status, "completed")
+        self.assertEqual(exporter.history.records_count, 1)
+
+    def test_client_parti_avant_le_premier_morceau(self):
+        exporter = self._exporter("csv")
+        self._fermer(DataExporter.export_to_csv(exporter))
+        exporter.history.refresh_from_db()
+        self.assertEqual(exporter.history.status, "interrupted")
+        self.assertEqual(exporter.history.exported_count, 0)
@@ -7,4 +7,5 @@ urlpatterns = [
     path("", views.export_data_view, name="index"),
     path("preview/", views.get_model_preview, name="model_preview"),
     path("debug/", views.debug_apps, name="debug_apps"),
+    path("pdf/<str:cle>/", views.telecharger_pdf, name="telecharger_pdf"),
 ]
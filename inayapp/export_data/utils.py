@@ -1,28 +1,118 @@
 # export_data / utils.py
+"""
+Moteur d'export : les tables sont lues par lots sur la clé primaire et
+écrites au fil de l'eau, la mémoire reste la même quelle que soit la taille
+des tables.
+
+CSV, JSON et JSONL partent en `StreamingHttpResponse` ; le classeur Excel
+est écrit en mode `constant_memory` dans un fichier temporaire, puis envoyé
+en `FileResponse`. L'avancement (`exported_count`, `status`) est enregistré
+dans ExportHistory à chaque lot. Les effectifs affichés sur la page d'export
+et annoncés avant l'export sont des estimations du moteur (information_schema),
+gardées en cache : aucun COUNT avant l'export, les nombres exacts sont comptés
+pendant l'écriture.
+"""
 import csv
 import json
+import logging
+import tempfile
+from datetime import datetime
+
 import xlsxwriter
 from django.apps import apps
-from django.http import HttpResponse
-from django.core.serializers import serialize
-from django.db.models import Model
-from io import BytesIO
-from datetime import datetime
-from django.conf import settings
-import logging
+from django.core.cache import cache
+from django.db import connection
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from .models import ExportHistory
 
 logger = logging.getLogger(__name__)
 
+CHUNK_SIZE = 2000
+CLE_ESTIMATIONS = "export_data:estimations"
+DUREE_ESTIMATIONS = 600
+
+# Nombre de lignes par table, sans COUNT : statistiques du moteur
+REQUETES_ESTIMATIONS = {
+    "mysql": (
+        "SELECT TABLE_NAME, TABLE_ROWS FROM information_schema.TABLES "
+        "WHERE TABLE_SCHEMA = DATABASE()"
+    ),
+    "postgresql": (
+        "SELECT c.relname, c.reltuples FROM pg_class c "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE c.relkind IN ('r', 'p') AND n.nspname = ANY(current_schemas(false))"
+    ),
+}
+
+
+def _statistiques_tables():
+    requete = REQUETES_ESTIMATIONS.get(connection.vendor)
+    if requete is None:
+        return {}
+    with connection.cursor() as cursor:
+        cursor.execute(requete)
+        # reltuples vaut -1 pour une table jamais analysée
+        return {table: int(lignes) for table, lignes in cursor.fetchall() if lignes is not None and lignes >= 0}
+
+
+def _calculer_estimations():
+    statistiques = _statistiques_tables()
+    estimations = {}
+    for model in apps.get_models():
+        table = model._meta.db_table
+        if table in statistiques:
+            estimations[model._meta.label] = (statistiques[table], True)
+            continue
+        # Pas de statistiques (SQLite, vue, table récente) : comptage exact
+        try:
+            estimations[model._meta.label] = (model.objects.count(), False)
+        except Exception as e:
+            logger.warning(f"Impossible de compter les objets pour {model.__name__}: {e}")
+    return estimations
+
+
+def estimations():
+    """{label du modèle: (nombre de lignes, estimé ?)}, en cache DUREE_ESTIMATIONS secondes"""
+    return cache.get_or_set(CLE_ESTIMATIONS, _calculer_estimations, DUREE_ESTIMATIONS)
+
+
+def valeur_export(obj, field):
+    """Valeur d'un champ telle qu'elle est exportée (texte)"""
+    try:
+        value = getattr(obj, field.name)
+        # Gérer les différents types de champs
+        if value is None:
+            return ""
+        if hasattr(value, "strftime"):  # DateTime
+            return value.strftime("%Y-%m-%d %H:%M:%S")
+        return str(value)
+    except Exception as e:
+        logger.warning(f"Erreur lors de la récupération du champ {field.name}: {e}")
+        return "Erreur"
+
+
+class _Tampon:
+    """Pseudo-fichier pour csv.writer : renvoie la ligne au lieu de l'écrire"""
+
+    def write(self, value):
+        return value
+
 
 class DataExporter:
     """Classe pour gérer l'export des données"""
 
-    def __init__(self):
+    def __init__(self, history=None, chunk_size=CHUNK_SIZE):
         self.models_data = {}
+        self.history = history
+        self.chunk_size = chunk_size
+        self.exported_count = 0
 
     def get_all_models(self):
-        """Récupère tous les modèles du projet"""
+        """Récupère tous les modèles du projet, avec leur nombre estimé de lignes"""
         all_models = {}
+        nombres = estimations()
 
         # Apps à exclure par défaut
         EXCLUDED_APPS = [
@@ -38,209 +128,277 @@ class DataExporter:
         ]
 
         for app_config in apps.get_app_configs():
-            if app_config.name not in EXCLUDED_APPS:
-                app_models = []
-                try:
-                    for model in app_config.get_models():
-                        # Vérifier que le modèle a des données ou peut être interrogé
-                        try:
-                            count = model.objects.count()
-                            app_models.append(
-                                {
-                                    "name": model.__name__,
-                                    "model": model,
-                                    "verbose_name": getattr(
-                                        model._meta, "verbose_name", model.__name__
-                                    ),
-                                    "count": count,
-                                    "app_label": app_config.label,  # Ajouter le label de l'app
-                                }
-                            )
-                        except Exception as e:
-                            logger.warning(
-                                f"Impossible de compter les objets pour {model.__name__}: {e}"
-                            )
-                            continue
-
-                    if app_models:
-                        all_models[app_config.label] = (
-                            {  # Utiliser le label au lieu du nom
-                                "verbose_name": app_config.verbose_name
-                                or app_config.name,
-                                "models": app_models,
-                            }
-                        )
-                except Exception as e:
-                    logger.error(
-                        f"Erreur lors du traitement de l'app {app_config.name}: {e}"
-                    )
+            if app_config.name in EXCLUDED_APPS:
+                continue
+            app_models = []
+            for model in app_config.get_models():
+                # Modèle impossible à interroger : absent des estimations
+                if model._meta.label not in nombres:
                     continue
+                count, estimated = nombres[model._meta.label]
+                app_models.append(
+                    {
+                        "name": model.__name__,
+                        "model": model,
+                        "verbose_name": getattr(model._meta, "verbose_name", model.__name__),
+                        "count": count,
+                        "estimated": estimated,
+                        "app_label": app_config.label,  # Ajouter le label de l'app
+                    }
+                )
+
+            if app_models:
+                all_models[app_config.label] = {  # Utiliser le label au lieu du nom
+                    "verbose_name": app_config.verbose_name or app_config.name,
+                    "models": app_models,
+                }
 
         return all_models
 
     def prepare_data(self, selected_models):
-        """Prépare les données pour l'export - VERSION CORRIGÉE"""
+        """Résout les modèles sélectionnés, avec leur nombre estimé de lignes"""
         self.models_data = {}
+        nombres = estimations()
 
         logger.info(f"Préparation des données pour: {selected_models}")
 
         for app_label, model_names in selected_models.items():
-            logger.info(f"Traitement de l'app: {app_label}")
-
             # Vérifier que l'app existe
             try:
-                app_config = apps.get_app_config(app_label)
+                apps.get_app_config(app_label)
             except LookupError:
-                logger.error(
-                    f"Application '{app_label}' non trouvée. Apps disponibles: {[ac.label for ac in apps.get_app_configs()]}"
-                )
+                logger.error(f"Application '{app_label}' non trouvée")
                 continue
 
             for model_name in model_names:
                 try:
-                    # Utiliser le label de l'app au lieu du nom
                     model_class = apps.get_model(app_label, model_name)
-                    logger.info(f"Traitement du modèle: {app_label}.{model_name}")
-
-                    queryset = model_class.objects.all()
-
-                    # Convertir en données sérialisables
-                    data = []
-                    for obj in queryset:
-                        obj_data = {}
-                        for field in model_class._meta.fields:
-                            try:
-                                value = getattr(obj, field.name)
-                                # Gérer les différents types de champs
-                                if value is None:
-                                    obj_data[field.name] = ""
-                                elif hasattr(value, "strftime"):  # DateTime
-                                    obj_data[field.name] = value.strftime(
-                                        "%Y-%m-%d %H:%M:%S"
-                                    )
-                                elif hasattr(value, "__str__"):
-                                    obj_data[field.name] = str(value)
-                                else:
-                                    obj_data[field.name] = value
-                            except Exception as e:
-                                logger.warning(
-                                    f"Erreur lors de la récupération du champ {field.name}: {e}"
-                                )
-                                obj_data[field.name] = "Erreur"
-                        data.append(obj_data)
-
                     model_key = f"{app_label}.{model_name}"
+                    count, estimated = nombres.get(model_class._meta.label, (0, True))
                     self.models_data[model_key] = {
-                        "data": data,
-                        "verbose_name": model_class._meta.verbose_name_plural
-                        or model_name,
-                        "count": len(data),
+                        "model": model_class,
+                        "verbose_name": model_class._meta.verbose_name_plural or model_name,
+                        "headers": [field.name for field in model_class._meta.fields],
+                        "count": count,
+                        "estimated": estimated,
                     }
-
                     logger.info(
-                        f"Modèle {model_key}: {len(data)} enregistrements préparés"
+                        f"Modèle {model_key}: {self.models_data[model_key]['count']} enregistrements"
                     )
-
                 except LookupError:
-                    logger.error(
-                        f"Modèle '{model_name}' non trouvé dans l'app '{app_label}'"
-                    )
+                    logger.error(f"Modèle '{model_name}' non trouvé dans l'app '{app_label}'")
                     continue
                 except Exception as e:
-                    logger.error(
-                        f"Erreur lors du traitement de {app_label}.{model_name}: {e}"
-                    )
+                    logger.error(f"Erreur lors du traitement de {app_label}.{model_name}: {e}")
                     continue
 
-    def export_to_csv(self):
-        """Export en CSV"""
-        response = HttpResponse(content_type="text/csv; charset=utf-8")
-        response["Content-Disposition"] = (
-            f'attachment; filename="export_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv"'
-        )
+    @property
+    def total_records(self):
+        """Nombre (estimé) de lignes à exporter"""
+        return sum(info["count"] for info in self.models_data.values())
+
+    def est_vide(self):
+        """Vrai si aucun modèle sélectionné n'a de ligne (une estimation peut valoir 0 à tort)"""
+        return not any(info["model"].objects.exists() for info in self.models_data.values())
+
+    # ── Lecture par lots ────────────────────────────────────────────────────
+
+    def iter_rows(self, model_key):
+        """Lignes (listes de textes) du modèle, lues par lots de `chunk_size`"""
+        model_class = self.models_data[model_key]["model"]
+        fields = model_class._meta.fields
+        queryset = model_class.objects.select_related(
+            *[field.name for field in fields if field.is_relation]
+        ).order_by("pk")
+        # Pagination sur la clé primaire : mysqlclient charge tout le résultat
+        # d'une requête côté client, même avec .iterator()
+        dernier = None
+        while True:
+            lot = queryset if dernier is None else queryset.filter(pk__gt=dernier)
+            nombre = 0
+            for obj in lot[: self.chunk_size].iterator(chunk_size=self.chunk_size):
+                nombre += 1
+                dernier = obj.pk
+                yield [valeur_export(obj, field) for field in fields]
+            self._avancer(nombre)
+            if nombre < self.chunk_size:
+                return
+
+    def _avancer(self, nombre):
+        self.exported_count += nombre
+        if self.history is not None and nombre:
+            ExportHistory.objects.filter(pk=self.history.pk).update(
+                exported_count=self.exported_count
+            )
+
+    def _terminer(self, status):
+        if self.history is None:
+            return
+        self.history.status = status
+        self.history.exported_count = self.exported_count
+        self.history.finished_at = timezone.now()
+        champs = ["status", "exported_count", "finished_at"]
+        if status == "completed":
+            # Le nombre annoncé était une estimation
+            self.history.records_count = self.exported_count
+            champs.append("records_count")
+        self.history.save(update_fields=champs)
+
+    def _nom_fichier(self, extension):
+        return f"export_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+
+    def _reponse_flux(self, morceaux, content_type, extension):
+        response = StreamingHttpResponse(_Flux(self, morceaux), content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{self._nom_fichier(extension)}"'
+        return response
 
-        writer = csv.writer(response)
+    # ── Formats ─────────────────────────────────────────────────────────────
+
+    def _lignes_csv(self):
+        writer = csv.writer(_Tampon())
 
         for model_key, model_info in self.models_data.items():
-            if model_info["data"]:
-                # Titre du modèle
-                writer.writerow(
+            rows = self.iter_rows(model_key)
+            # Modèles vides ignorés ; l'en-tête n'est écrit qu'avec la première ligne
+            for row in rows:
+                environ = "~" if model_info["estimated"] else ""
+                yield writer.writerow(
                     [
-                        f"=== {model_info['verbose_name']} ({model_info['count']} enregistrements) ==="
+                        f"=== {model_info['verbose_name']} "
+                        f"({environ}{model_info['count']} enregistrements) ==="
                     ]
                 )
+                yield writer.writerow(model_info["headers"])
+                yield writer.writerow(row)
+                break
+            else:
+                continue
+            for row in rows:
+                yield writer.writerow(row)
+            yield writer.writerow([])  # Ligne vide entre les modèles
 
-                # En-têtes
-                headers = list(model_info["data"][0].keys())
-                writer.writerow(headers)
-
-                # Données
-                for row in model_info["data"]:
-                    writer.writerow([str(row.get(header, "")) for header in headers])
-
-                writer.writerow([])  # Ligne vide entre les modèles
-
-        return response
+    def export_to_csv(self):
+        """Export en CSV (flux)"""
+        return self._reponse_flux(self._lignes_csv(), "text/csv; charset=utf-8", "csv")
 
     def export_to_excel(self):
-        """Export en Excel"""
-        output = BytesIO()
-        workbook = xlsxwriter.Workbook(output, {"in_memory": True})
-
-        # Styles
-        header_format = workbook.add_format(
-            {"bold": True, "font_color": "white", "bg_color": "#4472C4", "border": 1}
-        )
-
-        data_format = workbook.add_format({"border": 1})
-
-        for model_key, model_info in self.models_data.items():
-            if model_info["data"]:
-                # Créer une feuille par modèle (nom sécurisé pour Excel)
-                sheet_name = model_key.replace(".", "_")[:31]
-                worksheet = workbook.add_worksheet(sheet_name)
-
-                # En-têtes
-                headers = list(model_info["data"][0].keys())
-                for col, header in enumerate(headers):
-                    worksheet.write(0, col, header, header_format)
-
-                # Données
-                for row_idx, row_data in enumerate(model_info["data"], 1):
-                    for col_idx, header in enumerate(headers):
-                        value = str(row_data.get(header, ""))
-                        worksheet.write(row_idx, col_idx, value, data_format)
-
-                # Ajuster la largeur des colonnes
-                for col_idx in range(len(headers)):
-                    worksheet.set_column(col_idx, col_idx, 15)
-
-        workbook.close()
-        output.seek(0)
-
-        response = HttpResponse(
-            output.read(),
+        """Export en Excel, écrit ligne par ligne dans un fichier temporaire"""
+        fichier = tempfile.TemporaryFile(suffix=".xlsx")
+        try:
+            workbook = xlsxwriter.Workbook(fichier, {"constant_memory": True})
+
+            # Styles
+            header_format = workbook.add_format(
+                {"bold": True, "font_color": "white", "bg_color": "#4472C4", "border": 1}
+            )
+            data_format = workbook.add_format({"border": 1})
+
+            for model_key, model_info in self.models_data.items():
+                worksheet = None
+                # constant_memory : chaque ligne est écrite sur disque dès la suivante
+                for row_idx, row in enumerate(self.iter_rows(model_key), 1):
+                    if worksheet is None:
+                        # Une feuille par modèle non vide (nom sécurisé pour Excel)
+                        worksheet = workbook.add_worksheet(model_key.replace(".", "_")[:31])
+                        headers = model_info["headers"]
+                        worksheet.set_column(0, len(headers) - 1, 15)
+                        worksheet.write_row(0, 0, headers, header_format)
+                    worksheet.write_row(row_idx, 0, row, data_format)
+
+            workbook.close()
+        except Exception:
+            fichier.close()
+            self._terminer("failed")
+            raise
+        self._terminer("completed")
+        fichier.seek(0)
+
+        # FileResponse ferme (et supprime) le fichier temporaire après l'envoi
+        return FileResponse(
+            fichier,
+            as_attachment=True,
+            filename=self._nom_fichier("xlsx"),
             content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         )
-        response["Content-Disposition"] = (
-            f'attachment; filename="export_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx"'
-        )
-
-        return response
-
-    def export_to_json(self):
-        """Export en JSON"""
-        response = HttpResponse(content_type="application/json; charset=utf-8")
-        response["Content-Disposition"] = (
-            f'attachment; filename="export_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json"'
-        )
 
-        export_data = {
+    def _morceaux_json(self):
+        # Nombres exacts comptés pendant l'écriture : écrits après les données
+        entete = {
             "export_date": datetime.now().isoformat(),
             "total_models": len(self.models_data),
-            "total_records": sum(info["count"] for info in self.models_data.values()),
-            "models": self.models_data,
         }
+        yield json.dumps(entete, ensure_ascii=False, indent=2)[:-2] + ',\n  "models": {'
+        total = 0
+        for index, (model_key, model_info) in enumerate(self.models_data.items()):
+            resume = {"verbose_name": str(model_info["verbose_name"])}
+            yield (
+                ("," if index else "")
+                + f"\n    {json.dumps(model_key)}: "
+                + json.dumps(resume, ensure_ascii=False)[:-1]
+                + ', "data": ['
+            )
+            headers = model_info["headers"]
+            count = 0
+            for row in self.iter_rows(model_key):
+                yield ("," if count else "") + "\n      " + json.dumps(
+                    dict(zip(headers, row)), ensure_ascii=False
+                )
+                count += 1
+            total += count
+            yield f'\n    ], "count": {count}}}'
+        yield f'\n  }},\n  "total_records": {total}\n}}\n'
 
-        json.dump(export_data, response, ensure_ascii=False, indent=2)
-        return response
+    def export_to_json(self):
+        """Export en JSON (flux, même structure que l'export d'origine)"""
+        return self._reponse_flux(self._morceaux_json(), "application/json; charset=utf-8", "json")
+
+    def _lignes_jsonl(self):
+        for model_key, model_info in self.models_data.items():
+            headers = model_info["headers"]
+            for row in self.iter_rows(model_key):
+                yield json.dumps(
+                    {"model": model_key, "fields": dict(zip(headers, row))}, ensure_ascii=False
+                ) + "\n"
+
+    def export_to_jsonl(self):
+        """Export en JSON Lines : un enregistrement par ligne"""
+        return self._reponse_flux(self._lignes_jsonl(), "application/x-ndjson; charset=utf-8", "jsonl")
+
+
+class _Flux:
+    """
+    Itérateur d'un export en flux, qui enregistre son issue : terminé,
+    échec, ou interrompu à la fermeture de la réponse (client parti, même
+    avant le premier morceau, quand un générateur n'a encore rien exécuté).
+    """
+
+    def __init__(self, exporter, morceaux):
+        self.exporter = exporter
+        self.morceaux = morceaux
+        self.termine = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.morceaux)
+        except StopIteration:
+            self._terminer("completed")
+            raise
+        except Exception:
+            logger.exception(
+                "Erreur pendant l'export %s", getattr(self.exporter.history, "pk", "")
+            )
+            self._terminer("failed")
+            raise
+
+    def close(self):
+        # Appelé par Django à la fin de la réponse, complète ou non
+        self.morceaux.close()
+        self._terminer("interrupted")
+
+    def _terminer(self, status):
+        if not self.termine:
+            self.termine = True
+            self.exporter._terminer(status)
@@ -7,7 +7,9 @@ from django.contrib import messages
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.core.paginator import Paginator
-from .utils import DataExporter
+from utils import pdf
+
+from .utils import DataExporter, estimations
 from .models import ExportHistory
 import json
 import logging
@@ -62,22 +64,30 @@ def export_data_view(request):
             )
             return render(request, "export_data/index.html", context)
 
+        exporters = {
+            "csv": DataExporter.export_to_csv,
+            "excel": DataExporter.export_to_excel,
+            "json": DataExporter.export_to_json,
+            "jsonl": DataExporter.export_to_jsonl,
+        }
+        if export_format not in exporters:
+            messages.error(request, f"Format d'export '{export_format}' non supporté.")
+            return render(request, "export_data/index.html", context)
+
         try:
-            # Préparer les données
+            # Résoudre les modèles ; nombre de lignes estimé, sans COUNT
             exporter.prepare_data(selected_models)
+            total_records = exporter.total_records
 
-            # Compter le nombre total d'enregistrements
-            total_records = sum(info["count"] for info in exporter.models_data.values())
-
-            if total_records == 0:
+            if exporter.est_vide():
                 messages.warning(
                     request,
                     "Aucun enregistrement trouvé dans les modèles sélectionnés.",
                 )
                 return render(request, "export_data/index.html", context)
 
-            # Créer l'historique
-            history = ExportHistory.objects.create(
+            # Créer l'historique : l'exporteur y note l'avancement à chaque lot
+            exporter.history = ExportHistory.objects.create(
                 user=request.user,
                 exported_models=json.dumps(selected_models),
                 export_format=export_format,
@@ -85,27 +95,13 @@ def export_data_view(request):
                 records_count=total_records,
             )
 
-            logger.info(f"Export créé: {history.id}, {total_records} enregistrements")
-
-            # Export selon le format
-            if export_format == "csv":
-                response = exporter.export_to_csv()
-            elif export_format == "excel":
-                response = exporter.export_to_excel()
-            elif export_format == "json":
-                response = exporter.export_to_json()
-            else:
-                messages.error(
-                    request, f"Format d'export '{export_format}' non supporté."
-                )
-                return render(request, "export_data/index.html", context)
+            logger.info(f"Export créé: {exporter.history.id}, ~{total_records} enregistrements")
 
-            # Marquer l'export comme réussi
-            history.status = "completed"
-            history.save()
+            # CSV/JSON/JSONL : flux écrit pendant le téléchargement
+            response = exporters[export_format](exporter)
 
             messages.success(
-                request, f"Export réussi: {total_records} enregistrements exportés."
+                request, f"Export lancé: environ {total_records} enregistrements."
             )
             return response
 
@@ -244,13 +240,14 @@ def debug_apps(request):
     if not request.user.is_superuser:
         return JsonResponse({"error": "Permission denied"})
 
+    nombres = estimations()
     apps_info = []
     for app_config in apps.get_app_configs():
         models_info = []
         try:
             for model in app_config.get_models():
                 try:
-                    count = model.objects.count()
+                    count, estimated = nombres[model._meta.label]
                     models_info.append(
                         {
                             "name": model.__name__,
@@ -260,10 +257,11 @@ def debug_apps(request):
                                 model._meta, "verbose_name", model.__name__
                             ),
                             "count": count,
+                            "estimated": estimated,
                         }
                     )
-                except Exception as e:
-                    models_info.append({"name": model.__name__, "error": str(e)})
+                except KeyError:
+                    models_info.append({"name": model.__name__, "error": "Comptage impossible"})
         except Exception as e:
             models_info.append({"error": f"Erreur app: {str(e)}"})
 
@@ -276,4 +274,20 @@ def debug_apps(request):
             }
         )
 
-    return JsonResponse({"apps": apps_info}, indent=2)
+    return JsonResponse({"apps": apps_info}, json_dumps_params={"indent": 2})
+
+
+@login_required
+def telecharger_pdf(request, cle):
+    """PDF préparé par utils.pdf.preparer ; 202 tant qu'il est en cours"""
+    etat = pdf.etat(cle)
+    if not etat or not pdf.autorise(cle, request.user.pk):
+        return JsonResponse({"statut": "inconnu"}, status=404)
+    if etat["statut"] == "en_cours":
+        return JsonResponse({"statut": "en_cours"}, status=202)
+    if etat["statut"] == "echec":
+        return JsonResponse({"statut": "echec"}, status=500)
+    contenu = pdf.contenu(cle)
+    if contenu is None:
+        return JsonResponse({"statut": "inconnu"}, status=404)
+    return pdf.reponse_pdf(contenu, etat["nom"])
@@ -5,4 +5,7 @@ class FinanceConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "finance"
     def ready(self):
+        import finance.especes
+        import finance.facturation
         import finance.signals
+        import finance.soldes
@@ -0,0 +1,192 @@
+# finance/especes.py
+"""
+Soldes espèces des prestations (SoldeEspecesPrestation).
+
+Chaque écriture d'acte, de consommation, de prestation, de paiement espèces ou
+de tranche marque la prestation concernée ; après le commit, les soldes des
+prestations marquées sont recalculés ensemble (quatre requêtes groupées, puis
+un upsert). Les vues espèces filtrent et paginent ensuite ces lignes au lieu
+de classer chaque prestation en Python.
+"""
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.db.models.signals import post_delete, post_save, pre_delete
+from inayapp.transactions import ApresCommit
+from medical.models import PrestationActe, PrestationKt
+from medical.models.prestation_Kt import Convention
+from pharmacies.models import ConsommationProduit
+
+from .models import PaiementEspecesKt, SoldeEspecesPrestation, TranchePaiementKt
+
+CHAMPS = (
+    "actes_especes", "nombre_actes_especes", "consommations_supplementaires",
+    "nombre_consommations_supplementaires", "supplements", "total_especes",
+    "montant_paye", "montant_restant", "statut_paiement", "a_payer",
+)
+# Actes réglés en espèces : sans convention, ou convention urgence
+ACTES_ESPECES = Q(convention__isnull=True) | Q(convention__est_urgence=True)
+
+
+def recalculer(prestation_ids):
+    """Recalcule et enregistre les soldes espèces des prestations `prestation_ids`."""
+    supplements = dict(
+        PrestationKt.objects.filter(pk__in=prestation_ids).values_list(
+            "pk", "prix_supplementaire"
+        )
+    )
+    if not supplements:
+        return []
+
+    actes = {
+        prestation_id: (nombre, total)
+        for prestation_id, nombre, total in PrestationActe.objects.filter(
+            ACTES_ESPECES, prestation_id__in=supplements
+        )
+        .values_list("prestation_id")
+        .annotate(nombre=Count("pk"), total=Sum("tarif_conventionne"))
+        .order_by()
+    }
+    consommations = {
+        prestation_id: (nombre, total)
+        for prestation_id, nombre, total in ConsommationProduit.objects.filter(
+            prestation_acte__prestation_id__in=supplements,
+            quantite_reelle__gt=F("quantite_defaut"),
+        )
+        .values_list("prestation_acte__prestation_id")
+        .annotate(
+            nombre=Count("pk"),
+            total=Sum(
+                ExpressionWrapper(
+                    (F("quantite_reelle") - F("quantite_defaut")) * F("prix_unitaire"),
+                    output_field=DecimalField(max_digits=12, decimal_places=2),
+                )
+            ),
+        )
+        .order_by()
+    }
+    paiements = {
+        prestation_id: (montant_paye, montant_restant, statut)
+        for prestation_id, montant_paye, montant_restant, statut in (
+            PaiementEspecesKt.objects.filter(prestation_id__in=supplements).values_list(
+                "prestation_id", "montant_paye", "montant_restant", "statut"
+            )
+        )
+    }
+
+    zero = Decimal("0.00")
+    soldes = []
+    for prestation_id in sorted(supplements):
+        supplement = supplements[prestation_id] or zero
+        nombre_actes, montant_actes = actes.get(prestation_id, (0, zero))
+        nombre_consos, montant_consos = consommations.get(prestation_id, (0, zero))
+        total = (montant_actes or zero) + (montant_consos or zero) + supplement
+        montant_paye, montant_restant, statut = paiements.get(prestation_id, (zero, total, ""))
+        soldes.append(
+            SoldeEspecesPrestation(
+                prestation_id=prestation_id,
+                actes_especes=montant_actes or zero,
+                nombre_actes_especes=nombre_actes,
+                consommations_supplementaires=montant_consos or zero,
+                nombre_consommations_supplementaires=nombre_consos,
+                supplements=supplement,
+                total_especes=total,
+                montant_paye=montant_paye,
+                montant_restant=montant_restant,
+                statut_paiement=statut,
+                a_payer=bool(nombre_actes or nombre_consos or supplement > 0),
+            )
+        )
+    cible = ["prestation"] if connection.features.supports_update_conflicts_with_target else None
+    SoldeEspecesPrestation.objects.bulk_create(
+        soldes,
+        update_conflicts=True,
+        unique_fields=cible,
+        update_fields=[*CHAMPS, "mis_a_jour"],
+    )
+    return soldes
+
+
+def reconstruire(taille_lot=1000):
+    """Recalcule les soldes espèces de toutes les prestations ; retourne leur nombre."""
+    ids = list(PrestationKt.objects.order_by("pk").values_list("pk", flat=True))
+    for debut in range(0, len(ids), taille_lot):
+        recalculer(ids[debut:debut + taille_lot])
+    return len(ids)
+
+
+# ── Mise à jour après écriture ──────────────────────────────────────────────
+
+_marquage = ApresCommit(recalculer)
+
+
+def marquer(*prestation_ids):
+    """Recalcule les soldes espèces de ces prestations au commit (une fois par transaction)."""
+    _marquage.marquer(*prestation_ids)
+
+
+def _acte_modifie(sender, instance, **kwargs):
+    original = instance.get_original_values() or {}
+    marquer(instance.prestation_id, original.get("prestation_id"))
+
+
+def _consommation_modifiee(sender, instance, **kwargs):
+    acte = instance._state.fields_cache.get("prestation_acte")
+    if acte is not None:
+        marquer(acte.prestation_id)
+    else:
+        marquer(
+            PrestationActe.objects.filter(pk=instance.prestation_acte_id)
+            .values_list("prestation_id", flat=True)
+            .first()
+        )
+
+
+def _prestation_modifiee(sender, instance, created, **kwargs):
+    original = instance.get_original_values() or {}
+    if created or original.get("prix_supplementaire") != instance.prix_supplementaire:
+        marquer(instance.pk)
+
+
+def _paiement_modifie(sender, instance, **kwargs):
+    marquer(instance.prestation_id)
+
+
+def _tranche_modifiee(sender, instance, **kwargs):
+    paiement = instance._state.fields_cache.get("paiement_especes")
+    if paiement is not None:
+        marquer(paiement.prestation_id)
+    else:
+        marquer(
+            PaiementEspecesKt.objects.filter(pk=instance.paiement_especes_id)
+            .values_list("prestation_id", flat=True)
+            .first()
+        )
+
+
+def _convention_modifiee(sender, instance, **kwargs):
+    # Le drapeau urgence a pu changer, ou les actes vont perdre leur convention
+    marquer(
+        *PrestationActe.objects.filter(convention=instance)
+        .values_list("prestation_id", flat=True)
+        .distinct()
+    )
+
+
+for _modele, _recepteur in (
+    (PrestationActe, _acte_modifie),
+    (ConsommationProduit, _consommation_modifiee),
+    (PaiementEspecesKt, _paiement_modifie),
+    (TranchePaiementKt, _tranche_modifiee),
+):
+    post_save.connect(_recepteur, sender=_modele)
+    post_delete.connect(_recepteur, sender=_modele)
+post_save.connect(_prestation_modifiee, sender=PrestationKt)
+post_save.connect(_convention_modifiee, sender=Convention)
+pre_delete.connect(_convention_modifiee, sender=Convention)
+
+
+# Filtres des vues espèces sur PrestationKt
+EN_ATTENTE = Q(solde_especes__a_payer=True) & ~Q(solde_especes__statut_paiement="COMPLET")
+PAYEES = Q(solde_especes__a_payer=True, solde_especes__statut_paiement="COMPLET")
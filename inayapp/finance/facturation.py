@@ -0,0 +1,259 @@
+# finance/facturation.py
+"""
+Chiffres du tableau de bord de facturation (actes hors urgence).
+
+Le mois en cours est relu en une seule requête d'agrégation conditionnelle
+(un `COUNT`/`SUM` filtré par statut, groupé par convention). Les mois clos
+sont lus dans FacturationMensuelle ; un mois n'est recalculé que s'il n'a
+jamais été calculé ou si un de ses actes a changé depuis (statut, montant,
+convention, date de la prestation). Les actes sont rangés par mois de
+prestation : un vieil acte payé aujourd'hui invalide donc son mois.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DateField, Min, Q, Sum
+from django.db.models.functions import Trunc
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+from inayapp.timeseries import periodes
+from inayapp.transactions import ApresCommit
+from medical.models import PrestationActe, PrestationKt
+from medical.models.prestation_Kt import Convention
+
+from .models import FacturationMensuelle
+
+# Clé du tableau de bord -> statut de facturation
+STATUTS = {
+    "a_facturer": "A_FACTURER",
+    "factures": "FACTURE",
+    "payes": "PAYE",
+    "rejetes": "REJETE",
+}
+STATUTS_REPARTITION = ("FACTURE", "PAYE")
+CHAMPS_SUIVIS = ("prestation_id", "convention_id", "statut_facturation", "tarif_conventionne")
+JOURS_RETARD = 30
+
+
+def actes_hors_urgence():
+    # Sous-requête sur l'index est_urgence : pas de jointure sur Convention
+    return PrestationActe.objects.exclude(
+        convention__in=Convention.objects.filter(est_urgence=True).values("pk")
+    )
+
+
+def _debut(mois):
+    return timezone.make_aware(datetime.combine(mois, time.min))
+
+
+def _mois_suivant(mois):
+    return (mois + timedelta(days=32)).replace(day=1)
+
+
+def _mois_de(date_prestation):
+    return timezone.localtime(date_prestation).date().replace(day=1)
+
+
+def _agreger(queryset, *cles):
+    """{cles: [[convention_id, {statut: [nombre, montant]}], ...]} en une requête"""
+    annotations = {}
+    for i, statut in enumerate(STATUTS.values()):
+        condition = Q(statut_facturation=statut)
+        annotations[f"n{i}"] = Count("pk", filter=condition)
+        annotations[f"m{i}"] = Sum("tarif_conventionne", filter=condition)
+    resultat = defaultdict(list)
+    lignes = (
+        queryset.filter(statut_facturation__in=STATUTS.values())
+        .values(*cles, "convention_id")
+        .annotate(**annotations)
+        .order_by()
+    )
+    for ligne in lignes:
+        par_statut = {
+            statut: [ligne[f"n{i}"], str(ligne[f"m{i}"] or 0)]
+            for i, statut in enumerate(STATUTS.values())
+            if ligne[f"n{i}"]
+        }
+        resultat[tuple(ligne[cle] for cle in cles)].append([ligne["convention_id"], par_statut])
+    return resultat
+
+
+def _mois_clos(courant):
+    """Lignes des mois antérieurs à `courant`, recalculées si nécessaire"""
+    stockes = {}
+    lus = {}
+    for mois, lignes, calcule_le in FacturationMensuelle.objects.filter(
+        mois__lt=courant
+    ).values_list("mois", "lignes", "calcule_le"):
+        stockes[mois] = lignes
+        lus[mois] = calcule_le
+    # Les mois couverts partent de la première prestation, pas du premier mois
+    # stocké : un acte ancien modifié avant toute lecture invalide son seul mois
+    premiere = PrestationKt.objects.aggregate(premiere=Min("date_prestation"))["premiere"]
+    if premiere is None:
+        return stockes
+    tous = periodes(_mois_de(premiere), courant - timedelta(days=1), "month")
+    a_calculer = [mois for mois in tous if stockes.get(mois) is None]
+    if not a_calculer:
+        return stockes
+    queryset = actes_hors_urgence().filter(prestation__date_prestation__lt=_debut(courant))
+    if len(a_calculer) < len(tous):
+        intervalles = Q()
+        for mois in a_calculer:
+            intervalles |= Q(
+                prestation__date_prestation__gte=_debut(mois),
+                prestation__date_prestation__lt=_debut(_mois_suivant(mois)),
+            )
+        queryset = queryset.filter(intervalles)
+
+    calcules = _agreger(
+        queryset.annotate(
+            mois=Trunc("prestation__date_prestation", "month", output_field=DateField())
+        ),
+        "mois",
+    )
+    resultats = {mois: calcules.get((mois,), []) for mois in a_calculer}
+    # Un acte modifié pendant le calcul invalide son mois (lignes à NULL,
+    # calcule_le changé) : cette invalidation ne doit pas être écrasée
+    FacturationMensuelle.objects.bulk_create(
+        [
+            FacturationMensuelle(mois=mois, lignes=lignes)
+            for mois, lignes in resultats.items()
+            if mois not in lus
+        ],
+        ignore_conflicts=True,
+    )
+    maintenant = timezone.now()
+    for mois, lignes in resultats.items():
+        if mois in lus:
+            FacturationMensuelle.objects.filter(
+                mois=mois, lignes__isnull=True, calcule_le=lus[mois]
+            ).update(lignes=lignes, calcule_le=maintenant)
+    stockes.update(resultats)
+    return stockes
+
+
+def tableau_bord():
+    """Contexte de tableau_bord_facturation : stats, montants, retards, conventions"""
+    courant = timezone.localdate().replace(day=1)
+    totaux = defaultdict(lambda: [0, Decimal("0.00")])
+    sources = list(_mois_clos(courant).values())
+    sources.append(
+        _agreger(actes_hors_urgence().filter(prestation__date_prestation__gte=_debut(courant)))
+        .get((), [])
+    )
+    for lignes in sources:
+        for convention_id, par_statut in lignes or ():
+            for statut, (nombre, montant) in par_statut.items():
+                total = totaux[convention_id, statut]
+                total[0] += nombre
+                total[1] += Decimal(montant)
+
+    stats = {cle: 0 for cle in STATUTS}
+    montants = {cle: Decimal("0.00") for cle in STATUTS}
+    repartition = defaultdict(lambda: [0, Decimal("0.00")])
+    statut_vers_cle = {statut: cle for cle, statut in STATUTS.items()}
+    for (convention_id, statut), (nombre, montant) in totaux.items():
+        cle = statut_vers_cle[statut]
+        stats[cle] += nombre
+        montants[cle] += montant
+        if statut in STATUTS_REPARTITION:
+            repartition[convention_id][0] += nombre
+            repartition[convention_id][1] += montant
+
+    top = sorted(repartition.items(), key=lambda item: item[1][1], reverse=True)[:10]
+    noms = dict(
+        Convention.objects.filter(pk__in=[pk for pk, _ in top if pk is not None])
+        .values_list("pk", "nom")
+    )
+    conventions_stats = [
+        {"convention__nom": noms.get(pk), "count": nombre, "montant": montant}
+        for pk, (nombre, montant) in top
+    ]
+
+    date_limite = timezone.now().date() - timedelta(days=JOURS_RETARD)
+    actes_en_retard = actes_hors_urgence().filter(
+        statut_facturation="FACTURE", date_facturation__lt=date_limite
+    ).count()
+
+    return {
+        "stats": stats,
+        "montants": montants,
+        "actes_en_retard": actes_en_retard,
+        "conventions_stats": conventions_stats,
+    }
+
+
+# ── Invalidation des mois clos ──────────────────────────────────────────────
+
+def _invalider(mois):
+    courant = timezone.localdate().replace(day=1)
+    mois = sorted(m for m in mois if m < courant)
+    if mois:
+        FacturationMensuelle.objects.bulk_create(
+            [FacturationMensuelle(mois=m, lignes=None) for m in mois],
+            update_conflicts=True,
+            unique_fields=["mois"],
+            update_fields=["lignes", "calcule_le"],
+        )
+
+
+_marquage = ApresCommit(_invalider)
+
+
+def marquer(*dates_prestation):
+    """Mois de ces dates à recalculer, marqués au commit (une fois par transaction)."""
+    _marquage.marquer(*(_mois_de(d) for d in dates_prestation if d is not None))
+
+
+def tout_recalculer():
+    FacturationMensuelle.objects.update(lignes=None, calcule_le=timezone.now())
+
+
+def _dates_prestations(acte, *prestation_ids):
+    prestation = acte._state.fields_cache.get("prestation")
+    dates = []
+    if prestation is not None and prestation.pk == acte.prestation_id:
+        dates.append(prestation.date_prestation)
+        prestation_ids = [pk for pk in prestation_ids if pk != prestation.pk]
+    ids = {pk for pk in prestation_ids if pk is not None}
+    if ids:
+        dates.extend(
+            PrestationKt.objects.filter(pk__in=ids).values_list("date_prestation", flat=True)
+        )
+    return dates
+
+
+def _acte_enregistre(sender, instance, created, **kwargs):
+    original = instance.get_original_values()
+    if not created and original is not None and all(
+        original.get(champ) == getattr(instance, champ) for champ in CHAMPS_SUIVIS
+    ):
+        return
+    original = original or {}
+    marquer(*_dates_prestations(instance, instance.prestation_id, original.get("prestation_id")))
+
+
+def _acte_supprime(sender, instance, **kwargs):
+    marquer(*_dates_prestations(instance, instance.prestation_id))
+
+
+def _prestation_enregistree(sender, instance, created, **kwargs):
+    original = instance.get_original_values() or {}
+    ancienne = original.get("date_prestation")
+    if not created and ancienne is not None and ancienne != instance.date_prestation:
+        marquer(ancienne, instance.date_prestation)
+
+
+def _convention_modifiee(sender, **kwargs):
+    # Le drapeau urgence a pu changer, ou les actes ont été détachés (SET_NULL)
+    transaction.on_commit(tout_recalculer)
+
+
+post_save.connect(_acte_enregistre, sender=PrestationActe)
+post_delete.connect(_acte_supprime, sender=PrestationActe)
+post_save.connect(_prestation_enregistree, sender=PrestationKt)
+post_save.connect(_convention_modifiee, sender=Convention)
+post_delete.connect(_convention_modifiee, sender=Convention)
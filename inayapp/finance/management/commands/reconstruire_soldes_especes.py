@@ -0,0 +1,33 @@
+# finance/management/commands/reconstruire_soldes_especes.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from finance import especes
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule les soldes espèces des prestations (SoldeEspecesPrestation) à "
+        "partir des actes, consommations, frais supplémentaires et paiements"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--prestation", type=int, action="append", dest="prestations",
+            help="Limiter à cette prestation (option répétable)",
+        )
+        parser.add_argument("--taille-lot", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            if options["prestations"]:
+                nombre = len(especes.recalculer(options["prestations"]))
+            else:
+                nombre = especes.reconstruire(options["taille_lot"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{nombre} solde(s) recalculé(s) en {time.perf_counter() - started:.2f} s"
+            )
+        )
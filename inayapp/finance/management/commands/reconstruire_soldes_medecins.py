@@ -0,0 +1,33 @@
+# finance/management/commands/reconstruire_soldes_medecins.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from finance import soldes
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule les soldes des médecins (SoldeMedecin) à partir des actes, "
+        "prestations, décharges et paiements"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--medecin", type=int, action="append", dest="medecins",
+            help="Limiter à ce médecin (option répétable)",
+        )
+        parser.add_argument("--taille-lot", type=int, default=500)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            if options["medecins"]:
+                nombre = len(soldes.recalculer(options["medecins"]))
+            else:
+                nombre = soldes.reconstruire(options["taille_lot"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{nombre} solde(s) recalculé(s) en {time.perf_counter() - started:.2f} s"
+            )
+        )
@@ -0,0 +1,89 @@
+# Generated by Django 5.1.7 on 2026-10-18 12:15
+
+import django.db.models.deletion
+from collections import Counter
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def construire_soldes(apps, schema_editor):
+    # Calcul de finance.soldes.recalculer, sur les modèles historiques
+    Medecin = apps.get_model('medecin', 'Medecin')
+    PrestationKt = apps.get_model('medical', 'PrestationKt')
+    PrestationActe = apps.get_model('medical', 'PrestationActe')
+    Decharges = apps.get_model('finance', 'Decharges')
+    Payments = apps.get_model('finance', 'Payments')
+    SoldeMedecin = apps.get_model('finance', 'SoldeMedecin')
+    db = schema_editor.connection.alias
+
+    def sommes(queryset, cle, champ):
+        return dict(queryset.using(db).values_list(cle).annotate(total=Sum(champ)).order_by())
+
+    honoraires = sommes(
+        PrestationActe.objects.exclude(prestation__statut='PLANIFIE'),
+        'prestation__medecin_id',
+        'honoraire_medecin',
+    )
+    supplements = sommes(
+        PrestationKt.objects.exclude(statut='PLANIFIE'), 'medecin_id', 'prix_supplementaire_medecin'
+    )
+    decharges = sommes(Decharges.objects.all(), 'medecin_id', 'amount')
+    paiements = sommes(Payments.objects.all(), 'id_decharge__medecin_id', 'payment')
+    non_reglees = Counter(
+        Decharges.objects.using(db)
+        .exclude(prestation_actes__prestation__statut='PLANIFIE')
+        .annotate(
+            total_paye=Coalesce(
+                Sum('payments__payment'), Value(Decimal('0')), output_field=models.DecimalField()
+            )
+        )
+        .filter(amount__gt=F('total_paye'))
+        .values_list('medecin_id', flat=True)
+    )
+
+    zero = Decimal('0.00')
+    SoldeMedecin.objects.using(db).bulk_create(
+        [
+            SoldeMedecin(
+                medecin_id=medecin_id,
+                honoraires_actes=honoraires.get(medecin_id) or zero,
+                supplements=supplements.get(medecin_id) or zero,
+                decharges=decharges.get(medecin_id) or zero,
+                paiements=paiements.get(medecin_id) or zero,
+                decharges_non_reglees=non_reglees[medecin_id],
+            )
+            for medecin_id in Medecin.objects.using(db).order_by('pk').values_list('pk', flat=True)
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0004_alter_decharges_options_and_more'),
+        ('medecin', '0002_initial'),
+        ('medical', '0012_service_seuil_sejour_court_heures_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SoldeMedecin',
+            fields=[
+                ('medecin', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='solde', serialize=False, to='medecin.medecin', verbose_name='Médecin')),
+                ('honoraires_actes', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Honoraires des actes')),
+                ('supplements', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Part médecin des suppléments')),
+                ('decharges', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Décharges émises')),
+                ('paiements', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Paiements reçus')),
+                ('decharges_non_reglees', models.PositiveIntegerField(default=0, verbose_name='Décharges non réglées')),
+                ('mis_a_jour', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Solde médecin',
+                'verbose_name_plural': 'Soldes médecins',
+            },
+        ),
+        migrations.RunPython(construire_soldes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-18 12:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0005_soldemedecin'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacturationMensuelle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mois', models.DateField(unique=True, verbose_name='Premier jour du mois')),
+                ('lignes', models.JSONField(default=list, help_text='[[convention_id, {statut: [nombre, montant]}], ...]', null=True)),
+                ('calcule_le', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Facturation mensuelle',
+                'verbose_name_plural': 'Facturations mensuelles',
+                'ordering': ['mois'],
+            },
+        ),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 5.1.7 on 2026-10-18 12:22
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, ExpressionWrapper, F, Q, Sum
+
+
+def construire_soldes(apps, schema_editor):
+    # Calcul de finance.especes.recalculer, sur les modèles historiques
+    PrestationKt = apps.get_model('medical', 'PrestationKt')
+    PrestationActe = apps.get_model('medical', 'PrestationActe')
+    ConsommationProduit = apps.get_model('pharmacies', 'ConsommationProduit')
+    PaiementEspecesKt = apps.get_model('finance', 'PaiementEspecesKt')
+    SoldeEspecesPrestation = apps.get_model('finance', 'SoldeEspecesPrestation')
+    db = schema_editor.connection.alias
+
+    actes = {
+        prestation_id: (nombre, total)
+        for prestation_id, nombre, total in PrestationActe.objects.using(db)
+        .filter(Q(convention__isnull=True) | Q(convention__est_urgence=True))
+        .values_list('prestation_id')
+        .annotate(nombre=Count('pk'), total=Sum('tarif_conventionne'))
+        .order_by()
+    }
+    consommations = {
+        prestation_id: (nombre, total)
+        for prestation_id, nombre, total in ConsommationProduit.objects.using(db)
+        .filter(quantite_reelle__gt=F('quantite_defaut'))
+        .values_list('prestation_acte__prestation_id')
+        .annotate(
+            nombre=Count('pk'),
+            total=Sum(
+                ExpressionWrapper(
+                    (F('quantite_reelle') - F('quantite_defaut')) * F('prix_unitaire'),
+                    output_field=models.DecimalField(max_digits=12, decimal_places=2),
+                )
+            ),
+        )
+        .order_by()
+    }
+    paiements = {
+        prestation_id: (montant_paye, montant_restant, statut)
+        for prestation_id, montant_paye, montant_restant, statut in (
+            PaiementEspecesKt.objects.using(db).values_list(
+                'prestation_id', 'montant_paye', 'montant_restant', 'statut'
+            )
+        )
+    }
+
+    zero = Decimal('0.00')
+    soldes = []
+    for prestation_id, supplement in (
+        PrestationKt.objects.using(db).order_by('pk').values_list('pk', 'prix_supplementaire')
+    ):
+        supplement = supplement or zero
+        nombre_actes, montant_actes = actes.get(prestation_id, (0, zero))
+        nombre_consos, montant_consos = consommations.get(prestation_id, (0, zero))
+        total = (montant_actes or zero) + (montant_consos or zero) + supplement
+        montant_paye, montant_restant, statut = paiements.get(prestation_id, (zero, total, ''))
+        soldes.append(
+            SoldeEspecesPrestation(
+                prestation_id=prestation_id,
+                actes_especes=montant_actes or zero,
+                nombre_actes_especes=nombre_actes,
+                consommations_supplementaires=montant_consos or zero,
+                nombre_consommations_supplementaires=nombre_consos,
+                supplements=supplement,
+                total_especes=total,
+                montant_paye=montant_paye,
+                montant_restant=montant_restant,
+                statut_paiement=statut,
+                a_payer=bool(nombre_actes or nombre_consos or supplement > 0),
+            )
+        )
+    SoldeEspecesPrestation.objects.using(db).bulk_create(soldes, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0006_facturationmensuelle'),
+        ('medical', '0013_convention_est_urgence'),
+        ('pharmacies', '0005_produit_fulltext'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SoldeEspecesPrestation',
+            fields=[
+                ('prestation', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='solde_especes', serialize=False, to='medical.prestationkt', verbose_name='Prestation')),
+                ('actes_especes', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='Actes sans convention ou urgence')),
+                ('nombre_actes_especes', models.PositiveIntegerField(default=0)),
+                ('consommations_supplementaires', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='Consommations supplémentaires')),
+                ('nombre_consommations_supplementaires', models.PositiveIntegerField(default=0)),
+                ('supplements', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='Frais supplémentaires')),
+                ('total_especes', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='Total dû en espèces')),
+                ('montant_paye', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='Montant payé')),
+                ('montant_restant', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='Montant restant')),
+                ('statut_paiement', models.CharField(blank=True, choices=[('EN_COURS', 'En cours de paiement'), ('COMPLET', 'Paiement complet'), ('ANNULE', 'Annulé')], help_text="Vide tant qu'aucun paiement espèces n'a été ouvert", max_length=20, verbose_name='Statut du paiement espèces')),
+                ('a_payer', models.BooleanField(default=False, verbose_name='Contient des éléments à régler en espèces')),
+                ('mis_a_jour', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Solde espèces de prestation',
+                'verbose_name_plural': 'Soldes espèces des prestations',
+                'indexes': [models.Index(fields=['a_payer', 'statut_paiement'], name='finance_sol_a_payer_230183_idx')],
+            },
+        ),
+        migrations.RunPython(construire_soldes, migrations.RunPython.noop),
+    ]
@@ -85,6 +85,85 @@ class Payments(models.Model):
         )
 
 
+class SoldeMedecin(models.Model):
+    """
+    Situation financière d'un médecin, tenue à jour par finance.soldes après
+    chaque écriture d'acte, de prestation, de décharge ou de paiement.
+    Reconstructible avec `manage.py reconstruire_soldes_medecins`.
+    """
+
+    medecin = models.OneToOneField(
+        "medecin.Medecin",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="solde",
+        verbose_name="Médecin",
+    )
+    honoraires_actes = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal("0.00"),
+        verbose_name="Honoraires des actes",
+    )
+    supplements = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal("0.00"),
+        verbose_name="Part médecin des suppléments",
+    )
+    decharges = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal("0.00"),
+        verbose_name="Décharges émises",
+    )
+    paiements = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal("0.00"),
+        verbose_name="Paiements reçus",
+    )
+    decharges_non_reglees = models.PositiveIntegerField(
+        default=0, verbose_name="Décharges non réglées"
+    )
+    mis_a_jour = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Solde médecin"
+        verbose_name_plural = "Soldes médecins"
+
+    def __str__(self):
+        return f"{self.medecin} - {self.total_honoraires} DA"
+
+    @property
+    def total_honoraires(self):
+        return self.honoraires_actes + self.supplements
+
+    @property
+    def reste_avec_decharge(self):
+        return self.total_honoraires - self.paiements
+
+    @property
+    def reste_sans_decharge(self):
+        return self.total_honoraires - self.decharges
+
+
+class FacturationMensuelle(models.Model):
+    """
+    Chiffres de facturation d'un mois clos (actes hors urgence, par mois de
+    prestation), calculés par finance.facturation. `lignes` vaut NULL quand
+    un acte du mois a changé : le mois est recalculé au prochain affichage.
+    """
+
+    mois = models.DateField(unique=True, verbose_name="Premier jour du mois")
+    lignes = models.JSONField(
+        null=True,
+        default=list,
+        help_text="[[convention_id, {statut: [nombre, montant]}], ...]",
+    )
+    calcule_le = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Facturation mensuelle"
+        verbose_name_plural = "Facturations mensuelles"
+        ordering = ["mois"]
+
+    def __str__(self):
+        return f"Facturation {self.mois:%m/%Y}"
+
+
 class PaiementEspecesKt(models.Model):
     """Modèle pour gérer les paiements espèces avec traçabilité complète"""
 
@@ -291,3 +370,76 @@ class TranchePaiementKt(models.Model):
         """Met à jour les montants du paiement principal"""
         paiement = self.paiement_especes
         paiement._recalculate_and_update()
+
+
+class SoldeEspecesPrestation(models.Model):
+    """
+    Ce qu'une prestation doit en espèces (actes sans convention ou urgence,
+    consommations au-delà des quantités par défaut, frais supplémentaires) et
+    ce qui en a été réglé. Tenu à jour par finance.especes après chaque
+    écriture d'acte, de consommation, de prestation ou de paiement.
+    Reconstructible avec `manage.py reconstruire_soldes_especes`.
+    """
+
+    prestation = models.OneToOneField(
+        "medical.PrestationKt",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="solde_especes",
+        verbose_name="Prestation",
+    )
+    actes_especes = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal("0.00"),
+        verbose_name="Actes sans convention ou urgence",
+    )
+    nombre_actes_especes = models.PositiveIntegerField(default=0)
+    consommations_supplementaires = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal("0.00"),
+        verbose_name="Consommations supplémentaires",
+    )
+    nombre_consommations_supplementaires = models.PositiveIntegerField(default=0)
+    supplements = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal("0.00"),
+        verbose_name="Frais supplémentaires",
+    )
+    total_especes = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal("0.00"),
+        verbose_name="Total dû en espèces",
+    )
+    montant_paye = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal("0.00"),
+        verbose_name="Montant payé",
+    )
+    montant_restant = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal("0.00"),
+        verbose_name="Montant restant",
+    )
+    statut_paiement = models.CharField(
+        max_length=20,
+        choices=PaiementEspecesKt.STATUT_CHOICES,
+        blank=True,
+        verbose_name="Statut du paiement espèces",
+        help_text="Vide tant qu'aucun paiement espèces n'a été ouvert",
+    )
+    a_payer = models.BooleanField(
+        default=False, verbose_name="Contient des éléments à régler en espèces"
+    )
+    mis_a_jour = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Solde espèces de prestation"
+        verbose_name_plural = "Soldes espèces des prestations"
+        indexes = [models.Index(fields=["a_payer", "statut_paiement"])]
+
+    def __str__(self):
+        return f"Prestation #{self.prestation_id} - {self.montant_restant}/{self.total_especes} DA"
+
+    @property
+    def est_complet(self):
+        return self.statut_paiement == "COMPLET"
+
+    @property
+    def pourcentage_paye(self):
+        if self.total_especes > 0:
+            return self.montant_paye / self.total_especes * 100
+        return 0
@@ -0,0 +1,160 @@
+# finance/soldes.py
+"""
+Soldes des médecins (SoldeMedecin).
+
+Chaque écriture d'acte, de prestation, de décharge ou de paiement marque le
+médecin concerné ; après le commit, les soldes des médecins marqués sont
+recalculés ensemble (quelques requêtes groupées, puis un upsert). Une
+prestation de quinze actes ne recalcule donc le solde qu'une fois. Les
+prestations planifiées ne comptent pas.
+"""
+from collections import Counter
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from inayapp.transactions import ApresCommit
+from medecin.models import Medecin
+from medical.models import PrestationActe, PrestationKt
+
+from .models import Decharges, Payments, SoldeMedecin
+
+STATUT_EXCLU = "PLANIFIE"
+CHAMPS = ("honoraires_actes", "supplements", "decharges", "paiements", "decharges_non_reglees")
+
+
+def _sommes(queryset, cle, champ):
+    return dict(queryset.values_list(cle).annotate(total=Sum(champ)).order_by())
+
+
+def recalculer(medecin_ids):
+    """Recalcule et enregistre les soldes des médecins `medecin_ids`."""
+    ids = set(Medecin.objects.filter(pk__in=medecin_ids).values_list("pk", flat=True))
+    if not ids:
+        return []
+
+    honoraires = _sommes(
+        PrestationActe.objects.filter(prestation__medecin_id__in=ids).exclude(
+            prestation__statut=STATUT_EXCLU
+        ),
+        "prestation__medecin_id",
+        "honoraire_medecin",
+    )
+    supplements = _sommes(
+        PrestationKt.objects.filter(medecin_id__in=ids).exclude(statut=STATUT_EXCLU),
+        "medecin_id",
+        "prix_supplementaire_medecin",
+    )
+    decharges = _sommes(Decharges.objects.filter(medecin_id__in=ids), "medecin_id", "amount")
+    paiements = _sommes(
+        Payments.objects.filter(id_decharge__medecin_id__in=ids),
+        "id_decharge__medecin_id",
+        "payment",
+    )
+    non_reglees = Counter(
+        Decharges.objects.filter(medecin_id__in=ids)
+        .exclude(prestation_actes__prestation__statut=STATUT_EXCLU)
+        .annotate(
+            total_paye=Coalesce(
+                Sum("payments__payment"), Value(Decimal("0")), output_field=DecimalField()
+            )
+        )
+        .filter(amount__gt=F("total_paye"))
+        .values_list("medecin_id", flat=True)
+    )
+
+    zero = Decimal("0.00")
+    soldes = [
+        SoldeMedecin(
+            medecin_id=medecin_id,
+            honoraires_actes=honoraires.get(medecin_id) or zero,
+            supplements=supplements.get(medecin_id) or zero,
+            decharges=decharges.get(medecin_id) or zero,
+            paiements=paiements.get(medecin_id) or zero,
+            decharges_non_reglees=non_reglees[medecin_id],
+        )
+        for medecin_id in sorted(ids)
+    ]
+    cible = ["medecin"] if connection.features.supports_update_conflicts_with_target else None
+    SoldeMedecin.objects.bulk_create(
+        soldes,
+        update_conflicts=True,
+        unique_fields=cible,
+        update_fields=[*CHAMPS, "mis_a_jour"],
+    )
+    return soldes
+
+
+def reconstruire(taille_lot=500):
+    """Recalcule les soldes de tous les médecins ; retourne leur nombre."""
+    ids = list(Medecin.objects.order_by("pk").values_list("pk", flat=True))
+    for debut in range(0, len(ids), taille_lot):
+        recalculer(ids[debut:debut + taille_lot])
+    return len(ids)
+
+
+# ── Mise à jour après écriture ──────────────────────────────────────────────
+
+_marquage = ApresCommit(recalculer)
+
+
+def marquer(*medecin_ids):
+    """Recalcule les soldes de ces médecins au commit (une fois par transaction)."""
+    _marquage.marquer(*medecin_ids)
+
+
+def _medecin_de_prestation(acte):
+    prestation = acte._state.fields_cache.get("prestation")
+    if prestation is not None:
+        return prestation.medecin_id
+    return (
+        PrestationKt.objects.filter(pk=acte.prestation_id)
+        .values_list("medecin_id", flat=True)
+        .first()
+    )
+
+
+def _acte_modifie(sender, instance, **kwargs):
+    marquer(_medecin_de_prestation(instance))
+
+
+def _prestation_modifiee(sender, instance, **kwargs):
+    original = instance.get_original_values() or {}
+    marquer(instance.medecin_id, original.get("medecin_id"))
+
+
+def _decharge_modifiee(sender, instance, **kwargs):
+    marquer(instance.medecin_id)
+
+
+def _paiement_modifie(sender, instance, **kwargs):
+    decharge = instance._state.fields_cache.get("id_decharge")
+    if decharge is not None:
+        marquer(decharge.medecin_id)
+    elif instance.id_decharge_id:
+        marquer(
+            Decharges.objects.filter(pk=instance.id_decharge_id)
+            .values_list("medecin_id", flat=True)
+            .first()
+        )
+
+
+def _actes_de_decharge_modifies(sender, instance, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        if isinstance(instance, Decharges):
+            marquer(instance.medecin_id)
+        else:
+            marquer(_medecin_de_prestation(instance))
+
+
+for _modele, _recepteur in (
+    (PrestationActe, _acte_modifie),
+    (PrestationKt, _prestation_modifiee),
+    (Decharges, _decharge_modifiee),
+    (Payments, _paiement_modifie),
+):
+    post_save.connect(_recepteur, sender=_modele)
+    post_delete.connect(_recepteur, sender=_modele)
+m2m_changed.connect(_actes_de_decharge_modifies, sender=Decharges.prestation_actes.through)
@@ -1,3 +1,59 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.utils import timezone
+from medecin.models import Medecin
+from medical.models import ActeKt, PrestationActe, PrestationKt
+from medical.models.services import Service
+from patients.models import Patient
+
+from .facturation import tableau_bord
+from .models import FacturationMensuelle
+
+
+class TableauBordFacturationTests(TestCase):
+    """Les mois clos sont comptés depuis la première prestation"""
+
+    def setUp(self):
+        user = User.objects.create_user("facturation", "facturation@example.com", "x")
+        service = Service.objects.create(name="Service facturation")
+        self.acte = ActeKt.objects.create(code="FACT", libelle="Acte facturation", service=service)
+        self.medecin = Medecin.objects.create(first_name="Med", last_name="Facturation", created_by=user)
+        self.patient = Patient.objects.create(
+            first_name="Pat", last_name="Facturation", date_of_birth="1990-01-01"
+        )
+
+    def _acte_paye(self, mois_avant):
+        debut = timezone.localdate().replace(day=1)
+        for _ in range(mois_avant):
+            debut = (debut - timedelta(days=1)).replace(day=1)
+        prestation = PrestationKt.objects.create(
+            patient=self.patient,
+            medecin=self.medecin,
+            date_prestation=timezone.now().replace(year=debut.year, month=debut.month, day=15),
+            prix_total=0,
+        )
+        return PrestationActe.objects.create(
+            prestation=prestation,
+            acte=self.acte,
+            tarif_conventionne=Decimal("100.00"),
+            statut_facturation="PAYE",
+        )
+
+    def test_mois_invalide_avant_la_premiere_lecture(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._acte_paye(3)
+            recent = self._acte_paye(2)
+        # Aucun mois calculé (état après migration), puis un acte récent modifié
+        FacturationMensuelle.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            recent.tarif_conventionne = Decimal("50.00")
+            recent.save()
+        self.assertEqual(list(FacturationMensuelle.objects.values_list("lignes", flat=True)), [None])
 
-# Create your tests here.
+        contexte = tableau_bord()
+        self.assertEqual(contexte["stats"]["payes"], 2)
+        self.assertEqual(contexte["montants"]["payes"], Decimal("150.00"))
+        self.assertEqual(FacturationMensuelle.objects.filter(lignes__isnull=True).count(), 0)
@@ -15,7 +15,7 @@ from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
 from django.db import models, transaction
 from django.db.models import (Avg, CharField, Count, DecimalField,
                               ExpressionWrapper, F, OuterRef, Prefetch, Q,
-                              Subquery, Sum, Value)
+                              Subquery, Sum, Value, prefetch_related_objects)
 from django.db.models.functions import Coalesce, Concat, TruncDate
 from django.http import HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render, reverse
@@ -25,7 +25,9 @@ from django.utils.decorators import method_decorator
 from django.utils.safestring import mark_safe
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
+from finance import especes, facturation
 from finance.models import Decharges, Payments
+from inayapp.timeseries import serie
 from medecin.models import Medecin
 from medical.models import ActeKt, ActeProduit, PrestationActe, PrestationKt
 from medical.models.prestation_Kt import (ActeKt, ActeProduit, Convention,
@@ -39,7 +41,8 @@ from utils.utils import services_autorises
 from django.contrib.auth.decorators import permission_required
 from django.utils.decorators import method_decorator
 from .forms import DechargeForm, PaymentForm
-from .models import Decharges, PaiementEspecesKt, Payments, TranchePaiementKt
+from .models import (Decharges, PaiementEspecesKt, Payments, SoldeMedecin,
+                     TranchePaiementKt)
 
 
 @permission_required("accueil.view_menu_items_plannings", raise_exception=True)
@@ -503,53 +506,16 @@ def print_decharge_view(request, decharge_id):
 @audit_view
 @permission_required("finance.view_situation_medecins", raise_exception=True)
 def situation_medecins_list(request):
-    # 1. Sous-requête pour les honoraires
-    honoraire_sq = (
-        PrestationActe.objects.filter(prestation__medecin=OuterRef("pk"))
-        .exclude(prestation__statut="planifie")
-        .values("prestation__medecin")
-        .annotate(
-            total_honoraires_actes=Sum("honoraire_medecin"),
-            total_prix_supplementaire=Sum("prestation__prix_supplementaire_medecin"),
-        )
-        .annotate(total=F("total_honoraires_actes") + F("total_prix_supplementaire"))
-        .values("total")
-    )
-
-    # 2. Paiements
-    paiement_sq = (
-        Payments.objects.filter(id_decharge__medecin=OuterRef("pk"))
-        .values("id_decharge__medecin")
-        .annotate(total=Sum("payment"))
-        .values("total")
-    )
-
-    # 3. Décharge totales
-    decharge_sq = (
-        Decharges.objects.filter(medecin=OuterRef("pk"))
-        .values("medecin")
-        .annotate(total=Sum("amount"))
-        .values("total")
-    )
-
-    # 4. Query principal - simplifié sans le prefetch
-    medecins = (
+    # Soldes tenus à jour par finance.soldes : une seule requête
+    zero = Value(Decimal("0.00"), output_field=DecimalField())
+    medecins = list(
         Medecin.objects.annotate(
             total_honoraires=Coalesce(
-                Subquery(honoraire_sq),
-                Value(Decimal("0.00")),
-                output_field=DecimalField(),
-            ),
-            total_paiements=Coalesce(
-                Subquery(paiement_sq),
-                Value(Decimal("0.00")),
-                output_field=DecimalField(),
-            ),
-            total_decharges=Coalesce(
-                Subquery(decharge_sq),
-                Value(Decimal("0.00")),
-                output_field=DecimalField(),
+                F("solde__honoraires_actes") + F("solde__supplements"), zero
             ),
+            total_paiements=Coalesce(F("solde__paiements"), zero),
+            total_decharges=Coalesce(F("solde__decharges"), zero),
+            count_non_regle=Coalesce(F("solde__decharges_non_reglees"), Value(0)),
         )
         .annotate(
             reste_avec_decharge=ExpressionWrapper(
@@ -564,25 +530,6 @@ def situation_medecins_list(request):
         .order_by("-total_honoraires")
     )
 
-    # 5. Calcul simple du count des décharges non réglées (optionnel pour le badge)
-    for med in medecins:
-        # Compter les décharges non réglées pour l'affichage du badge
-        decharges_non_reglees = (
-            Decharges.objects.filter(medecin=med)
-            .annotate(
-                total_paie=Coalesce(
-                    Sum("payments__payment"), Value(0), output_field=DecimalField()
-                ),
-                solde=F("amount") - F("total_paie"),
-            )
-            .filter(solde__gt=0)
-            .exclude(prestation_actes__prestation__statut="planifie")
-            .distinct()
-        )
-
-        med.count_non_regle = decharges_non_reglees.count()
-
-    # 6. Totaux globaux simplifiés
     totals = {
         "global_reste_avec": sum(m.reste_avec_decharge for m in medecins),
         "global_reste_sans": sum(m.reste_sans_decharge for m in medecins),
@@ -605,10 +552,12 @@ def situation_medecin(request, medecin_id):
     base_query = (
         PrestationActe.objects
         .filter(prestation__medecin=medecin)
-        .exclude(prestation__statut='planifie')
+        .exclude(prestation__statut="PLANIFIE")
     )
 
-    prestation_query = PrestationKt.objects.filter(medecin=medecin)
+    prestation_query = PrestationKt.objects.filter(medecin=medecin).exclude(
+        statut="PLANIFIE"
+    )
 
     if date_debut and date_fin:
         base_query = base_query.filter(
@@ -620,14 +569,22 @@ def situation_medecin(request, medecin_id):
             & Q(date_prestation__date__lte=date_fin)
         )
 
-    # Statistiques globales (incluant prix supplémentaire médecin)
-    honoraires_actes = (
-        base_query.aggregate(total=Sum("honoraire_medecin"))["total"] or 0
-    )
-    prix_supplementaire_total = (
-        prestation_query.aggregate(total=Sum("prix_supplementaire_medecin"))["total"]
-        or 0
-    )
+    # Statistiques globales (incluant prix supplémentaire médecin) : sans
+    # filtre de dates, ce sont celles du solde du médecin
+    solde = None
+    if not (date_debut and date_fin):
+        solde = SoldeMedecin.objects.filter(medecin=medecin).first()
+    if solde:
+        honoraires_actes = solde.honoraires_actes
+        prix_supplementaire_total = solde.supplements
+    else:
+        honoraires_actes = (
+            base_query.aggregate(total=Sum("honoraire_medecin"))["total"] or 0
+        )
+        prix_supplementaire_total = (
+            prestation_query.aggregate(total=Sum("prix_supplementaire_medecin"))["total"]
+            or 0
+        )
 
     stats = {
         "total_honoraires_actes": honoraires_actes,
@@ -906,7 +863,7 @@ def gestion_convention_accorde_dossier(request):
     # Exclure urgence
     prestation_actes = (
         PrestationActe.objects.filter(convention__isnull=False)
-        .exclude(convention__nom__iexact="urgence")  # Exclure urgence
+        .exclude(convention__est_urgence=True)  # Exclure urgence
         .filter(
             Q(convention_accordee__in=[None, False])  # En attente ou refusé
             | Q(dossier_convention_complet=False)  # Dossier incomplet
@@ -1068,7 +1025,7 @@ def actes_a_facturer(request):
             convention_accordee=True,
             dossier_convention_complet=True,
         )
-        .exclude(convention__nom__iexact="urgence")  # Exclure urgence
+        .exclude(convention__est_urgence=True)  # Exclure urgence
         .select_related(
             "prestation__patient", "prestation__medecin", "acte", "convention"
         )
@@ -1157,7 +1114,7 @@ def actes_factures(request):
         PrestationActe.objects.filter(
             statut_facturation="FACTURE"
         )
-        .exclude(convention__nom__iexact="urgence")  # Exclure urgence
+        .exclude(convention__est_urgence=True)  # Exclure urgence
         .select_related(
             "prestation__patient", "prestation__medecin", "acte", "convention"
         )
@@ -1275,7 +1232,7 @@ def actes_payes(request):
         PrestationActe.objects.filter(
             statut_facturation="PAYE"
         )
-        .exclude(convention__nom__iexact="urgence")  # Exclure urgence
+        .exclude(convention__est_urgence=True)  # Exclure urgence
         .select_related(
             "prestation__patient", "prestation__medecin", "acte", "convention"
         )
@@ -1350,7 +1307,7 @@ def actes_rejetes(request):
         PrestationActe.objects.filter(
             statut_facturation="REJETE"
         )
-        .exclude(convention__nom__iexact="urgence")  # Exclure urgence
+        .exclude(convention__est_urgence=True)  # Exclure urgence
         .select_related(
             "prestation__patient", "prestation__medecin", "acte", "convention"
         )
@@ -1409,60 +1366,8 @@ def actes_rejetes(request):
 
 @permission_required("medical.view_facturation_details", raise_exception=True)
 def tableau_bord_facturation(request):
-    """Tableau de bord avec statistiques générales"""
-
-    # Statistiques générales - exclure urgence
-    base_qs = PrestationActe.objects.exclude(convention__nom__iexact="urgence")
-
-    stats = {
-        'a_facturer': base_qs.filter(statut_facturation="A_FACTURER").count(),
-        'factures': base_qs.filter(statut_facturation="FACTURE").count(),
-        'payes': base_qs.filter(statut_facturation="PAYE").count(),
-        'rejetes': base_qs.filter(statut_facturation="REJETE").count(),
-    }
-
-    # Montants - exclure urgence
-    montants = {
-        'a_facturer': base_qs.filter(
-            statut_facturation="A_FACTURER"
-        ).aggregate(total=Sum("tarif_conventionne"))["total"]
-        or Decimal("0.00"),
-        'factures': base_qs.filter(
-            statut_facturation="FACTURE"
-        ).aggregate(total=Sum("tarif_conventionne"))["total"]
-        or Decimal("0.00"),
-        'payes': base_qs.filter(
-            statut_facturation="PAYE"
-        ).aggregate(total=Sum("tarif_conventionne"))["total"] or Decimal("0.00"),
-        'rejetes': base_qs.filter(
-            statut_facturation="REJETE"
-        ).aggregate(total=Sum("tarif_conventionne"))["total"] or Decimal("0.00"),
-    }
-
-    # Actes en retard - exclure urgence
-
-    date_limite = timezone.now().date() - timezone.timedelta(days=30)
-    actes_en_retard = base_qs.filter(
-        statut_facturation="FACTURE", date_facturation__lt=date_limite
-    ).count()
-
-    # Répartition par convention - exclure urgence
-    conventions_stats = base_qs.filter(
-        statut_facturation__in=["FACTURE", "PAYE"]
-    ).values(
-        "convention__nom"
-    ).annotate(
-        count=Count("id"),
-        montant=Sum("tarif_conventionne")
-    ).order_by("-montant")[:10]
-
-    context = {
-        "stats": stats,
-        "montants": montants,
-        "actes_en_retard": actes_en_retard,
-        "conventions_stats": conventions_stats,
-    }
-
+    """Tableau de bord avec statistiques générales (hors urgence)"""
+    context = facturation.tableau_bord()
     return render(request, "facturation_KT/tableau_bord.html", context)
 
 
@@ -1500,28 +1405,12 @@ class PrestationsEspecesEnAttenteView(View):
 
         start_date, end_date = config.start_date, config.end_date
 
-        # CORRECTION: Récupérer TOUTES les prestations réalisées puis filtrer celles qui ont des éléments espèces
+        # Soldes espèces tenus à jour par finance.especes : filtrage, total et
+        # pagination en base, seule la page affichée est chargée
         prestations_candidates = (
-            PrestationKt.objects.filter(
-                statut__in=["REALISE"],
-            )
-            .select_related("patient", "medecin")
-            .prefetch_related(
-                Prefetch(
-                    "actes_details",
-                    queryset=PrestationActe.objects.select_related(
-                        "acte", "convention"
-                    ).prefetch_related(
-                        Prefetch(
-                            "consommations",
-                            queryset=ConsommationProduit.objects.select_related(
-                                "produit"
-                            ),
-                        )
-                    ),
-                ),
-                "paiement_especes__tranches",
-            )
+            PrestationKt.objects.filter(statut__in=["REALISE"])
+            .filter(especes.EN_ATTENTE)
+            .select_related("patient", "medecin", "solde_especes")
             .order_by("-date_prestation")
         )
 
@@ -1552,57 +1441,41 @@ class PrestationsEspecesEnAttenteView(View):
             except (ValueError, TypeError):
                 continue
 
-        # CORRECTION: Filtrer pour ne garder que les prestations avec éléments espèces non payés
-        prestations_with_totals = []
-        total_general_attente = Decimal("0.00")
-
-        for prestation in prestations_candidates:
-            # Vérifier s'il y a des éléments à payer en espèces
-            has_elements_especes = self._has_especes_elements(prestation)
-
-            if not has_elements_especes:
-                continue
-
-            # Vérifier le statut de paiement espèces
-            try:
-                paiement_especes = prestation.paiement_especes
-                # Si paiement complet, ignorer cette prestation
-                if paiement_especes.statut == "COMPLET":
-                    continue
-            except PaiementEspecesKt.DoesNotExist:
-                # Pas de paiement espèces = en attente
-                pass
-
-            # Calculer le total espèces pour cette prestation
-            total_especes = self._calculate_total_especes(prestation)
-            paiement_info = self._get_paiement_info(prestation)
-
-            # Récupérer les actes espèces pour affichage
-            actes_especes = prestation.actes_details.filter(
-                Q(convention__isnull=True) | Q(convention__nom__iexact="urgence")
-            )
-
-            prestations_with_totals.append(
-                {
-                    "prestation": prestation,
-                    "total_especes": total_especes,
-                    "actes_especes": actes_especes,
-                    "paiement_info": paiement_info,
-                    "has_frais_supplementaires": prestation.prix_supplementaire > 0,
-                    "has_consommations_supplementaires": self._has_consommations_supplementaires(
-                        prestation
-                    ),
-                }
-            )
-
-            # Ne compter dans le total que ce qui reste à payer
-            total_general_attente += paiement_info["montant_restant"]
+        # Ne compter dans le total que ce qui reste à payer
+        total_general_attente = prestations_candidates.aggregate(
+            total=Sum("solde_especes__montant_restant")
+        )["total"] or Decimal("0.00")
 
         # Pagination
         items_per_page = min(max(int(request.GET.get("per_page", 25)), 10), 100)
-        paginator = Paginator(prestations_with_totals, items_per_page)
+        paginator = Paginator(prestations_candidates, items_per_page)
         page_obj = paginator.get_page(request.GET.get("page", 1))
 
+        prestations = list(page_obj.object_list)
+        prefetch_related_objects(
+            prestations,
+            Prefetch(
+                "actes_details",
+                queryset=PrestationActe.objects.filter(especes.ACTES_ESPECES).select_related(
+                    "acte", "convention"
+                ),
+                to_attr="actes_especes",
+            ),
+        )
+        page_obj.object_list = [
+            {
+                "prestation": prestation,
+                "total_especes": prestation.solde_especes.total_especes,
+                "actes_especes": prestation.actes_especes,
+                "paiement_info": self._get_paiement_info(prestation.solde_especes),
+                "has_frais_supplementaires": prestation.prix_supplementaire > 0,
+                "has_consommations_supplementaires": (
+                    prestation.solde_especes.nombre_consommations_supplementaires > 0
+                ),
+            }
+            for prestation in prestations
+        ]
+
         context = {
             "paginator": paginator,
             "page_obj": page_obj,
@@ -1619,82 +1492,14 @@ class PrestationsEspecesEnAttenteView(View):
 
         return render(request, "facturation_KT/especes_en_attente.html", context)
 
-    def _has_especes_elements(self, prestation):
-        """Vérifie si une prestation a des éléments à payer en espèces"""
-        
-
-        # 1. Actes sans convention ou urgence
-        actes_especes = prestation.actes_details.filter(
-            Q(convention__isnull=True) | Q(convention__nom__iexact="urgence")
-        )
-        if actes_especes.exists():
-            return True
-
-        # 2. Frais supplémentaires
-        if prestation.prix_supplementaire > 0:
-            return True
-
-        # 3. Consommations supplémentaires (sur n'importe quel acte)
-        if self._has_consommations_supplementaires(prestation):
-            return True
-
-        return False
-
-    def _has_consommations_supplementaires(self, prestation):
-        """Vérifie s'il y a des consommations supplémentaires"""
-        for acte_detail in prestation.actes_details.all():
-            for conso in acte_detail.consommations.all():
-                if conso.quantite_reelle > conso.quantite_defaut:
-                    return True
-        return False
-
-    def _calculate_total_especes(self, prestation):
-        """Calcule le total espèces pour une prestation"""
-        total_especes = Decimal("0.00")
-        
-
-        # 1. Actes espèces (sans convention ou urgence)
-        actes_especes = prestation.actes_details.filter(
-            Q(convention__isnull=True) | Q(convention__nom__iexact="urgence")
-        )
-
-        for pa in actes_especes:
-            total_especes += pa.tarif_conventionne
-
-        # 2. Consommations supplémentaires (sur TOUS les actes, même conventionnés)
-        for pa in prestation.actes_details.all():
-            for conso in pa.consommations.all():
-                if conso.quantite_reelle > conso.quantite_defaut:
-                    quantite_supp = conso.quantite_reelle - conso.quantite_defaut
-                    total_especes += quantite_supp * conso.prix_unitaire
-
-        # 3. Frais supplémentaires
-        total_especes += prestation.prix_supplementaire
-
-        return total_especes
-
-    def _get_paiement_info(self, prestation):
-        """Récupère les informations de paiement pour une prestation"""
-        total_especes = self._calculate_total_especes(prestation)
-
-        try:
-            paiement_especes = prestation.paiement_especes
-            montant_paye = paiement_especes.montant_paye
-            montant_restant = paiement_especes.montant_restant
-            statut = paiement_especes.statut
-        except PaiementEspecesKt.DoesNotExist:
-            montant_paye = Decimal("0.00")
-            montant_restant = total_especes
-            statut = "EN_COURS"
-
+    def _get_paiement_info(self, solde):
+        """Informations de paiement d'une prestation, depuis son solde espèces"""
         return {
-            "total_especes": total_especes,
-            "montant_paye": montant_paye,
-            "montant_restant": montant_restant,
-            "statut": statut,
-            "pourcentage_paye": (
-                (montant_paye / total_especes * 100) if total_especes > 0 else 0
-            ),
+            "total_especes": solde.total_especes,
+            "montant_paye": solde.montant_paye,
+            "montant_restant": solde.montant_restant,
+            "statut": solde.statut_paiement or "EN_COURS",
+            "pourcentage_paye": solde.pourcentage_paye,
         }
 
     def _get_ajax_count(self, request):
@@ -1702,26 +1507,14 @@ class PrestationsEspecesEnAttenteView(View):
         # Compter les prestations en attente (derniers 30 jours)
         date_limite = date.today() - timedelta(days=30)
 
-        prestations_candidates = PrestationKt.objects.filter(
-            statut__in=["REALISE"],
-            date_prestation__gte=date_limite,
-        ).prefetch_related("actes_details__consommations", "paiement_especes")
-
-        count = 0
-        for prestation in prestations_candidates:
-            # Vérifier s'il y a des éléments espèces
-            if not self._has_especes_elements(prestation):
-                continue
-
-            # Vérifier le statut de paiement
-            try:
-                paiement_especes = prestation.paiement_especes
-                if paiement_especes.statut == "COMPLET":
-                    continue
-            except PaiementEspecesKt.DoesNotExist:
-                pass
-
-            count += 1
+        count = (
+            PrestationKt.objects.filter(
+                statut__in=["REALISE"],
+                date_prestation__gte=date_limite,
+            )
+            .filter(especes.EN_ATTENTE)
+            .count()
+        )
 
         return JsonResponse({"count": count, "success": True})
 
@@ -1764,7 +1557,7 @@ class GestionPaiementEspecesView(View):
 
             # Récupérer les actes espèces pour affichage
             actes_especes = prestation.actes_details.filter(
-                Q(convention__isnull=True) | Q(convention__nom__iexact="urgence")
+                Q(convention__isnull=True) | Q(convention__est_urgence=True)
             )
 
             data = {
@@ -1915,7 +1708,7 @@ class GestionPaiementEspecesView(View):
         
         # 1. Actes sans convention ou urgence
         actes_especes = prestation.actes_details.filter(
-            Q(convention__isnull=True) | Q(convention__nom__iexact="urgence")
+            Q(convention__isnull=True) | Q(convention__est_urgence=True)
         )
         if actes_especes.exists():
             return True
@@ -1940,7 +1733,7 @@ class GestionPaiementEspecesView(View):
 
         # 1. Actes espèces (sans convention ou urgence)
         actes_especes = prestation.actes_details.filter(
-            Q(convention__isnull=True) | Q(convention__nom__iexact="urgence")
+            Q(convention__isnull=True) | Q(convention__est_urgence=True)
         )
 
         for pa in actes_especes:
@@ -1973,6 +1766,7 @@ class GestionPaiementEspecesView(View):
                     "convention": (
                         acte.convention.nom if acte.convention else "Sans convention"
                     ),
+                    "urgence": bool(acte.convention and acte.convention.est_urgence),
                 }
             )
 
@@ -2148,7 +1942,7 @@ class PrestationsEspecesPayeesView(View):
 
             # Récupérer les actes espèces pour affichage (même logique que dans "en attente")
             actes_especes = prestation.actes_details.filter(
-                Q(convention__isnull=True) | Q(convention__nom__iexact="urgence")
+                Q(convention__isnull=True) | Q(convention__est_urgence=True)
             )
 
             prestations_with_totals.append(
@@ -2192,7 +1986,7 @@ class PrestationsEspecesPayeesView(View):
 
         # 1. Actes sans convention ou urgence
         actes_especes = prestation.actes_details.filter(
-            Q(convention__isnull=True) | Q(convention__nom__iexact="urgence")
+            Q(convention__isnull=True) | Q(convention__est_urgence=True)
         )
         if actes_especes.exists():
             return True
@@ -2246,48 +2040,26 @@ class DashboardPaiementsEspecesView(View):
 
         start_date, end_date = config.start_date, config.end_date
 
-        # Récupérer toutes les prestations réalisées dans la période
+        # Prestations de la période avec des éléments à régler en espèces
         prestations_candidates = PrestationKt.objects.filter(
             date_prestation__gte=start_date,
             date_prestation__lte=end_date,
             statut__in=["REALISE", "PAYE"],
-        ).prefetch_related("actes_details__consommations", "paiement_especes")
-
-        prestations_attente = []
-        prestations_payees = []
-
-        # Classifier les prestations
-        for prestation in prestations_candidates:
-            if not self._has_especes_elements(prestation):
-                continue
-
-            try:
-                paiement_especes = prestation.paiement_especes
-                if paiement_especes.statut == "COMPLET":
-                    prestations_payees.append(prestation)
-                else:
-                    prestations_attente.append(prestation)
-            except PaiementEspecesKt.DoesNotExist:
-                prestations_attente.append(prestation)
-
-        # Calculs des totaux
-        total_attente = Decimal("0.00")
-        total_paye = Decimal("0.00")
-
-        # Pour les prestations en attente
-        for prestation in prestations_attente:
-            try:
-                paiement_especes = prestation.paiement_especes
-                total_attente += paiement_especes.montant_restant
-            except PaiementEspecesKt.DoesNotExist:
-                # Si pas de paiement espèces créé, calculer le total
-                total_especes = self._calculate_total_especes_for_dashboard(prestation)
-                total_attente += total_especes
-
-        # Pour les prestations payées
-        for prestation in prestations_payees:
-            if hasattr(prestation, "paiement_especes"):
-                total_paye += prestation.paiement_especes.montant_total_du
+            solde_especes__a_payer=True,
+        )
+        prestations_attente = prestations_candidates.filter(especes.EN_ATTENTE)
+        prestations_payees = prestations_candidates.filter(especes.PAYEES)
+
+        # Comptes et totaux en une requête
+        complet = Q(solde_especes__statut_paiement="COMPLET")
+        totaux = prestations_candidates.aggregate(
+            count_attente=Count("pk", filter=~complet),
+            count_payees=Count("pk", filter=complet),
+            total_attente=Sum("solde_especes__montant_restant", filter=~complet),
+            total_paye=Sum("paiement_especes__montant_total_du", filter=complet),
+        )
+        total_attente = totaux["total_attente"] or Decimal("0.00")
+        total_paye = totaux["total_paye"] or Decimal("0.00")
 
         # Statistiques supplémentaires avec la plage de dates sélectionnée
         stats_complementaires = self._get_stats_complementaires(start_date, end_date)
@@ -2296,8 +2068,8 @@ class DashboardPaiementsEspecesView(View):
         nombre_jours = (end_date - start_date).days + 1
 
         context = {
-            "count_prestations_attente": len(prestations_attente),
-            "count_prestations_payees": len(prestations_payees),
+            "count_prestations_attente": totaux["count_attente"],
+            "count_prestations_payees": totaux["count_payees"],
             "total_attente": total_attente,
             "total_paye": total_paye,
             "pourcentage_paye": (
@@ -2317,53 +2089,6 @@ class DashboardPaiementsEspecesView(View):
             request, "facturation_KT/dashboard_paiements_especes.html", context
         )
 
-    def _has_especes_elements(self, prestation):
-        """Vérifie si une prestation a des éléments à payer en espèces"""
-        
-
-        # 1. Actes sans convention ou urgence
-        actes_especes = prestation.actes_details.filter(
-            Q(convention__isnull=True) | Q(convention__nom__iexact="urgence")
-        )
-        if actes_especes.exists():
-            return True
-
-        # 2. Frais supplémentaires
-        if prestation.prix_supplementaire > 0:
-            return True
-
-        # 3. Consommations supplémentaires
-        for acte_detail in prestation.actes_details.all():
-            for conso in acte_detail.consommations.all():
-                if conso.quantite_reelle > conso.quantite_defaut:
-                    return True
-
-        return False
-
-    def _calculate_total_especes_for_dashboard(self, prestation):
-        """Calcule le total espèces pour une prestation (version optimisée dashboard)"""
-        total_especes = Decimal("0.00")
-        
-
-        # Actes espèces
-        actes_especes = prestation.actes_details.filter(
-            Q(convention__isnull=True) | Q(convention__nom__iexact="urgence")
-        )
-
-        for pa in actes_especes:
-            total_especes += pa.tarif_conventionne
-
-        # Consommations supplémentaires (tous actes)
-        for pa in prestation.actes_details.all():
-            for conso in pa.consommations.all():
-                if conso.quantite_reelle > conso.quantite_defaut:
-                    quantite_supp = conso.quantite_reelle - conso.quantite_defaut
-                    total_especes += quantite_supp * conso.prix_unitaire
-
-        # Frais supplémentaires
-        total_especes += prestation.prix_supplementaire
-        return total_especes
-
     def _get_stats_complementaires(self, start_date, end_date):
         """Récupère des statistiques complémentaires pour le dashboard avec plage de dates"""
 
@@ -2383,7 +2108,7 @@ class DashboardPaiementsEspecesView(View):
             )
             .filter(
                 Q(actes_details__convention__isnull=True)
-                | Q(actes_details__convention__nom__iexact="urgence")
+                | Q(actes_details__convention__est_urgence=True)
             )
             .filter(
                 Q(paiement_especes__isnull=True)
@@ -2395,20 +2120,22 @@ class DashboardPaiementsEspecesView(View):
         )
 
         # Paiements par jour dans la période (limité aux 7 derniers jours de la période)
-        paiements_par_jour = []
+        # Nombre et montant par jour en une requête groupée, du plus récent au plus ancien
         jours_a_afficher = min(7, (end_date - start_date).days + 1)
-
-        for i in range(jours_a_afficher):
-            jour = end_date - timedelta(days=i)
-            if jour >= start_date:
-                count_jour = TranchePaiementKt.objects.filter(
-                    date_paiement__date=jour,
-                    paiement_especes__prestation__date_prestation__gte=start_date,
-                    paiement_especes__prestation__date_prestation__lte=end_date,
-                ).count()
-                paiements_par_jour.append(
-                    {"jour": jour.strftime("%d/%m"), "count": count_jour}
-                )
+        par_jour = serie(
+            TranchePaiementKt.objects.filter(
+                paiement_especes__prestation__date_prestation__gte=start_date,
+                paiement_especes__prestation__date_prestation__lte=end_date,
+            ),
+            "date_paiement",
+            end_date - timedelta(days=jours_a_afficher - 1),
+            end_date,
+            valeurs={"count": Count("id"), "montant": Sum("montant")},
+        )[::-1]
+        paiements_par_jour = [
+            {"jour": jour["date"].strftime("%d/%m"), "count": jour["count"]}
+            for jour in par_jour
+        ]
 
         # Moyenne des paiements dans la période
         moyenne_paiement = TranchePaiementKt.objects.filter(
@@ -2419,20 +2146,10 @@ class DashboardPaiementsEspecesView(View):
         ).aggregate(avg=Avg("montant"))["avg"] or Decimal("0.00")
 
         # Évolution quotidienne des montants encaissés
-        evolution_quotidienne = []
-        for i in range(jours_a_afficher):
-            jour = end_date - timedelta(days=i)
-            if jour >= start_date:
-                montant_jour = TranchePaiementKt.objects.filter(
-                    date_paiement__date=jour,
-                    paiement_especes__prestation__date_prestation__gte=start_date,
-                    paiement_especes__prestation__date_prestation__lte=end_date,
-                ).aggregate(total=Sum("montant"))["total"] or Decimal("0.00")
-
-                evolution_quotidienne.append({
-                    "jour": jour.strftime("%d/%m"),
-                    "montant": float(montant_jour)
-                })
+        evolution_quotidienne = [
+            {"jour": jour["date"].strftime("%d/%m"), "montant": float(jour["montant"])}
+            for jour in par_jour
+        ]
 
         return {
             "count_paiements_partiels": paiements_partiels.count(),
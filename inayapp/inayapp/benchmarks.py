@@ -0,0 +1,23 @@
+# inayapp/benchmarks.py
+"""
+Outils communs des commandes `benchmark_*`.
+
+`QueryCounter` se branche sur `connection.execute_wrapper` ; `Rollback` est
+levée à la fin d'un bloc `transaction.atomic()` pour annuler le jeu de
+données synthétique créé par la mesure.
+"""
+
+
+class Rollback(Exception):
+    pass
+
+
+class QueryCounter:
+    """Compte les requêtes exécutées (sans la limite de `connection.queries`)."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
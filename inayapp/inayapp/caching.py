@@ -0,0 +1,196 @@
+# inayapp/caching.py
+"""
+Configuration des caches partagés entre workers, et lecture « cache-aside ».
+
+`build_caches()` produit le réglage `CACHES` pour le moteur choisi par la
+variable d'environnement `INAYA_CACHE_BACKEND` :
+
+    file      (défaut) fichiers sur disque, partagés par tous les workers,
+              sans service externe
+    redis     Redis (`INAYA_REDIS_URL`), si le paquet `redis` est installé ;
+              sinon repli sur `file`. Chaque alias a sa propre base, à
+              partir de celle de l'URL (/1 : bases 1 à 5)
+    locmem    mémoire du processus (développement, un seul worker)
+    database  tables `DatabaseCache` (configuration historique)
+
+Les alias (`default`, `quick`, `database`, `session`, `longterm`) gardent
+leurs durées ; chacun a son propre espace de noms (répertoire, table ou base
+Redis), si bien qu'un `clear()` sur un alias n'efface pas les autres : avec
+Redis, `clear()` vide toute la base, quel que soit le préfixe des clés.
+
+`FileBasedCache` liste tout son répertoire à chaque écriture (ménage des
+entrées en trop) : avec `file`, les sessions sont donc gardées en base
+(`cached_db`) et leur cache est limité à `FILE_MAX_ENTRIES` entrées ; une
+session sortie du cache est relue en base.
+
+Clés de version : `get_version(key)` lit un jeton aléatoire partagé par tous
+les workers, `bump_version(key)` le change. Les entrées construites sous une
+version (clés de cache, index en mémoire via `VersionedIndex`) sont ainsi
+périmées d'un coup, dans tous les processus.
+"""
+import importlib.util
+import os
+import threading
+import uuid
+from urllib.parse import urlsplit, urlunsplit
+
+# alias: (durée par défaut, nombre maximal d'entrées, table DatabaseCache historique)
+CACHE_ALIASES = {
+    "default": (300, 5000, None),
+    "quick": (60, 1000, None),
+    "database": (86400, 5000, "cache_table_persistent"),
+    "session": (1800, 20000, "cache_table_sessions"),
+    "longterm": (604800, 5000, "cache_table_longterm"),
+}
+
+# Limites propres au moteur `file` (chaque écriture coûte un parcours du répertoire)
+FILE_MAX_ENTRIES = {"session": 1000}
+
+SESSION_ENGINES = {
+    "cache": "django.contrib.sessions.backends.cache",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "signed_cookies": "django.contrib.sessions.backends.signed_cookies",
+    "db": "django.contrib.sessions.backends.db",
+}
+
+
+def redis_available():
+    return importlib.util.find_spec("redis") is not None
+
+
+def cache_backend_name(environ=os.environ):
+    backend = environ.get("INAYA_CACHE_BACKEND", "file")
+    if backend == "redis" and not redis_available():
+        return "file"
+    return backend
+
+
+def redis_location(redis_url, alias):
+    """URL Redis de l'alias : base de `redis_url` + rang de l'alias."""
+    parts = urlsplit(redis_url)
+    base = int(parts.path.strip("/") or 0)
+    database = base + list(CACHE_ALIASES).index(alias)
+    return urlunsplit(parts._replace(path=f"/{database}"))
+
+
+def build_cache(alias, backend, cache_dir, redis_url="redis://127.0.0.1:6379/1"):
+    timeout, max_entries, table = CACHE_ALIASES[alias]
+    if backend == "redis":
+        return {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": redis_location(redis_url, alias),
+            "TIMEOUT": timeout,
+            "KEY_PREFIX": f"inaya:{alias}",
+        }
+    if backend == "locmem":
+        return {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": f"inaya-{alias}",
+            "TIMEOUT": timeout,
+            "OPTIONS": {"MAX_ENTRIES": max_entries},
+        }
+    if backend == "database" and table:
+        return {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": table,
+            "TIMEOUT": timeout,
+            "OPTIONS": {"MAX_ENTRIES": max_entries},
+        }
+    if backend == "database":
+        return build_cache(alias, "locmem", cache_dir)
+    return {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(cache_dir, alias),
+        "TIMEOUT": timeout,
+        "OPTIONS": {"MAX_ENTRIES": FILE_MAX_ENTRIES.get(alias, max_entries)},
+    }
+
+
+def build_caches(base_dir, environ=os.environ):
+    """Réglage `CACHES` complet pour le moteur choisi par l'environnement."""
+    backend = cache_backend_name(environ)
+    cache_dir = environ.get("INAYA_CACHE_DIR", os.path.join(base_dir, "var", "cache"))
+    redis_url = environ.get("INAYA_REDIS_URL", "redis://127.0.0.1:6379/1")
+    return {
+        alias: build_cache(alias, backend, cache_dir, redis_url)
+        for alias in CACHE_ALIASES
+    }
+
+
+def session_engine(environ=os.environ):
+    """
+    Moteur de session choisi par `INAYA_SESSION_ENGINE` ; par défaut `cache`,
+    ou `cached_db` avec le moteur de cache `file`.
+    """
+    default = "cached_db" if cache_backend_name(environ) == "file" else "cache"
+    return SESSION_ENGINES[environ.get("INAYA_SESSION_ENGINE", default)]
+
+
+def cache_aside(key, compute, timeout=None, alias="default"):
+    """
+    Lit `key` dans le cache `alias` ; en cas d'absence, calcule et stocke.
+
+    `None` n'étant pas distinguable d'une absence, une valeur calculée à
+    `None` n'est pas mise en cache.
+    """
+    from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+    from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+    cache = caches[alias or DEFAULT_CACHE_ALIAS]
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        if value is not None:
+            cache.set(key, value, DEFAULT_TIMEOUT if timeout is None else timeout)
+    return value
+
+
+def get_version(key, alias="default"):
+    """Version courante de `key` dans le cache `alias`, créée au premier appel."""
+    from django.core.cache import caches
+
+    cache = caches[alias]
+    version = cache.get(key)
+    if version is None:
+        # add : deux workers qui démarrent ensemble retiennent la même version
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(*keys, alias="default"):
+    """Change la version des clés `keys` : tout ce qui en dépend est à refaire."""
+    from django.core.cache import caches
+
+    caches[alias].set_many({key: uuid.uuid4().hex for key in keys}, None)
+
+
+def bump_version_on_commit(*keys, alias="default"):
+    """`bump_version` après le commit : un autre worker ne recharge pas l'ancien état."""
+    from django.db import transaction
+
+    transaction.on_commit(lambda: bump_version(*keys, alias=alias))
+
+
+class VersionedIndex:
+    """
+    Objet construit par `load()` et gardé dans le processus tant que la
+    version de `key` ne change pas ; la vérification coûte un accès au cache.
+    """
+
+    def __init__(self, key, load, alias="default"):
+        self.key = key
+        self.load = load
+        self.alias = alias
+        self._lock = threading.Lock()
+        self._value = None
+        self._version = None
+
+    def get(self):
+        version = get_version(self.key, self.alias)
+        if self._value is None or version != self._version:
+            with self._lock:
+                if self._value is None or version != self._version:
+                    self._value = self.load()
+                    self._version = version
+        return self._value
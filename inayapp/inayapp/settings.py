@@ -2,6 +2,8 @@ from decimal import Decimal
 import os
 from pathlib import Path
 
+from .caching import build_caches, session_engine
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -361,6 +363,13 @@ AUDIT_SETTINGS = {
     # "EXCLUDE_MODELS": ["auth.Permission", "contenttypes.ContentType"],
     "MAX_LOG_AGE_DAYS": 365,
     "ENABLE_API_AUDIT": True,
+    # Écriture différée des journaux (voir audit/writer.py)
+    "WRITER": {
+        "MODE": "thread",  # "sync" pour écrire immédiatement
+        "MAX_QUEUE_SIZE": 10000,
+        "BATCH_SIZE": 200,
+        "FLUSH_INTERVAL": 2.0,
+    },
 }
 
 # ============================================
@@ -369,53 +378,21 @@ AUDIT_SETTINGS = {
 
 # settings.py
 
-CACHES = {
-    # Cache par défaut - Mémoire (rapide pour données fréquentes)
-    "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": "unique-snowflake",
-        "TIMEOUT": 300,  # 5 minutes
-        "OPTIONS": {
-            "MAX_ENTRIES": 500,
-            "CULL_FREQUENCY": 3,
-        },
-    },
-    # Cache base de données (persistant pour données importantes)
-    "database": {
-        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
-        "LOCATION": "cache_table_persistent",
-        "TIMEOUT": 86400,  # 24 heures
-        "OPTIONS": {
-            "MAX_ENTRIES": 2000,
-            "CULL_FREQUENCY": 4,
-        },
-    },
-    # Cache session (pour données utilisateur)
-    "session": {
-        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
-        "LOCATION": "cache_table_sessions",
-        "TIMEOUT": 1800,  # 30 minutes
-    },
-    # Cache court terme (pour calculs rapides)
-    "quick": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": "quick-cache",
-        "TIMEOUT": 60,  # 1 minute
-        "OPTIONS": {
-            "MAX_ENTRIES": 100,
-        },
-    },
-    # Cache long terme (pour données rarement modifiées)
-    "longterm": {
-        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
-        "LOCATION": "cache_table_longterm",
-        "TIMEOUT": 604800,  # 7 jours
-    },
-}
+# Caches partagés entre workers (fichiers par défaut, Redis si disponible).
+# Voir inayapp/caching.py : INAYA_CACHE_BACKEND = file | redis | locmem | database
+CACHES = build_caches(BASE_DIR)
 
 
 # Configuration des sessions pour utiliser le cache
-SESSION_ENGINE = "django.contrib.sessions.backends.cache"
+# INAYA_SESSION_ENGINE = cache (défaut ; cached_db avec le cache file) | cached_db
+#                       | signed_cookies | db
+SESSION_ENGINE = session_engine()
 SESSION_CACHE_ALIAS = "session"
-# Configuration de la base de données pour le cache
-# Assurez-vous d'avoir créé la table de cache dans votre base de données
+# Avec INAYA_CACHE_BACKEND=database, créer les tables : manage.py createcachetable
+
+# Recherche de produits (voir pharmacies/recherche.py)
+# memory : index en mémoire par processus ; fulltext : index FULLTEXT MariaDB
+PRODUCT_SEARCH_BACKEND = os.environ.get("INAYA_PRODUCT_SEARCH", "memory")
+
+# Processus de rendu PDF par worker web (voir utils/pdf.py) ; 0 : rendu sur place
+PDF_WORKERS = int(os.environ.get("INAYA_PDF_WORKERS", "2"))
@@ -0,0 +1,50 @@
+// Préparation des PDF en arrière-plan (utils.pdf.preparer)
+//
+// La demande (avec preparer=1) répond 202 et l'URL de téléchargement ; cette
+// URL est interrogée jusqu'à ce que le document soit prêt, puis le fichier
+// est enregistré. Résout `false` si le serveur n'a pas lancé de préparation
+// (redirection, message d'erreur) : l'appelant reprend alors l'envoi normal.
+function preparerPdf(url, options = {}) {
+    const intervalle = options.intervalle || 1500;
+
+    return fetch(url, {
+        method: options.method || 'GET',
+        body: options.body,
+        credentials: 'same-origin',
+        headers: { 'X-Requested-With': 'XMLHttpRequest' },
+    })
+        .then(reponse => (reponse.status === 202 ? reponse.json() : null))
+        .then(preparation => {
+            if (!preparation) {
+                return false;
+            }
+            return new Promise((resolve, reject) => {
+                const interroger = () => {
+                    fetch(preparation.url, { credentials: 'same-origin' })
+                        .then(reponse => {
+                            if (reponse.status === 202) {
+                                setTimeout(interroger, intervalle);
+                                return;
+                            }
+                            if (!reponse.ok) {
+                                throw new Error('Échec de la préparation du PDF');
+                            }
+                            const disposition = reponse.headers.get('Content-Disposition') || '';
+                            const nom = (disposition.match(/filename="([^"]+)"/) || [])[1] || 'document.pdf';
+                            return reponse.blob().then(contenu => {
+                                const lien = document.createElement('a');
+                                lien.href = URL.createObjectURL(contenu);
+                                lien.download = nom;
+                                document.body.appendChild(lien);
+                                lien.click();
+                                lien.remove();
+                                setTimeout(() => URL.revokeObjectURL(lien.href), 10000);
+                                resolve(true);
+                            });
+                        })
+                        .catch(reject);
+                };
+                interroger();
+            });
+        });
+}
@@ -0,0 +1,125 @@
+# inayapp/timeseries.py
+"""
+Séries temporelles (jour, semaine, mois) pour les graphiques des tableaux de bord.
+
+`serie()` agrège un queryset en une seule requête `Trunc` + `GROUP BY`,
+puis complète en Python les périodes sans données. Avec `cache_key`, les
+périodes closes (entièrement passées et comprises dans l'intervalle) sont
+gardées sans expiration dans le cache `longterm` : seule la période en cours,
+et les périodes jamais calculées, sont relues en base.
+
+La clé de cache doit décrire le queryset (filtres compris) : deux séries
+différentes ne doivent jamais partager une clé. Le cache ne convient qu'aux
+données dont le passé ne change plus (dates de création, de réception).
+"""
+import calendar
+from datetime import datetime, timedelta
+
+from django.core.cache import caches
+from django.db.models import Count, DateField
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+CACHE_ALIAS = "longterm"
+
+
+def _as_date(valeur):
+    if isinstance(valeur, datetime):
+        if timezone.is_aware(valeur):
+            valeur = timezone.localtime(valeur)
+        return valeur.date()
+    return valeur
+
+
+def debut_periode(jour, periode):
+    """Premier jour de la période (`day`, `week` : lundi, `month`) contenant `jour`."""
+    if periode == "day":
+        return jour
+    if periode == "week":
+        return jour - timedelta(days=jour.weekday())
+    if periode == "month":
+        return jour.replace(day=1)
+    raise ValueError(f"Période inconnue : {periode}")
+
+
+def fin_periode(debut, periode):
+    """Dernier jour de la période commençant le `debut`."""
+    if periode == "day":
+        return debut
+    if periode == "week":
+        return debut + timedelta(days=6)
+    return debut.replace(day=calendar.monthrange(debut.year, debut.month)[1])
+
+
+def periodes(debut, fin, periode="day"):
+    """Débuts des périodes couvrant [debut, fin], dans l'ordre."""
+    courant = debut_periode(_as_date(debut), periode)
+    fin = _as_date(fin)
+    resultat = []
+    while courant <= fin:
+        resultat.append(courant)
+        courant = fin_periode(courant, periode) + timedelta(days=1)
+    return resultat
+
+
+def _calculer(queryset, champ, debut, fin, periode, valeurs):
+    is_datetime = queryset.model._meta.get_field(champ).get_internal_type() == "DateTimeField"
+    lookup = f"{champ}__date" if is_datetime else champ
+    rows = (
+        queryset.filter(**{f"{lookup}__gte": debut, f"{lookup}__lte": fin})
+        .annotate(_periode=Trunc(champ, periode, output_field=DateField()))
+        .values("_periode")
+        .annotate(**valeurs)
+        .order_by()
+    )
+    return {
+        _as_date(row.pop("_periode")): {nom: row[nom] or 0 for nom in valeurs}
+        for row in rows
+    }
+
+
+def serie(queryset, champ, debut, fin, periode="day", valeurs=None, cache_key=None):
+    """
+    [{"date": début de période, <nom>: valeur, ...}] de `debut` à `fin` inclus.
+
+    `champ` est un DateField ou DateTimeField du modèle ; `valeurs` associe
+    un nom à un agrégat (par défaut `{"count": Count("pk")}`). Les périodes
+    sans ligne valent 0. La première période est entière ; la dernière
+    s'arrête à `fin`.
+    """
+    valeurs = valeurs or {"count": Count("pk")}
+    fin = _as_date(fin)
+    debuts = periodes(debut, fin, periode)
+    if not debuts:
+        return []
+    zero = {nom: 0 for nom in valeurs}
+    courante = debut_periode(timezone.localdate(), periode)
+
+    def close(debut_p):
+        return debut_p < courante and fin_periode(debut_p, periode) <= fin
+
+    resultat = {}
+    cles = {}
+    if cache_key:
+        cache = caches[CACHE_ALIAS]
+        cles = {
+            f"timeseries:{cache_key}:{periode}:{debut_p.isoformat()}": debut_p
+            for debut_p in debuts
+            if close(debut_p)
+        }
+        for cle, valeur in cache.get_many(list(cles)).items():
+            resultat[cles[cle]] = valeur
+
+    manquantes = [debut_p for debut_p in debuts if debut_p not in resultat]
+    if manquantes:
+        calcul = _calculer(queryset, champ, manquantes[0], fin, periode, valeurs)
+        for debut_p in manquantes:
+            resultat[debut_p] = calcul.get(debut_p, zero)
+        if cache_key:
+            cache.set_many(
+                {cle: resultat[debut_p] for cle, debut_p in cles.items() if debut_p in manquantes},
+                timeout=None,
+            )
+
+    return [{"date": debut_p, **resultat[debut_p]} for debut_p in debuts]
+
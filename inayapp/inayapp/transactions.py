@@ -0,0 +1,35 @@
+# inayapp/transactions.py
+"""
+Traitements regroupés au commit.
+
+`ApresCommit(traiter)` accumule les clés (identifiants, mois...) marquées
+pendant une transaction et appelle `traiter(cles)` une seule fois au commit,
+quel que soit le nombre d'écritures ; hors transaction, le traitement est
+immédiat. Les clés en attente sont propres au thread, comme la connexion.
+
+Chaque marquage inscrit un rappel `on_commit` : le premier exécuté traite
+toutes les clés, les suivants ne trouvent plus rien. Après un rollback, les
+clés marquées restent en attente jusqu'au commit suivant ; les traitements
+recalculent depuis la base, un recalcul en trop est donc sans effet.
+"""
+import threading
+
+from django.db import transaction
+
+
+class ApresCommit:
+    def __init__(self, traiter):
+        self.traiter = traiter
+        self._local = threading.local()
+
+    def marquer(self, *cles):
+        cles = {cle for cle in cles if cle is not None}
+        if not cles:
+            return
+        self._local.__dict__.setdefault("cles", set()).update(cles)
+        transaction.on_commit(self.vider)
+
+    def vider(self):
+        cles = self._local.__dict__.pop("cles", None)
+        if cles:
+            self.traiter(cles)
@@ -5,4 +5,6 @@ class MedicalConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "medical"
     def ready(self):
-        import medical.signals
\ No newline at end of file
+        import medical.catalogue
+        import medical.signals
+        import medical.tarifs
\ No newline at end of file
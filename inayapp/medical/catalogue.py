@@ -0,0 +1,213 @@
+# medical/catalogue.py
+"""
+Catalogues de l'écran de location de bloc (blocs, forfaits, actes).
+
+Chaque catalogue est construit une fois en JSON (et en gzip), puis gardé dans
+le cache partagé sous une clé versionnée. Les signaux des modèles du
+catalogue changent la version après le commit : le catalogue suivant est
+reconstruit à la première lecture. L'ETag est l'empreinte du contenu ; un
+navigateur qui renvoie `If-None-Match` reçoit un 304 sans corps.
+"""
+import gzip
+import hashlib
+import json
+import re
+from collections import namedtuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.signals import post_delete, post_save
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from inayapp.caching import bump_version_on_commit, cache_aside, get_version
+from pharmacies.models import Produit
+
+from .models.bloc_location import (
+    ActeLocation,
+    ActeProduitInclus,
+    Bloc,
+    BlocProduitInclus,
+    Forfait,
+    ForfaitActeInclus,
+    ForfaitProduitInclus,
+)
+
+CATALOGUES = ("blocs", "forfaits", "actes")
+TIMEOUT = 24 * 3600
+
+Snapshot = namedtuple("Snapshot", "nom etag contenu contenu_gzip")
+
+# JSON valide, et sans danger dans une balise <script>
+_ECHAPPEMENTS_HTML = {ord("<"): "\\u003C", ord(">"): "\\u003E", ord("&"): "\\u0026"}
+_GZIP = re.compile(r"\bgzip\b")
+
+
+def _produit(lien, quantite):
+    return {
+        "id": lien.produit.id,
+        "nom": lien.produit.nom,
+        "quantite_defaut": quantite,
+        "prix_unitaire": float(lien.produit.prix_vente),
+    }
+
+
+def _blocs():
+    return {
+        str(bloc.id): {
+            "id": bloc.id,
+            "nom_bloc": bloc.nom_bloc,
+            "prix_base": float(bloc.prix_base),
+            "prix_supplement_30min": float(bloc.prix_supplement_30min),
+            "produits_inclus": [
+                _produit(bp, bp.quantite) for bp in bloc.produits_inclus.all()
+            ],
+        }
+        for bloc in Bloc.objects.filter(est_active=True).prefetch_related(
+            "produits_inclus__produit"
+        )
+    }
+
+
+def _forfaits():
+    return {
+        str(forfait.id): {
+            "id": forfait.id,
+            "nom": forfait.nom,
+            "prix": float(forfait.prix),
+            "duree": forfait.duree,
+            "produits_inclus": [_produit(fp, fp.quantite) for fp in forfait.produits.all()],
+            "actes_inclus": [
+                {
+                    "id": fa.acte.id,
+                    "nom": fa.acte.nom,
+                    "quantite_incluse": fa.quantite,
+                    "prix_unitaire_inclus": float(fa.prix_unitaire_inclus),
+                    "prix_standard": float(fa.acte.prix),
+                    "duree_estimee": fa.acte.duree_estimee,
+                    "produits_inclus": [
+                        _produit(ap, ap.quantite_standard)
+                        for ap in fa.acte.produits_inclus.all()
+                    ],
+                }
+                for fa in forfait.actes_inclus.all()
+            ],
+        }
+        for forfait in Forfait.objects.filter(est_active=True).prefetch_related(
+            "produits__produit", "actes_inclus__acte__produits_inclus__produit"
+        )
+    }
+
+
+def _actes():
+    return [
+        {
+            "id": acte.id,
+            "nom": acte.nom,
+            "prix": float(acte.prix),
+            "duree_estimee": acte.duree_estimee,
+            "produits_inclus": [
+                dict(_produit(ap, ap.quantite_standard), est_obligatoire=ap.est_obligatoire)
+                for ap in acte.produits_inclus.all()
+            ],
+        }
+        for acte in ActeLocation.objects.filter(est_active=True).prefetch_related(
+            "produits_inclus__produit"
+        )
+    ]
+
+
+CONSTRUCTEURS = {"blocs": _blocs, "forfaits": _forfaits, "actes": _actes}
+
+
+def _cle_version(nom):
+    return f"medical:catalogue:{nom}:version"
+
+
+def construire(nom):
+    """Snapshot du catalogue `nom`, lu en base."""
+    contenu = (
+        json.dumps(
+            {"success": True, nom: CONSTRUCTEURS[nom]()},
+            cls=DjangoJSONEncoder,
+            separators=(",", ":"),
+        )
+        .translate(_ECHAPPEMENTS_HTML)
+        .encode()
+    )
+    etag = f'"{hashlib.sha1(contenu).hexdigest()[:20]}"'
+    return Snapshot(nom, etag, contenu, gzip.compress(contenu, compresslevel=6))
+
+
+def snapshot(nom):
+    """Snapshot courant du catalogue `nom` (cache partagé, sinon construit)."""
+    if nom not in CONSTRUCTEURS:
+        raise KeyError(nom)
+    cle = f"medical:catalogue:{nom}:{get_version(_cle_version(nom))}"
+    return cache_aside(cle, lambda: construire(nom), timeout=TIMEOUT)
+
+
+def embarquer(*noms):
+    """{nom: JSON} des catalogues, à placer dans des balises <script type="application/json">."""
+    return {nom: snapshot(nom).contenu.decode() for nom in noms or CATALOGUES}
+
+
+def reponse(request, nom):
+    """Réponse HTTP du catalogue : 304 si l'ETag du client est à jour, gzip si accepté."""
+    snap = snapshot(nom)
+    if snap.etag in parse_etags(request.headers.get("If-None-Match", "")):
+        response = HttpResponseNotModified()
+    elif _GZIP.search(request.headers.get("Accept-Encoding", "")):
+        response = HttpResponse(snap.contenu_gzip, content_type="application/json")
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(snap.contenu, content_type="application/json")
+    response["ETag"] = snap.etag
+    # Le navigateur garde la copie mais la revalide à chaque chargement
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return response
+
+
+def invalider(*noms):
+    """Change la version des catalogues `noms` après le commit."""
+    bump_version_on_commit(*(_cle_version(nom) for nom in noms))
+
+
+# Les forfaits reprennent les actes inclus et leurs produits
+DEPENDANCES = {
+    Bloc: ("blocs",),
+    BlocProduitInclus: ("blocs",),
+    Forfait: ("forfaits",),
+    ForfaitProduitInclus: ("forfaits",),
+    ForfaitActeInclus: ("forfaits",),
+    ActeLocation: ("actes", "forfaits"),
+    ActeProduitInclus: ("actes", "forfaits"),
+}
+
+
+def _modele_modifie(sender, **kwargs):
+    invalider(*DEPENDANCES[sender])
+
+
+for _modele in DEPENDANCES:
+    post_save.connect(_modele_modifie, sender=_modele)
+    post_delete.connect(_modele_modifie, sender=_modele)
+
+
+def _produit_modifie(sender, instance, created, **kwargs):
+    # Un nouveau produit n'est dans aucun catalogue ; seuls nom et prix y figurent
+    if created:
+        return
+    original = instance.get_original_values()
+    if original is None or any(
+        original.get(champ) != getattr(instance, champ) for champ in ("nom", "prix_vente")
+    ):
+        invalider(*CATALOGUES)
+
+
+def _produit_supprime(sender, **kwargs):
+    invalider(*CATALOGUES)
+
+
+post_save.connect(_produit_modifie, sender=Produit)
+post_delete.connect(_produit_supprime, sender=Produit)
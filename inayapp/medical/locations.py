@@ -0,0 +1,247 @@
+# medical/locations.py
+"""
+Enregistrement d'une location de bloc (création et modification).
+
+Les vues (formulaire HTML ou JSON) valident la saisie avec
+`LocationBlocSaisieSerializer`, puis appellent `enregistrer_location` dans
+une transaction. Les actes et les consommations de produits sont calculés en
+mémoire à partir des inclusions du bloc, du forfait et des actes, insérés en
+bloc, puis le prix et les paiements sont recalculés sur ces lignes sans
+relecture.
+"""
+from decimal import Decimal
+
+from django.db.models import prefetch_related_objects
+
+from pharmacies.models import Produit
+
+from .models.bloc_location import (
+    ActeLocation,
+    ConsommationProduitBloc,
+    LocationBloc,
+    LocationBlocActe,
+)
+
+CHAMPS_LOCATION = (
+    "patient",
+    "medecin",
+    "bloc",
+    "type_tarification",
+    "forfait",
+    "date_operation",
+    "heure_operation",
+    "nom_acte",
+    "observations",
+)
+
+
+class Consommations:
+    """Consommations d'une location, avec les règles de fusion par produit des forfaits"""
+
+    def __init__(self, location):
+        self.location = location
+        self.lignes = []
+        self._par_produit = {}
+
+    def ajouter(self, produit, quantite, quantite_incluse, source, acte=None, prix_unitaire=None):
+        ligne = ConsommationProduitBloc(
+            location=self.location,
+            produit=produit,
+            acte_associe=acte,
+            quantite=Decimal(quantite),
+            quantite_incluse=Decimal(quantite_incluse),
+            prix_unitaire=produit.prix_vente if prix_unitaire is None else prix_unitaire,
+            source_inclusion=source,
+        )
+        self.lignes.append(ligne)
+        self._par_produit.setdefault(produit.pk, ligne)
+        return ligne
+
+    def existante(self, produit_id):
+        return self._par_produit.get(produit_id)
+
+    def fusionner(self, ligne, sources_conservees):
+        """Une même consommation couverte par le forfait et par un acte du forfait"""
+        if ligne.source_inclusion not in sources_conservees:
+            ligne.source_inclusion = "FORFAIT_MIXTE"
+
+    def finaliser(self):
+        # Calculs de ConsommationProduitBloc.save, que bulk_create n'appelle pas
+        for ligne in self.lignes:
+            ligne.ecart_quantite = ligne.quantite - ligne.quantite_incluse
+            ligne.est_inclus = ligne.ecart_quantite <= 0
+        return self.lignes
+
+
+def _acte(location, acte, quantite, prix_unitaire):
+    return LocationBlocActe(
+        location=location,
+        acte=acte,
+        quantite=quantite,
+        prix_unitaire=prix_unitaire,
+        prix_total=prix_unitaire * quantite,
+    )
+
+
+def _lignes_forfait(location, saisie, actes, consommations):
+    forfait = location.forfait
+    saisis = {a["acte_id"]: a for a in saisie["actes_forfait"]}
+    inclus = list(
+        forfait.actes_inclus.select_related("acte").prefetch_related(
+            "acte__produits_inclus__produit"
+        )
+    )
+    for acte_inclus in inclus:
+        acte = acte_inclus.acte
+        donnees = saisis.get(acte.id, {})
+        utilisee = donnees.get("quantite_utilisee")
+        if utilisee is None:
+            utilisee = acte_inclus.quantite
+        ligne_incluse = _acte(
+            location, acte, min(utilisee, acte_inclus.quantite), acte_inclus.prix_unitaire_inclus
+        )
+        actes.append(ligne_incluse)
+        if utilisee > acte_inclus.quantite:
+            actes.append(_acte(location, acte, utilisee - acte_inclus.quantite, acte.prix))
+
+        produits_saisis = {p["produit_id"]: p["quantite"] for p in donnees.get("produits", [])}
+        for produit_acte in acte.produits_inclus.all():
+            incluse = produit_acte.quantite_standard * acte_inclus.quantite
+            consommee = produits_saisis.get(
+                produit_acte.produit_id, produit_acte.quantite_standard * utilisee
+            )
+            existante = consommations.existante(produit_acte.produit_id)
+            if existante:
+                existante.quantite += consommee
+                existante.quantite_incluse += incluse
+                consommations.fusionner(existante, ("FORFAIT_ACTE", "FORFAIT_MIXTE"))
+            elif consommee > 0:
+                consommations.ajouter(
+                    produit_acte.produit, consommee, incluse, "FORFAIT_ACTE", acte=ligne_incluse
+                )
+
+    reelles = {p["produit_id"]: p["quantite"] for p in saisie["produits_inclus"]}
+    for produit_forfait in forfait.produits.select_related("produit"):
+        reelle = reelles.get(produit_forfait.produit_id, produit_forfait.quantite)
+        existante = consommations.existante(produit_forfait.produit_id)
+        if existante:
+            existante.quantite = max(existante.quantite, reelle)
+            existante.quantite_incluse += produit_forfait.quantite
+            consommations.fusionner(existante, ("FORFAIT", "FORFAIT_MIXTE"))
+        elif reelle > 0:
+            consommations.ajouter(
+                produit_forfait.produit, reelle, produit_forfait.quantite, "FORFAIT"
+            )
+    return {acte_inclus.acte_id: acte_inclus for acte_inclus in inclus}
+
+
+def _lignes_bloc(location, saisie, consommations):
+    reelles = {p["produit_id"]: p["quantite"] for p in saisie["produits_inclus"]}
+    for produit_bloc in location.bloc.produits_inclus.select_related("produit"):
+        reelle = reelles.get(produit_bloc.produit_id, produit_bloc.quantite)
+        if reelle > 0:
+            consommations.ajouter(produit_bloc.produit, reelle, produit_bloc.quantite, "BLOC")
+
+
+def _lignes_actes(location, saisie, actes_forfait, produits, actes, consommations):
+    actes_par_id = ActeLocation.objects.prefetch_related("produits_inclus__produit").in_bulk(
+        {a["acte_id"] for a in saisie["actes"]}
+    )
+    for donnees in saisie["actes"]:
+        acte = actes_par_id[donnees["acte_id"]]
+        prix = acte.prix if donnees.get("prix") is None else donnees["prix"]
+        quantite = donnees["quantite"]
+        # Acte du forfait : seul l'excédent est facturé
+        acte_inclus = actes_forfait.get(acte.id)
+        if acte_inclus:
+            if quantite > acte_inclus.quantite:
+                actes.append(_acte(location, acte, quantite - acte_inclus.quantite, prix))
+            continue
+
+        ligne = _acte(location, acte, quantite, prix)
+        actes.append(ligne)
+        standards = {p.produit_id: p for p in acte.produits_inclus.all()}
+        if donnees.get("produits") is None:
+            for produit_acte in standards.values():
+                if produit_acte.est_obligatoire:
+                    totale = produit_acte.quantite_standard * quantite
+                    consommations.ajouter(produit_acte.produit, totale, totale, "ACTE", acte=ligne)
+            continue
+        for produit_saisi in donnees["produits"]:
+            if produit_saisi["quantite"] <= 0:
+                continue
+            produit_acte = standards.get(produit_saisi["produit_id"])
+            if produit_acte:
+                consommations.ajouter(
+                    produit_acte.produit,
+                    produit_saisi["quantite"],
+                    produit_acte.quantite_standard * quantite,
+                    "ACTE",
+                    acte=ligne,
+                )
+            else:
+                consommations.ajouter(
+                    produits[produit_saisi["produit_id"]],
+                    produit_saisi["quantite"],
+                    0,
+                    "ACTE_SUPPLEMENTAIRE",
+                    acte=ligne,
+                )
+
+
+def enregistrer_location(saisie, location=None, utilisateur=None):
+    """
+    Crée (`location=None`) ou remplace une location de bloc et toutes ses
+    lignes à partir d'une saisie validée. À appeler dans une transaction.
+    """
+    creation = location is None
+    if creation:
+        location = LocationBloc(cree_par=utilisateur)
+    for champ in CHAMPS_LOCATION:
+        setattr(location, champ, saisie.get(champ))
+    location.observations = location.observations or ""
+    for champ in ("montant_paye_caisse", "notes_paiement"):
+        if champ in saisie:
+            setattr(location, champ, saisie[champ])
+
+    # Premier enregistrement sans durée ni lignes : pas de calcul de prix ici
+    location.duree_reelle = None
+    if not creation:
+        location.consommations_produits.all().delete()
+        location.actes_location.all().delete()
+    location._prefetched_objects_cache = {
+        "actes_location": LocationBlocActe.objects.none(),
+        "consommations_produits": ConsommationProduitBloc.objects.none(),
+    }
+    location.save()
+
+    produits = Produit.objects.in_bulk(
+        {p["produit_id"] for ligne in saisie["actes"] for p in ligne.get("produits") or []}
+        | {p["produit_id"] for p in saisie["produits_supplementaires"]}
+    )
+    actes = []
+    consommations = Consommations(location)
+    actes_forfait = {}
+    if location.type_tarification == "FORFAIT" and location.forfait:
+        actes_forfait = _lignes_forfait(location, saisie, actes, consommations)
+    else:
+        _lignes_bloc(location, saisie, consommations)
+    _lignes_actes(location, saisie, actes_forfait, produits, actes, consommations)
+    for produit_saisi in saisie["produits_supplementaires"]:
+        consommations.ajouter(
+            produits[produit_saisi["produit_id"]],
+            produit_saisi["quantite"],
+            0,
+            "SUPPLEMENTAIRE",
+            prix_unitaire=produit_saisi.get("prix_unitaire"),
+        )
+
+    LocationBlocActe.objects.bulk_create(actes)
+    ConsommationProduitBloc.objects.bulk_create(consommations.finaliser())
+
+    # Les montants de la facture (LocationBloc.save) se calculent sur ces lignes
+    location._prefetched_objects_cache = {}
+    prefetch_related_objects([location], "actes_location__acte", "consommations_produits")
+    location.duree_reelle = saisie["duree_reelle"]
+    location.save()
+    return location
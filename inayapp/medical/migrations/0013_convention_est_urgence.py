@@ -0,0 +1,24 @@
+# Generated by Django 5.1.7 on 2026-10-18 12:19
+
+from django.db import migrations, models
+
+
+def marquer_urgence(apps, schema_editor):
+    Convention = apps.get_model("medical", "Convention")
+    Convention.objects.filter(nom__iexact="urgence").update(est_urgence=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical', '0012_service_seuil_sejour_court_heures_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='convention',
+            name='est_urgence',
+            field=models.BooleanField(db_index=True, default=False, editable=False, help_text='Convention « urgence » : réglée en espèces, jamais facturée (déduit du nom)'),
+        ),
+        migrations.RunPython(marquer_urgence, migrations.RunPython.noop),
+    ]
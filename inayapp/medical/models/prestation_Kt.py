@@ -11,6 +11,8 @@ from django.contrib.auth import get_user_model
 from django.db import models
 from django.utils import timezone
 
+from audit.tracking import FieldTrackerMixin
+
 User = get_user_model()
 
 class ActeKt(models.Model):
@@ -59,10 +61,23 @@ class Convention(models.Model):
     nom = models.CharField(max_length=255, unique=True)
     description = models.TextField(blank=True, null=True)
     active = models.BooleanField(default=True)
+    est_urgence = models.BooleanField(
+        default=False,
+        editable=False,
+        db_index=True,
+        help_text="Convention « urgence » : réglée en espèces, jamais facturée (déduit du nom)",
+    )
 
     def __str__(self):
         return self.nom
 
+    def save(self, *args, **kwargs):
+        self.est_urgence = (self.nom or "").lower() == "urgence"
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "nom" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "est_urgence"}
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = "Convention KT"
         verbose_name_plural = "Conventions KT"
@@ -142,7 +157,7 @@ class TarifActe(models.Model):
         super().save(*args, **kwargs)
 
 
-class PrestationKt(models.Model):
+class PrestationKt(FieldTrackerMixin, models.Model):
     STATUT_CHOICES = [
         ("PLANIFIE", "Planifié"),
         ("REALISE", "Réalisé"),
@@ -284,7 +299,7 @@ class PrestationKt(models.Model):
                 convention__isnull=False,
                 convention_accordee=True,
                 dossier_convention_complet=True,
-            ).exclude(convention__nom__iexact="urgence")
+            ).exclude(convention__est_urgence=True)
 
             if actes_facturables.exists():
                 actes_non_payes = actes_facturables.filter(
@@ -298,7 +313,7 @@ class PrestationKt(models.Model):
 
             # 2. Vérifier les paiements espèces (urgence ou sans convention)
             actes_especes = actes.filter(
-                Q(convention__isnull=True) | Q(convention__nom__iexact="urgence")
+                Q(convention__isnull=True) | Q(convention__est_urgence=True)
             )
 
             if actes_especes.exists():
@@ -334,7 +349,7 @@ class PrestationKt(models.Model):
             convention__isnull=False,
             convention_accordee=True,
             dossier_convention_complet=True,
-        ).exclude(convention__nom__iexact="urgence")
+        ).exclude(convention__est_urgence=True)
 
         if actes_facturables.exists():
             actes_non_payes = actes_facturables.filter(
@@ -345,7 +360,7 @@ class PrestationKt(models.Model):
 
         # Vérifier les paiements espèces
         actes_especes = actes.filter(
-            Q(convention__isnull=True) | Q(convention__nom__iexact="urgence")
+            Q(convention__isnull=True) | Q(convention__est_urgence=True)
         )
 
         if actes_especes.exists():
@@ -374,7 +389,7 @@ class PrestationKt(models.Model):
         super().save(*args, **kwargs)
 
 
-class PrestationActe(models.Model):
+class PrestationActe(FieldTrackerMixin, models.Model):
     prestation = models.ForeignKey(
         "PrestationKt", on_delete=models.CASCADE, related_name="actes_details"
     )
@@ -495,15 +510,40 @@ class PrestationActe(models.Model):
         # MISE À JOUR AUTOMATIQUE DU STATUT DE FACTURATION
         self._update_statut_facturation()
 
+        original = self.get_original_values()
+        etait_facturable = bool(original) and self._est_facturable(original)
+
         super().save(*args, **kwargs)
 
         # Mettre à jour le statut de la prestation si nécessaire
-        self._update_prestation_statut()
+        if self._peut_changer_statut_prestation(etait_facturable):
+            self._update_prestation_statut()
+
+    @staticmethod
+    def _est_facturable(valeurs):
+        """Critères du filtre des actes facturables de _update_prestation_statut"""
+        return (
+            valeurs.get("convention_id") is not None
+            and valeurs.get("convention_accordee") is True
+            and valeurs.get("dossier_convention_complet") is True
+        )
+
+    def _peut_changer_statut_prestation(self, etait_facturable):
+        """
+        La prestation ne passe à « Payé » que si tous ses actes facturables le
+        sont : un acte facturable non payé, ou qui ne l'était pas et ne l'est
+        toujours pas, ne peut rien y changer (évite la relecture des actes).
+        """
+        if self.prestation.statut == "PAYE":
+            return False
+        if self._est_facturable(self.__dict__):
+            return self.statut_facturation == "PAYE"
+        return etait_facturable
 
     def _update_statut_facturation(self):
         """Met à jour automatiquement le statut de facturation"""
         # Si c'est urgence, ne pas gérer la facturation (réglé immédiatement)
-        if self.convention and self.convention.nom.lower() == "urgence":
+        if self.convention and self.convention.est_urgence:
             self.statut_facturation = "NON_FACTURABLE"
             return
 
@@ -543,7 +583,7 @@ class PrestationActe(models.Model):
     def facturer(self, date_facturation=None):
         """Marque l'acte comme facturé"""
         # Vérifier si c'est urgence
-        if self.convention and self.convention.nom.lower() == "urgence":
+        if self.convention and self.convention.est_urgence:
             raise ValidationError("Les actes d'urgence ne peuvent pas être facturés - ils sont réglés immédiatement")
 
         if not self.peut_facturer_convention:
@@ -616,12 +656,14 @@ class PrestationActe(models.Model):
         1) Tarif médecin spécifique (HonorairesMedecin)
         2) montant_honoraire_base depuis TarifActe
         """
+        from medical import tarifs
+
         # 1️⃣ Tarif médecin spécifique
-        honoraire_config = HonorairesMedecin.objects.get_tarif_effectif(
-            medecin=self.prestation.medecin,
-            acte=self.acte,
-            convention=self.convention,
-            date_reference=self.prestation.date_prestation,
+        honoraire_config = tarifs.honoraire(
+            self.prestation.medecin_id,
+            self.acte_id,
+            self.convention_id,
+            self.prestation.date_prestation,
         )
         if honoraire_config:
             self.honoraire_medecin = honoraire_config.montant
@@ -638,26 +680,13 @@ class PrestationActe(models.Model):
         return tarif_obj.montant if tarif_obj else Decimal("0.00")
 
     def _get_tarif_acte_obj(self):
-        """Récupère l'objet TarifActe approprié"""
-        # Recherche avec convention
-        if self.convention:
-            tarif = TarifActe.objects.filter(
-                acte=self.acte,
-                convention=self.convention,
-                date_effective__lte=self.prestation.date_prestation
-            ).order_by("-date_effective").first()
-
-            if tarif:
-                return tarif
-
-        # Recherche tarif de base (sans convention)
-        tarif = TarifActe.objects.filter(
-            acte=self.acte,
-            convention__isnull=True,
-            date_effective__lte=self.prestation.date_prestation
-        ).order_by("-is_default", "-date_effective").first()
+        """
+        Tarif (montant, honoraire de base) applicable à la date de la
+        prestation : convention, sinon tarif de base (voir medical.tarifs)
+        """
+        from medical import tarifs
 
-        return tarif
+        return tarifs.tarif(self.acte_id, self.convention_id, self.prestation.date_prestation)
 
     def get_produits_defaut(self):
         """Récupère les produits par défaut avec leur quantité"""
@@ -691,7 +720,7 @@ class PrestationActe(models.Model):
     def peut_facturer_convention(self):
         """Détermine si on peut facturer en convention"""
         # Urgence ne peut pas être facturée (réglée immédiatement)
-        if self.convention and self.convention.nom.lower() == "urgence":
+        if self.convention and self.convention.est_urgence:
             return False
 
         return (
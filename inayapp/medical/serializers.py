@@ -0,0 +1,111 @@
+# medical/serializers.py
+from decimal import Decimal
+
+from medecin.models import Medecin
+from patients.models import Patient
+from pharmacies.models import Produit
+from rest_framework import serializers
+
+from .models.bloc_location import ActeLocation, Bloc, Forfait, LocationBloc
+
+QUANTITE = {"max_digits": 10, "decimal_places": 2, "min_value": 0}
+
+
+class ProduitQuantiteSerializer(serializers.Serializer):
+    produit_id = serializers.IntegerField()
+    quantite = serializers.DecimalField(**QUANTITE)
+
+
+class ActeForfaitSerializer(serializers.Serializer):
+    """Acte inclus dans le forfait : quantité utilisée et produits réellement consommés"""
+
+    acte_id = serializers.IntegerField()
+    quantite_utilisee = serializers.IntegerField(min_value=0, required=False, allow_null=True)
+    produits = ProduitQuantiteSerializer(many=True, required=False)
+
+
+class ActeSupplementaireSerializer(serializers.Serializer):
+    """Sans `produits`, les produits obligatoires de l'acte sont repris aux quantités standard"""
+
+    acte_id = serializers.IntegerField()
+    quantite = serializers.IntegerField(min_value=1, default=1)
+    prix = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=0, required=False, allow_null=True
+    )
+    produits = ProduitQuantiteSerializer(many=True, required=False)
+
+
+class ProduitSupplementaireSerializer(serializers.Serializer):
+    produit_id = serializers.IntegerField()
+    quantite = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal("0.01"))
+    prix_unitaire = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=0, required=False, allow_null=True
+    )
+
+
+class LocationBlocSaisieSerializer(serializers.Serializer):
+    """Saisie complète d'une location de bloc (voir medical/locations.py)"""
+
+    patient = serializers.PrimaryKeyRelatedField(queryset=Patient.objects.all())
+    medecin = serializers.PrimaryKeyRelatedField(queryset=Medecin.objects.all())
+    bloc = serializers.PrimaryKeyRelatedField(queryset=Bloc.objects.all())
+    type_tarification = serializers.ChoiceField(
+        choices=LocationBloc.TYPE_TARIFICATION_CHOICES, default="DUREE"
+    )
+    forfait = serializers.PrimaryKeyRelatedField(
+        queryset=Forfait.objects.all(), required=False, allow_null=True
+    )
+    date_operation = serializers.DateField()
+    heure_operation = serializers.TimeField(required=False, allow_null=True)
+    nom_acte = serializers.CharField(
+        max_length=255, required=False, allow_blank=True, allow_null=True
+    )
+    duree_reelle = serializers.IntegerField(min_value=1)
+    observations = serializers.CharField(required=False, allow_blank=True, default="")
+    montant_paye_caisse = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=0, required=False
+    )
+    notes_paiement = serializers.CharField(required=False, allow_blank=True)
+
+    actes_forfait = ActeForfaitSerializer(many=True, required=False, default=list)
+    produits_inclus = ProduitQuantiteSerializer(many=True, required=False, default=list)
+    actes = ActeSupplementaireSerializer(many=True, required=False, default=list)
+    produits_supplementaires = ProduitSupplementaireSerializer(
+        many=True, required=False, default=list
+    )
+
+    def validate(self, data):
+        errors = []
+        data["nom_acte"] = (data.get("nom_acte") or "").strip() or None
+        if data["type_tarification"] == "DUREE":
+            data["forfait"] = None
+            if not data["nom_acte"]:
+                errors.append(
+                    "Le nom de l'intervention est obligatoire pour la tarification à la durée."
+                )
+        elif not data.get("forfait"):
+            errors.append("Un forfait doit être sélectionné pour la tarification forfaitaire.")
+
+        # Identifiants imbriqués vérifiés en une requête par modèle
+        acte_ids = {a["acte_id"] for a in data["actes_forfait"] + data["actes"]}
+        produit_ids = {
+            p["produit_id"]
+            for ligne in data["actes_forfait"] + data["actes"]
+            for p in ligne.get("produits", [])
+        }
+        produit_ids.update(p["produit_id"] for p in data["produits_inclus"])
+        produit_ids.update(p["produit_id"] for p in data["produits_supplementaires"])
+        actes_inconnus = acte_ids - set(
+            ActeLocation.objects.filter(pk__in=acte_ids).values_list("pk", flat=True)
+        )
+        produits_inconnus = produit_ids - set(
+            Produit.objects.filter(pk__in=produit_ids).values_list("pk", flat=True)
+        )
+        if actes_inconnus:
+            errors.append(f"Actes introuvables : {sorted(actes_inconnus)}")
+        if produits_inconnus:
+            errors.append(f"Produits introuvables : {sorted(produits_inconnus)}")
+
+        if errors:
+            raise serializers.ValidationError(errors)
+        return data
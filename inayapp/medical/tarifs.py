@@ -0,0 +1,139 @@
+# medical/tarifs.py
+"""
+Résolution des tarifs d'actes (TarifActe) et des honoraires médecins
+(HonorairesMedecin) à une date donnée.
+
+Les deux tables sont chargées en mémoire une fois par processus, rangées par
+clé (acte, convention[, médecin]) et triées par date d'effet : la ligne en
+vigueur à une date se trouve par bisection, sans requête. L'index est
+reconstruit quand la version partagée change, c'est-à-dire après le commit
+d'une modification de tarif ou d'honoraire.
+"""
+from bisect import bisect_right
+from collections import namedtuple
+from datetime import datetime
+
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+from inayapp.caching import VersionedIndex, bump_version_on_commit
+
+from .models.prestation_Kt import HonorairesMedecin, TarifActe
+
+VERSION_KEY = "medical:tarifs:version"
+
+Tarif = namedtuple("Tarif", "id montant montant_honoraire_base date_effective")
+Honoraire = namedtuple("Honoraire", "id montant date_effective")
+
+
+def _jour(date_reference):
+    """Date du jour (heure locale) comme le fait un filtre sur un DateField"""
+    if isinstance(date_reference, datetime):
+        if timezone.is_aware(date_reference):
+            date_reference = timezone.localtime(date_reference)
+        return date_reference.date()
+    return date_reference
+
+
+def _pk(valeur):
+    # Comme le filtre ORM : un identifiant venu d'un formulaire peut être une chaîne
+    return None if valeur is None else int(valeur)
+
+
+class _Periodes:
+    """Lignes d'une même clé triées par date d'effet"""
+
+    __slots__ = ("dates", "lignes")
+
+    def __init__(self, lignes):
+        # À date égale, la ligne la plus récente (pk) l'emporte
+        lignes.sort(key=lambda ligne: (ligne.date_effective, ligne.id))
+        self.lignes = lignes
+        self.dates = [ligne.date_effective for ligne in lignes]
+
+    def au(self, jour):
+        i = bisect_right(self.dates, jour)
+        return self.lignes[i - 1] if i else None
+
+
+def _periodes(groupes):
+    return {cle: _Periodes(lignes) for cle, lignes in groupes.items()}
+
+
+class IndexTarifs:
+    def __init__(self, conventions, base, base_defaut, honoraires):
+        self._conventions = conventions
+        self._base = base
+        self._base_defaut = base_defaut
+        self._honoraires = honoraires
+
+    @classmethod
+    def charger(cls):
+        conventions, base, base_defaut, honoraires = {}, {}, {}, {}
+        for (pk, acte_id, convention_id, montant, honoraire_base, date_effective,
+             is_default) in TarifActe.objects.values_list(
+            "id", "acte_id", "convention_id", "montant", "montant_honoraire_base",
+            "date_effective", "is_default",
+        ):
+            tarif = Tarif(pk, montant, honoraire_base, date_effective)
+            if convention_id is not None:
+                conventions.setdefault((acte_id, convention_id), []).append(tarif)
+                continue
+            base.setdefault(acte_id, []).append(tarif)
+            if is_default:
+                base_defaut.setdefault(acte_id, []).append(tarif)
+        for pk, medecin_id, acte_id, convention_id, montant, date_effective in (
+            HonorairesMedecin.objects.values_list(
+                "id", "medecin_id", "acte_id", "convention_id", "montant", "date_effective"
+            )
+        ):
+            honoraires.setdefault((medecin_id, acte_id, convention_id), []).append(
+                Honoraire(pk, montant, date_effective)
+            )
+        return cls(
+            _periodes(conventions), _periodes(base), _periodes(base_defaut),
+            _periodes(honoraires),
+        )
+
+    def tarif(self, acte_id, convention_id, date_reference):
+        """
+        Tarif de la convention en vigueur, sinon tarif de base : le tarif par
+        défaut le plus récent, puis le plus récent tout court.
+        """
+        acte_id, convention_id = _pk(acte_id), _pk(convention_id)
+        jour = _jour(date_reference)
+        if convention_id is not None:
+            periodes = self._conventions.get((acte_id, convention_id))
+            tarif = periodes.au(jour) if periodes else None
+            if tarif:
+                return tarif
+        for index in (self._base_defaut, self._base):
+            periodes = index.get(acte_id)
+            tarif = periodes.au(jour) if periodes else None
+            if tarif:
+                return tarif
+        return None
+
+    def honoraire(self, medecin_id, acte_id, convention_id, date_reference):
+        """Honoraire configuré pour le médecin, l'acte et la convention exacte"""
+        periodes = self._honoraires.get((_pk(medecin_id), _pk(acte_id), _pk(convention_id)))
+        return periodes.au(_jour(date_reference)) if periodes else None
+
+
+registre = VersionedIndex(VERSION_KEY, lambda: IndexTarifs.charger())
+
+
+def tarif(acte_id, convention_id, date_reference):
+    return registre.get().tarif(acte_id, convention_id, date_reference)
+
+
+def honoraire(medecin_id, acte_id, convention_id, date_reference):
+    return registre.get().honoraire(medecin_id, acte_id, convention_id, date_reference)
+
+
+def _invalider(sender, **kwargs):
+    bump_version_on_commit(VERSION_KEY)
+
+
+for _modele in (TarifActe, HonorairesMedecin):
+    post_save.connect(_invalider, sender=_modele)
+    post_delete.connect(_invalider, sender=_modele)
@@ -9,6 +9,7 @@ from .views.bloc_location import (
     LocationBlocDetailView,
     LocationBlocEditView,
     LocationBlocListView,
+    LocationBlocSaisieAPIView,
     get_acte_produits,
     get_all_actes_data,
     get_all_blocs_data,
@@ -91,6 +92,16 @@ urlpatterns = [
         LocationBlocCreateView.as_view(),
         name="location_bloc_create",
     ),
+    path(
+        "locations-bloc/api/",
+        LocationBlocSaisieAPIView.as_view(),
+        name="location_bloc_api_create",
+    ),
+    path(
+        "locations-bloc/<int:location_id>/api/",
+        LocationBlocSaisieAPIView.as_view(),
+        name="location_bloc_api_update",
+    ),
     path(
         "locations-bloc/<int:location_id>/",
         LocationBlocDetailView.as_view(),
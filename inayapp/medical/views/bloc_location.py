@@ -9,7 +9,6 @@ from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import PermissionRequiredMixin
-from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.db import transaction
 from django.db.models import Prefetch
@@ -23,19 +22,20 @@ from django.views import View
 from django.views.decorators.csrf import csrf_protect
 from django.views.generic import ListView
 from medecin.models import Medecin
+from medical import catalogue
+from medical.locations import enregistrer_location
+from medical.serializers import LocationBlocSaisieSerializer
 from medical.models.bloc_location import (
     ActeLocation,
     ActeProduitInclus,
     Bloc,
-    BlocProduitInclus,
     ConsommationProduitBloc,
     Forfait,
-    ForfaitActeInclus,
     ForfaitProduitInclus,
     LocationBloc,
-    LocationBlocActe
 )
 from patients.models import Patient
+from pharmacies import recherche
 from pharmacies.models import Produit
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
@@ -43,18 +43,144 @@ from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
 from reportlab.lib.units import inch
 from reportlab.pdfgen import canvas
 from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
-from datetime import datetime
+from utils import pdf
 
 logger = logging.getLogger(__name__)
 
-def to_decimal(value, default=Decimal("0")):
-    """Convertit une valeur en Decimal de manière sécurisée"""
-    if value is None:
-        return default
-    try:
-        return Decimal(str(value))
-    except (ValueError, InvalidOperation):
-        return default
+_CLE_PRODUIT_ACTE_FORFAIT = re.compile(
+    r"^actes_forfait\[(\d+)\]\[produits\]\[(\d+)\]\[(id|quantite_utilisee)\]$"
+)
+
+
+def _liste(post, *noms):
+    """Première liste non vide parmi les noms de champ (anciens noms en repli)"""
+    for nom in noms:
+        valeurs = post.getlist(nom)
+        if valeurs:
+            return valeurs
+    return []
+
+
+def saisie_depuis_formulaire(post, produits_des_actes=True):
+    """
+    Données du formulaire HTML de location au format de
+    `LocationBlocSaisieSerializer`. Les produits des actes du forfait
+    (`actes_forfait[i][produits][j][...]`) sont lus en un seul passage sur
+    les clés, sans limite de nombre.
+    """
+    type_tarification = post.get("type_tarification", "DUREE")
+    saisie = {
+        champ: post.get(champ)
+        for champ in (
+            "patient",
+            "medecin",
+            "bloc",
+            "date_operation",
+            "nom_acte",
+            "observations",
+        )
+    }
+    saisie.update(
+        type_tarification=type_tarification,
+        forfait=post.get("forfait") if type_tarification == "FORFAIT" else None,
+        heure_operation=post.get("heure_operation") or None,
+        duree_reelle=post.get("duree_reelle") or None,
+        observations=(post.get("observations") or "").strip(),
+    )
+    saisie = {champ: valeur for champ, valeur in saisie.items() if valeur is not None}
+    for champ in ("montant_paye_caisse", "notes_paiement"):
+        if champ in post:
+            saisie[champ] = post.get(champ).strip() or ("0" if champ == "montant_paye_caisse" else "")
+
+    actes_forfait = {}
+    if type_tarification == "FORFAIT":
+        quantites = post.getlist("actes_inclus[quantite_utilisee][]")
+        for i, acte_id in enumerate(post.getlist("actes_inclus[id][]")):
+            if acte_id:
+                acte = actes_forfait.setdefault(acte_id, {"acte_id": acte_id, "produits": []})
+                if i < len(quantites) and quantites[i] != "":
+                    acte["quantite_utilisee"] = quantites[i]
+        produits = {}
+        for cle in post:
+            correspondance = _CLE_PRODUIT_ACTE_FORFAIT.match(cle)
+            if correspondance:
+                acte_idx, prod_idx, champ = correspondance.groups()
+                produits.setdefault((acte_idx, prod_idx), {})[champ] = post.get(cle)
+        for (acte_idx, _), produit in sorted(produits.items()):
+            acte_id = post.get(f"actes_forfait[{acte_idx}][acte_id]")
+            if acte_id and produit.get("id") and produit.get("quantite_utilisee"):
+                acte = actes_forfait.setdefault(acte_id, {"acte_id": acte_id, "produits": []})
+                acte["produits"].append(
+                    {"produit_id": produit["id"], "quantite": produit["quantite_utilisee"]}
+                )
+    saisie["actes_forfait"] = list(actes_forfait.values())
+
+    quantites = _liste(
+        post, "produits_inclus[quantite_utilisee][]", "produits_inclus[quantite_reelle][]"
+    )
+    saisie["produits_inclus"] = [
+        {"produit_id": produit_id, "quantite": quantites[i] if i < len(quantites) and quantites[i] else 0}
+        for i, produit_id in enumerate(post.getlist("produits_inclus[id][]"))
+        if produit_id
+    ]
+
+    acte_ids = _liste(post, "actes_supp[id][]", "acte_id[]")
+    acte_quantites = _liste(post, "actes_supp[quantite][]", "acte_quantite[]")
+    acte_prix = _liste(post, "actes_supp[prix][]", "acte_prix[]")
+    saisie["actes"] = []
+    for i, acte_id in enumerate(acte_ids):
+        if not acte_id:
+            continue
+        acte = {"acte_id": acte_id}
+        if i < len(acte_quantites) and acte_quantites[i]:
+            acte["quantite"] = acte_quantites[i]
+        if i < len(acte_prix) and acte_prix[i]:
+            acte["prix"] = acte_prix[i]
+        if produits_des_actes:
+            produit_ids = post.getlist(f"actes[{i}][produits][]")
+            quantites_produits = post.getlist(f"actes[{i}][quantites_reelles][]")
+            acte["produits"] = [
+                {
+                    "produit_id": produit_id,
+                    "quantite": quantites_produits[j] if j < len(quantites_produits) and quantites_produits[j] else 0,
+                }
+                for j, produit_id in enumerate(produit_ids)
+                if produit_id
+            ]
+        saisie["actes"].append(acte)
+
+    produit_ids = _liste(post, "produits_supp[id][]", "produit_id[]")
+    produit_quantites = _liste(post, "produits_supp[quantite][]", "quantite[]")
+    produit_prix = post.getlist("produits_supp[prix][]")
+    saisie["produits_supplementaires"] = []
+    for i, produit_id in enumerate(produit_ids):
+        if not produit_id:
+            continue
+        produit = {"produit_id": produit_id, "quantite": "1"}
+        if i < len(produit_quantites) and produit_quantites[i]:
+            produit["quantite"] = produit_quantites[i]
+        if i < len(produit_prix) and produit_prix[i]:
+            produit["prix_unitaire"] = produit_prix[i]
+        saisie["produits_supplementaires"].append(produit)
+    return saisie
+
+
+def erreurs_saisie(erreurs, prefixe=""):
+    """Messages à plat des erreurs d'un serializer, pour le formulaire HTML"""
+    if isinstance(erreurs, dict):
+        messages_ = []
+        for champ, detail in erreurs.items():
+            nom = "" if champ == "non_field_errors" else f"{prefixe}{champ}"
+            messages_ += erreurs_saisie(detail, f"{nom} " if nom else prefixe)
+        return messages_
+    if isinstance(erreurs, list):
+        messages_ = []
+        for i, detail in enumerate(erreurs):
+            sous_prefixe = f"{prefixe}{i + 1} " if isinstance(detail, (dict, list)) else prefixe
+            messages_ += erreurs_saisie(detail, sous_prefixe)
+        return messages_
+    return [f"{prefixe.strip()} : {erreurs}" if prefixe.strip() else str(erreurs)]
+
 
 class LocationBlocCreateView(View):
     """Création d'une location de bloc avec gestion automatique des produits inclus"""
@@ -69,6 +195,7 @@ class LocationBlocCreateView(View):
                 "nom"
             ),
             "now": timezone.localdate(),
+            "catalogues": catalogue.embarquer(),
         }
         return render(request, "locations/location_create.html", context)
 
@@ -82,486 +209,83 @@ class LocationBlocCreateView(View):
                 "nom"
             ),
             "now": timezone.localdate(),
+            "catalogues": catalogue.embarquer(),
             "errors": errors,
             "form_data": request.POST,
         }
         return render(request, "locations/location_create.html", context)
 
 
-    @transaction.atomic
     def post(self, request):
-        errors = []
-        # Récupération des champs obligatoires
-        patient_id = request.POST.get("patient")
-        medecin_id = request.POST.get("medecin")
-        bloc_id = request.POST.get("bloc")
-        nom_acte_raw = (request.POST.get("nom_acte") or "").strip()
-        type_tarification = request.POST.get("type_tarification", "DUREE")
-        observations = request.POST.get("observations", "").strip()
-        date_operation_str = request.POST.get("date_operation")
-        heure_operation_str = request.POST.get("heure_operation", "")
-        duree_reelle_str = request.POST.get("duree_reelle", "")
-        nom_acte = nom_acte_raw if nom_acte_raw else None
-        # GESTION DES PAIEMENTS
-        montant_paye_caisse_str = request.POST.get("montant_paye_caisse", "0")
-        notes_paiement = request.POST.get("notes_paiement", "").strip()
-        montant_paye_caisse = Decimal("0.00")
-        if montant_paye_caisse_str:
-            try:
-                montant_paye_caisse = Decimal(montant_paye_caisse_str)
-                if montant_paye_caisse < 0:
-                    errors.append("Le montant payé ne peut pas être négatif.")
-            except (ValueError, InvalidOperation):
-                errors.append("Format du montant payé invalide.")
-        # Validation des champs obligatoires
-        if not all([patient_id, medecin_id, bloc_id, date_operation_str]):
-            errors.append("Tous les champs obligatoires doivent être remplis.")
-        # Validation du nom de l'intervention pour DUREE
-        if type_tarification == "DUREE" and not nom_acte:
-            errors.append(
-                "Le nom de l'intervention est obligatoire pour la tarification à la durée."
-            )
-        # Validation du forfait si tarification forfaitaire
-        forfait_id = request.POST.get("forfait") if type_tarification == "FORFAIT" else None
-        if type_tarification == "FORFAIT" and not forfait_id:
-            errors.append(
-                "Un forfait doit être sélectionné pour la tarification forfaitaire."
-            )
-        duree_reelle = None
-        if not duree_reelle_str:
-            errors.append("La durée réelle est requise pour une opération.")
-        else:
-            try:
-                duree_reelle = int(duree_reelle_str)
-                if duree_reelle <= 0:
-                    errors.append("La durée réelle doit être positive.")
-            except ValueError:
-                errors.append("Format de durée réelle invalide.")
-        # Conversion de la date
-        date_operation = parse_date(date_operation_str)
-        if date_operation is None:
-            errors.append("Format de date invalide (YYYY-MM-DD).")
-        # Traitement des heures (optionnelles)
-        heure_operation = None
-        if heure_operation_str:
-            try:
-                heure_operation = datetime.strptime(heure_operation_str, "%H:%M").time()
-            except Exception:
-                errors.append("Format heure invalide (HH:MM).")
-        # ========== RÉCUPÉRATION DES DONNÉES DU FORMULAIRE ==========
-        # 1. Actes inclus dans le forfait
-        actes_inclus_data = {}
-        if type_tarification == "FORFAIT":
-            actes_inclus_ids = request.POST.getlist("actes_inclus[id][]") or []
-            quantites_utilisees_actes = request.POST.getlist("actes_inclus[quantite_utilisee][]") or []
-            # Pour les actes inclus forfait :
-            for i, acte_id in enumerate(actes_inclus_ids):
-                if acte_id:
-                    try:
-                        quantite_utilisee = to_decimal(
-                            quantites_utilisees_actes[i]
-                            if i < len(quantites_utilisees_actes)
-                            else 0
-                        )
-                        actes_inclus_data[int(acte_id)] = quantite_utilisee
-                    except (ValueError, IndexError):
-                        pass
-        # 2. Produits des actes forfaitaires
-        produits_actes_forfait_data = {}
-        if type_tarification == "FORFAIT":
-            for acte_idx in range(20):
-                for prod_idx in range(50):
-                    prod_id_key = f"actes_forfait[{acte_idx}][produits][{prod_idx}][id]"
-                    qte_key = f"actes_forfait[{acte_idx}][produits][{prod_idx}][quantite_utilisee]"
-                    prod_id = request.POST.get(prod_id_key)
-                    qte_utilisee = request.POST.get(qte_key)
-                    # Pour les produits actes forfait :
-                    if prod_id and qte_utilisee:
-                        try:
-                            acte_id_from_form = request.POST.get(f"actes_forfait[{acte_idx}][acte_id]")
-                            if acte_id_from_form:
-                                key = f"{acte_id_from_form}_{prod_id}"
-                                produits_actes_forfait_data[key] = to_decimal(qte_utilisee)
-                        except (ValueError, KeyError):
-                            continue
-        # 3. Produits inclus (bloc/forfait) avec quantités réelles ajustées
-        produits_inclus_data = []
-        produit_inclus_ids = request.POST.getlist("produits_inclus[id][]") or []
-        quantites_reelles_inclus = request.POST.getlist("produits_inclus[quantite_reelle][]") or []
-        # Pour les produits inclus :
-        for i, produit_id in enumerate(produit_inclus_ids):
-            if not produit_id:
-                continue
-            try:
-                quantite_reelle = to_decimal(
-                    quantites_reelles_inclus[i]
-                    if i < len(quantites_reelles_inclus) and quantites_reelles_inclus[i]
-                    else 0
-                )
-                if quantite_reelle >= 0:
-                    produits_inclus_data.append(
-                        {"produit_id": produit_id, "quantite_reelle": quantite_reelle}
-                    )
-            except (ValueError, IndexError):
-                errors.append(f"Données invalides pour le produit inclus {i+1}")
-
-        # 4. Actes supplémentaires avec leurs produits
-        actes_data = []
-        acte_ids = request.POST.getlist("acte_id[]")
-        acte_quantites = request.POST.getlist("acte_quantite[]")
-        acte_prix = request.POST.getlist("acte_prix[]")
-        for i, acte_id in enumerate(acte_ids):
-            if not acte_id:
-                continue
-            try:
-                quantite = int(acte_quantites[i]) if i < len(acte_quantites) and acte_quantites[i] else 1
-                prix = Decimal(acte_prix[i]) if i < len(acte_prix) and acte_prix[i] else None
-                if quantite > 0:
-                    # Récupérer les produits de cet acte
-                    acte_produits = []
-                    produit_acte_ids = request.POST.getlist(f"actes[{i}][produits][]") or []
-                    quantites_acte_produits = request.POST.getlist(f"actes[{i}][quantites_reelles][]") or []
-                    # Pour les produits des actes :
-                    for j, prod_id in enumerate(produit_acte_ids):
-                        if prod_id:
-                            try:
-                                qte_reelle = to_decimal(
-                                    quantites_acte_produits[j] if j < len(quantites_acte_produits) else 0
-                                )
-                                acte_produits.append({
-                                    "produit_id": prod_id,
-                                    "quantite_reelle": qte_reelle,
-                                })
-                            except (ValueError, IndexError):
-                                continue
-                    actes_data.append(
-                        {
-                            "acte_id": acte_id,
-                            "quantite": quantite,
-                            "prix": prix,
-                            "produits": acte_produits,
-                        }
-                    )
-            except (ValueError, IndexError):
-                errors.append(f"Données invalides pour l'acte {i+1}")
-        # 5. Produits supplémentaires
-        produits_supp = []
-        produits_supp_ids = request.POST.getlist("produits_supp[id][]") or []
-        quantites_supp = request.POST.getlist("produits_supp[quantite][]") or []
-        prix_supp = request.POST.getlist("produits_supp[prix][]") or []
-        # Pour les produits supplémentaires :
-        for i, pid in enumerate(produits_supp_ids):
-            if not pid:
-                continue
-            try:
-                qte = to_decimal(
-                    quantites_supp[i] if i < len(quantites_supp) and quantites_supp[i] else 1
-                )
-                p = to_decimal(prix_supp[i] if i < len(prix_supp) and prix_supp[i] else 0)
-                if qte > 0:
-                    produits_supp.append({"produit_id": pid, "quantite": qte, "prix_unitaire": p})
-            except ValueError:
-                errors.append(f"Quantité ou prix invalide pour le produit supplémentaire {i+1}")
-
-        if errors:
-            return self._render_with_errors(request, errors)
+        serializer = LocationBlocSaisieSerializer(data=saisie_depuis_formulaire(request.POST))
+        if not serializer.is_valid():
+            return self._render_with_errors(request, erreurs_saisie(serializer.errors))
         try:
-            patient = get_object_or_404(Patient, id=patient_id)
-            medecin = get_object_or_404(Medecin, id=medecin_id)
-            bloc = get_object_or_404(Bloc, id=bloc_id)
-            forfait = get_object_or_404(Forfait, id=forfait_id) if forfait_id else None
-
-            location = LocationBloc(
-                bloc=bloc,
-                patient=patient,
-                medecin=medecin,
-                date_operation=date_operation,
-                heure_operation=heure_operation,
-                nom_acte=nom_acte,
-                type_tarification=type_tarification,
-                forfait=forfait,
-                observations=observations,
-                cree_par=request.user,
-                montant_paye_caisse=montant_paye_caisse,
-                notes_paiement=notes_paiement,
-                duree_reelle=None,  # On met None temporairement
-            )
-
-            # Save first without duree_reelle to get PK
-            location.save()
-            if type_tarification == "FORFAIT" and forfait:
-                actes_inclus_forfait = ForfaitActeInclus.objects.filter(forfait=forfait).select_related('acte').prefetch_related('acte__produits_inclus__produit')
-                for acte_inclus in actes_inclus_forfait:
-                    quantite_utilisee = actes_inclus_data.get(
-                        acte_inclus.acte.id, acte_inclus.quantite
-                    )
-                    location_acte_inclus = LocationBlocActe.objects.create(
-                        location=location,
-                        acte=acte_inclus.acte,
-                        quantite=min(quantite_utilisee, acte_inclus.quantite),
-                        prix_unitaire=acte_inclus.prix_unitaire_inclus,
-                    )
-                    if quantite_utilisee > acte_inclus.quantite:
-                        quantite_supplementaire = quantite_utilisee - acte_inclus.quantite
-                        LocationBlocActe.objects.create(
-                            location=location,
-                            acte=acte_inclus.acte,
-                            quantite=quantite_supplementaire,
-                            prix_unitaire=acte_inclus.acte.prix,
-                        )
-                    for acte_produit_inclus in acte_inclus.acte.produits_inclus.all():
-                        quantite_par_acte = acte_produit_inclus.quantite_standard
-                        quantite_totale_incluse = quantite_par_acte * acte_inclus.quantite
-                        quantite_totale_utilisee = quantite_par_acte * quantite_utilisee
-                        cle_produit = f"{acte_inclus.acte.id}_{acte_produit_inclus.produit.id}"
-                        if cle_produit in produits_actes_forfait_data:
-                            quantite_totale_utilisee = produits_actes_forfait_data[
-                                cle_produit
-                            ]
-                        consommation_existante = ConsommationProduitBloc.objects.filter(
-                            location=location,
-                            produit=acte_produit_inclus.produit,
-                        ).first()
-                        if consommation_existante:
-                            # S'assurer que toutes les valeurs sont en Decimal
-                            nouvelle_quantite = to_decimal(consommation_existante.quantite) + to_decimal(quantite_totale_utilisee)
-                            nouvelle_quantite_incluse = to_decimal(consommation_existante.quantite_incluse) + to_decimal(quantite_totale_incluse)
-                            
-                            consommation_existante.quantite = nouvelle_quantite
-                            consommation_existante.quantite_incluse = nouvelle_quantite_incluse
-                            consommation_existante.ecart_quantite = nouvelle_quantite - nouvelle_quantite_incluse
-                            consommation_existante.est_inclus = (consommation_existante.ecart_quantite <= 0)
-                            
-                            # Mise à jour de la source d'inclusion
-                            if consommation_existante.source_inclusion == "FORFAIT":
-                                consommation_existante.source_inclusion = "FORFAIT_MIXTE"
-                            elif consommation_existante.source_inclusion not in ["FORFAIT_ACTE", "FORFAIT_MIXTE"]:
-                                consommation_existante.source_inclusion = "FORFAIT_MIXTE"
-                            
-                            consommation_existante.save()
-                        else:
-                            if quantite_totale_utilisee > 0:
-                                ecart = quantite_totale_utilisee - quantite_totale_incluse
-                                ConsommationProduitBloc.objects.create(
-                                    location=location,
-                                    produit=acte_produit_inclus.produit,
-                                    quantite=quantite_totale_utilisee,
-                                    prix_unitaire=Decimal(
-                                        acte_produit_inclus.produit.prix_vente
-                                    ),
-                                    est_inclus=(ecart <= 0),
-                                    source_inclusion="FORFAIT_ACTE",
-                                    quantite_incluse=quantite_totale_incluse,
-                                    ecart_quantite=ecart,
-                                    acte_associe=location_acte_inclus,
-                                )
-            if type_tarification == "DUREE":
-                quantites_reelles_dict = {
-                    int(p["produit_id"]): p["quantite_reelle"]
-                    for p in produits_inclus_data
-                }
-                for bloc_produit in BlocProduitInclus.objects.filter(bloc=bloc):
-                    quantite_reelle = quantites_reelles_dict.get(
-                        bloc_produit.produit.id,
-                        bloc_produit.quantite,
-                    )
-                    ecart = quantite_reelle - bloc_produit.quantite
-                    if quantite_reelle > 0:
-                        ConsommationProduitBloc.objects.create(
-                            location=location,
-                            produit=bloc_produit.produit,
-                            quantite=quantite_reelle,
-                            prix_unitaire=Decimal(bloc_produit.produit.prix_vente),
-                            est_inclus=(ecart <= 0),
-                            source_inclusion="BLOC",
-                            quantite_incluse=bloc_produit.quantite,
-                            ecart_quantite=ecart,
-                        )
-            if type_tarification == "FORFAIT" and forfait:
-                quantites_reelles_dict = {
-                    int(p["produit_id"]): p["quantite_reelle"]
-                    for p in produits_inclus_data
-                }
-                for forfait_produit in forfait.produits.all():
-                    quantite_reelle = quantites_reelles_dict.get(
-                        forfait_produit.produit.id,
-                        forfait_produit.quantite,
-                    )
-                    ecart = quantite_reelle - forfait_produit.quantite
-                    consommation_existante = ConsommationProduitBloc.objects.filter(
-                        location=location,
-                        produit=forfait_produit.produit,
-                    ).first()
-                    if consommation_existante:
-                        consommation_existante.quantite = max(
-                            consommation_existante.quantite, quantite_reelle
-                        )
-                        consommation_existante.quantite_incluse += forfait_produit.quantite
-                        consommation_existante.ecart_quantite = (
-                            consommation_existante.quantite
-                            - consommation_existante.quantite_incluse
-                        )
-                        consommation_existante.est_inclus = (
-                            consommation_existante.ecart_quantite <= 0
-                        )
-                        if consommation_existante.source_inclusion == "FORFAIT_ACTE":
-                            consommation_existante.source_inclusion = "FORFAIT_MIXTE"
-                        elif consommation_existante.source_inclusion not in ["FORFAIT", "FORFAIT_MIXTE"]:
-                            consommation_existante.source_inclusion = "FORFAIT_MIXTE"
-                        consommation_existante.save()
-                    else:
-                        if quantite_reelle > 0:
-                            ConsommationProduitBloc.objects.create(
-                                location=location,
-                                produit=forfait_produit.produit,
-                                quantite=quantite_reelle,
-                                prix_unitaire=Decimal(
-                                    forfait_produit.produit.prix_vente
-                                ),
-                                est_inclus=(ecart <= 0),
-                                source_inclusion="FORFAIT",
-                                quantite_incluse=forfait_produit.quantite,
-                                ecart_quantite=ecart,
-                            )
-            for acte_data in actes_data:
-                try:
-                    acte = ActeLocation.objects.get(id=acte_data["acte_id"])
-                    prix_unitaire = acte_data["prix"] if acte_data["prix"] else acte.prix
-                    if type_tarification == "FORFAIT" and forfait:
-                        acte_inclus = ForfaitActeInclus.objects.filter(
-                            forfait=forfait, acte=acte
-                        ).first()
-                        if acte_inclus:
-                            quantite_supplementaire = max(
-                                0, acte_data["quantite"] - acte_inclus.quantite
-                            )
-                            if quantite_supplementaire > 0:
-                                location_acte = LocationBlocActe.objects.create(
-                                    location=location,
-                                    acte=acte,
-                                    quantite=quantite_supplementaire,
-                                    prix_unitaire=prix_unitaire,
-                                )
-                            continue
-                        location_acte = LocationBlocActe.objects.create(
-                            location=location,
-                            acte=acte,
-                            quantite=acte_data["quantite"],
-                            prix_unitaire=prix_unitaire,
-                        )
-                    for prod_acte_data in acte_data["produits"]:
-                        try:
-                            produit = Produit.objects.get(
-                                id=prod_acte_data["produit_id"]
-                            )
-                            quantite_reelle = prod_acte_data["quantite_reelle"]
-                            try:
-                                acte_produit_inclus = ActeProduitInclus.objects.get(
-                                    acte=acte, produit=produit
-                                )
-                                quantite_incluse = acte_produit_inclus.quantite_standard * acte_data["quantite"]
-                                ecart = quantite_reelle - quantite_incluse
-                                est_inclus = ecart <= 0
-                                source = "ACTE"
-                            except ActeProduitInclus.DoesNotExist:
-                                quantite_incluse = 0
-                                ecart = quantite_reelle
-                                est_inclus = False
-                                source = "ACTE_SUPPLEMENTAIRE"
-                            if quantite_reelle > 0:
-                                ConsommationProduitBloc.objects.create(
-                                    location=location,
-                                    produit=produit,
-                                    quantite=quantite_reelle,
-                                    prix_unitaire=Decimal(produit.prix_vente),
-                                    est_inclus=est_inclus,
-                                    source_inclusion=source,
-                                    quantite_incluse=quantite_incluse,
-                                    ecart_quantite=ecart,
-                                    acte_associe=location_acte,
-                                )
-                        except Produit.DoesNotExist:
-                            logger.error(
-                                f"Produit d'acte introuvable: {prod_acte_data['produit_id']}"
-                            )
-                            continue
-                except ActeLocation.DoesNotExist:
-                    logger.error(f"Acte introuvable: {acte_data['acte_id']}")
-                    continue
-            for ps in produits_supp:
-                try:
-                    prod = Produit.objects.get(id=ps["produit_id"])
-                    ConsommationProduitBloc.objects.create(
-                        location=location,
-                        produit=prod,
-                        quantite=ps["quantite"],
-                        prix_unitaire=Decimal(ps["prix_unitaire"]),
-                        est_inclus=False,
-                        source_inclusion="SUPPLEMENTAIRE",
-                        quantite_incluse=0,
-                        ecart_quantite=ps["quantite"],
-                    )
-                except Produit.DoesNotExist:
-                    logger.error(
-                        f"Produit supplémentaire introuvable: {ps['produit_id']}"
-                    )
-                    continue
-            # Now set duree_reelle and calculate
-            location.duree_reelle = duree_reelle
-            location.prix_final = location.calculer_prix_automatique(duree_reelle)
-            if location.type_tarification == "FORFAIT":
-                location.prix_supplement_duree = location.calculer_supplement_forfait(duree_reelle)
-            else:
-                location.prix_supplement_duree = Decimal("0.00")
-            location.calculer_paiements(montant_paye_caisse)
-            location.save()
-            prix_total = location.montant_total_facture
-            message_base = (
-                f"Location de bloc créée avec succès pour le {date_operation.strftime('%d/%m/%Y')}. "
-                f"Prix total: {prix_total:.2f} DA"
-            )
-            if location.statut_paiement == "EQUILIBRE":
-                message_paiement = f" - Paiement équilibré ({montant_paye_caisse:.2f} DA)"
-            elif location.statut_paiement == "SURPLUS_CLINIQUE":
-                message_paiement = f" - Surplus de {location.surplus_a_verser:.2f} DA à verser au médecin"
-            elif location.statut_paiement == "COMPLEMENT_MEDECIN":
-                message_paiement = f" - Complément de {location.complement_du_medecin:.2f} DA dû par le médecin"
-            elif location.statut_paiement == "AUCUN_PAIEMENT":
-                message_paiement = " - Aucun paiement enregistré"
-            else:
-                message_paiement = ""
-            messages.success(request, message_base + message_paiement)
-            return redirect("medical:location_bloc_detail", location_id=location.id)
+            with transaction.atomic():
+                location = enregistrer_location(serializer.validated_data, utilisateur=request.user)
         except Exception as e:
             logger.exception("Erreur lors de la création de la location")
-            errors.append(f"Erreur lors de la création : {str(e)}")
-            return self._render_with_errors(request, errors)
+            return self._render_with_errors(request, [f"Erreur lors de la création : {str(e)}"])
+
+        montant_paye_caisse = location.montant_paye_caisse
+        message_base = (
+            f"Location de bloc créée avec succès pour le {location.date_operation.strftime('%d/%m/%Y')}. "
+            f"Prix total: {location.montant_total_facture:.2f} DA"
+        )
+        if location.statut_paiement == "EQUILIBRE":
+            message_paiement = f" - Paiement équilibré ({montant_paye_caisse:.2f} DA)"
+        elif location.statut_paiement == "SURPLUS_CLINIQUE":
+            message_paiement = f" - Surplus de {location.surplus_a_verser:.2f} DA à verser au médecin"
+        elif location.statut_paiement == "COMPLEMENT_MEDECIN":
+            message_paiement = f" - Complément de {location.complement_du_medecin:.2f} DA dû par le médecin"
+        elif location.statut_paiement == "AUCUN_PAIEMENT":
+            message_paiement = " - Aucun paiement enregistré"
+        else:
+            message_paiement = ""
+        messages.success(request, message_base + message_paiement)
+        return redirect("medical:location_bloc_detail", location_id=location.id)
+
+
+class LocationBlocSaisieAPIView(View):
+    """
+    Enregistrement JSON d'une location de bloc : POST sur la liste pour créer,
+    sur une location pour la remplacer. Corps au format de
+    `LocationBlocSaisieSerializer` (actes et produits en tableaux imbriqués).
+    """
+
+    def post(self, request, location_id=None):
+        if not request.user.is_authenticated:
+            return JsonResponse({"success": False, "errors": ["Authentification requise"]}, status=401)
+        location = get_object_or_404(LocationBloc, id=location_id) if location_id else None
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({"success": False, "errors": ["JSON invalide"]}, status=400)
+        serializer = LocationBlocSaisieSerializer(data=data)
+        if not serializer.is_valid():
+            return JsonResponse({"success": False, "errors": serializer.errors}, status=400)
+        with transaction.atomic():
+            location = enregistrer_location(
+                serializer.validated_data, location=location, utilisateur=request.user
+            )
+        return JsonResponse(
+            {
+                "success": True,
+                "location_id": location.id,
+                "prix_final": location.prix_final,
+                "montant_total_facture": location.montant_total_facture,
+                "statut_paiement": location.statut_paiement,
+                "url": reverse("medical:location_bloc_detail", args=[location.id]),
+            },
+            status=201 if location_id is None else 200,
+        )
 
 
 @login_required
 def get_all_blocs_data(request):
     """Retourne tous les blocs avec leurs produits inclus pour le JavaScript"""
     try:
-        blocs_data = {}
-        for bloc in Bloc.objects.filter(est_active=True).prefetch_related(
-            "produits_inclus__produit"
-        ):
-            blocs_data[str(bloc.id)] = {
-                "id": bloc.id,
-                "nom_bloc": bloc.nom_bloc,
-                "prix_base": float(bloc.prix_base),
-                "prix_supplement_30min": float(bloc.prix_supplement_30min),
-                "produits_inclus": [
-                    {
-                        "id": bp.produit.id,
-                        "nom": bp.produit.nom,
-                        "quantite_defaut": bp.quantite,
-                        "prix_unitaire": float(bp.produit.prix_vente),
-                    }
-                    for bp in bloc.produits_inclus.all()
-                ],
-            }
-        return JsonResponse({"success": True, "blocs": blocs_data})
+        return catalogue.reponse(request, "blocs")
     except Exception as e:
         logger.exception("Erreur lors de la récupération des données des blocs")
         return JsonResponse({"success": False, "error": str(e)}, status=500)
@@ -571,50 +295,7 @@ def get_all_blocs_data(request):
 def get_all_forfaits_data(request):
     """Retourne tous les forfaits avec leurs produits ET actes inclus pour le JavaScript"""
     try:
-        forfaits_data = {}
-        for forfait in Forfait.objects.filter(est_active=True).prefetch_related(
-            "produits__produit", "actes_inclus__acte__produits_inclus__produit"
-        ):
-            actes_inclus = []
-            for fa in forfait.actes_inclus.all():
-                # CORRECTION: Charger explicitement les produits de l'acte
-                produits_acte = []
-                for ap in fa.acte.produits_inclus.all():
-                    produits_acte.append({
-                        "id": ap.produit.id,
-                        "nom": ap.produit.nom,
-                        "quantite_defaut": ap.quantite_standard,
-                        "prix_unitaire": float(ap.produit.prix_vente),
-                    })
-
-                actes_inclus.append(
-                    {
-                        "id": fa.acte.id,
-                        "nom": fa.acte.nom,
-                        "quantite_incluse": fa.quantite,
-                        "prix_unitaire_inclus": float(fa.prix_unitaire_inclus),
-                        "prix_standard": float(fa.acte.prix),
-                        "duree_estimee": fa.acte.duree_estimee,
-                    "produits_inclus": produits_acte,  # CORRECTION: Structure correcte
-                })
-
-            forfaits_data[str(forfait.id)] = {
-                "id": forfait.id,
-                "nom": forfait.nom,
-                "prix": float(forfait.prix),
-                "duree": forfait.duree,
-                "produits_inclus": [
-                    {
-                        "id": fp.produit.id,
-                        "nom": fp.produit.nom,
-                        "quantite_defaut": fp.quantite,
-                        "prix_unitaire": float(fp.produit.prix_vente),
-                    }
-                    for fp in forfait.produits.all()
-                ],
-                "actes_inclus": actes_inclus,
-            }
-        return JsonResponse({"success": True, "forfaits": forfaits_data})
+        return catalogue.reponse(request, "forfaits")
     except Exception as e:
         logger.exception("Erreur lors de la récupération des données des forfaits")
         return JsonResponse({"success": False, "error": str(e)}, status=500)
@@ -624,29 +305,7 @@ def get_all_forfaits_data(request):
 def get_all_actes_data(request):
     """Retourne tous les actes avec leurs produits inclus pour le JavaScript"""
     try:
-        actes_data = []
-        for acte in ActeLocation.objects.filter(est_active=True).prefetch_related(
-            "produits_inclus__produit"
-        ):
-            actes_data.append(
-                {
-                    "id": acte.id,
-                    "nom": acte.nom,
-                    "prix": float(acte.prix),
-                    "duree_estimee": acte.duree_estimee,
-                    "produits_inclus": [
-                        {
-                            "id": ap.produit.id,
-                            "nom": ap.produit.nom,
-                            "quantite_defaut": ap.quantite_standard,
-                            "prix_unitaire": float(ap.produit.prix_vente),
-                            "est_obligatoire": ap.est_obligatoire,
-                        }
-                        for ap in acte.produits_inclus.all()
-                    ],
-                }
-            )
-        return JsonResponse({"success": True, "actes": actes_data})
+        return catalogue.reponse(request, "actes")
     except Exception as e:
         logger.exception("Erreur lors de la récupération des données des actes")
         return JsonResponse({"success": False, "error": str(e)}, status=500)
@@ -654,18 +313,27 @@ def get_all_actes_data(request):
 
 @login_required
 def get_produits_supplementaires(request):
-    """Retourne la liste des produits disponibles pour les suppléments"""
+    """
+    Retourne les produits disponibles pour les suppléments, lus dans l'index
+    de recherche ; avec `q` (et `limit`/`offset`), seulement les produits
+    correspondants, par pertinence.
+    """
     try:
-        produits = []
-        for produit in Produit.objects.filter(est_active=True).order_by("nom"):
-            produits.append(
-                {
-                    "id": produit.id,
-                    "nom": produit.nom,
-                    "code": produit.code_produit or "",
-                    "prix": float(produit.prix_vente),
-                }
-            )
+        query = request.GET.get("q", "").strip()
+        if query:
+            limit, offset = recherche.pagination(request.GET)
+            trouves = recherche.rechercher(query, limit=limit, offset=offset)
+        else:
+            trouves = recherche.produits_indexes()
+        produits = [
+            {
+                "id": produit.id,
+                "nom": produit.nom,
+                "code": produit.code or "",
+                "prix": float(produit.prix_vente),
+            }
+            for produit in trouves
+        ]
         return JsonResponse({"success": True, "produits": produits})
     except Exception as e:
         logger.exception("Erreur lors de la récupération des produits supplémentaires")
@@ -902,13 +570,9 @@ class LocationBlocEditView(View):
             "patients": Patient.objects.all(),
             "medecins": Medecin.objects.all(),
             "blocs": Bloc.objects.filter(est_active=True).order_by("nom_bloc"),
-            "forfaits": Forfait.objects.filter(est_active=True)
-            .prefetch_related("produits__produit")
-            .order_by("nom"),
+            "forfaits": Forfait.objects.filter(est_active=True).order_by("nom"),
             "produits": Produit.objects.filter(est_active=True).order_by("nom"),
-            "actes_location": ActeLocation.objects.filter(est_active=True)
-            .prefetch_related("produits_inclus__produit")
-            .order_by("nom"),
+            "actes_location": ActeLocation.objects.filter(est_active=True).order_by("nom"),
             "now": timezone.localdate(),
             "actes_selected": location.actes_location.all(),
             "produits_selected": location.consommations_produits.filter(
@@ -917,194 +581,29 @@ class LocationBlocEditView(View):
         }
         return render(request, "locations/location_edit.html", context)
 
-    @transaction.atomic
     def post(self, request, location_id):
         location = get_object_or_404(LocationBloc, id=location_id)
-        errors = []
-        patient_id = request.POST.get("patient")
-        medecin_id = request.POST.get("medecin")
-        bloc_id = request.POST.get("bloc")
-        nom_acte = request.POST.get("nom_acte", "").strip()
-        type_tarification = request.POST.get("type_tarification", "DUREE")
-        observations = request.POST.get("observations", "").strip()
-        date_operation_str = request.POST.get("date_operation")
-        heure_operation_str = request.POST.get("heure_operation", "")
-        duree_reelle_str = request.POST.get("duree_reelle", "")
-        forfait_id = (
-            request.POST.get("forfait") if type_tarification == "FORFAIT" else None
+        serializer = LocationBlocSaisieSerializer(
+            data=saisie_depuis_formulaire(request.POST, produits_des_actes=False)
         )
-        if not all(
-            [
-                patient_id,
-                medecin_id,
-                bloc_id,
-                date_operation_str,
-                nom_acte,
-                type_tarification,
-            ]
-        ):
-            errors.append("Tous les champs obligatoires doivent être remplis.")
-        if type_tarification == "FORFAIT" and not forfait_id:
-            errors.append(
-                "Un forfait doit être sélectionné pour la tarification forfaitaire."
+        if not serializer.is_valid():
+            return self._render_with_errors(
+                request, location_id, erreurs_saisie(serializer.errors)
             )
-        duree_reelle = None
-        if not duree_reelle_str:
-            errors.append("La durée réelle est requise pour une opération.")
-        else:
-            try:
-                duree_reelle = int(duree_reelle_str)
-                if duree_reelle <= 0:
-                    errors.append("La durée réelle doit être positive.")
-            except ValueError:
-                errors.append("Format de durée réelle invalide.")
-        date_operation = parse_date(date_operation_str)
-        if date_operation is None:
-            errors.append("Format de date invalide (YYYY-MM-DD).")
-        heure_operation = None
-        if heure_operation_str:
-            try:
-                heure_operation = datetime.strptime(heure_operation_str, "%H:%M").time()
-            except Exception:
-                errors.append("Format heure invalide (HH:MM).")
-        actes_data = []
-        acte_ids = request.POST.getlist("acte_id[]")
-        acte_quantites = request.POST.getlist("acte_quantite[]")
-        acte_prix = request.POST.getlist("acte_prix[]")
-        for i, acte_id in enumerate(acte_ids):
-            if not acte_id:
-                continue
-            try:
-                quantite = (
-                    int(acte_quantites[i])
-                    if i < len(acte_quantites) and acte_quantites[i]
-                    else 1
-                )
-                prix = (
-                    Decimal(acte_prix[i])
-                    if i < len(acte_prix) and acte_prix[i]
-                    else None
-                )
-                if quantite > 0:
-                    actes_data.append(
-                        {"acte_id": acte_id, "quantite": quantite, "prix": prix}
-                    )
-            except (ValueError, IndexError):
-                errors.append(f"Données invalides pour l'acte {i+1}")
-        produits_supp = []
-        produit_ids = request.POST.getlist("produit_id[]")
-        quantites = request.POST.getlist("quantite[]")
-        for i, pid in enumerate(produit_ids):
-            if not pid:
-                continue
-            try:
-                qte = int(quantites[i]) if i < len(quantites) and quantites[i] else 1
-                if qte > 0:
-                    produits_supp.append({"produit_id": pid, "quantite": qte})
-            except ValueError:
-                errors.append(f"Quantité invalide pour le produit {i+1}")
-        if errors:
-            return self._render_with_errors(request, location_id, errors)
         try:
-            patient = get_object_or_404(Patient, id=patient_id)
-            medecin = get_object_or_404(Medecin, id=medecin_id)
-            bloc = get_object_or_404(Bloc, id=bloc_id)
-            forfait = get_object_or_404(Forfait, id=forfait_id) if forfait_id else None
-            location.patient = patient
-            location.medecin = medecin
-            location.bloc = bloc
-            location.date_operation = date_operation
-            location.heure_operation = heure_operation
-            location.nom_acte = nom_acte
-            location.type_tarification = type_tarification
-            location.forfait = forfait
-            location.observations = observations
-            # Temporarily set duree_reelle to None to skip calculations
-            temp_duree = location.duree_reelle
-            location.duree_reelle = None
-            location.actes_location.all().delete()
-            location.consommations_produits.all().delete()
-            location.save()
-            if type_tarification == "DUREE":
-                for bloc_produit in BlocProduitInclus.objects.filter(bloc=bloc):
-                    ConsommationProduitBloc.objects.create(
-                        location=location,
-                        produit=bloc_produit.produit,
-                        quantite=bloc_produit.quantite,
-                        prix_unitaire=Decimal(bloc_produit.produit.prix_vente),
-                        est_inclus=True,
-                        source_inclusion="BLOC",
-                    )
-            if type_tarification == "FORFAIT" and forfait:
-                for forfait_produit in forfait.produits.all():
-                    ConsommationProduitBloc.objects.create(
-                        location=location,
-                        produit=forfait_produit.produit,
-                        quantite=forfait_produit.quantite,
-                        prix_unitaire=Decimal(forfait_produit.produit.prix_vente),
-                        est_inclus=True,
-                        source_inclusion="FORFAIT",
-                    )
-            for acte_data in actes_data:
-                try:
-                    acte = ActeLocation.objects.get(id=acte_data["acte_id"])
-                    prix_unitaire = (
-                        acte_data["prix"] if acte_data["prix"] else acte.prix
-                    )
-                    location_acte = LocationBlocActe.objects.create(
-                        location=location,
-                        acte=acte,
-                        quantite=acte_data["quantite"],
-                        prix_unitaire=prix_unitaire,
-                    )
-                    for produit_acte in ActeProduitInclus.objects.filter(
-                        acte=acte, est_obligatoire=True
-                    ):
-                        quantite_totale = (
-                            produit_acte.quantite_standard * acte_data["quantite"]
-                        )
-                        ConsommationProduitBloc.objects.create(
-                            location=location,
-                            produit=produit_acte.produit,
-                            quantite=quantite_totale,
-                            prix_unitaire=Decimal(produit_acte.produit.prix_vente),
-                            est_inclus=True,
-                            source_inclusion="ACTE",
-                        )
-                except ActeLocation.DoesNotExist:
-                    continue
-            for ps in produits_supp:
-                try:
-                    prod = Produit.objects.get(id=ps["produit_id"])
-                    ConsommationProduitBloc.objects.create(
-                        location=location,
-                        produit=prod,
-                        quantite=ps["quantite"],
-                        prix_unitaire=Decimal(prod.prix_vente),
-                        est_inclus=False,
-                        source_inclusion="SUPPLEMENTAIRE",
-                    )
-                except Produit.DoesNotExist:
-                    continue
-            # Restore duree_reelle and calculate
-            location.duree_reelle = duree_reelle
-            location.prix_final = location.calculer_prix_automatique(duree_reelle)
-            if location.type_tarification == "FORFAIT":
-                location.prix_supplement_duree = location.calculer_supplement_forfait(duree_reelle)
-            else:
-                location.prix_supplement_duree = Decimal("0.00")
-            location.calculer_paiements()
-            location.save()
-            messages.success(
-                request,
-                f"Location de bloc '{location.nom_acte}' modifiée avec succès. "
-                f"Prix total: {location.montant_total_facture:.2f} DA",
-            )
-            return redirect("medical:location_bloc_detail", location_id=location.id)
+            with transaction.atomic():
+                location = enregistrer_location(serializer.validated_data, location=location)
         except Exception as e:
             logger.exception("Erreur lors de la modification de la location")
-            errors.append(f"Erreur lors de la modification : {str(e)}")
-            return self._render_with_errors(request, location_id, errors)
+            return self._render_with_errors(
+                request, location_id, [f"Erreur lors de la modification : {str(e)}"]
+            )
+        messages.success(
+            request,
+            f"Location de bloc '{location.nom_acte}' modifiée avec succès. "
+            f"Prix total: {location.montant_total_facture:.2f} DA",
+        )
+        return redirect("medical:location_bloc_detail", location_id=location.id)
 
     def _render_with_errors(self, request, location_id, errors):
         location = get_object_or_404(LocationBloc, id=location_id)
@@ -1113,13 +612,9 @@ class LocationBlocEditView(View):
             "patients": Patient.objects.all(),
             "medecins": Medecin.objects.all(),
             "blocs": Bloc.objects.filter(est_active=True).order_by("nom_bloc"),
-            "forfaits": Forfait.objects.filter(est_active=True)
-            .prefetch_related("produits__produit")
-            .order_by("nom"),
+            "forfaits": Forfait.objects.filter(est_active=True).order_by("nom"),
             "produits": Produit.objects.filter(est_active=True).order_by("nom"),
-            "actes_location": ActeLocation.objects.filter(est_active=True)
-            .prefetch_related("produits_inclus__produit")
-            .order_by("nom"),
+            "actes_location": ActeLocation.objects.filter(est_active=True).order_by("nom"),
             "now": timezone.localdate(),
             "errors": errors,
             "form_data": request.POST,
@@ -1217,11 +712,47 @@ class ActeDetailView(View):
             return JsonResponse({"error": str(e)}, status=500)
 
 
+def locations_a_exporter():
+    """Locations avec bloc, patient, médecin, forfait et consommations, pour le PDF"""
+    return LocationBloc.objects.select_related(
+        "bloc", "patient", "medecin", "forfait"
+    ).prefetch_related(
+        Prefetch(
+            "consommations_produits",
+            queryset=ConsommationProduitBloc.objects.select_related(
+                "produit", "acte_associe"
+            ),
+            to_attr="prefetched_consommations",
+        )
+    )
+
+
+def location_pdf(location_id):
+    """PDF de la location (exécuté dans le pool utils.pdf)"""
+    return _construire_location_pdf(locations_a_exporter().get(pk=location_id))
+
+
 def generate_location_pdf_bytes(location):
-    cache_key = f"pdf_location_{location.id}"
-    pdf = cache.get(cache_key)
-    if pdf:
-        return pdf
+    """PDF de la location, relu dans le cache tant que ses données n'ont pas changé"""
+    consommations = getattr(
+        location, "prefetched_consommations", location.consommations_produits.all()
+    )
+    sources = (
+        pdf.valeurs(location),
+        pdf.valeurs(location.bloc),
+        pdf.valeurs(location.patient),
+        pdf.valeurs(location.medecin),
+        pdf.valeurs(location.forfait),
+        [
+            (pdf.valeurs(acte_location), pdf.valeurs(acte_location.acte))
+            for acte_location in location.actes_location.select_related("acte")
+        ],
+        [(pdf.valeurs(c), pdf.valeurs(c.produit)) for c in consommations],
+    )
+    return pdf.document("location_bloc", sources, location_pdf, location.pk)
+
+
+def _construire_location_pdf(location):
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4)
     styles = getSampleStyleSheet()
@@ -1414,10 +945,9 @@ def generate_location_pdf_bytes(location):
     story.append(Paragraph("Clinique INAYA", footer_style))
     story.append(Paragraph("Service Comptabilité", footer_style))
     doc.build(story)
-    pdf = buffer.getvalue()
+    contenu = buffer.getvalue()
     buffer.close()
-    cache.set(cache_key, pdf, timeout=3600)
-    return pdf
+    return contenu
 
 
 class LocationBlocExportPDFView(PermissionRequiredMixin, View):
@@ -1425,25 +955,11 @@ class LocationBlocExportPDFView(PermissionRequiredMixin, View):
 
     def get(self, request, location_id):
         try:
-            qs = LocationBloc.objects.select_related(
-                "bloc", "patient", "medecin", "forfait"
-            )
-            consommations_prefetch = Prefetch(
-                "consommations_produits",
-                queryset=ConsommationProduitBloc.objects.select_related(
-                    "produit", "acte_associe"
-                ),
-                to_attr="prefetched_consommations",
-            )
-            qs = qs.prefetch_related(consommations_prefetch)
-            location = get_object_or_404(qs, id=location_id)
-            pdf = generate_location_pdf_bytes(location)
-            response = HttpResponse(content_type="application/pdf")
-            response["Content-Disposition"] = (
-                f'attachment; filename="Facture_BL-{location.id:05d}.pdf"'
+            location = get_object_or_404(locations_a_exporter(), id=location_id)
+            return pdf.reponse_pdf(
+                generate_location_pdf_bytes(location),
+                f"Facture_BL-{location.id:05d}.pdf",
             )
-            response.write(pdf)
-            return response
         except Exception as e:
             logger.error(
                 f"Error generating PDF for LocationBloc {location_id}: {str(e)}",
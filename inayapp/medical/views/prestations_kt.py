@@ -13,7 +13,7 @@ from django.contrib.auth.models import User
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
 from django.db import models, transaction
 from django.db.models import ExpressionWrapper, F, Prefetch, Q, Sum, Value
-from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.template.loader import get_template
 from django.utils import timezone
@@ -44,6 +44,11 @@ from django.contrib.auth.decorators import permission_required
 from django.utils.decorators import method_decorator
 
 
+def _pk(valeur):
+    """Identifiant entier d'un champ de formulaire, None s'il est invalide"""
+    return int(valeur) if str(valeur).isdigit() else None
+
+
 @method_decorator(
     permission_required("medical.view_tarifs_acte", raise_exception=True),
     name="dispatch",
@@ -200,16 +205,26 @@ class PrestationCreateView(View):
         conso_data = []
         total = Decimal("0.00")
 
+        # Actes et conventions chargés en une requête chacun
+        actes_par_id = ActeKt.objects.in_bulk(filter(None, map(_pk, acte_ids)))
+        conventions_par_id = Convention.objects.in_bulk(
+            filter(None, map(_pk, convention_ids))
+        )
+
         # Validation des actes
         for idx, acte_pk in enumerate(acte_ids):
             try:
-                acte = ActeKt.objects.get(pk=acte_pk)
+                acte = actes_par_id.get(_pk(acte_pk))
+                if acte is None:
+                    raise ActeKt.DoesNotExist
                 conv = None
                 conv_ok = False
                 dossier_complet = False
 
                 if convention_ids and convention_ids[idx]:
-                    conv = Convention.objects.get(pk=convention_ids[idx])
+                    conv = conventions_par_id.get(_pk(convention_ids[idx]))
+                    if conv is None:
+                        raise Convention.DoesNotExist
                     conv_ok = conv_ok_vals[idx] == "oui"
                     # NOUVEAU : gestion du dossier complet
                     dossier_complet = dossier_complet_vals[idx] == "oui"
@@ -277,6 +292,19 @@ class PrestationCreateView(View):
             prix_supplementaire_medecin=part_medecin,
         )
 
+        # Produits consommés et quantités par défaut chargés en une requête chacun
+        conso_data = [
+            c for c in conso_data if c["produit_id"] and int(c["quantite_reelle"]) > 0
+        ]
+        produits_par_id = Produit.objects.in_bulk({c["produit_id"] for c in conso_data})
+        quantites_defaut = {
+            (acte_id, produit_id): quantite
+            for acte_id, produit_id, quantite in ActeProduit.objects.filter(
+                acte__in=[d["acte"] for d in prestation_data],
+                produit__in=list(produits_par_id),
+            ).values_list("acte_id", "produit_id", "quantite_defaut")
+        }
+
         # Création des PrestationActe et consommations
         for idx, d in enumerate(prestation_data):
             pa = PrestationActe.objects.create(
@@ -290,18 +318,13 @@ class PrestationCreateView(View):
 
             # Traitement des consommations
             for c in [c for c in conso_data if c["idx"] == idx]:
-                if not c["produit_id"] or int(c["quantite_reelle"]) <= 0:
-                    continue
-
-                prod = get_object_or_404(Produit, id=c["produit_id"])
+                prod = produits_par_id.get(int(c["produit_id"]))
+                if prod is None:
+                    raise Http404("Produit introuvable")
                 quantite_reelle = int(c["quantite_reelle"])
 
                 # Récupération de la quantité par défaut
-                try:
-                    acte_produit = ActeProduit.objects.get(acte=d["acte"], produit=prod)
-                    qte_defaut = acte_produit.quantite_defaut
-                except ActeProduit.DoesNotExist:
-                    qte_defaut = 0
+                qte_defaut = quantites_defaut.get((d["acte"].id, prod.id), 0)
 
                 # Création de la consommation
                 ConsommationProduit.objects.create(
@@ -657,7 +680,7 @@ class PrestationDetailView(View):
         # NOUVEAU: Vérifier s'il y a des actes en espèces
         has_actes_especes = (
             actes.filter(
-                Q(convention__isnull=True) | Q(convention__nom__iexact="urgence")
+                Q(convention__isnull=True) | Q(convention__est_urgence=True)
             ).exists()
             or prestation.prix_supplementaire
         )
@@ -668,7 +691,7 @@ class PrestationDetailView(View):
         total_consommations = Decimal("0.00")
 
         for pa in actes:
-            if pa.convention is None or (pa.convention and pa.convention.nom.lower() == "urgence"):
+            if pa.convention is None or (pa.convention and pa.convention.est_urgence):
                 total_actes_espece += pa.tarif_conventionne
             else:
                 total_actes_convention += pa.tarif_conventionne
@@ -1168,9 +1191,75 @@ from reportlab.lib.units import inch
 from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
 from medical.models import PrestationKt, PrestationActe
 from pharmacies.models import ConsommationProduit
+from utils import pdf
 from utils.utils import services_autorises
 
 
+def prestations_a_exporter(queryset):
+    """Prestations avec patient, médecin, actes et consommations, pour les PDF"""
+    return (
+        queryset.select_related("patient", "medecin")
+        .prefetch_related(
+            Prefetch(
+                "actes_details",
+                queryset=PrestationActe.objects.select_related(
+                    "acte", "convention"
+                ).prefetch_related(
+                    Prefetch(
+                        "consommations",
+                        queryset=ConsommationProduit.objects.select_related("produit"),
+                    )
+                ),
+            )
+        )
+        .distinct()
+        .order_by("date_prestation", "patient__last_name", "patient__first_name")
+    )
+
+
+def empreinte_prestations(prestations):
+    """Données source des PDF de prestations chargées par prestations_a_exporter"""
+    return [
+        (
+            pdf.valeurs(prestation),
+            pdf.valeurs(prestation.patient),
+            pdf.valeurs(prestation.medecin),
+            [
+                (
+                    pdf.valeurs(acte),
+                    pdf.valeurs(acte.acte),
+                    pdf.valeurs(acte.convention),
+                    [
+                        (pdf.valeurs(conso), pdf.valeurs(conso.produit))
+                        for conso in acte.consommations.all()
+                    ],
+                )
+                for acte in prestation.actes_details.all()
+            ],
+        )
+        for prestation in prestations
+    ]
+
+
+def planning_prestations_pdf(prestation_ids, export_date, user_id):
+    """PDF du planning des prestations (exécuté dans le pool utils.pdf)"""
+    prestations = prestations_a_exporter(PrestationKt.objects.filter(pk__in=prestation_ids))
+    user = User.objects.get(pk=user_id)
+    return ExportPrestationsPdfView()._generate_pdf(prestations, export_date, user).content
+
+
+def bon_paiement_especes_pdf(prestation_id, user_id):
+    """PDF du bon de paiement espèces (exécuté dans le pool utils.pdf)"""
+    prestation = prestations_a_exporter(PrestationKt.objects.filter(pk=prestation_id)).get()
+    actes_especes = prestation.actes_details.filter(
+        Q(convention__isnull=True) | Q(convention__est_urgence=True)
+    )
+    user = User.objects.get(pk=user_id)
+    return ExportBonPaiementEspecesView()._generate_bon_paiement_pdf(
+        prestation, actes_especes, user
+    ).content
+
+
 @method_decorator(
     permission_required("medical.export_prestationkt", raise_exception=True),
     name="dispatch",
@@ -1199,44 +1288,38 @@ class ExportPrestationsPdfView(View):
             service_ids = services.values_list("id", flat=True)
 
             # Récupérer les prestations planifiées pour cette date
-            prestations = (
-                PrestationKt.objects.filter(
-                    actes_details__acte__service__id__in=service_ids,
-                    statut="PLANIFIE",
-                    date_prestation__date=export_date,
-                )
-                .select_related("patient", "medecin")
-                .prefetch_related(
-                    Prefetch(
-                        "actes_details",
-                        queryset=PrestationActe.objects.select_related(
-                            "acte", "convention"
-                        ).prefetch_related(
-                            Prefetch(
-                                "consommations",
-                                queryset=ConsommationProduit.objects.select_related(
-                                    "produit"
-                                ),
-                            )
-                        ),
+            prestations = list(
+                prestations_a_exporter(
+                    PrestationKt.objects.filter(
+                        actes_details__acte__service__id__in=service_ids,
+                        statut="PLANIFIE",
+                        date_prestation__date=export_date,
                     )
                 )
-                .distinct()
-                .order_by(
-                    "date_prestation", "patient__last_name", "patient__first_name"
-                )
             )
 
             # Vérifier s'il y a des prestations
-            if not prestations.exists():
+            if not prestations:
                 messages.warning(
                     request,
                     f"Aucune prestation planifiée trouvée pour le {export_date.strftime('%d/%m/%Y')}",
                 )
                 return redirect("medical:prestation_list")
 
-            # Générer le PDF
-            return self._generate_pdf(prestations, export_date, request.user)
+            # Générer le PDF (relu dans le cache si les prestations n'ont pas changé)
+            filename = f"planning_prestations_{export_date.strftime('%Y-%m-%d')}.pdf"
+            sources = (export_date, request.user.pk, empreinte_prestations(prestations))
+            args = ([p.pk for p in prestations], export_date, request.user.pk)
+            if request.POST.get("preparer"):
+                cle = pdf.preparer(
+                    "planning_prestations", sources, filename,
+                    planning_prestations_pdf, *args, utilisateur_id=request.user.pk,
+                )
+                return pdf.reponse_preparation(cle)
+            contenu = pdf.document(
+                "planning_prestations", sources, planning_prestations_pdf, *args
+            )
+            return pdf.reponse_pdf(contenu, filename)
 
         except Exception as e:
             messages.error(request, f"Erreur lors de l'exportation : {str(e)}")
@@ -1367,12 +1450,12 @@ class ExportPrestationsPdfView(View):
 
         # Actes conventionnés (excluant urgence)
         actes_conventionnes_qs = actes_details.filter(convention__isnull=False).exclude(
-            convention__nom__iexact="urgence"
+            convention__est_urgence=True
         )
 
         # Actes non conventionnés (sans convention ou urgence)
         actes_non_conventionnes_qs = actes_details.filter(
-            Q(convention__isnull=True) | Q(convention__nom__iexact="urgence")
+            Q(convention__isnull=True) | Q(convention__est_urgence=True)
         )
 
         # Compter les totaux
@@ -1589,29 +1672,12 @@ class ExportBonPaiementEspecesView(View):
         try:
             # Récupérer la prestation avec optimisations
             prestation = get_object_or_404(
-                PrestationKt.objects.select_related(
-                    "patient", "medecin"
-                ).prefetch_related(
-                    Prefetch(
-                        "actes_details",
-                        queryset=PrestationActe.objects.select_related(
-                            "acte", "convention"
-                        ).prefetch_related(
-                            Prefetch(
-                                "consommations",
-                                queryset=ConsommationProduit.objects.select_related(
-                                    "produit"
-                                ),
-                            )
-                        ),
-                    )
-                ),
-                pk=prestation_id,
+                prestations_a_exporter(PrestationKt.objects.all()), pk=prestation_id
             )
 
             # Filtrer les actes en espèces (sans convention OU urgence)
             actes_especes = prestation.actes_details.filter(
-                Q(convention__isnull=True) | Q(convention__nom__iexact="urgence")
+                Q(convention__isnull=True) | Q(convention__est_urgence=True)
             )
 
             # Vérifier qu'il y a des actes en espèces OU des frais supplémentaires
@@ -1642,10 +1708,16 @@ class ExportBonPaiementEspecesView(View):
                     "medical:prestation_detail", prestation_id=prestation.id
                 )
 
-            # Générer le PDF
-            return self._generate_bon_paiement_pdf(
-                prestation, actes_especes, request.user
+            # Générer le PDF (relu dans le cache si la prestation n'a pas changé)
+            filename = f"bon_paiement_especes_{prestation.id}_{prestation.date_prestation.strftime('%Y%m%d')}.pdf"
+            contenu = pdf.document(
+                "bon_paiement_especes",
+                (request.user.pk, empreinte_prestations([prestation])),
+                bon_paiement_especes_pdf,
+                prestation.pk,
+                request.user.pk,
             )
+            return pdf.reponse_pdf(contenu, filename)
 
         except Exception as e:
             messages.error(
@@ -1786,7 +1858,7 @@ class ExportBonPaiementEspecesView(View):
             # Type de paiement
             if (
                 acte_detail.convention
-                and acte_detail.convention.nom.lower() == "urgence"
+                and acte_detail.convention.est_urgence
             ):
                 type_paiement = "Urgence"
             else:
@@ -0,0 +1,121 @@
+# pharmacies/alertes.py
+"""
+Lecture des alertes de stock depuis l'instantané `AlerteStock`.
+
+Les écrans (tableau de bord, liste des stocks, alertes système) n'agrègent
+plus la table des lots : une requête sur l'instantané donne tous les
+compteurs. Voir `AlerteStockManager` pour sa mise à jour.
+"""
+from datetime import timedelta
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models.stock import AlerteStock
+
+BIENTOT_JOURS = 30
+
+
+def resume(today=None):
+    """Compteurs d'alertes, en une requête."""
+    today = today or timezone.now().date()
+    limite = today + timedelta(days=BIENTOT_JOURS)
+    peremption = Q(type_alerte=AlerteStock.PEREMPTION)
+    return AlerteStock.objects.aggregate(
+        lots_perimes=Count("pk", filter=peremption & Q(date_peremption__lt=today)),
+        lots_bientot_perimes=Count(
+            "pk",
+            filter=peremption & Q(date_peremption__gte=today, date_peremption__lte=limite),
+        ),
+        produits_stock_faible=Count("pk", filter=Q(type_alerte=AlerteStock.STOCK_FAIBLE)),
+        produits_rupture=Count("pk", filter=Q(type_alerte=AlerteStock.RUPTURE)),
+    )
+
+
+def lots_expirant(jours, today=None):
+    """
+    Alertes des lots expirant dans `jours` jours, triées par date.
+
+    Retourne None si `jours` dépasse l'horizon de l'instantané : l'appelant
+    lit alors les lots directement.
+    """
+    if jours > AlerteStock.objects.HORIZON_JOURS:
+        return None
+    today = today or timezone.now().date()
+    return (
+        AlerteStock.objects.filter(
+            type_alerte=AlerteStock.PEREMPTION,
+            date_peremption__gte=today,
+            date_peremption__lte=today + timedelta(days=jours),
+        )
+        .select_related("produit", "service")
+        .order_by("date_peremption", "pk")
+    )
+
+
+def messages(compteurs):
+    """Messages du tableau de bord pour les compteurs de `resume()`."""
+    alertes = []
+    if compteurs["produits_stock_faible"]:
+        alertes.append(
+            f"{compteurs['produits_stock_faible']} produit(s) en stock faible "
+            f"(≤ {AlerteStock.objects.SEUIL_STOCK_FAIBLE} unités)"
+        )
+    if compteurs["produits_rupture"]:
+        alertes.append(f"{compteurs['produits_rupture']} produit(s) en rupture de stock")
+    if compteurs["lots_bientot_perimes"]:
+        alertes.append(
+            f"{compteurs['lots_bientot_perimes']} lot(s) proche(s) de la péremption "
+            f"(< {BIENTOT_JOURS} jours)"
+        )
+    if compteurs["lots_perimes"]:
+        alertes.append(f"⚠️ {compteurs['lots_perimes']} lot(s) périmé(s) en stock !")
+    return alertes
+
+
+def alertes_systeme(compteurs):
+    """Alertes structurées (type, titre, message, icône) pour l'API système."""
+    alertes = []
+    if compteurs["lots_perimes"]:
+        alertes.append(
+            {
+                "type": "critique",
+                "titre": "Lots périmés",
+                "message": f"{compteurs['lots_perimes']} lot(s) périmé(s) encore en stock",
+                "icon": "skull-crossbones",
+            }
+        )
+    if compteurs["produits_rupture"]:
+        alertes.append(
+            {
+                "type": "critique",
+                "titre": "Rupture",
+                "message": f"{compteurs['produits_rupture']} produit(s) en rupture de stock",
+                "icon": "times-circle",
+            }
+        )
+    if compteurs["lots_bientot_perimes"]:
+        alertes.append(
+            {
+                "type": "urgent",
+                "titre": "Péremption proche",
+                "message": (
+                    f"{compteurs['lots_bientot_perimes']} lot(s) expirent dans moins de "
+                    f"{BIENTOT_JOURS} jours"
+                ),
+                "icon": "hourglass-half",
+            }
+        )
+    if compteurs["produits_stock_faible"]:
+        alertes.append(
+            {
+                "type": "info",
+                "titre": "Stock faible",
+                "message": (
+                    f"{compteurs['produits_stock_faible']} produit(s) à "
+                    f"{AlerteStock.objects.SEUIL_STOCK_FAIBLE} unités ou moins"
+                ),
+                "icon": "exclamation-triangle",
+            }
+        )
+    return alertes
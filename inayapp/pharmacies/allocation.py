@@ -0,0 +1,241 @@
+# pharmacies/allocation.py
+"""
+Mouvements de lots en bloc : allocation FEFO (premier périmé, premier
+sorti) des stocks d'un service, entrées de lots et transferts.
+
+Toutes les lignes d'une consommation sont servies dans une seule
+transaction : les lots nécessaires sont verrouillés en une requête
+(`select_for_update`), les prélèvements calculés en mémoire puis appliqués
+par un seul `bulk_update`, les positions et alertes recalculées et les
+`MouvementStock` créés en bloc. Deux allocations concurrentes sur les
+mêmes lots s'attendent au lieu de vendre deux fois la même quantité.
+
+Les écritures en bloc n'émettent pas `post_save` : les journaux d'audit des
+lots et des mouvements sont écrits explicitement (`create_bulk_audit_logs`),
+par le rédacteur d'audit groupé.
+"""
+import math
+from collections import OrderedDict, namedtuple
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from audit.utils import create_bulk_audit_logs
+
+from .models.stock import MouvementStock, Stock, rafraichir_apres_mouvement
+
+Prelevement = namedtuple("Prelevement", "stock produit_id quantite")
+LotEntrant = namedtuple("LotEntrant", "produit_id date_peremption numero_lot quantite")
+
+
+def _unites(quantite):
+    # Les stocks sont en unités entières : une unité entamée est consommée
+    return int(math.ceil(quantite))
+
+
+def regrouper_lignes(lignes):
+    """[(produit_id, quantite)] -> {produit_id: quantite totale}, ordre conservé."""
+    besoins = OrderedDict()
+    for produit_id, quantite in lignes:
+        unites = _unites(quantite)
+        if unites <= 0:
+            continue
+        besoins[produit_id] = besoins.get(produit_id, 0) + unites
+    return besoins
+
+
+def calculer_prelevements(lots, besoins):
+    """
+    Répartit `besoins` ({produit_id: quantite}) sur `lots` triés FEFO.
+
+    Fonction pure : retourne (prélèvements, manquants) où `manquants` vaut
+    {produit_id: (demandé, disponible)} pour les produits insuffisants.
+    """
+    restant = dict(besoins)
+    disponible = {}
+    prelevements = []
+    for lot in lots:
+        disponible[lot.produit_id] = disponible.get(lot.produit_id, 0) + lot.quantite
+        a_prendre = min(restant.get(lot.produit_id, 0), lot.quantite)
+        if a_prendre <= 0:
+            continue
+        prelevements.append(Prelevement(lot, lot.produit_id, a_prendre))
+        restant[lot.produit_id] -= a_prendre
+
+    manquants = {
+        produit_id: (besoins[produit_id], disponible.get(produit_id, 0))
+        for produit_id, quantite in restant.items()
+        if quantite > 0
+    }
+    return prelevements, manquants
+
+
+def allouer_fefo(service, lignes, instance, type_mouvement="SORTIE", date_reference=None):
+    """
+    Prélève `lignes` ([(produit_id, quantite)]) sur les stocks de `service`.
+
+    Les lots périmés ou vides sont ignorés. Si un produit est insuffisant,
+    rien n'est prélevé et une `ValidationError` détaille les manques.
+    Les mouvements de stock sont rattachés à `instance`.
+    Retourne la liste des `Prelevement` appliqués.
+    """
+    besoins = regrouper_lignes(lignes)
+    if not besoins:
+        return []
+    date_reference = date_reference or timezone.now().date()
+
+    with transaction.atomic():
+        # Verrouillage en une requête, dans un ordre stable (pas d'interblocage)
+        lots = list(
+            Stock.objects.select_for_update()
+            .filter(
+                service=service,
+                produit_id__in=list(besoins),
+                quantite__gt=0,
+                date_peremption__gte=date_reference,
+            )
+            .order_by("produit_id", "date_peremption", "pk")
+        )
+
+        prelevements, manquants = calculer_prelevements(lots, besoins)
+        if manquants:
+            from .models import Produit
+
+            noms = dict(
+                Produit.objects.filter(pk__in=list(manquants)).values_list("pk", "nom")
+            )
+            raise ValidationError(
+                [
+                    f"Stock insuffisant pour {noms.get(produit_id, produit_id)}. "
+                    f"Disponible: {disponible}, Demandé: {demande}"
+                    for produit_id, (demande, disponible) in manquants.items()
+                ]
+            )
+
+        for prelevement in prelevements:
+            prelevement.stock.quantite -= prelevement.quantite
+        Stock.objects.bulk_update([p.stock for p in prelevements], ["quantite"])
+        rafraichir_apres_mouvement({(p.produit_id, service.pk) for p in prelevements})
+
+        content_type = ContentType.objects.get_for_model(instance)
+        mouvements = MouvementStock.objects.bulk_create(
+            [
+                MouvementStock(
+                    type_mouvement=type_mouvement,
+                    produit_id=prelevement.produit_id,
+                    service=service,
+                    quantite=prelevement.quantite,
+                    lot_concerne=prelevement.stock.numero_lot,
+                    content_type=content_type,
+                    object_id=instance.pk,
+                )
+                for prelevement in prelevements
+            ]
+        )
+        create_bulk_audit_logs([p.stock for p in prelevements], "UPDATE")
+        create_bulk_audit_logs(mouvements, "CREATE")
+    return prelevements
+
+
+def entrer_lots(service, lots, instance, type_mouvement="ENTREE"):
+    """
+    Ajoute `lots` ([LotEntrant]) au stock de `service`, en bloc.
+
+    Les lots existants (même produit, péremption et numéro) sont verrouillés
+    en une requête puis incrémentés par un seul `bulk_update` ; les autres
+    sont créés par `bulk_create`. Un `MouvementStock` par lot, rattaché à
+    `instance`. Retourne les `Stock` concernés.
+    """
+    quantites = OrderedDict()
+    for lot in lots:
+        if lot.quantite <= 0:
+            continue
+        cle = (lot.produit_id, lot.date_peremption, lot.numero_lot)
+        quantites[cle] = quantites.get(cle, 0) + lot.quantite
+    if not quantites:
+        return []
+
+    with transaction.atomic():
+        existants = {}
+        for stock in (
+            Stock.objects.select_for_update()
+            .filter(
+                service=service,
+                produit_id__in={produit_id for produit_id, _, _ in quantites},
+                date_peremption__in={date for _, date, _ in quantites},
+            )
+            .order_by("pk")
+        ):
+            existants.setdefault(
+                (stock.produit_id, stock.date_peremption, stock.numero_lot), stock
+            )
+
+        a_modifier = []
+        a_creer = []
+        for (produit_id, date_peremption, numero_lot), quantite in quantites.items():
+            stock = existants.get((produit_id, date_peremption, numero_lot))
+            if stock is None:
+                a_creer.append(
+                    Stock(
+                        produit_id=produit_id,
+                        service=service,
+                        date_peremption=date_peremption,
+                        numero_lot=numero_lot,
+                        quantite=quantite,
+                    )
+                )
+            else:
+                stock.quantite += quantite
+                a_modifier.append(stock)
+        Stock.objects.bulk_update(a_modifier, ["quantite"])
+        Stock.objects.bulk_create(a_creer)
+        rafraichir_apres_mouvement({(produit_id, service.pk) for produit_id, _, _ in quantites})
+
+        content_type = ContentType.objects.get_for_model(instance)
+        mouvements = MouvementStock.objects.bulk_create(
+            [
+                MouvementStock(
+                    type_mouvement=type_mouvement,
+                    produit_id=produit_id,
+                    service=service,
+                    quantite=quantite,
+                    lot_concerne=numero_lot,
+                    content_type=content_type,
+                    object_id=instance.pk,
+                )
+                for (produit_id, _, numero_lot), quantite in quantites.items()
+            ]
+        )
+        create_bulk_audit_logs(a_modifier, "UPDATE")
+        create_bulk_audit_logs(a_creer, "CREATE")
+        create_bulk_audit_logs(mouvements, "CREATE")
+    return a_modifier + a_creer
+
+
+def transferer_fefo(source, destination, lignes, instance):
+    """
+    Transfère `lignes` ([(produit_id, quantite)]) de `source` vers `destination`.
+
+    Les lots sont prélevés FEFO dans `source` puis recréés à l'identique
+    (numéro et péremption) dans `destination`, dans une seule transaction.
+    Retourne les `Prelevement` de la source.
+    """
+    with transaction.atomic():
+        prelevements = allouer_fefo(
+            source, lignes, instance, type_mouvement="TRANSFERT_SORTIE"
+        )
+        entrer_lots(
+            destination,
+            [
+                LotEntrant(
+                    p.produit_id, p.stock.date_peremption, p.stock.numero_lot, p.quantite
+                )
+                for p in prelevements
+            ],
+            instance,
+            type_mouvement="TRANSFERT_ENTREE",
+        )
+    return prelevements
+
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class PharmaciesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "pharmacies"
+
+    def ready(self):
+        # Invalidation du service pharmacie mis en cache et de l'index produits
+        import pharmacies.disponibilite
+        import pharmacies.recherche
@@ -0,0 +1,140 @@
+# pharmacies/disponibilite.py
+"""
+Disponibilité des stocks pour plusieurs produits et services à la fois.
+
+Une demande interne de 80 produits ne coûte qu'une requête : les lots
+disponibles (non vides, non périmés) de tous les couples produit/service
+sont lus ensemble, triés FEFO, puis regroupés en mémoire. Sans le détail
+des lots, les totaux viennent directement des positions de stock.
+
+Le service pharmacie est résolu une fois puis gardé en cache ; les signaux
+de `Service` l'invalident.
+"""
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+from inayapp.caching import cache_aside
+from medical.models import Service
+
+from .models.stock import Stock, StockPosition
+
+SERVICE_PHARMACIE_KEY = "pharmacies:service_pharmacie"
+SERVICE_PHARMACIE_TIMEOUT = 60 * 60
+
+Lot = namedtuple("Lot", "id numero_lot quantite date_peremption")
+
+
+class Disponibilite(
+    namedtuple("Disponibilite", "produit_id service_id quantite prochaine_peremption lots")
+):
+    __slots__ = ()
+
+    @property
+    def prochain_lot(self):
+        """Lot le plus proche de la péremption, ou None."""
+        return self.lots[0] if self.lots else None
+
+    def as_dict(self, max_lots=None):
+        lots = self.lots if max_lots is None else self.lots[:max_lots]
+        return {
+            "stock_disponible": self.quantite,
+            "prochaine_peremption": (
+                self.prochaine_peremption.isoformat() if self.prochaine_peremption else None
+            ),
+            "lots": [
+                {
+                    "id": lot.id,
+                    "numero_lot": lot.numero_lot or "N/A",
+                    "quantite": lot.quantite,
+                    "date_peremption": lot.date_peremption.isoformat(),
+                }
+                for lot in lots
+            ],
+        }
+
+
+def _pk(objet):
+    # Les identifiants reçus en JSON ou en GET peuvent être des chaînes
+    return int(getattr(objet, "pk", objet))
+
+
+def service_pharmacie():
+    """Service pharmacie (`est_pharmacies`), mis en cache ; lève `Service.DoesNotExist`."""
+
+    def charger():
+        return Service.objects.filter(est_pharmacies=True).order_by("pk").first()
+
+    service = cache_aside(SERVICE_PHARMACIE_KEY, charger, SERVICE_PHARMACIE_TIMEOUT)
+    if service is None:
+        raise Service.DoesNotExist("Aucun service pharmacie n'est configuré")
+    return service
+
+
+def _invalider_service_pharmacie(sender, **kwargs):
+    cache.delete(SERVICE_PHARMACIE_KEY)
+
+
+post_save.connect(_invalider_service_pharmacie, sender=Service)
+post_delete.connect(_invalider_service_pharmacie, sender=Service)
+
+
+def disponibilites(produits, services, avec_lots=True, date_reference=None):
+    """
+    {(produit_id, service_id): Disponibilite} pour tous les couples demandés.
+
+    `produits` et `services` sont des instances ou des identifiants. Les
+    couples sans stock valent une disponibilité nulle. Avec `avec_lots`,
+    `lots` détaille les lots disponibles dans l'ordre FEFO ; sinon il est
+    vide et les totaux viennent des positions de stock.
+    """
+    produit_ids = list(dict.fromkeys(_pk(produit) for produit in produits))
+    service_ids = list(dict.fromkeys(_pk(service) for service in services))
+    resultat = {
+        (produit_id, service_id): Disponibilite(produit_id, service_id, 0, None, [])
+        for produit_id in produit_ids
+        for service_id in service_ids
+    }
+    if not resultat:
+        return resultat
+
+    if not avec_lots and date_reference is None:
+        for pair, position in StockPosition.objects.lire(produit_ids, service_ids).items():
+            if pair in resultat and position.quantite_disponible:
+                resultat[pair] = resultat[pair]._replace(
+                    quantite=position.quantite_disponible,
+                    prochaine_peremption=position.prochaine_peremption,
+                )
+        return resultat
+
+    lots = (
+        Stock.objects.filter(
+            produit_id__in=produit_ids,
+            service_id__in=service_ids,
+            quantite__gt=0,
+            date_peremption__gte=date_reference or timezone.now().date(),
+        )
+        .order_by("produit_id", "service_id", "date_peremption", "pk")
+        .values_list("produit_id", "service_id", "id", "numero_lot", "quantite", "date_peremption")
+    )
+    for produit_id, service_id, *lot in lots:
+        lot = Lot(*lot)
+        courant = resultat[produit_id, service_id]
+        courant.lots.append(lot)
+        resultat[produit_id, service_id] = courant._replace(
+            quantite=courant.quantite + lot.quantite,
+            prochaine_peremption=courant.prochaine_peremption or lot.date_peremption,
+        )
+    return resultat
+
+
+def disponibilites_service(produits, service, **kwargs):
+    """{produit_id: Disponibilite} dans un seul service."""
+    service_id = _pk(service)
+    return {
+        produit_id: disponibilite
+        for (produit_id, _), disponibilite in disponibilites(
+            produits, [service_id], **kwargs
+        ).items()
+    }
@@ -0,0 +1,99 @@
+# pharmacies/management/commands/benchmark_fefo.py
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from inayapp.benchmarks import QueryCounter, Rollback
+from medical.models import Service
+from pharmacies.allocation import allouer_fefo
+from pharmacies.models import Produit, Stock
+
+
+def creer_jeu_de_donnees(prefixe, produits, lots_par_produit, quantite_par_lot):
+    """Crée un service, `produits` produits et leurs lots ; retourne (service, produits)."""
+    service = Service.objects.create(name=f"{prefixe} pharmacie")
+    type_produit = Produit._meta.get_field("type_produit").choices[0][0]
+    produits = Produit.objects.bulk_create(
+        [
+            Produit(
+                nom=f"{prefixe} produit {index}",
+                code_produit=f"{prefixe}-{index}",
+                type_produit=type_produit,
+                prix_achat=1,
+                prix_vente=2,
+            )
+            for index in range(produits)
+        ]
+    )
+    produits = list(Produit.objects.filter(code_produit__startswith=f"{prefixe}-"))
+    aujourd_hui = timezone.now().date()
+    Stock.objects.bulk_create(
+        [
+            Stock(
+                produit=produit,
+                service=service,
+                quantite=quantite_par_lot,
+                date_peremption=aujourd_hui + timedelta(days=30 * (lot + 1)),
+                numero_lot=f"L{lot}",
+            )
+            for produit in produits
+            for lot in range(lots_par_produit)
+        ],
+        batch_size=1000,
+    )
+    return service, produits
+
+
+def allouer_lot_par_lot(service, lignes):
+    """Algorithme historique (signal post_save) : un UPDATE par lot, sans verrou."""
+    for produit_id, quantite in lignes:
+        restant = quantite
+        stocks = Stock.objects.filter(
+            produit_id=produit_id,
+            service=service,
+            date_peremption__gte=timezone.now().date(),
+        ).order_by("date_peremption")
+        for stock in stocks:
+            if restant <= 0:
+                break
+            a_deduire = min(restant, stock.quantite)
+            stock.quantite -= a_deduire
+            stock.save()
+            restant -= a_deduire
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure l'allocation FEFO d'une consommation de N lignes (ancien algorithme "
+        "lot par lot contre allocation groupée) ; tout est annulé à la fin"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lines", type=int, default=1000)
+        parser.add_argument("--lots", type=int, default=3)
+
+    def handle(self, *args, **options):
+        lines, lots = options["lines"], options["lots"]
+        for label, allouer in (
+            ("Lot par lot", lambda service, lignes: allouer_lot_par_lot(service, lignes)),
+            ("FEFO groupé", lambda service, lignes: allouer_fefo(service, lignes, service)),
+        ):
+            try:
+                with transaction.atomic():
+                    service, produits = creer_jeu_de_donnees("BENCH-FEFO", lines, lots, 10)
+                    # Chaque ligne consomme un lot et demi
+                    lignes = [(produit.pk, 15) for produit in produits]
+
+                    counter = QueryCounter()
+                    started = time.perf_counter()
+                    with connection.execute_wrapper(counter):
+                        allouer(service, lignes)
+                    elapsed = time.perf_counter() - started
+                    raise Rollback()
+            except Rollback:
+                pass
+            self.stdout.write(
+                f"{label:<12}: {lines} lignes en {elapsed:.2f}s, {counter.count} requêtes"
+            )
@@ -0,0 +1,137 @@
+# pharmacies/management/commands/benchmark_stock_alerts.py
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+from inayapp.benchmarks import QueryCounter, Rollback
+from medical.models import Service
+from pharmacies import alertes
+from pharmacies.models import AlerteStock, Produit, Stock, StockPosition
+
+
+def compteurs_sur_les_lots(today):
+    """Anciens calculs des écrans : agrégats sur toute la table des lots."""
+    limite = today + timedelta(days=alertes.BIENTOT_JOURS)
+    seuil = AlerteStock.objects.SEUIL_STOCK_FAIBLE
+    par_produit = Stock.objects.values("produit").annotate(total_quantite=Sum("quantite"))
+    return {
+        "lots_perimes": Stock.objects.filter(quantite__gt=0, date_peremption__lt=today).count(),
+        "lots_bientot_perimes": Stock.objects.filter(
+            quantite__gt=0, date_peremption__gte=today, date_peremption__lte=limite
+        ).count(),
+        "produits_stock_faible": par_produit.filter(
+            total_quantite__lte=seuil, total_quantite__gt=0
+        ).count(),
+        "produits_rupture": par_produit.filter(total_quantite=0).count(),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère un jeu synthétique de lots (500 000 par défaut), puis compare les "
+        "compteurs d'alertes calculés sur les lots et lus dans l'instantané ; "
+        "tout est annulé à la fin"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lots", type=int, default=500_000)
+        parser.add_argument("--products", type=int, default=20_000)
+        parser.add_argument("--services", type=int, default=5)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def mesurer(self, label, fonction, repeat):
+        durees = []
+        for _ in range(repeat):
+            counter = QueryCounter()
+            started = time.perf_counter()
+            with connection.execute_wrapper(counter):
+                resultat = fonction()
+            durees.append(time.perf_counter() - started)
+        durees.sort()
+        self.stdout.write(
+            f"{label:<28}: médiane {durees[len(durees) // 2] * 1000:.1f} ms, "
+            f"{counter.count} requête(s)"
+        )
+        return resultat
+
+    def generer(self, lots, produits, services):
+        rng = random.Random(14)
+        today = timezone.now().date()
+        services = [Service.objects.create(name=f"BENCH-ALERTES {i}") for i in range(services)]
+        type_produit = Produit._meta.get_field("type_produit").choices[0][0]
+        Produit.objects.bulk_create(
+            [
+                Produit(
+                    nom=f"BENCH-ALERTES produit {i}",
+                    code_produit=f"BENCH-ALERTES-{i}",
+                    type_produit=type_produit,
+                    prix_achat=1,
+                    prix_vente=2,
+                )
+                for i in range(produits)
+            ],
+            batch_size=5000,
+        )
+        produit_ids = list(
+            Produit.objects.filter(code_produit__startswith="BENCH-ALERTES-").values_list(
+                "pk", flat=True
+            )
+        )
+        for start in range(0, lots, 10_000):
+            Stock.objects.bulk_create(
+                [
+                    Stock(
+                        # Distribution biaisée : la queue a peu de lots (stocks faibles)
+                        produit_id=produit_ids[int(len(produit_ids) * rng.random() ** 3)],
+                        service=rng.choice(services),
+                        # Un lot sur dix est vide
+                        quantite=0 if rng.random() < 0.1 else rng.randint(1, 50),
+                        date_peremption=today + timedelta(days=rng.randint(-60, 720)),
+                        numero_lot=f"B{start + i}",
+                    )
+                    for i in range(min(10_000, lots - start))
+                ]
+            )
+        # Positions recalculées en une passe, comme après la migration
+        StockPosition.objects.refresh(
+            Stock.objects.values_list("produit_id", "service_id").distinct()
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.now().date()
+        try:
+            with transaction.atomic():
+                started = time.perf_counter()
+                self.generer(options["lots"], options["products"], options["services"])
+                self.stdout.write(
+                    f"Jeu de données : {options['lots']} lots en "
+                    f"{time.perf_counter() - started:.1f}s"
+                )
+
+                self.mesurer("Reconstruction instantané", AlerteStock.objects.reconstruire, 1)
+                attendu = self.mesurer(
+                    "Compteurs sur les lots", lambda: compteurs_sur_les_lots(today), options["repeat"]
+                )
+                obtenu = self.mesurer(
+                    "Compteurs sur l'instantané", lambda: alertes.resume(today), options["repeat"]
+                )
+                self.mesurer(
+                    "Lots expirant (30 j)",
+                    lambda: len(list(alertes.lots_expirant(30, today))),
+                    options["repeat"],
+                )
+
+                lot = Stock.objects.filter(quantite__gt=0).order_by("pk").first()
+                lot.quantite -= 1
+                self.mesurer("Mouvement (save d'un lot)", lot.save, 1)
+                raise Rollback()
+        except Rollback:
+            pass
+
+        self.stdout.write(f"Compteurs : {attendu}")
+        if attendu != obtenu:
+            self.stderr.write(f"Instantané différent : {obtenu}")
@@ -0,0 +1,103 @@
+# pharmacies/management/commands/reconcile_stock_positions.py
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Min, Q, Sum
+from django.utils import timezone
+from pharmacies.models import Stock, StockPosition
+from pharmacies.models.stock import rafraichir_apres_mouvement
+
+CHAMPS = ("quantite_disponible", "quantite_perimee", "prochaine_peremption")
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare les positions de stock aux lots (quantités disponibles, périmées, "
+        "prochaine péremption) et, avec --fix, corrige les écarts"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="Recalcule les positions en écart")
+        parser.add_argument("--service", type=int, help="Limite la vérification à un service")
+        parser.add_argument("--limit", type=int, default=20, help="Nombre d'écarts affichés")
+
+    def attendues(self, service_id, today):
+        disponible = Q(quantite__gt=0, date_peremption__gte=today)
+        perime = Q(quantite__gt=0, date_peremption__lt=today)
+        stocks = Stock.objects.all()
+        if service_id:
+            stocks = stocks.filter(service_id=service_id)
+        rows = (
+            stocks.values("produit_id", "service_id")
+            .annotate(
+                quantite_disponible=Sum("quantite", filter=disponible),
+                quantite_perimee=Sum("quantite", filter=perime),
+                prochaine_peremption=Min("date_peremption", filter=disponible),
+            )
+            .order_by()
+        )
+        return {
+            (row["produit_id"], row["service_id"]): (
+                row["quantite_disponible"] or 0,
+                row["quantite_perimee"] or 0,
+                row["prochaine_peremption"],
+            )
+            for row in rows
+        }
+
+    def rafraichir_perimees(self, service_id, today):
+        """
+        Recalcule les positions dont le lot le plus proche a périmé depuis.
+
+        Elles ne sont recalculées qu'à la lecture (`StockPositionManager.lire`) :
+        ce n'est pas un écart.
+        """
+        positions = StockPosition.objects.filter(prochaine_peremption__lt=today)
+        if service_id:
+            positions = positions.filter(service_id=service_id)
+        paires = list(positions.values_list("produit_id", "service_id"))
+        for start in range(0, len(paires), 500):
+            StockPosition.objects.refresh(paires[start : start + 500])
+
+    def actuelles(self, service_id):
+        positions = StockPosition.objects.all()
+        if service_id:
+            positions = positions.filter(service_id=service_id)
+        return {
+            (row[0], row[1]): tuple(row[2:])
+            for row in positions.values_list("produit_id", "service_id", *CHAMPS)
+        }
+
+    def handle(self, *args, **options):
+        today = timezone.now().date()
+        self.rafraichir_perimees(options["service"], today)
+        attendues = self.attendues(options["service"], today)
+        actuelles = self.actuelles(options["service"])
+
+        ecarts = {
+            pair: (actuelles.get(pair), attendues.get(pair))
+            for pair in set(attendues) | set(actuelles)
+            if actuelles.get(pair) != attendues.get(pair)
+        }
+
+        self.stdout.write(
+            f"{len(attendues)} couple(s) produit/service avec lots, "
+            f"{len(actuelles)} position(s), {len(ecarts)} écart(s)"
+        )
+        for (produit_id, service_id), (actuelle, attendue) in sorted(ecarts.items())[
+            : options["limit"]
+        ]:
+            self.stdout.write(
+                f"  produit {produit_id} / service {service_id} : "
+                f"position {actuelle} ≠ lots {attendue}"
+            )
+
+        if not ecarts:
+            return
+        if not options["fix"]:
+            raise CommandError("Positions de stock incohérentes (relancer avec --fix)")
+
+        paires = list(ecarts)
+        with transaction.atomic():
+            for start in range(0, len(paires), 500):
+                rafraichir_apres_mouvement(paires[start : start + 500])
+        self.stdout.write(self.style.SUCCESS(f"{len(paires)} position(s) recalculée(s)"))
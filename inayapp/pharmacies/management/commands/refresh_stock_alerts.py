@@ -0,0 +1,28 @@
+# pharmacies/management/commands/refresh_stock_alerts.py
+#
+# Planification, une fois par jour après minuit (les lots entrent dans
+# l'horizon de péremption avec le temps, sans mouvement) :
+#
+#   cron    30 0 * * *  cd /chemin/vers/inayapp && python manage.py refresh_stock_alerts
+#   Celery  tâche pharmacies.tasks.refresh_stock_alerts dans le planning beat
+import time
+
+from django.core.management.base import BaseCommand
+from pharmacies.models import AlerteStock
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruit l'instantané des alertes de stock (lots périmés ou proches "
+        "de la péremption, stocks faibles, ruptures). À planifier une fois par "
+        "jour, après minuit ; les mouvements de lots le tiennent à jour entre-temps"
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        total = AlerteStock.objects.reconstruire()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{total} alerte(s) calculée(s) en {time.perf_counter() - started:.2f}s"
+            )
+        )
@@ -0,0 +1,67 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Min, Q, Sum
+from django.utils import timezone
+
+
+def remplir_positions(apps, schema_editor):
+    Stock = apps.get_model("pharmacies", "Stock")
+    StockPosition = apps.get_model("pharmacies", "StockPosition")
+    today = timezone.now().date()
+    disponible = Q(quantite__gt=0, date_peremption__gte=today)
+    perime = Q(quantite__gt=0, date_peremption__lt=today)
+    rows = (
+        Stock.objects.values("produit_id", "service_id")
+        .annotate(
+            disponible=Sum("quantite", filter=disponible),
+            perime=Sum("quantite", filter=perime),
+            prochaine=Min("date_peremption", filter=disponible),
+        )
+        .order_by()
+    )
+    StockPosition.objects.bulk_create(
+        [
+            StockPosition(
+                produit_id=row["produit_id"],
+                service_id=row["service_id"],
+                quantite_disponible=row["disponible"] or 0,
+                quantite_perimee=row["perime"] or 0,
+                prochaine_peremption=row["prochaine"],
+                dernier_mouvement=timezone.now(),
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical', '0012_service_seuil_sejour_court_heures_and_more'),
+        ('pharmacies', '0002_rename_est_actif_produit_est_active'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockPosition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantite_disponible', models.IntegerField(default=0)),
+                ('quantite_perimee', models.IntegerField(default=0)),
+                ('prochaine_peremption', models.DateField(blank=True, null=True)),
+                ('dernier_mouvement', models.DateTimeField(blank=True, null=True)),
+                ('produit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='positions', to='pharmacies.produit')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='medical.service')),
+            ],
+            options={
+                'verbose_name': 'Position de stock',
+                'verbose_name_plural': 'Positions de stock',
+                'indexes': [models.Index(fields=['service', 'quantite_disponible'], name='pharmacies__service_ce1011_idx')],
+                'unique_together': {('produit', 'service')},
+            },
+        ),
+        migrations.RunPython(remplir_positions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,116 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:49
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, Sum
+from django.utils import timezone
+
+# Valeurs de AlerteStockManager à la création de la table
+HORIZON_JOURS = 90
+SEUIL_STOCK_FAIBLE = 10
+
+
+def remplir_alertes(apps, schema_editor):
+    """Premier instantané des alertes, sans attendre refresh_stock_alerts"""
+    alias = schema_editor.connection.alias
+    Stock = apps.get_model("pharmacies", "Stock")
+    StockPosition = apps.get_model("pharmacies", "StockPosition")
+    AlerteStock = apps.get_model("pharmacies", "AlerteStock")
+    now = timezone.now()
+    lots = Stock.objects.using(alias).filter(
+        quantite__gt=0,
+        date_peremption__lte=now.date() + timedelta(days=HORIZON_JOURS),
+    )
+    AlerteStock.objects.using(alias).bulk_create(
+        (
+            AlerteStock(
+                type_alerte="PEREMPTION",
+                produit_id=lot["produit_id"],
+                service_id=lot["service_id"],
+                stock_id=lot["id"],
+                numero_lot=lot["numero_lot"],
+                quantite=lot["quantite"],
+                date_peremption=lot["date_peremption"],
+                calculee_le=now,
+            )
+            for lot in lots.values(
+                "id", "produit_id", "service_id", "numero_lot", "quantite", "date_peremption"
+            ).iterator(chunk_size=5000)
+        ),
+        batch_size=5000,
+    )
+    totaux = (
+        StockPosition.objects.using(alias)
+        .values("produit_id")
+        .annotate(total=Sum(F("quantite_disponible") + F("quantite_perimee")))
+        .filter(total__lte=SEUIL_STOCK_FAIBLE)
+        .order_by()
+    )
+    AlerteStock.objects.using(alias).bulk_create(
+        [
+            AlerteStock(
+                type_alerte="RUPTURE" if row["total"] <= 0 else "STOCK_FAIBLE",
+                produit_id=row["produit_id"],
+                quantite=row["total"],
+                calculee_le=now,
+            )
+            for row in totaux
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical', '0012_service_seuil_sejour_court_heures_and_more'),
+        ('pharmacies', '0003_stock_position'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlerteStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_alerte', models.CharField(choices=[('PEREMPTION', 'Lot périmé ou proche de la péremption'), ('STOCK_FAIBLE', 'Stock faible'), ('RUPTURE', 'Rupture de stock')], max_length=20)),
+                ('stock_id', models.BigIntegerField(blank=True, null=True)),
+                ('numero_lot', models.CharField(blank=True, max_length=50, null=True)),
+                ('quantite', models.IntegerField(default=0)),
+                ('date_peremption', models.DateField(blank=True, null=True)),
+                ('calculee_le', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Alerte de stock',
+                'verbose_name_plural': 'Alertes de stock',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['service', 'produit', 'date_peremption'], name='pharmacies__service_4ed58c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['quantite', 'date_peremption'], name='pharmacies__quantit_e872e5_idx'),
+        ),
+        migrations.AddField(
+            model_name='alertestock',
+            name='produit',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='pharmacies.produit'),
+        ),
+        migrations.AddField(
+            model_name='alertestock',
+            name='service',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='medical.service'),
+        ),
+        migrations.AddIndex(
+            model_name='alertestock',
+            index=models.Index(fields=['type_alerte', 'date_peremption'], name='pharmacies__type_al_8da2e1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alertestock',
+            index=models.Index(fields=['service', 'produit'], name='pharmacies__service_0480a7_idx'),
+        ),
+        migrations.RunPython(remplir_alertes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Index FULLTEXT pour PRODUCT_SEARCH_BACKEND = "fulltext" (MariaDB seulement)
+from django.db import migrations
+
+
+def creer_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "mysql":
+        return
+    schema_editor.execute(
+        "CREATE FULLTEXT INDEX pharmacies_produit_recherche_ft "
+        "ON pharmacies_produit (nom, code_produit)"
+    )
+
+
+def supprimer_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "mysql":
+        return
+    schema_editor.execute(
+        "DROP INDEX pharmacies_produit_recherche_ft ON pharmacies_produit"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacies', '0004_stock_alerts'),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_index, supprimer_index),
+    ]
@@ -9,9 +9,6 @@ from django.core.validators import MinValueValidator
 from django.db import models, transaction
 from django.db.models import F, Sum
 from django.utils import timezone
-from medical.models.services import Service
-
-from .stock import MouvementStock, Stock
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -261,34 +258,32 @@ class Livraison(models.Model):
                 "Seules les livraisons en transit peuvent être reçues"
             )
 
-        # Mise à jour du stock
-        service_pharmacie = Service.objects.get(est_pharmacies=True)
-
-        for ligne in self.lignes.all():
-            Stock.objects.update_or_create_stock(
-                produit=ligne.produit,
-                service=service_pharmacie,
-                date_peremption=ligne.date_peremption,
-                numero_lot=ligne.numero_lot,
-                quantite=ligne.quantite_livree,
+        from ..allocation import LotEntrant, entrer_lots
+        from ..disponibilite import service_pharmacie
+
+        with transaction.atomic():
+            # Mise à jour du stock : tous les lots en bloc
+            entrer_lots(
+                service_pharmacie(),
+                [
+                    LotEntrant(
+                        ligne.produit_id,
+                        ligne.date_peremption,
+                        ligne.numero_lot,
+                        ligne.quantite_livree,
+                    )
+                    for ligne in self.lignes.all()
+                ],
+                self,
             )
 
-            MouvementStock.log_mouvement(
-                instance=self,
-                type_mouvement="ENTREE",
-                produit=ligne.produit,
-                service=service_pharmacie,
-                quantite=ligne.quantite_livree,
-                lot_concerne=ligne.numero_lot,
-            )
-
-        self.statut = "RECU"
-        self.date_reception = timezone.now()
-        self.recepteur = user
-        self.save()
+            self.statut = "RECU"
+            self.date_reception = timezone.now()
+            self.recepteur = user
+            self.save()
 
-        # Générer le bon de réception
-        BonReception.objects.create(livraison=self)
+            # Générer le bon de réception
+            BonReception.objects.create(livraison=self)
 
 
 class LigneLivraison(models.Model):
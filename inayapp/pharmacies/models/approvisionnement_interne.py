@@ -221,13 +221,11 @@ class DemandeInterne(models.Model):
         if not self.peut_etre_preparee:
             raise ValidationError("Cette demande ne peut pas être préparée")
 
-        # Vérifier la disponibilité des stocks
+        # Vérifier la disponibilité des stocks, toutes lignes en une requête
         with transaction.atomic():
-            for ligne in self.lignes.all():
-                stock_disponible = Stock.objects.get_stock_disponible(
-                    produit=ligne.produit, service=self.pharmacie
-                )
-
+            lignes = self.charger_disponibilites()
+            for ligne in lignes:
+                stock_disponible = ligne.stock_disponible_pharmacie
                 quantite_a_servir = ligne.quantite_accordee or ligne.quantite_demandee
 
                 if stock_disponible < quantite_a_servir:
@@ -241,40 +239,46 @@ class DemandeInterne(models.Model):
             self.preparee_par = user
             self.save()
 
+    def charger_disponibilites(self):
+        """
+        Renseigne le stock pharmacie de toutes les lignes en une requête.
+
+        Retourne les lignes (celles préchargées par `prefetch_related` si
+        présentes) ; `stock_disponible_pharmacie` ne fait alors plus de requête.
+        """
+        from ..disponibilite import disponibilites_service
+
+        if "lignes" in getattr(self, "_prefetched_objects_cache", {}):
+            lignes = list(self.lignes.all())
+        else:
+            lignes = list(self.lignes.select_related("produit"))
+        par_produit = disponibilites_service(
+            [ligne.produit_id for ligne in lignes], self.pharmacie_id, avec_lots=False
+        )
+        for ligne in lignes:
+            ligne._stock_disponible_pharmacie = par_produit[ligne.produit_id].quantite
+        return lignes
+
     def livrer(self, user):
         """Livre la demande et met à jour les stocks"""
         if not self.peut_etre_livree:
             raise ValidationError("Cette demande ne peut pas être livrée")
 
+        from ..allocation import transferer_fefo
+
         with transaction.atomic():
-            for ligne in self.lignes.all():
-                quantite_livree = ligne.quantite_accordee or ligne.quantite_demandee
-
-                # Créer le mouvement de stock (sortie de la pharmacie)
-                MouvementStock.objects.create(
-                    produit=ligne.produit,
-                    service=self.pharmacie,
-                    type_mouvement="SORTIE",
-                    quantite=quantite_livree,
-                    motif=f"Livraison demande interne {self.reference}",
-                    reference_document=self.reference,
-                    effectue_par=user,
-                )
-
-                # Créer le mouvement de stock (entrée dans le service)
-                MouvementStock.objects.create(
-                    produit=ligne.produit,
-                    service=self.service_demandeur,
-                    type_mouvement="ENTREE",
-                    quantite=quantite_livree,
-                    motif=f"Réception demande interne {self.reference}",
-                    reference_document=self.reference,
-                    effectue_par=user,
-                )
-
-                # Mettre à jour la quantité livrée
-                ligne.quantite_livree = quantite_livree
-                ligne.save()
+            lignes = list(self.lignes.all())
+            for ligne in lignes:
+                ligne.quantite_livree = ligne.quantite_accordee or ligne.quantite_demandee
+
+            # Sortie FEFO de la pharmacie et entrée des mêmes lots dans le service
+            transferer_fefo(
+                self.pharmacie,
+                self.service_demandeur,
+                [(ligne.produit_id, ligne.quantite_livree) for ligne in lignes],
+                self,
+            )
+            LigneDemandeInterne.objects.bulk_update(lignes, ["quantite_livree"])
 
             self.statut = "LIVREE"
             self.date_livraison = timezone.now()
@@ -334,8 +338,10 @@ class LigneDemandeInterne(models.Model):
     @property
     def stock_disponible_pharmacie(self):
         """Retourne le stock disponible dans la pharmacie"""
+        if hasattr(self, "_stock_disponible_pharmacie"):
+            return self._stock_disponible_pharmacie
         return Stock.objects.get_stock_disponible(
-            produit=self.produit, service=self.demande.pharmacie
+            produit=self.produit_id, service=self.demande.pharmacie_id
         )
 
     @property
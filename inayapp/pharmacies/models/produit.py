@@ -1,4 +1,5 @@
 # pharmacies/models/produit.py
+from audit.tracking import FieldTrackerMixin
 from django.db import models
 from django.urls import reverse
 from django.core.validators import MinValueValidator
@@ -85,7 +86,7 @@ class ProduitManager(models.Manager):
         ).distinct()
 
 
-class Produit(models.Model):
+class Produit(FieldTrackerMixin, models.Model):
     """Modèle représentant un produit de pharmacie"""
 
     class TypeProduit(models.TextChoices):
@@ -155,7 +156,7 @@ class Produit(models.Model):
     @property
     def stock_total(self):
         """Stock total tous services confondus"""
-        return sum(stock.quantite for stock in self.stocks.all())
+        return sum(position.quantite_totale for position in self.positions.all())
 
     @property
     def valeur_stock(self):
@@ -6,6 +6,9 @@ from django.core.exceptions import ValidationError
 from django.db import models, transaction
 from django.utils import timezone
 
+from audit.tracking import FieldTrackerMixin
+from inayapp.transactions import ApresCommit
+
 
 class StockManager(models.Manager):
     def get_available(self, produit, service):
@@ -19,12 +22,7 @@ class StockManager(models.Manager):
 
     def get_stock_disponible(self, produit, service):
         """Retourne la quantité totale disponible pour un produit dans un service"""
-        return (
-            self.get_available(produit, service).aggregate(
-                total=models.Sum("quantite")
-            )["total"]
-            or 0
-        )
+        return StockPosition.objects.disponible(produit, service)
 
     def update_or_create_stock(
         self, produit, service, date_peremption, numero_lot, quantite
@@ -45,7 +43,7 @@ class StockManager(models.Manager):
             return stock
 
 
-class Stock(models.Model):
+class Stock(FieldTrackerMixin, models.Model):
     produit = models.ForeignKey(
         "Produit", on_delete=models.PROTECT, verbose_name="Produit"
     )
@@ -68,6 +66,8 @@ class Stock(models.Model):
         indexes = [
             models.Index(fields=["date_peremption"]),
             models.Index(fields=["numero_lot"]),
+            models.Index(fields=["service", "produit", "date_peremption"]),
+            models.Index(fields=["quantite", "date_peremption"]),
         ]
 
     def __str__(self):
@@ -79,6 +79,382 @@ class Stock(models.Model):
                 "La date de péremption ne peut pas être dans le passé"
             )
 
+    def _positions(self):
+        """Couples (produit, service) concernés, y compris avant modification."""
+        pairs = {(self.produit_id, self.service_id)}
+        original = self.get_original_values() or {}
+        if "produit_id" in original and "service_id" in original:
+            pairs.add((original["produit_id"], original["service_id"]))
+        return pairs
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            pairs = self._positions()
+            super().save(*args, **kwargs)
+            rafraichir_apres_mouvement(pairs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            pairs = self._positions()
+            result = super().delete(*args, **kwargs)
+            rafraichir_apres_mouvement(pairs)
+        return result
+
+
+class StockPositionManager(models.Manager):
+    def _aggregates(self, pairs, today):
+        """{(produit_id, service_id): valeurs} calculées sur les lots, en une requête."""
+        produit_ids = {produit_id for produit_id, _ in pairs}
+        service_ids = {service_id for _, service_id in pairs}
+        disponible = models.Q(quantite__gt=0, date_peremption__gte=today)
+        perime = models.Q(quantite__gt=0, date_peremption__lt=today)
+        rows = (
+            Stock.objects.filter(produit_id__in=produit_ids, service_id__in=service_ids)
+            .values("produit_id", "service_id")
+            .annotate(
+                disponible=models.Sum("quantite", filter=disponible),
+                perime=models.Sum("quantite", filter=perime),
+                prochaine=models.Min("date_peremption", filter=disponible),
+            )
+            .order_by()
+        )
+        return {
+            (row["produit_id"], row["service_id"]): row
+            for row in rows
+            if (row["produit_id"], row["service_id"]) in pairs
+        }
+
+    def _verrouiller(self, pairs):
+        """
+        Verrouille les positions des couples, créées au besoin.
+
+        Deux transactions modifiant des lots différents d'un même couple
+        recalculent ainsi sa position l'une après l'autre : sans verrou,
+        chacune écraserait l'agrégat de l'autre (REPEATABLE READ).
+        """
+        existantes = set(
+            self.select_for_update()
+            .filter(_condition_couples(pairs))
+            .order_by("pk")
+            .values_list("produit_id", "service_id")
+        )
+        manquantes = pairs - existantes
+        if manquantes:
+            # Une insertion concurrente du même couple attend le commit de l'autre
+            self.bulk_create(
+                [
+                    StockPosition(produit_id=produit_id, service_id=service_id)
+                    for produit_id, service_id in manquantes
+                ],
+                ignore_conflicts=True,
+            )
+            list(
+                self.select_for_update()
+                .filter(_condition_couples(manquantes))
+                .order_by("pk")
+                .values_list("pk", flat=True)
+            )
+
+    def refresh(self, pairs):
+        """
+        Recalcule les positions des couples (produit_id, service_id) depuis les lots.
+
+        À appeler dans la transaction qui modifie les lots : verrou des
+        positions, une requête d'agrégat, un upsert, et la suppression des
+        positions sans lot.
+        """
+        pairs = {pair for pair in pairs if None not in pair}
+        if not pairs:
+            return {}
+        with transaction.atomic(savepoint=False):
+            return self._recalculer(pairs)
+
+    def _recalculer(self, pairs):
+        self._verrouiller(pairs)
+        today = timezone.now().date()
+        now = timezone.now()
+        aggregates = self._aggregates(pairs, today)
+
+        positions = [
+            StockPosition(
+                produit_id=produit_id,
+                service_id=service_id,
+                quantite_disponible=row["disponible"] or 0,
+                quantite_perimee=row["perime"] or 0,
+                prochaine_peremption=row["prochaine"],
+                dernier_mouvement=now,
+            )
+            for (produit_id, service_id), row in aggregates.items()
+        ]
+        self.bulk_create(
+            positions,
+            update_conflicts=True,
+            unique_fields=["produit", "service"],
+            update_fields=[
+                "quantite_disponible",
+                "quantite_perimee",
+                "prochaine_peremption",
+                "dernier_mouvement",
+            ],
+        )
+
+        vides = pairs - set(aggregates)
+        if vides:
+            self.filter(_condition_couples(vides)).delete()
+        return {(p.produit_id, p.service_id): p for p in positions}
+
+    def lire(self, produit_ids, service_ids):
+        """
+        {(produit_id, service_id): StockPosition} existantes, en une requête.
+
+        Une position dont le lot le plus proche est périmé depuis le dernier
+        calcul est recalculée au passage.
+        """
+        today = timezone.now().date()
+        positions = {
+            (position.produit_id, position.service_id): position
+            for position in self.filter(
+                produit_id__in=set(produit_ids), service_id__in=set(service_ids)
+            )
+        }
+        perimees = {
+            pair
+            for pair, position in positions.items()
+            if position.prochaine_peremption and position.prochaine_peremption < today
+        }
+        if perimees:
+            recalculees = self.refresh(perimees)
+            for pair in perimees:
+                positions.pop(pair)
+                if pair in recalculees:
+                    positions[pair] = recalculees[pair]
+        return positions
+
+    def disponibles(self, produit_ids, service):
+        """{produit_id: quantité disponible} dans `service`."""
+        service_id = getattr(service, "pk", service)
+        positions = self.lire(produit_ids, [service_id])
+        return {
+            produit_id: positions[produit_id, service_id].quantite_disponible
+            if (produit_id, service_id) in positions
+            else 0
+            for produit_id in set(produit_ids)
+        }
+
+    def disponible(self, produit, service):
+        produit_id = getattr(produit, "pk", produit)
+        return self.disponibles([produit_id], service)[produit_id]
+
+
+class StockPosition(models.Model):
+    """
+    Position de stock dénormalisée par produit et service.
+
+    Tenue à jour dans la transaction de chaque modification de lot
+    (`Stock.save`/`delete`, allocations FEFO) ; `reconcile_stock_positions`
+    la compare aux lots.
+    """
+
+    produit = models.ForeignKey(
+        "Produit", on_delete=models.CASCADE, related_name="positions"
+    )
+    service = models.ForeignKey("medical.Service", on_delete=models.CASCADE)
+    quantite_disponible = models.IntegerField(default=0)
+    quantite_perimee = models.IntegerField(default=0)
+    prochaine_peremption = models.DateField(null=True, blank=True)
+    dernier_mouvement = models.DateTimeField(null=True, blank=True)
+
+    objects = StockPositionManager()
+
+    class Meta:
+        verbose_name = "Position de stock"
+        verbose_name_plural = "Positions de stock"
+        unique_together = ["produit", "service"]
+        indexes = [models.Index(fields=["service", "quantite_disponible"])]
+
+    def __str__(self):
+        return f"{self.produit} | {self.service} | Disponible: {self.quantite_disponible}"
+
+    @property
+    def quantite_totale(self):
+        return self.quantite_disponible + self.quantite_perimee
+
+
+def _condition_couples(pairs, produit="produit_id", service="service_id"):
+    """Q sélectionnant les couples (produit_id, service_id), groupés par service."""
+    par_service = {}
+    for produit_id, service_id in pairs:
+        par_service.setdefault(service_id, set()).add(produit_id)
+    condition = models.Q()
+    for service_id, produit_ids in par_service.items():
+        condition |= models.Q(**{service: service_id, f"{produit}__in": produit_ids})
+    return condition
+
+
+class AlerteStockManager(models.Manager):
+    # Lots signalés jusqu'à cette échéance ; au-delà, lire les lots directement
+    HORIZON_JOURS = 90
+    SEUIL_STOCK_FAIBLE = 10
+
+    def _alertes_lots(self, lots, now):
+        return (
+            AlerteStock(
+                type_alerte=AlerteStock.PEREMPTION,
+                produit_id=produit_id,
+                service_id=service_id,
+                stock_id=stock_id,
+                numero_lot=numero_lot,
+                quantite=quantite,
+                date_peremption=date_peremption,
+                calculee_le=now,
+            )
+            for (
+                stock_id,
+                produit_id,
+                service_id,
+                numero_lot,
+                quantite,
+                date_peremption,
+            ) in lots.values_list(
+                "id", "produit_id", "service_id", "numero_lot", "quantite", "date_peremption"
+            ).iterator(chunk_size=5000)
+        )
+
+    def _alertes_produits(self, positions, now):
+        totaux = (
+            positions.values("produit_id")
+            .annotate(total=models.Sum(models.F("quantite_disponible") + models.F("quantite_perimee")))
+            .filter(total__lte=self.SEUIL_STOCK_FAIBLE)
+            .order_by()
+        )
+        return [
+            AlerteStock(
+                type_alerte=AlerteStock.RUPTURE if row["total"] <= 0 else AlerteStock.STOCK_FAIBLE,
+                produit_id=row["produit_id"],
+                quantite=row["total"],
+                calculee_le=now,
+            )
+            for row in totaux
+        ]
+
+    def _lots(self, today):
+        return Stock.objects.filter(
+            quantite__gt=0,
+            date_peremption__lte=today + timezone.timedelta(days=self.HORIZON_JOURS),
+        )
+
+    def _inserer(self, alertes, batch_size=5000):
+        lot = []
+        for alerte in alertes:
+            lot.append(alerte)
+            if len(lot) >= batch_size:
+                self.bulk_create(lot)
+                lot = []
+        if lot:
+            self.bulk_create(lot)
+
+    def rafraichir(self, pairs):
+        """
+        Met à jour les alertes des couples (produit_id, service_id) modifiés.
+
+        Lots des couples et alertes produit (tous services confondus) sont
+        recalculés à partir des positions, en une transaction.
+        """
+        pairs = {pair for pair in pairs if None not in pair}
+        if not pairs:
+            return
+        now = timezone.now()
+        produit_ids = {produit_id for produit_id, _ in pairs}
+
+        with transaction.atomic():
+            # Instantané sans dépendances : supprimé en une requête
+            self.filter(type_alerte=AlerteStock.PEREMPTION).filter(
+                _condition_couples(pairs)
+            ).delete()
+            self._inserer(
+                self._alertes_lots(self._lots(now.date()).filter(_condition_couples(pairs)), now)
+            )
+
+            self.filter(
+                type_alerte__in=[AlerteStock.STOCK_FAIBLE, AlerteStock.RUPTURE],
+                produit_id__in=produit_ids,
+            ).delete()
+            self.bulk_create(
+                self._alertes_produits(
+                    StockPosition.objects.filter(produit_id__in=produit_ids), now
+                )
+            )
+
+    def reconstruire(self):
+        """Recalcule toutes les alertes (tâche périodique, une fois par jour)."""
+        now = timezone.now()
+        with transaction.atomic():
+            self.all().delete()
+            self._inserer(self._alertes_lots(self._lots(now.date()), now))
+            self.bulk_create(self._alertes_produits(StockPosition.objects.all(), now))
+        return self.count()
+
+
+class AlerteStock(models.Model):
+    """
+    Instantané des alertes de stock : lots périmés ou proches de la
+    péremption (jusqu'à `HORIZON_JOURS`), produits en stock faible ou en
+    rupture.
+
+    Reconstruit chaque jour par `refresh_stock_alerts` (à planifier, voir la
+    commande) et mis à jour au commit de chaque mouvement de lot ; les écrans
+    d'alertes ne lisent que cette table.
+    """
+
+    PEREMPTION = "PEREMPTION"
+    STOCK_FAIBLE = "STOCK_FAIBLE"
+    RUPTURE = "RUPTURE"
+    TYPE_CHOICES = [
+        (PEREMPTION, "Lot périmé ou proche de la péremption"),
+        (STOCK_FAIBLE, "Stock faible"),
+        (RUPTURE, "Rupture de stock"),
+    ]
+
+    type_alerte = models.CharField(max_length=20, choices=TYPE_CHOICES)
+    produit = models.ForeignKey("Produit", on_delete=models.CASCADE)
+    service = models.ForeignKey(
+        "medical.Service", on_delete=models.CASCADE, null=True, blank=True
+    )
+    # Lot concerné (alertes de péremption) ; pas de clé étrangère pour que la
+    # suppression d'un lot ne dépende pas de l'instantané
+    stock_id = models.BigIntegerField(null=True, blank=True)
+    numero_lot = models.CharField(max_length=50, blank=True, null=True)
+    quantite = models.IntegerField(default=0)
+    date_peremption = models.DateField(null=True, blank=True)
+    calculee_le = models.DateTimeField()
+
+    objects = AlerteStockManager()
+
+    class Meta:
+        verbose_name = "Alerte de stock"
+        verbose_name_plural = "Alertes de stock"
+        indexes = [
+            models.Index(fields=["type_alerte", "date_peremption"]),
+            models.Index(fields=["service", "produit"]),
+        ]
+
+    def __str__(self):
+        return f"{self.get_type_alerte_display()} | {self.produit_id} | {self.quantite}"
+
+
+_alertes_a_rafraichir = ApresCommit(lambda pairs: AlerteStock.objects.rafraichir(pairs))
+
+
+def rafraichir_apres_mouvement(pairs):
+    """
+    Positions et alertes des couples (produit_id, service_id) dont les lots ont changé.
+
+    Les positions sont mises à jour dans la transaction ; les alertes une
+    seule fois au commit, pour tous les couples touchés par la transaction.
+    """
+    StockPosition.objects.refresh(pairs)
+    _alertes_a_rafraichir.marquer(*pairs)
+
 
 class MouvementStock(models.Model):
     TYPES_MOUVEMENT = (
@@ -0,0 +1,218 @@
+# pharmacies/recherche.py
+"""
+Recherche de produits pour les sélecteurs (pharmacie, bloc opératoire).
+
+Chaque processus garde en mémoire un index des produits : noms, codes et
+codes-barres normalisés (minuscules, sans accents ni ponctuation), avec un
+index de trigrammes pour les termes de trois caractères ou plus. Les termes
+plus courts gardent la simple inclusion (« 12 » trouve « PRD-012 ») : ils
+sont vérifiés par un parcours des produits retenus, de tout l'index s'ils
+sont seuls. Une frappe dans un sélecteur ne touche donc pas la base.
+
+Les signaux de `Produit` changent une clé de version dans le cache partagé ;
+chaque processus reconstruit son index à la recherche suivante.
+
+Avec `PRODUCT_SEARCH_BACKEND = "fulltext"` et MariaDB, la recherche passe
+par l'index FULLTEXT de `pharmacies_produit` (migration 0005).
+"""
+import re
+import unicodedata
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.signals import post_delete, post_save
+from inayapp.caching import VersionedIndex, bump_version_on_commit
+
+from .models.produit import Produit
+
+VERSION_KEY = "pharmacies:recherche_produits:version"
+LIMITE_PAR_DEFAUT = 20
+
+ProduitIndexe = namedtuple(
+    "ProduitIndexe",
+    "id nom code code_barres prix_vente est_active "
+    "nom_normalise code_normalise code_barres_normalise texte",
+)
+
+_SEPARATEURS = re.compile(r"[\W_]+")
+
+
+def normaliser(texte):
+    """Minuscules, sans accents ; toute ponctuation devient une espace."""
+    texte = texte or ""
+    if not texte.isascii():
+        texte = unicodedata.normalize("NFKD", texte)
+        texte = "".join(c for c in texte if not unicodedata.combining(c))
+    return _SEPARATEURS.sub(" ", texte.casefold()).strip()
+
+
+def _trigrammes(mot):
+    return {mot[i : i + 3] for i in range(len(mot) - 2)}
+
+
+class IndexProduits:
+    def __init__(self, produits):
+        self.produits = produits
+        # Tuples lus dans la boucle de recherche (plus rapides que les attributs)
+        self.cles = [
+            (p.texte, p.code_normalise, p.code_barres_normalise, p.nom_normalise, p.est_active)
+            for p in produits
+        ]
+        self.trigrammes = {}
+        for position, produit in enumerate(produits):
+            for mot in set(produit.texte.split()):
+                for trigramme in _trigrammes(mot):
+                    self.trigrammes.setdefault(trigramme, set()).add(position)
+
+    @classmethod
+    def charger(cls):
+        produits = []
+        rows = Produit.objects.order_by("nom", "pk").values_list(
+            "pk", "nom", "code_produit", "code_barres", "prix_vente", "est_active"
+        )
+        for pk, nom, code, code_barres, prix_vente, est_active in rows:
+            nom_normalise = normaliser(nom)
+            code_normalise = normaliser(code)
+            code_barres_normalise = normaliser(code_barres)
+            produits.append(
+                ProduitIndexe(
+                    pk, nom, code, code_barres, prix_vente, est_active,
+                    nom_normalise, code_normalise, code_barres_normalise,
+                    # Espaces aux bords : « " " + terme in texte » teste un début de mot
+                    f" {code_normalise} {code_barres_normalise} {nom_normalise} ",
+                )
+            )
+        return cls(produits)
+
+    def _postings(self, terme):
+        # Terme court : aucun filtre, l'inclusion est vérifiée au parcours
+        return [self.trigrammes.get(t, set()) for t in _trigrammes(terme)]
+
+    def rechercher(self, requete, limit=LIMITE_PAR_DEFAUT, offset=0, actifs=True):
+        """
+        Produits correspondant à tous les termes, par rang puis par nom :
+        0 code exact, 1 début de code, 2 début de nom, 3 débuts de mots,
+        4 simple inclusion.
+        """
+        requete = normaliser(requete)
+        termes = requete.split()
+        if not termes:
+            return []
+
+        # Intersection en commençant par la liste la plus courte, tous termes confondus
+        postings = sorted(
+            (posting for terme in termes for posting in self._postings(terme)), key=len
+        )
+        if not postings:
+            # Uniquement des termes courts : parcours de tout l'index
+            positions = range(len(self.produits))
+        else:
+            positions = postings[0]
+            for posting in postings[1:]:
+                if not positions:
+                    return []
+                positions = positions & posting
+
+        premier, autres = termes[0], termes[1:]
+        debut_premier = " " + premier
+        debuts_mots = [" " + terme for terme in autres]
+        fin = None if limit is None else offset + limit
+        cles = self.cles
+        rangs = ([], [], [], [], [])
+        # Les positions suivent l'ordre alphabétique des noms
+        for position in sorted(positions):
+            texte, code, code_barres, nom, est_active = cles[position]
+            if actifs and not est_active:
+                continue
+            # Les trigrammes ne garantissent pas la contiguïté : vérification finale
+            if premier not in texte or (autres and not all(t in texte for t in autres)):
+                continue
+            if code == requete or code_barres == requete:
+                rangs[0].append(position)
+                if fin is not None and len(rangs[0]) >= fin:
+                    break
+            elif code.startswith(requete):
+                rangs[1].append(position)
+            elif nom.startswith(requete):
+                rangs[2].append(position)
+            elif debut_premier in texte and (
+                not autres or all(debut in texte for debut in debuts_mots)
+            ):
+                rangs[3].append(position)
+            else:
+                rangs[4].append(position)
+        trouves = [position for rang in rangs for position in rang][offset:fin]
+        return [self.produits[position] for position in trouves]
+
+    def tous(self, actifs=True):
+        return [p for p in self.produits if p.est_active or not actifs]
+
+
+registre = VersionedIndex(VERSION_KEY, lambda: IndexProduits.charger())
+
+
+def _invalider(sender, **kwargs):
+    bump_version_on_commit(VERSION_KEY)
+
+
+post_save.connect(_invalider, sender=Produit)
+post_delete.connect(_invalider, sender=Produit)
+
+
+def _fulltext_actif():
+    return (
+        getattr(settings, "PRODUCT_SEARCH_BACKEND", "memory") == "fulltext"
+        and connection.vendor == "mysql"
+    )
+
+
+def _rechercher_fulltext(requete, limit, offset, actifs):
+    termes = normaliser(requete).split()
+    if not termes:
+        return []
+    booleen = " ".join(f"+{terme}*" for terme in termes)
+    produits = Produit.objects.extra(
+        select={"pertinence": "MATCH (nom, code_produit) AGAINST (%s IN BOOLEAN MODE)"},
+        select_params=[booleen],
+        where=["MATCH (nom, code_produit) AGAINST (%s IN BOOLEAN MODE)"],
+        params=[booleen],
+    ).order_by("-pertinence", "nom")
+    if actifs:
+        produits = produits.filter(est_active=True)
+    fin = None if limit is None else offset + limit
+    return [
+        ProduitIndexe(
+            p.pk, p.nom, p.code_produit, p.code_barres, p.prix_vente, p.est_active,
+            "", "", "", "",
+        )
+        for p in produits[offset:fin]
+    ]
+
+
+def rechercher(requete, limit=LIMITE_PAR_DEFAUT, offset=0, actifs=True):
+    """
+    [ProduitIndexe] correspondant à `requete`, classés par pertinence.
+
+    Code exact, puis début de code, début de nom, débuts de mots, et enfin
+    simple inclusion ; à rang égal, ordre alphabétique. `limit=None` pour
+    tous les résultats.
+    """
+    if _fulltext_actif():
+        return _rechercher_fulltext(requete, limit, offset, actifs)
+    return registre.get().rechercher(requete, limit=limit, offset=offset, actifs=actifs)
+
+
+def pagination(params, limit=LIMITE_PAR_DEFAUT, limit_max=100):
+    """(limit, offset) lus dans les paramètres GET, bornés."""
+    try:
+        limit = min(max(int(params.get("limit", limit)), 1), limit_max)
+        offset = max(int(params.get("offset", 0)), 0)
+    except (TypeError, ValueError):
+        offset = 0
+    return limit, offset
+
+
+def produits_indexes(actifs=True):
+    """Tous les produits (actifs) de l'index, par ordre alphabétique."""
+    return registre.get().tous(actifs=actifs)
@@ -7,29 +7,13 @@ from django.dispatch import receiver
 from django.template.loader import render_to_string
 from django.utils import timezone
 
-from .models import Consommation, Stock
+from .models import Stock
 from .models.approvisionnement_interne import DemandeInterne
 from .models.stock import MouvementStock
 
 
-@receiver(post_save, sender=Consommation)
-def mise_a_jour_stock_apres_consommation(sender, instance, created, **kwargs):
-    if created:
-        restant = instance.quantite_consomme
-        # Récupérer les stocks non périmés, triés par date de péremption
-        stocks = Stock.objects.filter(
-            produit=instance.produit,
-            service=instance.service,
-            date_peremption__gte=timezone.now().date(),
-        ).order_by("date_peremption")
-
-        for stock in stocks:
-            if restant <= 0:
-                break
-            a_deduire = min(restant, stock.quantite)
-            stock.quantite -= a_deduire
-            stock.save()
-            restant -= a_deduire
+# Les sorties de stock des consommations passent par pharmacies.allocation
+# (allocation FEFO verrouillée, en bloc), et non plus par un signal.
 
 
 @receiver(post_save, sender=DemandeInterne)
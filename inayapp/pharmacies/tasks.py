@@ -0,0 +1,7 @@
+from celery import shared_task
+from django.core.management import call_command
+
+
+@shared_task
+def refresh_stock_alerts():
+    call_command("refresh_stock_alerts")
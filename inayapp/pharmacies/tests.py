@@ -1,3 +1,196 @@
-from django.test import TestCase
+import random
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from audit.models import AuditConfiguration
+from audit.registry import registry
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.utils import timezone
+from medical.models import Service
+
+from .allocation import (
+    LotEntrant,
+    allouer_fefo,
+    calculer_prelevements,
+    entrer_lots,
+    transferer_fefo,
+)
+from .models import MouvementStock, Produit, Stock
+from .recherche import IndexProduits, ProduitIndexe, normaliser
+
+
+class _Lot:
+    def __init__(self, produit_id, quantite):
+        self.produit_id = produit_id
+        self.quantite = quantite
+
+
+class CalculerPrelevementsTests(SimpleTestCase):
+    def test_premier_perime_premier_sorti(self):
+        lots = [_Lot(1, 10), _Lot(1, 10), _Lot(2, 5)]
+        prelevements, manquants = calculer_prelevements(lots, {1: 15, 2: 5})
+        self.assertEqual(manquants, {})
+        self.assertEqual(
+            [(p.stock, p.quantite) for p in prelevements],
+            [(lots[0], 10), (lots[1], 5), (lots[2], 5)],
+        )
+
+    def test_stock_insuffisant(self):
+        prelevements, manquants = calculer_prelevements([_Lot(1, 4)], {1: 6})
+        self.assertEqual(manquants, {1: (6, 4)})
+
+
+def _produit_indexe(pk, nom, code):
+    nom_normalise, code_normalise = normaliser(nom), normaliser(code)
+    return ProduitIndexe(
+        pk, nom, code, "", 1, True, nom_normalise, code_normalise, "",
+        f" {code_normalise}  {nom_normalise} ",
+    )
+
+
+class IndexProduitsTests(SimpleTestCase):
+    def setUp(self):
+        self.index = IndexProduits(
+            [
+                _produit_indexe(1, "Amoxicilline 500 mg", "PRD-012"),
+                _produit_indexe(2, "Paracétamol 1 g", "PRD-120"),
+                _produit_indexe(3, "Sérum salé", "SRM-001"),
+            ]
+        )
+
+    def _ids(self, requete):
+        return [p.id for p in self.index.rechercher(requete, limit=None)]
+
+    def test_terme_court_inclusion(self):
+        # « 12 » commence le mot « 120 » (rang 3), est inclus dans « 012 » (rang 4)
+        self.assertEqual(self._ids("12"), [2, 1])
+        self.assertEqual(self._ids("ra"), [2])
+
+    def test_terme_court_avec_terme_long(self):
+        self.assertEqual(self._ids("para 1"), [2])
+        self.assertEqual(self._ids("serum 12"), [])
+
+    def test_rang(self):
+        self.assertEqual(self._ids("prd-120"), [2])
+        self.assertEqual(self._ids("prd"), [1, 2])
+
+
+class AllocationConcurrenteTests(TransactionTestCase):
+    """Des allocations parallèles sur les mêmes lots ne vendent jamais deux fois"""
+
+    STOCK_INITIAL = 500
+    THREADS = 8
+
+    def setUp(self):
+        self.service = Service.objects.create(name="Pharmacie concurrence")
+        self.produit = Produit.objects.create(
+            nom="Produit concurrence",
+            code_produit="CONC-FEFO",
+            type_produit=Produit._meta.get_field("type_produit").choices[0][0],
+            prix_achat=1,
+            prix_vente=2,
+        )
+        aujourd_hui = timezone.now().date()
+        Stock.objects.bulk_create(
+            [
+                Stock(
+                    produit=self.produit,
+                    service=self.service,
+                    quantite=self.STOCK_INITIAL // 5,
+                    date_peremption=aujourd_hui + timedelta(days=30 * (lot + 1)),
+                    numero_lot=f"L{lot}",
+                )
+                for lot in range(5)
+            ]
+        )
+
+    @skipUnlessDBFeature("has_select_for_update")
+    def test_pas_de_stock_negatif(self):
+        servi = []
+        erreurs = []
+        verrou = threading.Lock()
+
+        def consommer(graine):
+            rng = random.Random(graine)
+            try:
+                while True:
+                    quantite = rng.randint(1, 9)
+                    try:
+                        allouer_fefo(self.service, [(self.produit.pk, quantite)], self.service)
+                    except ValidationError:
+                        break  # Stock épuisé pour cette demande
+                    with verrou:
+                        servi.append(quantite)
+            except Exception as e:
+                erreurs.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=consommer, args=(i,)) for i in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(erreurs, [])
+        stocks = Stock.objects.filter(produit=self.produit)
+        self.assertFalse(stocks.filter(quantite__lt=0).exists())
+        restant = stocks.aggregate(total=Sum("quantite"))["total"]
+        self.assertEqual(sum(servi) + restant, self.STOCK_INITIAL)
+        sorties = MouvementStock.objects.filter(produit=self.produit).aggregate(
+            total=Sum("quantite")
+        )["total"]
+        self.assertEqual(sorties, sum(servi))
+
+
+class AuditMouvementsEnBlocTests(TestCase):
+    """Les entrées et transferts en bloc sont journalisés comme des save()"""
+
+    def setUp(self):
+        registry.clear()
+        for model in (Stock, MouvementStock):
+            AuditConfiguration.objects.create(content_type=ContentType.objects.get_for_model(model))
+        self.pharmacie = Service.objects.create(name="Pharmacie audit")
+        self.bloc = Service.objects.create(name="Bloc audit")
+        self.produit = Produit.objects.create(
+            nom="Produit audit",
+            code_produit="AUDIT-BLOC",
+            type_produit=Produit._meta.get_field("type_produit").choices[0][0],
+            prix_achat=1,
+            prix_vente=2,
+        )
+        self.peremption = timezone.now().date() + timedelta(days=90)
+
+    def tearDown(self):
+        registry.clear()
+
+    def _journaux(self, fonction, *args):
+        with mock.patch("audit.utils.record") as record:
+            fonction(*args)
+        return [
+            (log.model_name, log.action, log.changes.get("quantite"))
+            for log in (appel.args[0] for appel in record.call_args_list)
+        ]
+
+    def test_entree_et_transfert(self):
+        lot = LotEntrant(self.produit.pk, self.peremption, "A1", 10)
+        self.assertEqual(
+            self._journaux(entrer_lots, self.pharmacie, [lot], self.produit),
+            [("stock", "CREATE", None), ("mouvementstock", "CREATE", None)],
+        )
+        self.assertEqual(
+            self._journaux(
+                transferer_fefo, self.pharmacie, self.bloc, [(self.produit.pk, 4)], self.produit
+            ),
+            [
+                ("stock", "UPDATE", {"old": "10", "new": "6"}),
+                ("mouvementstock", "CREATE", None),
+                ("stock", "CREATE", None),
+                ("mouvementstock", "CREATE", None),
+            ],
+        )
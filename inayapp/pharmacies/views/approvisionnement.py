@@ -18,13 +18,17 @@ from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import (CreateView, DetailView, ListView, UpdateView,
                                   View)
+from inayapp.timeseries import serie
 from medical.models.services import Service
 
+from .. import alertes as alertes_stock
+from ..disponibilite import Disponibilite, disponibilites, service_pharmacie
 from ..models.approvisionnement import (BonReception, CommandeFournisseur,
                                          ExpressionBesoin,
                                         LigneBesoin, LigneCommande,
                                          LigneLivraison,
                                         Livraison)
+from ..models.approvisionnement_interne import DemandeInterne
 from ..models.fournisseur import Fournisseur
 from ..models.produit import Produit
 from ..models.stock import Stock
@@ -608,33 +612,9 @@ class DashboardView(LoginRequiredMixin, View):
         alertes = []
 
 
-        # Stocks faibles - Alternative sans stock_minimum
-        # Option 1: Définir un seuil fixe pour tous les produits
-        SEUIL_STOCK_FAIBLE = 10
-
-        # Calculer le stock total par produit
-        from django.db.models import Sum
-
-        stocks_faibles = (
-            Stock.objects.values("produit")
-            .annotate(total_quantite=Sum("quantite"))
-            .filter(total_quantite__lte=SEUIL_STOCK_FAIBLE, total_quantite__gt=0)
-            .count()
-        )
-        if stocks_faibles > 0:
-            alertes.append(
-                f"{stocks_faibles} produit(s) en stock faible (≤ {SEUIL_STOCK_FAIBLE} unités)"
-            )
-
-        # Stocks épuisés
-        stocks_epuises = (
-            Stock.objects.values("produit")
-            .annotate(total_quantite=Sum("quantite"))
-            .filter(total_quantite=0)
-            .count()
-        )
-        if stocks_epuises > 0:
-            alertes.append(f"{stocks_epuises} produit(s) en rupture de stock")
+        # Stocks faibles, ruptures et péremptions : instantané des alertes
+        compteurs = alertes_stock.resume(today)
+        alertes.extend(alertes_stock.messages(compteurs))
 
         # Top fournisseurs
         from django.db.models import Count, DecimalField, F, Sum
@@ -663,42 +643,30 @@ class DashboardView(LoginRequiredMixin, View):
 
         date_debut = today - timedelta(days=30)
 
-        chart_data = []
-        for i in range(30):
-            date = date_debut + timedelta(days=i)
-            chart_data.append(
-                {
-                    "date": date.strftime("%d/%m"),
-                    "besoins_externes": ExpressionBesoin.objects.filter(
-                        date_creation__date=date, type_approvisionnement="EXTERNE"
-                    ).count(),
-                    "livraisons": Livraison.objects.filter(
-                        date_reception__date=date
-                    ).count(),
-                }
-            )
-
-        # Ajout de statistiques supplémentaires utiles
-        # Produits proches de la péremption (30 jours)
-        date_limite_peremption = today + timedelta(days=30)
-        produits_peremption_proche = Stock.objects.filter(
-            quantite__gt=0,
-            date_peremption__lte=date_limite_peremption,
-            date_peremption__gte=today,
-        ).count()
-
-        if produits_peremption_proche > 0:
-            alertes.append(
-                f"{produits_peremption_proche} lot(s) proche(s) de la péremption (< 30 jours)"
-            )
-
-        # Produits périmés
-        produits_perimes = Stock.objects.filter(
-            quantite__gt=0, date_peremption__lt=today
-        ).count()
+        # Une requête groupée par modèle ; les jours passés restent en cache
+        besoins_externes = serie(
+            ExpressionBesoin.objects.filter(type_approvisionnement="EXTERNE"),
+            "date_creation",
+            date_debut,
+            date_debut + timedelta(days=29),
+            cache_key="pharmacies:besoins_externes",
+        )
+        livraisons = serie(
+            Livraison.objects.all(),
+            "date_reception",
+            date_debut,
+            date_debut + timedelta(days=29),
+            cache_key="pharmacies:livraisons_recues",
+        )
 
-        if produits_perimes > 0:
-            alertes.append(f"⚠️ {produits_perimes} lot(s) périmé(s) en stock !")
+        chart_data = [
+            {
+                "date": besoin["date"].strftime("%d/%m"),
+                "besoins_externes": besoin["count"],
+                "livraisons": livraison["count"],
+            }
+            for besoin, livraison in zip(besoins_externes, livraisons)
+        ]
 
         context = {
             "stats": stats,
@@ -707,8 +675,8 @@ class DashboardView(LoginRequiredMixin, View):
             "top_fournisseurs": top_fournisseurs,
             "alertes": alertes,
             "chart_data": chart_data,
-            "produits_peremption_proche": produits_peremption_proche,
-            "produits_perimes": produits_perimes,
+            "produits_peremption_proche": compteurs["lots_bientot_perimes"],
+            "produits_perimes": compteurs["lots_perimes"],
         }
 
         return context
@@ -719,10 +687,8 @@ class GetStockDisponibleAPIView(LoginRequiredMixin, View):
     def get(self, request, produit_id):
         try:
             produit = get_object_or_404(Produit, pk=produit_id)
-            service_pharmacie = Service.objects.get(est_pharmacie=True)
-
             stock_disponible = Stock.objects.get_stock_disponible(
-                produit=produit, service=service_pharmacie
+                produit=produit, service=service_pharmacie()
             )
 
             return JsonResponse(
@@ -742,25 +708,45 @@ class GetStocksMultiplesAPIView(LoginRequiredMixin, View):
         try:
             data = json.loads(request.body)
             produit_ids = data.get("produit_ids", [])
+            service_ids = data.get("service_ids") or [service_pharmacie().pk]
 
-            service_pharmacie = Service.objects.get(est_pharmacie=True)
-            stocks = {}
+            noms = dict(
+                Produit.objects.filter(pk__in=produit_ids).values_list("pk", "nom")
+            )
+            trouves = [produit_id for produit_id in produit_ids if int(produit_id) in noms]
+            par_couple = disponibilites(trouves, service_ids)
 
+            stocks = {}
             for produit_id in produit_ids:
-                try:
-                    produit = Produit.objects.get(pk=produit_id)
-                    stock_disponible = Stock.objects.get_stock_disponible(
-                        produit=produit, service=service_pharmacie
-                    )
-                    stocks[produit_id] = {
-                        "stock_disponible": stock_disponible,
-                        "produit_nom": produit.nom,
-                    }
-                except Produit.DoesNotExist:
+                if int(produit_id) not in noms:
                     stocks[produit_id] = {
                         "stock_disponible": 0,
                         "produit_nom": "Produit introuvable",
                     }
+                    continue
+                par_service = {
+                    service_id: par_couple[int(produit_id), int(service_id)]
+                    for service_id in service_ids
+                }
+                # Lots de tous les services demandés, dans l'ordre FEFO
+                lots = sorted(
+                    (lot for d in par_service.values() for lot in d.lots),
+                    key=lambda lot: (lot.date_peremption, lot.id),
+                )
+                stocks[produit_id] = {
+                    **Disponibilite(
+                        int(produit_id),
+                        None,
+                        sum(d.quantite for d in par_service.values()),
+                        lots[0].date_peremption if lots else None,
+                        lots,
+                    ).as_dict(),
+                    "produit_nom": noms[int(produit_id)],
+                }
+                if len(service_ids) > 1:
+                    stocks[produit_id]["services"] = {
+                        service_id: d.as_dict() for service_id, d in par_service.items()
+                    }
 
             return JsonResponse({"success": True, "stocks": stocks})
 
@@ -773,10 +759,22 @@ from django.http import JsonResponse
 
 
 def system_alerts_api(request):
-    # Implémentation réelle à compléter
-    return JsonResponse(
-        {"alertes": ["3 produits en stock faible", "1 demande urgente en attente"]}
-    )
+    """Alertes de stock et demandes internes urgentes en attente"""
+    alertes = alertes_stock.alertes_systeme(alertes_stock.resume())
+
+    urgentes = DemandeInterne.objects.filter(
+        statut="EN_ATTENTE", priorite__in=["URGENTE", "CRITIQUE"]
+    ).count()
+    if urgentes:
+        alertes.append(
+            {
+                "type": "urgent",
+                "titre": "Demandes internes",
+                "message": f"{urgentes} demande(s) urgente(s) en attente",
+                "icon": "bell",
+            }
+        )
+    return JsonResponse({"success": True, "alertes": alertes})
 
 
 def menu_stats_api(request):
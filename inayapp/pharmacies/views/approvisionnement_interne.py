@@ -15,6 +15,7 @@ from django.views.decorators.csrf import csrf_exempt
 from ..models.approvisionnement_interne import DemandeInterne, LigneDemandeInterne
 from ..models.produit import Produit
 from ..models.stock import Stock
+from .. import recherche
 from medical.models.services import Service
 
 
@@ -99,6 +100,9 @@ def detail_demande_interne(request, demande_id):
         and user_service == demande.pharmacie
     )
 
+    # Stock pharmacie de toutes les lignes en une requête
+    demande.charger_disponibilites()
+
     context = {
         "demande": demande,
         "can_validate": can_validate,
@@ -314,7 +318,7 @@ def api_stock_disponible(request):
 
     try:
         stock_disponible = Stock.objects.get_stock_disponible(
-            produit_id=produit_id, service_id=service_id
+            produit=int(produit_id), service=int(service_id)
         )
 
         return JsonResponse(
@@ -339,22 +343,16 @@ def api_recherche_produits(request):
     if len(query) < 2:
         return JsonResponse({"produits": []})
 
-    produits = Produit.objects.filter(
-        Q(nom__icontains=query) | Q(code_produit__icontains=query), est_active=True
-    ).order_by("nom")[:20]
-
-    produits_data = []
-    for produit in produits:
-        produits_data.append(
-            {
-                "id": produit.id,
-                "nom": produit.nom,
-                "code": produit.code_produit,
-                "prix_unitaire": (
-                    float(produit.prix_vente) if produit.prix_vente else 0
-                ),
-            }
-        )
+    limit, offset = recherche.pagination(request.GET, limit=20)
+    produits_data = [
+        {
+            "id": produit.id,
+            "nom": produit.nom,
+            "code": produit.code,
+            "prix_unitaire": float(produit.prix_vente) if produit.prix_vente else 0,
+        }
+        for produit in recherche.rechercher(query, limit=limit, offset=offset)
+    ]
 
     return JsonResponse({"produits": produits_data})
 
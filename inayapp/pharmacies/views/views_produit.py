@@ -16,6 +16,7 @@ from django.shortcuts import get_object_or_404
 
 from ..models import Produit
 from ..forms.ph_forms import ProduitForm, ProduitSearchForm
+from .. import recherche
 
 
 class ProduitListView(LoginRequiredMixin, ListView):
@@ -170,14 +171,13 @@ class ProduitAutocompleteView(LoginRequiredMixin, ListView):
         if len(query) < 2:
             return JsonResponse({"results": []})
 
-        produits = Produit.objects.actifs().filter(
-            Q(nom__icontains=query) | Q(code_produit__icontains=query)
-        )[:10]
+        limit, offset = recherche.pagination(request.GET, limit=10)
+        produits = recherche.rechercher(query, limit=limit, offset=offset)
 
         results = [
             {
                 "id": produit.id,
-                "text": f"{produit.code_produit} - {produit.nom}",
+                "text": f"{produit.code} - {produit.nom}",
                 "prix_vente": str(produit.prix_vente),
             }
             for produit in produits
@@ -21,9 +21,13 @@ from django.views.generic import (
 )
 from django.shortcuts import get_object_or_404, redirect
 from django.http import JsonResponse
-from django.db.models import Q, Sum
+from django.db.models import Q
 from ..models import Stock, Produit, AjustementStock, MouvementStock
 from ..forms.ph_forms import StockForm, AjustementStockForm
+from .. import alertes, recherche
+from ..disponibilite import disponibilites_service
+
+MAX_PRODUITS_RECHERCHE = 500
 
 
 class StockListView(LoginRequiredMixin, ListView):
@@ -41,11 +45,16 @@ class StockListView(LoginRequiredMixin, ListView):
         # Filtres de recherche
         search = self.request.GET.get("search")
         if search:
-            queryset = queryset.filter(
-                Q(produit__nom__icontains=search)
-                | Q(produit__code_produit__icontains=search)
-                | Q(service__name__icontains=search)
-            )
+            # Produits trouvés dans l'index (sans accents) ; au-delà de
+            # MAX_PRODUITS_RECHERCHE, le filtre IN coûterait plus que le LIKE
+            produits = recherche.rechercher(search, limit=MAX_PRODUITS_RECHERCHE + 1, actifs=False)
+            if len(produits) > MAX_PRODUITS_RECHERCHE:
+                par_produit = Q(produit__nom__icontains=search) | Q(
+                    produit__code_produit__icontains=search
+                )
+            else:
+                par_produit = Q(produit_id__in=[produit.id for produit in produits])
+            queryset = queryset.filter(par_produit | Q(service__name__icontains=search))
 
         service = self.request.GET.get("service")
         if service:
@@ -76,15 +85,11 @@ class StockListView(LoginRequiredMixin, ListView):
         context["soon_date"] = today + timedelta(days=30)
         context["services"] = Service.objects.all().order_by("name")
 
-        # Statistiques rapides
+        # Statistiques rapides (péremptions lues dans l'instantané des alertes)
+        compteurs = alertes.resume(today)
         context["total_stocks"] = Stock.objects.filter(quantite__gt=0).count()
-        context["stocks_expires"] = Stock.objects.filter(
-            date_peremption__lt=timezone.now().date()
-        ).count()
-        context["stocks_bientot_expires"] = Stock.objects.filter(
-            date_peremption__lte=timezone.now().date() + timezone.timedelta(days=30),
-            date_peremption__gte=timezone.now().date(),
-        ).count()
+        context["stocks_expires"] = compteurs["lots_perimes"]
+        context["stocks_bientot_expires"] = compteurs["lots_bientot_perimes"]
 
         return context
 
@@ -245,21 +250,17 @@ def get_stock_disponible(request):
 
         service = Service.objects.get(pk=service_id)
 
-        stocks = Stock.objects.get_available(produit, service)
-        total_disponible = stocks.aggregate(total=Sum("quantite"))["total"] or 0
+        disponibilite = disponibilites_service([produit], service)[produit.pk]
+        total_disponible = disponibilite.quantite
 
         stocks_data = []
-        for stock in stocks[:5]:  # Limiter à 5 lots
+        for lot in disponibilite.lots[:5]:  # Limiter à 5 lots
             stocks_data.append(
                 {
-                    "id": stock.id,
-                    "quantite": stock.quantite,
-                    "date_peremption": (
-                        stock.date_peremption.strftime("%d/%m/%Y")
-                        if stock.date_peremption
-                        else ""
-                    ),
-                    "numero_lot": stock.numero_lot or "N/A",
+                    "id": lot.id,
+                    "quantite": lot.quantite,
+                    "date_peremption": lot.date_peremption.strftime("%d/%m/%Y"),
+                    "numero_lot": lot.numero_lot or "N/A",
                 }
             )
 
@@ -278,22 +279,25 @@ def stocks_expires_bientot(request):
     dans_jours = int(request.GET.get("jours", 30))
     date_limite = timezone.now().date() + timedelta(days=dans_jours)
 
-    stocks = (
-        Stock.objects.filter(
-            date_peremption__lte=date_limite,
-            date_peremption__gte=timezone.now().date(),
-            quantite__gt=0,
+    # Instantané des alertes, ou lots directement au-delà de son horizon
+    stocks = alertes.lots_expirant(dans_jours)
+    if stocks is None:
+        stocks = (
+            Stock.objects.filter(
+                date_peremption__lte=date_limite,
+                date_peremption__gte=timezone.now().date(),
+                quantite__gt=0,
+            )
+            .select_related("produit", "service")
+            .order_by("date_peremption")
         )
-        .select_related("produit", "service")
-        .order_by("date_peremption")
-    )
 
     data = []
     for stock in stocks:
         jours_restants = (stock.date_peremption - timezone.now().date()).days
         data.append(
             {
-                "id": stock.id,
+                "id": getattr(stock, "stock_id", stock.pk),
                 "produit": stock.produit.nom,
                 "service": stock.service.name,
                 "quantite": stock.quantite,
@@ -0,0 +1,131 @@
+# rh/anviz_fake.py
+"""
+Pointeuse Anviz simulée, pour les essais et benchmarks de synchronisation.
+
+Reproduit les deux endpoints utilisés par `AnvizAPI` (`chklogin` et
+`searchrecord`) avec le même format de réponse (JSON à clés non citées
+entouré de <html>), une latence configurable et un mode « injoignable ».
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def generate_records(anviz_ids, start, days, punches_per_day=2):
+    """Enregistrements triés : `punches_per_day` pointages par employé et par jour."""
+    records = []
+    for day in range(days):
+        base = start + timedelta(days=day)
+        for anviz_id in anviz_ids:
+            for punch in range(punches_per_day):
+                check_time = base + timedelta(hours=8 + 8 * punch, minutes=anviz_id % 50)
+                records.append(
+                    {
+                        "id": str(anviz_id),
+                        "name": f"Employé {anviz_id}",
+                        "time": check_time.strftime("%Y-%m-%d %H:%M:%S"),
+                        "status": "0",
+                    }
+                )
+    records.sort(key=lambda r: r["time"])
+    return records
+
+
+def _render(data):
+    """Encode au format de la pointeuse : {key:"valeur",...} dans <html>."""
+
+    def encode(value):
+        if isinstance(value, dict):
+            return "{" + ",".join(f"{k}:{encode(v)}" for k, v in value.items()) + "}"
+        if isinstance(value, list):
+            return "[" + ",".join(encode(v) for v in value) + "]"
+        if isinstance(value, int):
+            return str(value)
+        return '"' + str(value).replace('"', '\\"') + '"'
+
+    return f"<html>{encode(data)}</html>"
+
+
+class FakeAnvizServer:
+    """Serveur HTTP local simulant une pointeuse, lancé dans un thread."""
+
+    def __init__(self, records=None, latency=0.0, unreachable=False, host="127.0.0.1"):
+        self.records = records or []
+        self.latency = latency
+        self.unreachable = unreachable
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.requests += 1
+                if server.unreachable:
+                    # Simule une pointeuse qui ne répond jamais dans les délais
+                    time.sleep(3600)
+                    return
+                if server.latency:
+                    time.sleep(server.latency)
+
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                if url.path.endswith("/chklogin"):
+                    body = _render({"code": "success", "session_key": "1"})
+                elif url.path.endswith("/searchrecord"):
+                    body = _render({"record": server.search(params)})
+                else:
+                    self.send_error(404)
+                    return
+
+                payload = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self.httpd = ThreadingHTTPServer((host, 0), Handler)
+        self.httpd.daemon_threads = True
+        self.host, self.port = self.httpd.server_address
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def search(self, params):
+        start = int(params.get("start", 0))
+        limit = int(params.get("limit", 15))
+        from_date = params.get("from") or "0000-00-00"
+        to_date = params.get("to") or "9999-99-99"
+        window = [r for r in self.records if from_date <= r["time"][:10] <= to_date]
+        return window[start : start + limit]
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def start_fake_devices(count, anviz_ids, start=None, days=7, latency=0.0, unreachable=0):
+    """Démarre `count` pointeuses simulées ; les `unreachable` dernières ne répondent pas."""
+    start = start or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
+    servers = []
+    for index in range(count):
+        servers.append(
+            FakeAnvizServer(
+                records=generate_records(anviz_ids[index::count], start, days),
+                latency=latency,
+                unreachable=index >= count - unreachable,
+            ).start()
+        )
+    return servers
@@ -9,6 +9,7 @@ from django.core.exceptions import ObjectDoesNotExist
 from django.core.management import CommandError
 from .models import AnvizConfiguration, Pointage
 from django.db.models import Max
+from django.utils import timezone
 
 
 def get_last_attendance_sync_date():
@@ -29,8 +30,30 @@ def get_last_attendance_sync_date():
     return last_sync
 
 
+def get_device_sync_window(config):
+    """
+    Fenêtre (from_date, to_date, start) propre à une pointeuse.
+
+    Repart du jour du dernier pointage importé depuis cette pointeuse ; si la
+    fenêtre est inchangée depuis la dernière synchronisation, reprend à la
+    dernière page lue au lieu de relire tout le jour.
+    """
+    today = date.today()
+    if config.last_record_time is None:
+        from_date = date.fromisoformat(get_last_attendance_sync_date())
+    else:
+        from_date = timezone.localtime(config.last_record_time).date()
+
+    start = config.last_page_start if config.sync_from_date == from_date else 0
+    return from_date, today, start
+
+
+class AnvizError(Exception):
+    """Page d'enregistrements illisible (réseau, session ou réponse invalide)"""
+
+
 class AnvizAPI:
-    def __init__(self, config=None):
+    def __init__(self, config=None, timeout=5):
         # Récupération de la configuration depuis la base de données
         if config is None:
             try:
@@ -58,7 +81,11 @@ class AnvizAPI:
         self.password = config.password
         self.session_timeout = config.session_timeout
 
-        self.base_url = f"http://{self.ip}/goform"
+        self.port = getattr(config, "port", 80) or 80
+        self.timeout = timeout
+
+        host = self.ip if self.port == 80 else f"{self.ip}:{self.port}"
+        self.base_url = f"http://{host}/goform"
         self.session = requests.Session()
         self.session_key = None
 
@@ -75,7 +102,7 @@ class AnvizAPI:
                     'userid': self.username,
                     'password': self.password
                 },
-                timeout=5
+                timeout=self.timeout
             )
             response.raise_for_status()
             # Nettoyer la réponse (retirer <html> et </html>)
@@ -122,7 +149,7 @@ class AnvizAPI:
                 "Referer": f"{self.base_url}/advance/index.html"
             }
 
-            response = self.session.get(users_url, params=params, headers=headers, timeout=5)
+            response = self.session.get(users_url, params=params, headers=headers, timeout=self.timeout)
             response.raise_for_status()
 
             # Nettoyage de la réponse en retirant les balises HTML
@@ -137,20 +164,25 @@ class AnvizAPI:
             print(f"Erreur d'analyse JSON lors de la récupération des utilisateurs : {e}")
             return []
 
-    def get_attendances(self, start=0, limit=100):
-        """Récupère la liste des enregistrements d'attendances depuis l'appareil"""
+    def get_attendances(self, start=0, limit=100, from_date=None, to_date=None):
+        """
+        Récupère la liste des enregistrements d'attendances depuis l'appareil.
+
+        `from_date`/`to_date` (AAAA-MM-JJ) doivent être calculés une fois par
+        synchronisation ; à défaut, la fenêtre est recalculée à chaque page.
+        Lève `AnvizError` si la page n'a pas pu être lue : une liste vide
+        signifie toujours qu'il n'y a plus d'enregistrements.
+        """
         if not self.session_key:
             if not self.login():
-                return []
+                raise AnvizError("Échec de connexion à la pointeuse")
 
         try:
-
-            from_date = (
-                get_last_attendance_sync_date()
-            )  # Date de dernière synchronisation des enregistrements d'attendance
-
-            today = date.today()  # Date de fin pour la recherche  
-            to_date = today.strftime("%Y-%m-%d")
+            if from_date is None:
+                # Date de dernière synchronisation des enregistrements d'attendance
+                from_date = get_last_attendance_sync_date()
+            if to_date is None:
+                to_date = date.today().strftime("%Y-%m-%d")
 
             attendances_url = f"{self.base_url}/searchrecord"
             params = {
@@ -158,6 +190,7 @@ class AnvizAPI:
                 'limit': limit,
                 'from': from_date,
                 'to': to_date,
+                'order': 'asc',
                 'session_id': self.username,
                 'session_key': self.session_key,
                 't': self._get_timestamp()
@@ -167,7 +200,7 @@ class AnvizAPI:
                 "X-Requested-With": "XMLHttpRequest",
                 "Referer": f"{self.base_url}/advance/index.html",
             }
-            response = self.session.get(attendances_url, params=params, headers=headers, timeout=5)
+            response = self.session.get(attendances_url, params=params, headers=headers, timeout=self.timeout)
 
             response.raise_for_status()
 
@@ -179,11 +212,11 @@ class AnvizAPI:
             # On suppose que les enregistrements se trouvent dans la clé "record"
             return data.get('record', [])
         except requests.exceptions.RequestException as e:
-            print(f"Erreur lors de la récupération des attendances : {e}")
-            return []
+            raise AnvizError(f"Erreur lors de la récupération des attendances : {e}") from e
         except ValueError as e:
-            print(f"Erreur d'analyse JSON lors de la récupération des attendances : {e}")
-            return []
+            raise AnvizError(
+                f"Erreur d'analyse JSON lors de la récupération des attendances : {e}"
+            ) from e
 
 
 # http://192.168.10.250/goform/userlist?start=0&limit=15&session_id=admin&session_key=1636275619&t=1744300074269
@@ -0,0 +1,742 @@
+# rh/attendance_engine.py
+"""
+Moteur de calcul des présences.
+
+Toutes les fonctions de classification / appariement des pointages sont pures :
+elles travaillent sur des listes de `Pointage` déjà chargées. `AttendanceEngine`
+charge en une seule passe les pointages de tous les employés d'une page et de
+toute la période, les regroupe en mémoire par (employé, jour), puis calcule
+paires, heures supplémentaires, retards et absences sans requête par jour.
+"""
+from collections import defaultdict
+from datetime import datetime
+from datetime import time as datetime_time
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import (DemandeHeuresSupplementaires, IRGBracket, JourFerie,
+                     Pointage, SalaryAdvanceRequest, ShiftType)
+
+
+def format_duration(seconds):
+    """Formate une durée (en secondes) au format 'XhYY'. Retourne '-' si la durée est négative ou nulle."""
+    if seconds <= 0:
+        return "-"
+    hours = int(seconds / 3600)
+    minutes = int((seconds % 3600) / 60)
+    return f"{hours}h {minutes:02d}m"
+
+
+def format_minutes(seconds):
+    """Formate une durée (en secondes) en minutes suivie de ' min'."""
+    minutes = int(seconds / 60)
+    return f"{minutes} min" if minutes > 0 else "-"
+
+
+def local_date(check_time):
+    """Jour local d'un pointage (identique au lookup `check_time__date`)."""
+    return timezone.localtime(check_time).date()
+
+
+# ---------------------------------------------------------------------------
+# Classification et appariement (fonctions pures)
+# ---------------------------------------------------------------------------
+
+
+def pair_attendances(attendances_today, attendances_tomorrow, employee, current_date):
+    """
+    Classe les pointages du jour (et du lendemain si fournis) selon le ShiftType
+    de l'employé et construit les paires (entrée, sortie).
+    """
+    if not employee.shift_type:
+        return [], [], []
+
+    shift_type = employee.shift_type
+
+    # Obtenir les horaires pour aujourd'hui
+    hs, he = shift_type.get_hours_for_date(current_date, employee)
+
+    if hs is None or he is None:
+        return [], [], []  # Jour de repos
+
+    # Override avec les horaires de référence manuels si définis
+    ref_start = getattr(employee, "reference_start", None) or hs
+    ref_end = getattr(employee, "reference_end", None) or he
+
+    is_night = shift_type.is_night_shift or shift_type.is_cross_midnight_shift()
+
+    # Fusionner et trier tous les pointages
+    all_recs = sorted(
+        list(attendances_today) + list(attendances_tomorrow),
+        key=lambda x: x.check_time,
+    )
+
+    if not all_recs:
+        return [], [], []
+
+    # Filtrage global des rebonds
+    all_recs = filter_bounces_global(all_recs, min_interval_minutes=120)
+
+    if not all_recs:
+        return [], [], []
+
+    # Classification selon le type de shift
+    entries, exits = classify_attendances_by_shift_type(
+        all_recs, shift_type, employee, current_date, ref_start, ref_end
+    )
+
+    # Appliquer le filtrage spécifique des rebonds
+    entries = filter_bounces(entries, shift_type.entry_tolerance_minutes)
+    exits = filter_bounces(exits, shift_type.exit_tolerance_minutes)
+
+    # Appariage des entrées et sorties
+    pairs = create_entry_exit_pairs(
+        entries, exits, employee, current_date, ref_start, ref_end, is_night
+    )
+
+    return pairs, entries, exits
+
+
+def should_load_tomorrow_attendances(
+    shift_type, employee, current_date, next_date, is_night
+):
+    """Détermine s'il faut charger les pointages du lendemain"""
+    if is_night or shift_type.is_cross_midnight_shift():
+        return True
+
+    if shift_type.category == ShiftType.ROTATING:
+        # Vérifier si demain est aussi un jour travaillé
+        hs_tomorrow, he_tomorrow = shift_type.get_hours_for_date(next_date, employee)
+        return hs_tomorrow is not None and he_tomorrow is not None
+
+    if shift_type.category == ShiftType.FLEXIBLE:
+        return True  # Pour les horaires flexibles, toujours charger
+
+    return False
+
+
+def needs_tomorrow(employee, current_date):
+    """Indique si l'appariement du jour doit inclure les pointages du lendemain."""
+    shift_type = employee.shift_type
+    if not shift_type:
+        return False
+
+    hs, he = shift_type.get_hours_for_date(current_date, employee)
+    if hs is None or he is None:
+        return False
+
+    is_night = shift_type.is_night_shift or shift_type.is_cross_midnight_shift()
+    return should_load_tomorrow_attendances(
+        shift_type, employee, current_date, current_date + timedelta(days=1), is_night
+    )
+
+
+def classify_attendances_by_shift_type(
+    all_recs, shift_type, employee, current_date, ref_start, ref_end
+):
+    """Classifie les pointages selon le type de shift"""
+    entries = []
+    exits = []
+
+    if (
+        shift_type.category == ShiftType.FIXED
+        and not shift_type.is_night_shift
+        and not shift_type.is_cross_midnight_shift()
+    ):
+        # FIXED jour classique → alternance simple
+        for i, rec in enumerate(all_recs):
+            if i % 2 == 0:
+                entries.append(rec)
+            else:
+                exits.append(rec)
+
+    else:
+        # Classification par fenêtres temporelles (pour ROTATING, FLEXIBLE, CUSTOM, et shifts de nuit)
+        entries, exits = classify_by_time_windows(
+            all_recs, shift_type, current_date, ref_start, ref_end
+        )
+
+    return entries, exits
+
+
+def classify_by_time_windows(all_recs, shift_type, current_date, ref_start, ref_end):
+    """Classification par fenêtres temporelles"""
+    entries = []
+    exits = []
+
+    next_date = current_date + timedelta(days=1)
+    is_night = shift_type.is_night_shift or shift_type.is_cross_midnight_shift()
+
+    # Définir les bornes de temps de référence
+    start_dt = timezone.make_aware(datetime.combine(current_date, ref_start))
+
+    if is_night:
+        end_dt = timezone.make_aware(datetime.combine(next_date, ref_end))
+    else:
+        end_dt = timezone.make_aware(datetime.combine(current_date, ref_end))
+
+    # Tolérance personnalisable
+    entry_tolerance = timedelta(minutes=shift_type.entry_tolerance_minutes)
+    exit_tolerance = timedelta(minutes=shift_type.exit_tolerance_minutes)
+
+    # Point milieu pour la classification temporelle
+    mid_time = start_dt + (end_dt - start_dt) / 2
+
+    for rec in all_recs:
+        # Fenêtres de tolérance
+        in_entry_window = (
+            (start_dt - entry_tolerance)
+            <= rec.check_time
+            <= (start_dt + entry_tolerance)
+        )
+        in_exit_window = (
+            (end_dt - exit_tolerance) <= rec.check_time <= (end_dt + exit_tolerance)
+        )
+
+        if in_entry_window and not in_exit_window:
+            entries.append(rec)
+        elif in_exit_window and not in_entry_window:
+            exits.append(rec)
+        elif in_entry_window and in_exit_window:
+            # Dans les deux fenêtres, choisir la plus proche
+            time_to_start = abs((rec.check_time - start_dt).total_seconds())
+            time_to_end = abs((rec.check_time - end_dt).total_seconds())
+
+            if time_to_start <= time_to_end:
+                entries.append(rec)
+            else:
+                exits.append(rec)
+        else:
+            # Classification temporelle basique
+            if rec.check_time < mid_time:
+                entries.append(rec)
+            else:
+                exits.append(rec)
+
+    return entries, exits
+
+
+def filter_bounces_global(pointages_list, min_interval_minutes=240):
+    """Filtre les pointages successifs trop rapprochés sur tous les pointages"""
+    return filter_bounces(pointages_list, min_interval_minutes)
+
+
+def filter_bounces(pointages_list, min_interval_minutes):
+    """Filtre les pointages successifs trop rapprochés"""
+    if not pointages_list:
+        return []
+
+    sorted_pointages = sorted(pointages_list, key=lambda x: x.check_time)
+    filtered = [sorted_pointages[0]]
+
+    for pointage in sorted_pointages[1:]:
+        last_time = filtered[-1].check_time
+        time_diff = (pointage.check_time - last_time).total_seconds() / 60
+
+        if time_diff >= min_interval_minutes:
+            filtered.append(pointage)
+
+    return filtered
+
+
+def create_entry_exit_pairs(
+    entries, exits, employee, current_date, ref_start, ref_end, is_night
+):
+    """Crée les paires entrée/sortie"""
+    pairs = []
+    used_exits = set()
+
+    next_date = current_date + timedelta(days=1)
+
+    # Cutoff pour les postes de nuit
+    cutoff_next_day = (
+        timezone.make_aware(datetime.combine(next_date, ref_start))
+        if is_night
+        else None
+    )
+
+    for entry in entries:
+        matched_exit = None
+
+        # Chercher une sortie après cette entrée
+        for exit_rec in exits:
+            if exit_rec.check_time > entry.check_time and exit_rec.id not in used_exits:
+
+                # Pour les postes de nuit, vérifier le cutoff
+                if (
+                    is_night
+                    and cutoff_next_day
+                    and exit_rec.check_time > cutoff_next_day
+                ):
+                    continue
+
+                matched_exit = exit_rec
+                break
+
+        # Si pas de sortie trouvée, créer une sortie factice
+        if not matched_exit:
+            theoretical_exit_time = calculate_theoretical_exit_time(
+                entry, ref_end, current_date, next_date, is_night
+            )
+
+            matched_exit = SimpleNamespace(
+                check_time=theoretical_exit_time,
+                id=None,
+                employee=employee,
+            )
+
+        pairs.append((entry, matched_exit))
+        if hasattr(matched_exit, "id") and matched_exit.id:
+            used_exits.add(matched_exit.id)
+
+    return pairs
+
+
+def calculate_theoretical_exit_time(entry, ref_end, current_date, next_date, is_night):
+    """Calcule l'heure de sortie théorique"""
+    theoretical_exit_time = entry.check_time.replace(
+        hour=ref_end.hour, minute=ref_end.minute, second=0, microsecond=0
+    )
+
+    # Pour les postes de nuit ou shifts qui traversent minuit
+    if is_night:
+        if entry.check_time.date() == current_date:
+            theoretical_exit_time = theoretical_exit_time.replace(
+                year=next_date.year, month=next_date.month, day=next_date.day
+            )
+
+    # Ajuster si nécessaire (par exemple, retirer du temps pour éviter les chevauchements)
+    theoretical_exit_time -= timedelta(hours=4)
+
+    return theoretical_exit_time
+
+
+# ---------------------------------------------------------------------------
+# Indicateurs journaliers (fonctions pures)
+# ---------------------------------------------------------------------------
+
+
+def get_employee_schedule(employee, date):
+    """
+    Récupère les horaires de travail pour un employé à une date donnée.
+    Prend en compte le ShiftType s'il existe, sinon utilise les horaires de référence.
+    """
+    if employee.shift_type:
+        start_time, end_time = employee.shift_type.get_hours_for_date(date, employee)
+        if start_time and end_time:
+            return start_time, end_time
+
+    # Fallback vers les horaires de référence de l'employé
+    ref_start = employee.reference_start or datetime_time(8, 0)
+    ref_end = employee.reference_end or datetime_time(16, 0)
+    return ref_start, ref_end
+
+
+def is_working_day(employee, date, holidays):
+    """
+    Détermine si un employé doit travailler un jour donné selon son ShiftType.
+    """
+    is_holiday = date in holidays
+    is_weekend = date.weekday() in [4, 5]  # Samedi=5, Dimanche=6
+
+    if employee.shift_type:
+
+        # Vérifier d'abord si l'employé a des horaires définis pour ce jour
+        start_time, end_time = employee.shift_type.get_hours_for_date(date, employee)
+        has_schedule = start_time is not None and end_time is not None
+
+        # Si pas d'horaires définis pour ce jour, pas de travail
+        if not has_schedule:
+            return False
+
+        # Si le ShiftType ne considère PAS les week-ends et jours fériés comme travaillables
+        if employee.shift_type.considers_weekends_holidays and (
+            is_holiday or is_weekend
+        ):
+            return False
+
+        # Si on arrive ici, l'employé a des horaires et le jour est potentiellement travaillable
+        return True
+
+    # Logique par défaut : pas de travail les week-ends et jours fériés
+    return not (is_holiday or is_weekend)
+
+
+def calculer_heures_reference(pairs, employee, current_date, ref_start, ref_end):
+    """Calcule le temps de travail effectif dans les heures de référence"""
+    # Création des datetime objects pour la plage de référence
+    ref_start_naive = datetime.combine(current_date, ref_start)
+    ref_end_naive = datetime.combine(current_date, ref_end)
+
+    # Gestion des horaires de nuit (fin avant début)
+    if ref_end < ref_start:
+        ref_end_naive += timedelta(days=1)
+
+    # Conversion en objets conscients du fuseau horaire
+    ref_start_dt = timezone.make_aware(ref_start_naive)
+    ref_end_dt = timezone.make_aware(ref_end_naive)
+
+    total_seconds_w = 0
+
+    for entry, exit_time in pairs:
+        if not exit_time:
+            continue
+
+        # Déterminer les limites effectives
+        debut_effectif = max(entry.check_time, ref_start_dt)
+        fin_effective = min(exit_time.check_time, ref_end_dt)
+
+        # Calculer la durée dans la plage de référence
+        if fin_effective > debut_effectif:
+            duree = (fin_effective - debut_effectif).total_seconds()
+            total_seconds_w += duree
+
+    return total_seconds_w
+
+
+def calculer_retard(pairs, employee, date, is_holiday, is_weekend, ref_start):
+    """Calcule le retard en secondes sur la première entrée"""
+    if not pairs or not ref_start:
+        return 0
+
+    if is_holiday or is_weekend:
+        return 0
+
+    ref_entry = timezone.make_aware(datetime.combine(date, ref_start))
+    first_entry = pairs[0][0].check_time
+
+    return (
+        max((first_entry - ref_entry).total_seconds(), 0)
+        if first_entry > ref_entry
+        else 0
+    )
+
+
+def calculer_depart_anticipe(pairs, employee, date, ref_end):
+    """Calcule le départ anticipé en secondes sur la dernière sortie"""
+    if not pairs or not ref_end:
+        return 0
+
+    # Gestion des horaires de nuit
+    ref_exit_date = date
+    if ref_end < (employee.reference_start or datetime_time(8, 0)):
+        ref_exit_date = date + timedelta(days=1)
+
+    ref_exit = timezone.make_aware(datetime.combine(ref_exit_date, ref_end))
+    last_time = pairs[-1][1].check_time
+
+    return max((ref_exit - last_time).total_seconds(), 0) if last_time < ref_exit else 0
+
+
+def calculer_heures_sup(pairs, current_date, ref_start, ref_end):
+    """Retourne (heures sup. de début, heures sup. de fin) en secondes."""
+    early_overtime = 0
+    late_overtime = 0
+
+    for entry, exit_point in pairs:
+        entry_time = entry.check_time.time()
+
+        # Heures supplémentaires en début de journée
+        if entry_time < ref_start:
+            entry_dt = datetime.combine(current_date, entry_time)
+            ref_start_dt = datetime.combine(current_date, ref_start)
+            early_overtime += (ref_start_dt - entry_dt).total_seconds()
+
+        # Heures supplémentaires en fin de journée (seulement pour les vrais objets Pointage)
+        if isinstance(exit_point, Pointage):
+            exit_time = exit_point.check_time.time()
+            exit_date = exit_point.check_time.date()
+
+            # Gérer les horaires de nuit qui s'étendent sur le jour suivant
+            if ref_end < ref_start:  # Horaire de nuit
+                if exit_date == current_date:
+                    # Si la sortie est le même jour et avant minuit
+                    if exit_time > ref_start:  # Après l'heure de début
+                        ref_end_dt = datetime.combine(
+                            current_date + timedelta(days=1), ref_end
+                        )
+                        exit_dt = datetime.combine(
+                            current_date + timedelta(days=1), exit_time
+                        )
+                    else:
+                        ref_end_dt = datetime.combine(current_date, ref_end)
+                        exit_dt = datetime.combine(current_date, exit_time)
+                else:
+                    # Sortie le jour suivant
+                    ref_end_dt = datetime.combine(exit_date, ref_end)
+                    exit_dt = datetime.combine(exit_date, exit_time)
+            else:
+                # Horaire normal
+                ref_end_dt = datetime.combine(current_date, ref_end)
+                exit_dt = datetime.combine(exit_date, exit_time)
+
+            if exit_dt > ref_end_dt:
+                late_overtime += (exit_dt - ref_end_dt).total_seconds()
+
+    return early_overtime, late_overtime
+
+
+def validate_overtime(demande, overtime_seconds):
+    """Part des heures sup. couverte par une demande approuvée (en secondes)."""
+    if overtime_seconds <= 0 or demande is None:
+        return 0
+    heures_approuvees_sec = float(demande.nombre_heures) * 3600
+    return min(overtime_seconds, heures_approuvees_sec)
+
+
+def compute_day(current_date, employee, holidays, attendances, attendances_tomorrow=(), demande=None):
+    """
+    Calcule les données d'un jour pour un employé à partir de pointages déjà chargés.
+
+    `attendances` sont les pointages du jour, `attendances_tomorrow` ceux du
+    lendemain (utilisés seulement si le shift l'exige) et `demande` la demande
+    d'heures supplémentaires approuvée couvrant ce jour, s'il y en a une.
+    """
+    is_holiday = current_date in holidays
+    is_weekend = current_date.weekday() in [4, 5]  # Samedi=5, Dimanche=6
+    is_expected_work_day = is_working_day(employee, current_date, holidays)
+
+    # Récupérer les horaires pour ce jour
+    ref_start, ref_end = get_employee_schedule(employee, current_date)
+
+    attendances = list(attendances)
+    if not needs_tomorrow(employee, current_date):
+        attendances_tomorrow = ()
+
+    # Classification des pointages
+    pairs, entries, exits = pair_attendances(
+        attendances, attendances_tomorrow, employee, current_date
+    )
+
+    early_overtime, late_overtime = calculer_heures_sup(
+        pairs, current_date, ref_start, ref_end
+    )
+    overtime_seconds = early_overtime + late_overtime
+    has_attendances = bool(attendances)
+
+    validated_overtime = 0
+    total_seconds_w = 0
+    if employee.shift_type:
+        if employee.shift_type.considers_weekends_holidays and (
+            is_holiday or is_weekend or not is_expected_work_day
+        ):
+            # Pour les jours non-travaillés normalement, toutes les heures sont supplémentaires
+            total_overtime = sum(
+                (exit_point.check_time - entry.check_time).total_seconds()
+                for entry, exit_point in pairs
+                if isinstance(exit_point, Pointage)
+            )
+            validated_overtime = validate_overtime(demande, total_overtime)
+        else:
+            # Jour de travail normal
+            total_seconds_w = calculer_heures_reference(
+                pairs, employee, current_date, ref_start, ref_end
+            )
+            validated_overtime = validate_overtime(demande, overtime_seconds)
+
+    late_seconds = calculer_retard(
+        pairs, employee, current_date, is_holiday, is_weekend, ref_start
+    )
+    early_leave_seconds = calculer_depart_anticipe(
+        pairs, employee, current_date, ref_end
+    )
+
+    return {
+        "date": current_date,
+        "is_holiday": is_holiday,
+        "is_holiday_worked": is_holiday and not is_weekend and has_attendances,
+        "is_holiday_weekday": is_holiday and not is_weekend,
+        "is_weekend": is_weekend,
+        "is_expected_work_day": is_expected_work_day,
+        "shift_start": ref_start,
+        "shift_end": ref_end,
+        "pairs": pairs,
+        "total_seconds_w": total_seconds_w,
+        "pointages": attendances,
+        "total": format_duration(total_seconds_w),
+        "overtime_seconds": overtime_seconds,
+        "overtime": format_duration(overtime_seconds),
+        "early_overtime": format_duration(early_overtime),
+        "late_overtime": format_duration(late_overtime),
+        "early_overtime_seconds": early_overtime / 3600,
+        "late_overtime_seconds": late_overtime / 3600,
+        "late_seconds": late_seconds,
+        "late_minutes": format_minutes(late_seconds),
+        "early_leave_seconds": early_leave_seconds,
+        "early_leave_minutes": format_minutes(early_leave_seconds),
+        "is_absent": not has_attendances and is_expected_work_day,
+        "entries": [e.check_time.time().strftime("%H:%M") for e in entries],
+        "exits": [x.check_time.time().strftime("%H:%M") for x in exits],
+        "validated_overtime": validated_overtime,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Moteur batch
+# ---------------------------------------------------------------------------
+
+
+class AttendanceEngine:
+    """
+    Calcule les présences d'un ensemble d'employés sur une période
+    avec un nombre constant de requêtes.
+
+    Les employés doivent être chargés avec `select_related("shift_type")`
+    (ou via `Personnel.objects.select_related("employee__shift_type")`).
+    """
+
+    def __init__(self, employees, start_date, end_date, holidays=None):
+        self.employees = [e for e in employees if e is not None]
+        self.start_date = start_date
+        self.end_date = end_date
+        self.holidays = set(holidays) if holidays is not None else None
+        self._punches = defaultdict(list)
+        self._demandes = defaultdict(list)
+        self._advances = {}
+        self._monthly_advances = {}
+        self._irg_brackets = None
+        self._loaded = False
+
+    @classmethod
+    def for_personnels(cls, personnels, start_date, end_date, holidays=None):
+        return cls(
+            [p.employee for p in personnels if p.employee_id],
+            start_date,
+            end_date,
+            holidays,
+        )
+
+    def _personnel_ids(self):
+        ids = []
+        for employee in self.employees:
+            personnel = getattr(employee, "personnel", None)
+            if personnel is not None:
+                ids.append(personnel.pk)
+        return ids
+
+    def load(self):
+        """Charge pointages, jours fériés et demandes approuvées en une requête chacun."""
+        if self._loaded:
+            return self
+
+        employee_ids = [e.pk for e in self.employees]
+        personnel_ids = self._personnel_ids()
+
+        if self.holidays is None:
+            self.holidays = set(
+                JourFerie.objects.filter(
+                    date__range=(self.start_date, self.end_date)
+                ).values_list("date", flat=True)
+            )
+
+        # Le lendemain de la période est inclus pour les postes de nuit
+        punches = (
+            Pointage.objects.filter(
+                employee_id__in=employee_ids,
+                check_time__date__range=(
+                    self.start_date,
+                    self.end_date + timedelta(days=1),
+                ),
+            )
+            .only("id", "employee_id", "check_time")
+            .order_by("employee_id", "check_time")
+        )
+        for punch in punches:
+            self._punches[(punch.employee_id, local_date(punch.check_time))].append(
+                punch
+            )
+
+        if personnel_ids:
+            # L'ordre par défaut (-created_at) reproduit le `.first()` historique
+            demandes = DemandeHeuresSupplementaires.objects.filter(
+                personnel_demandeur_id__in=personnel_ids,
+                statut="approuvee",
+                date_debut__date__lte=self.end_date,
+                date_fin__date__gte=self.start_date,
+            )
+            for demande in demandes:
+                self._demandes[demande.personnel_demandeur_id].append(demande)
+
+        self._loaded = True
+        return self
+
+    def punches_for(self, employee, day):
+        self.load()
+        return self._punches.get((employee.pk, day), [])
+
+    def approved_demande(self, personnel, day):
+        """Demande d'heures sup. approuvée couvrant `day` (la plus récente)."""
+        if personnel is None:
+            return None
+        for demande in self._demandes.get(personnel.pk, []):
+            if local_date(demande.date_debut) <= day <= local_date(demande.date_fin):
+                return demande
+        return None
+
+    def compute_day(self, employee, day):
+        self.load()
+        return compute_day(
+            day,
+            employee,
+            self.holidays,
+            self.punches_for(employee, day),
+            self.punches_for(employee, day + timedelta(days=1)),
+            self.approved_demande(getattr(employee, "personnel", None), day),
+        )
+
+    def compute_days(self, employee):
+        """Liste des données journalières de `employee` sur toute la période."""
+        self.load()
+        days = []
+        current_date = self.start_date
+        while current_date <= self.end_date:
+            days.append(self.compute_day(employee, current_date))
+            current_date += timedelta(days=1)
+        return days
+
+    # --- Données salariales groupées -------------------------------------
+
+    def load_salary_data(self, config):
+        """Charge en bloc les avances et les tranches IRG nécessaires à la paie."""
+        personnel_ids = self._personnel_ids()
+        approved = SalaryAdvanceRequest.objects.filter(
+            personnel_id__in=personnel_ids,
+            status=SalaryAdvanceRequest.RequestStatus.APPROVED,
+        )
+        self._advances = dict(
+            approved.filter(
+                payment_date__gte=self.start_date, payment_date__lte=self.end_date
+            )
+            .values("personnel_id")
+            .annotate(total=Sum("amount"))
+            .values_list("personnel_id", "total")
+        )
+        self._monthly_advances = dict(
+            approved.filter(
+                payment_date__month=self.start_date.month,
+                payment_date__year=self.start_date.year,
+            )
+            .values("personnel_id")
+            .annotate(total=Sum("amount"))
+            .values_list("personnel_id", "total")
+        )
+        self._irg_brackets = (
+            list(IRGBracket.objects.filter(config=config).order_by("min_amount"))
+            if config.pk
+            else []
+        )
+        return self
+
+    def advances_for(self, personnel):
+        return self._advances.get(personnel.pk) or Decimal(0)
+
+    def monthly_advances_for(self, personnel):
+        return self._monthly_advances.get(personnel.pk) or Decimal("0.00")
+
+    @property
+    def irg_brackets(self):
+        return self._irg_brackets
@@ -0,0 +1,239 @@
+# rh/attendance_summary.py
+"""
+Maintenance incrémentale de la table `DailyAttendanceSummary`.
+
+Le rapport de pointage et la paie lisent ces lignes au lieu de rejouer
+l'appariement des pointages à chaque requête. Seuls les jours touchés par un
+import, un jour férié ou une demande d'heures supplémentaires sont recalculés ;
+les jours jamais calculés le sont à la première lecture.
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from django.db import transaction
+from django.utils import timezone
+
+from .attendance_engine import AttendanceEngine, format_duration, format_minutes
+from .models import DailyAttendanceSummary, Employee, Pointage
+
+logger = logging.getLogger(__name__)
+
+
+def date_range(start_date, end_date):
+    current = start_date
+    while current <= end_date:
+        yield current
+        current += timedelta(days=1)
+
+
+def summary_from_day(employee, day):
+    """Convertit le dictionnaire produit par `compute_day` en ligne de résumé."""
+    return DailyAttendanceSummary(
+        employee=employee,
+        date=day["date"],
+        pairs=[
+            [
+                entry.check_time.isoformat(),
+                exit_point.check_time.isoformat(),
+                isinstance(exit_point, Pointage),
+            ]
+            for entry, exit_point in day["pairs"]
+        ],
+        entries=day["entries"],
+        exits=day["exits"],
+        punch_count=len(day["pointages"]),
+        shift_start=day["shift_start"],
+        shift_end=day["shift_end"],
+        is_holiday=day["is_holiday"],
+        is_weekend=day["is_weekend"],
+        is_expected_work_day=day["is_expected_work_day"],
+        is_absent=day["is_absent"],
+        worked_seconds=day["total_seconds_w"],
+        early_overtime_seconds=day["early_overtime_seconds"] * 3600,
+        late_overtime_seconds=day["late_overtime_seconds"] * 3600,
+        late_seconds=day["late_seconds"],
+        early_leave_seconds=day["early_leave_seconds"],
+        validated_overtime_seconds=day["validated_overtime"],
+    )
+
+
+def day_from_summary(summary):
+    """Reconstruit le dictionnaire journalier attendu par le rapport."""
+    pairs = [
+        (
+            SimpleNamespace(check_time=datetime.fromisoformat(entry), id=None),
+            SimpleNamespace(check_time=datetime.fromisoformat(exit_time), id=None),
+        )
+        for entry, exit_time, _is_real in summary.pairs
+    ]
+    early_overtime = summary.early_overtime_seconds
+    late_overtime = summary.late_overtime_seconds
+    overtime_seconds = early_overtime + late_overtime
+
+    return {
+        "date": summary.date,
+        "is_holiday": summary.is_holiday,
+        "is_holiday_worked": summary.is_holiday
+        and not summary.is_weekend
+        and summary.punch_count > 0,
+        "is_holiday_weekday": summary.is_holiday and not summary.is_weekend,
+        "is_weekend": summary.is_weekend,
+        "is_expected_work_day": summary.is_expected_work_day,
+        "shift_start": summary.shift_start,
+        "shift_end": summary.shift_end,
+        "pairs": pairs,
+        "total_seconds_w": summary.worked_seconds,
+        "punch_count": summary.punch_count,
+        "total": format_duration(summary.worked_seconds),
+        "overtime_seconds": overtime_seconds,
+        "overtime": format_duration(overtime_seconds),
+        "early_overtime": format_duration(early_overtime),
+        "late_overtime": format_duration(late_overtime),
+        "early_overtime_seconds": early_overtime / 3600,
+        "late_overtime_seconds": late_overtime / 3600,
+        "late_seconds": summary.late_seconds,
+        "late_minutes": format_minutes(summary.late_seconds),
+        "early_leave_seconds": summary.early_leave_seconds,
+        "early_leave_minutes": format_minutes(summary.early_leave_seconds),
+        "is_absent": summary.is_absent,
+        "entries": summary.entries,
+        "exits": summary.exits,
+        "validated_overtime": summary.validated_overtime_seconds,
+    }
+
+
+def _write_summaries(rows, keys):
+    """Remplace les lignes `keys` ((employee_id, date)) par `rows`."""
+    by_employee = defaultdict(list)
+    for employee_id, day in keys:
+        by_employee[employee_id].append(day)
+
+    with transaction.atomic():
+        for employee_id, days in by_employee.items():
+            DailyAttendanceSummary.objects.filter(
+                employee_id=employee_id, date__in=days
+            ).delete()
+        DailyAttendanceSummary.objects.bulk_create(rows, batch_size=1000)
+
+
+def recompute_days(keys, engine=None):
+    """
+    Recalcule et persiste les résumés des couples (employee_id, date) fournis.
+
+    Un seul `AttendanceEngine` couvre tous les employés et la plage de dates
+    concernée : le nombre de requêtes ne dépend pas du nombre de jours.
+    """
+    keys = set(keys)
+    if not keys:
+        return 0
+
+    if engine is None:
+        employee_ids = {employee_id for employee_id, _ in keys}
+        days = [day for _, day in keys]
+        employees = Employee.objects.filter(pk__in=employee_ids).select_related(
+            "shift_type", "personnel"
+        )
+        engine = AttendanceEngine(list(employees), min(days), max(days))
+
+    employees = {employee.pk: employee for employee in engine.employees}
+    rows = [
+        summary_from_day(employees[employee_id], engine.compute_day(employees[employee_id], day))
+        for employee_id, day in sorted(keys)
+        if employee_id in employees
+    ]
+    _write_summaries(rows, keys)
+    return len(rows)
+
+
+def recompute_range(employee_ids, start_date, end_date):
+    """Recalcule tous les jours de la période pour les employés donnés."""
+    return recompute_days(
+        (employee_id, day)
+        for employee_id in employee_ids
+        for day in date_range(start_date, end_date)
+    )
+
+
+def recompute_for_punches(punch_keys):
+    """
+    Recalcule les jours touchés par de nouveaux pointages.
+
+    Un pointage peut clore le poste de nuit de la veille : le jour précédent
+    est donc recalculé lui aussi.
+    """
+    keys = set()
+    for employee_id, day in punch_keys:
+        keys.add((employee_id, day))
+        keys.add((employee_id, day - timedelta(days=1)))
+    return recompute_days(keys)
+
+
+def recompute_existing_for_dates(dates):
+    """Recalcule les résumés déjà matérialisés pour les dates données (jours fériés)."""
+    keys = DailyAttendanceSummary.objects.filter(date__in=list(dates)).values_list(
+        "employee_id", "date"
+    )
+    return recompute_days(keys)
+
+
+def invalidate_employees(employee_ids, start_date=None):
+    """Supprime les résumés de ces employés (recalculés à la prochaine lecture)."""
+    summaries = DailyAttendanceSummary.objects.filter(employee_id__in=list(employee_ids))
+    if start_date is not None:
+        summaries = summaries.filter(date__gte=start_date)
+    summaries.delete()
+
+
+def invalidate_employee(employee_id, start_date=None):
+    invalidate_employees([employee_id], start_date)
+
+
+def load_days(engine):
+    """
+    Retourne {employee_id: [jours]} pour les employés et la période de `engine`.
+
+    Les résumés existants sont lus en une requête ; les jours manquants sont
+    calculés avec `engine`, puis persistés s'ils sont révolus (aujourd'hui et
+    les jours suivants peuvent encore recevoir des pointages).
+    """
+    employee_ids = [employee.pk for employee in engine.employees]
+    summaries = {
+        (summary.employee_id, summary.date): summary
+        for summary in DailyAttendanceSummary.objects.filter(
+            employee_id__in=employee_ids,
+            date__range=(engine.start_date, engine.end_date),
+        )
+    }
+
+    missing = [
+        (employee.pk, day)
+        for employee in engine.employees
+        for day in date_range(engine.start_date, engine.end_date)
+        if (employee.pk, day) not in summaries
+    ]
+    if missing:
+        employees = {employee.pk: employee for employee in engine.employees}
+        rows = [
+            summary_from_day(
+                employees[employee_id],
+                engine.compute_day(employees[employee_id], day),
+            )
+            for employee_id, day in missing
+        ]
+        today = timezone.localdate()
+        DailyAttendanceSummary.objects.bulk_create(
+            [row for row in rows if row.date < today],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+        summaries.update({(row.employee_id, row.date): row for row in rows})
+
+    return {
+        employee.pk: [
+            day_from_summary(summaries[(employee.pk, day)])
+            for day in date_range(engine.start_date, engine.end_date)
+        ]
+        for employee in engine.employees
+    }
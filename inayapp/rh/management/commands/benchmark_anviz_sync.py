@@ -0,0 +1,85 @@
+# rh/management/commands/benchmark_anviz_sync.py
+import io
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from inayapp.benchmarks import Rollback
+from rh.anviz_fake import start_fake_devices
+from rh.management.commands.sync_attendances import Command as SyncCommand
+from rh.models import AnvizConfiguration, Pointage
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure la synchronisation des pointages contre des pointeuses Anviz "
+        "simulées (séquentielle puis parallèle), dans une transaction annulée"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--devices", type=int, default=10)
+        parser.add_argument("--employees", type=int, default=150)
+        parser.add_argument("--days", type=int, default=7)
+        parser.add_argument(
+            "--latency", type=float, default=0.05, help="Latence par requête (s)"
+        )
+        parser.add_argument(
+            "--unreachable",
+            type=int,
+            default=1,
+            help="Nombre de pointeuses qui ne répondent jamais",
+        )
+        parser.add_argument("--page-size", type=int, default=500)
+        parser.add_argument("--timeout", type=float, default=2)
+
+    def handle(self, *args, **options):
+        anviz_ids = list(range(8_000_000_000, 8_000_000_000 + options["employees"]))
+        servers = start_fake_devices(
+            options["devices"],
+            anviz_ids,
+            days=options["days"],
+            latency=options["latency"],
+            unreachable=options["unreachable"],
+        )
+        try:
+            for label, workers in (("Séquentiel", 1), ("Parallèle", options["devices"])):
+                try:
+                    with transaction.atomic():
+                        elapsed, imported = self.run(servers, workers, options)
+                        raise Rollback()
+                except Rollback:
+                    pass
+                self.stdout.write(
+                    f"{label:<11}: {imported} pointages importés en {elapsed:.2f}s "
+                    f"({options['devices']} pointeuses, {options['unreachable']} injoignable(s))"
+                )
+        finally:
+            for server in servers:
+                server.stop()
+
+    def run(self, servers, workers, options):
+        AnvizConfiguration.objects.update(is_active=False)
+        configs = [
+            AnvizConfiguration.objects.create(
+                name=f"Simulée {index}",
+                ip_address=server.host,
+                port=server.port,
+                username="admin",
+                password="admin",
+            )
+            for index, server in enumerate(servers)
+        ]
+
+        sync = SyncCommand(stdout=io.StringIO(), stderr=io.StringIO())
+        started = time.perf_counter()
+        sync.sync_devices(
+            configs,
+            limit=options["page_size"],
+            workers=workers,
+            timeout=options["timeout"],
+            deadline=options["timeout"] * 3 + 60,
+        )
+        elapsed = time.perf_counter() - started
+        return elapsed, Pointage.objects.filter(
+            employee__anviz_id__gte=8_000_000_000
+        ).count()
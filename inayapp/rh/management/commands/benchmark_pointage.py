@@ -0,0 +1,129 @@
+# rh/management/commands/benchmark_pointage.py
+import time
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from inayapp.benchmarks import QueryCounter, Rollback
+from rh.attendance_engine import AttendanceEngine
+from rh.models import Employee, Personnel, Pointage, ShiftType
+from rh.views.pointage import traiter_jour
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare le calcul jour par jour du rapport de pointage avec "
+        "AttendanceEngine (nombre de requêtes et durée)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--employees", type=int, default=150)
+        parser.add_argument("--days", type=int, default=30)
+        parser.add_argument(
+            "--existing",
+            action="store_true",
+            help="Utilise les pointages existants au lieu d'un jeu synthétique",
+        )
+
+    def handle(self, *args, **options):
+        end_date = date.today() - timedelta(days=1)
+        start_date = end_date - timedelta(days=options["days"] - 1)
+
+        if options["existing"]:
+            self.run(start_date, end_date, options["employees"])
+            return
+
+        # Le jeu synthétique est créé dans une transaction annulée à la fin
+        try:
+            with transaction.atomic():
+                self.seed(options["employees"], start_date, end_date)
+                self.run(start_date, end_date, options["employees"])
+                raise Rollback()
+        except Rollback:
+            self.stdout.write("Jeu de données synthétique supprimé.")
+
+    def seed(self, nb_employees, start_date, end_date):
+        shift = ShiftType.objects.create(
+            name="Benchmark",
+            category=ShiftType.FIXED,
+            work_days="0,1,2,3,6",
+            start_time=datetime.strptime("08:00", "%H:%M").time(),
+            end_time=datetime.strptime("16:00", "%H:%M").time(),
+        )
+        base_id = 9_000_000_000
+        Employee.objects.bulk_create(
+            [
+                Employee(anviz_id=base_id + i, name=f"Bench {i}", shift_type=shift)
+                for i in range(nb_employees)
+            ]
+        )
+        employees = list(Employee.objects.filter(anviz_id__gte=base_id))
+        Personnel.objects.bulk_create(
+            [Personnel(nom_prenom=e.name, employee=e, salaire=60000) for e in employees]
+        )
+
+        punches = []
+        for employee in employees:
+            current = start_date
+            while current <= end_date:
+                for hour, minute in ((8, 5), (16, 10)):
+                    punches.append(
+                        Pointage(
+                            employee=employee,
+                            check_time=timezone.make_aware(
+                                datetime.combine(current, datetime.min.time())
+                                + timedelta(hours=hour, minutes=minute + employee.pk % 7)
+                            ),
+                        )
+                    )
+                current += timedelta(days=1)
+        Pointage.objects.bulk_create(punches, batch_size=2000)
+        self.stdout.write(
+            f"{len(employees)} employés, {len(punches)} pointages générés."
+        )
+
+    def run(self, start_date, end_date, limit):
+        personnels = list(
+            Personnel.objects.filter(
+                employee__attendances__check_time__date__range=(start_date, end_date)
+            )
+            .select_related("employee__shift_type")
+            .distinct()
+            .order_by("nom_prenom")[:limit]
+        )
+        holidays = []
+
+        legacy_queries = QueryCounter()
+        with connection.execute_wrapper(legacy_queries):
+            started = time.perf_counter()
+            for personnel in personnels:
+                current = start_date
+                while current <= end_date:
+                    traiter_jour(current, personnel.employee, holidays)
+                    current += timedelta(days=1)
+            legacy_duration = time.perf_counter() - started
+
+        engine_queries = QueryCounter()
+        with connection.execute_wrapper(engine_queries):
+            started = time.perf_counter()
+            engine = AttendanceEngine.for_personnels(
+                personnels, start_date, end_date, holidays
+            )
+            for personnel in personnels:
+                engine.compute_days(personnel.employee)
+            engine_duration = time.perf_counter() - started
+
+        self.stdout.write(
+            f"Période {start_date} → {end_date}, {len(personnels)} employés"
+        )
+        self.stdout.write(
+            f"Jour par jour  : {legacy_queries.count} requêtes, "
+            f"{legacy_duration:.2f}s"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"AttendanceEngine : {engine_queries.count} requêtes, "
+                f"{engine_duration:.2f}s"
+            )
+        )
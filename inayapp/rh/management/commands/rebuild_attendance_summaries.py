@@ -0,0 +1,50 @@
+# rh/management/commands/rebuild_attendance_summaries.py
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from rh.attendance_summary import recompute_range
+from rh.models import Employee
+
+
+class Command(BaseCommand):
+    help = "Recalcule les résumés journaliers de présence (DailyAttendanceSummary)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", help="Date de début (AAAA-MM-JJ)")
+        parser.add_argument("--end", help="Date de fin (AAAA-MM-JJ)")
+        parser.add_argument(
+            "--employee",
+            type=int,
+            action="append",
+            help="ID Anviz d'un employé (répétable)",
+        )
+
+    def handle(self, *args, **options):
+        end_date = parse_date(options["end"]) if options["end"] else date.today()
+        start_date = (
+            parse_date(options["start"])
+            if options["start"]
+            else end_date.replace(day=1)
+        )
+        if not start_date or not end_date or start_date > end_date:
+            raise CommandError("Période invalide.")
+
+        employees = Employee.objects.all()
+        if options["employee"]:
+            employees = employees.filter(anviz_id__in=options["employee"])
+        employee_ids = list(employees.values_list("pk", flat=True))
+
+        # Traitement mois par mois pour borner la mémoire
+        total = 0
+        chunk_start = start_date
+        while chunk_start <= end_date:
+            chunk_end = min(chunk_start + timedelta(days=30), end_date)
+            total += recompute_range(employee_ids, chunk_start, chunk_end)
+            chunk_start = chunk_end + timedelta(days=1)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{total} résumés recalculés du {start_date} au {end_date}."
+            )
+        )
@@ -1,102 +1,278 @@
 # rh/management/commands/sync_attendances.py
 import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 from django.utils.timezone import make_aware
-from rh.anviz_service import AnvizAPI
-from rh.models import AnvizConfiguration, Pointage, Employee
+from rh.anviz_service import AnvizAPI, get_device_sync_window
+from rh.attendance_engine import local_date
+from rh.attendance_summary import recompute_for_punches
+from rh.models import AnvizConfiguration, Employee, Pointage
 
 logger = logging.getLogger(__name__)
 
+# Messages échangés entre les threads de lecture et le thread principal
+PAGE, LOGIN_FAILED, ERROR, DONE = "page", "login_failed", "error", "done"
+
+
+def fetch_device(config, window, limit, timeout, messages, stop):
+    """
+    Lit toutes les pages d'une pointeuse (thread de travail, sans accès DB).
+
+    Chaque page est transmise au thread principal via `messages`, qui se
+    charge seul des écritures en base. La lecture s'arrête entre deux pages
+    dès que `stop` est levé (pointeuse abandonnée à l'échéance).
+    """
+    from_date, to_date, start = window
+    try:
+        api = AnvizAPI(config=config, timeout=timeout)
+        if not api.login():
+            messages.put((config.pk, LOGIN_FAILED, None))
+            return
+
+        while not stop.is_set():
+            attendances = api.get_attendances(
+                start=start,
+                limit=limit,
+                from_date=from_date.strftime("%Y-%m-%d"),
+                to_date=to_date.strftime("%Y-%m-%d"),
+            )
+            if not attendances:
+                break
+            messages.put((config.pk, PAGE, (start, attendances)))
+            if len(attendances) < limit:
+                break  # Dernière page
+            start += limit
+    except Exception as e:
+        logger.error(
+            f"❌ Erreur lors de la récupération des enregistrements depuis {config.ip_address} : {e}"
+        )
+        messages.put((config.pk, ERROR, str(e)))
+    finally:
+        messages.put((config.pk, DONE, None))
+
 
 class Command(BaseCommand):
     help = "Synchronise les enregistrements d'attendances depuis toutes les pointeuses Anviz actives"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--page-size",
+            type=int,
+            default=500,
+            help="Nombre d'enregistrements demandés par page à la pointeuse",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=8,
+            help="Nombre de pointeuses interrogées en parallèle",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=5,
+            help="Délai maximal (secondes) d'une requête HTTP vers une pointeuse",
+        )
+        parser.add_argument(
+            "--deadline",
+            type=float,
+            default=300,
+            help="Durée maximale (secondes) de la synchronisation, toutes pointeuses confondues",
+        )
+
     def handle(self, *args, **options):
-        configs = AnvizConfiguration.objects.filter(is_active=True)
-        if not configs.exists():
+        configs = list(AnvizConfiguration.objects.filter(is_active=True))
+        if not configs:
             raise CommandError("❌ Aucune configuration active trouvée pour Anviz.")
 
-        total_synced = 0
-        total_errors = 0
+        self.sync_devices(
+            configs,
+            limit=options["page_size"],
+            workers=options["workers"],
+            timeout=options["timeout"],
+            deadline=options["deadline"],
+        )
+
+    def sync_devices(self, configs, limit=500, workers=8, timeout=5, deadline=300):
+        """
+        Synchronise les pointeuses en parallèle, chacune depuis son propre curseur.
+
+        Les lectures HTTP tournent dans un pool de threads ; les pages sont
+        importées au fil de l'eau par le thread courant. Une pointeuse lente ou
+        injoignable n'empêche pas l'import des autres : elle est abandonnée à
+        l'échéance de `deadline` et reprendra depuis son curseur.
+        """
+        # (employee_id, jour) touchés par l'import, pour les résumés journaliers
+        self.touched_days = set()
+        configs_by_pk = {config.pk: config for config in configs}
+        synced = {config.pk: 0 for config in configs}
+        errors = 0
+        messages = queue.Queue()
+        stop = threading.Event()
+        # Pointeuses en échec : le curseur reste en place, pas de last_synced_at
+        failed = set()
 
+        executor = ThreadPoolExecutor(max_workers=max(1, workers))
         for config in configs:
             self.stdout.write(
                 self.style.WARNING(
                     f"🔄 Synchronisation de la pointeuse : {config.ip_address}"
                 )
             )
+            window = get_device_sync_window(config)
+            config.sync_from_date = window[0]
+            executor.submit(fetch_device, config, window, limit, timeout, messages, stop)
 
-            api = AnvizAPI(config=config)
-            if not api.login():
+        pending = set(configs_by_pk)
+        ends_at = time.monotonic() + deadline
+        while pending:
+            remaining = ends_at - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                config_pk, kind, payload = messages.get(timeout=remaining)
+            except queue.Empty:
+                break
+
+            config = configs_by_pk[config_pk]
+            if kind == PAGE:
+                page_start, attendances = payload
+                synced[config_pk] += self.process_batch(attendances, config)
+                config.last_page_start = page_start
+                config.save(
+                    update_fields=["last_record_time", "sync_from_date", "last_page_start"]
+                )
+            elif kind == LOGIN_FAILED:
                 self.stderr.write(
                     self.style.ERROR(
                         f"❌ Échec de connexion à la pointeuse {config.ip_address}"
                     )
                 )
-                total_errors += 1
-                continue
-
-            start = 0
-            limit = 15
-            synced_this_device = 0
-
-            while True:
-                try:
-                    attendances = api.get_attendances(start=start, limit=limit)
-                    if not attendances:
-                        break
-
-                    processed = self.process_batch(attendances)
-                    synced_this_device += processed
-                    start += limit
-                except Exception as e:
-                    logger.error(
-                        f"❌ Erreur lors de la récupération des enregistrements depuis {config.ip_address} : {e}"
+                failed.add(config_pk)
+                errors += 1
+            elif kind == ERROR:
+                self.stderr.write(
+                    self.style.ERROR(
+                        f"❌ Pointeuse {config.ip_address} interrompue : {payload} "
+                        f"({synced[config_pk]} enregistrements importés, reprise au prochain passage)"
                     )
-                    break
+                )
+                failed.add(config_pk)
+                errors += 1
+            elif kind == DONE:
+                pending.discard(config_pk)
+                if config_pk in failed:
+                    continue
+                config.last_synced_at = timezone.now()
+                config.save(update_fields=["last_synced_at"])
+                self.stdout.write(
+                    f"✅ Pointeuse {config.ip_address} : {synced[config_pk]} enregistrements synchronisés"
+                )
 
-            self.stdout.write(
-                f"✅ Pointeuse {config.ip_address} : {synced_this_device} enregistrements synchronisés"
+        for config_pk in pending:
+            errors += 1
+            self.stderr.write(
+                self.style.ERROR(
+                    f"⏱️ Pointeuse {configs_by_pk[config_pk].ip_address} abandonnée "
+                    f"après {deadline}s ({synced[config_pk]} enregistrements importés)"
+                )
             )
-            total_synced += synced_this_device
+        # Les threads abandonnés s'arrêtent après leur requête en cours (au plus
+        # `timeout` secondes) : la sortie de l'interpréteur les attend
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+        recomputed = recompute_for_punches(self.touched_days)
+        self.stdout.write(f"📊 {recomputed} résumés journaliers recalculés")
 
+        total_synced = sum(synced.values())
         self.stdout.write(
             self.style.SUCCESS(
-                f"✔️ Synchronisation terminée : {total_synced} réussis, {total_errors} erreurs."
+                f"✔️ Synchronisation terminée : {total_synced} réussis, {errors} erreurs."
             )
         )
+        return total_synced
+
+    def process_batch(self, attendances, config=None):
+        """
+        Importe une page d'enregistrements en un nombre constant de requêtes.
 
-    def process_batch(self, attendances):
-        count = 0
+        Les employés de la page sont résolus en une requête (les inconnus sont
+        créés en bloc) et les pointages insérés avec `ignore_conflicts` : la
+        contrainte unique (employee, check_time) rend l'import idempotent.
+        """
+        records = []
         for record in attendances:
             try:
                 if not all(key in record for key in ("id", "time", "status")):
                     raise ValueError("Champs manquants dans l'enregistrement")
 
-                emp_id = int(record["id"])
-                check_time = make_aware(parse_datetime(record["time"]))
-
-                employee = self.get_or_create_employee(emp_id, record.get("name"))
-
-                Pointage.objects.update_or_create(
-                    employee=employee,
-                    check_time=check_time,
+                records.append(
+                    (
+                        int(record["id"]),
+                        make_aware(parse_datetime(record["time"])),
+                        record.get("name"),
+                    )
                 )
-                count += 1
             except Exception as e:
                 logger.error(f"⚠️ Erreur enregistrement {record.get('id')}: {str(e)}")
                 continue
-        return count
 
+        if not records:
+            return 0
+
+        employees = self.get_or_create_employees(
+            {emp_id: name for emp_id, _, name in records}
+        )
+
+        pointages = [
+            Pointage(employee=employees[emp_id], check_time=check_time)
+            for emp_id, check_time, _ in records
+        ]
+        Pointage.objects.bulk_create(pointages, ignore_conflicts=True)
+
+        self.touched_days.update(
+            (employees[emp_id].pk, local_date(check_time))
+            for emp_id, check_time, _ in records
+        )
+
+        # Faire avancer le curseur de la pointeuse
+        if config is not None:
+            latest = max(check_time for _, check_time, _ in records)
+            if config.last_record_time is None or latest > config.last_record_time:
+                config.last_record_time = latest
+        return len(pointages)
+
+    def get_or_create_employees(self, names_by_anviz_id):
+        """Retourne {anviz_id: Employee}, en créant en bloc les employés inconnus."""
+        anviz_ids = list(names_by_anviz_id)
+        employees = {
+            employee.anviz_id: employee
+            for employee in Employee.objects.filter(anviz_id__in=anviz_ids)
+        }
 
-    def get_or_create_employee(self, emp_id, name):
-        try:
-            return Employee.objects.get(anviz_id=emp_id)
-        except Employee.DoesNotExist:
-            return Employee.objects.create(
-                anviz_id=emp_id,
-                name=name or f"Employé #{emp_id}",
-                card_number=str(emp_id),
+        missing = [anviz_id for anviz_id in anviz_ids if anviz_id not in employees]
+        if missing:
+            Employee.objects.bulk_create(
+                [
+                    Employee(
+                        anviz_id=anviz_id,
+                        name=names_by_anviz_id[anviz_id] or f"Employé #{anviz_id}",
+                    )
+                    for anviz_id in missing
+                ],
+                ignore_conflicts=True,
+            )
+            employees.update(
+                {
+                    employee.anviz_id: employee
+                    for employee in Employee.objects.filter(anviz_id__in=missing)
+                }
             )
+        return employees
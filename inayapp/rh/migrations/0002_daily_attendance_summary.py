@@ -0,0 +1,45 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rh', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAttendanceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('pairs', models.JSONField(blank=True, default=list)),
+                ('entries', models.JSONField(blank=True, default=list)),
+                ('exits', models.JSONField(blank=True, default=list)),
+                ('punch_count', models.PositiveIntegerField(default=0)),
+                ('shift_start', models.TimeField(blank=True, null=True)),
+                ('shift_end', models.TimeField(blank=True, null=True)),
+                ('is_holiday', models.BooleanField(default=False)),
+                ('is_weekend', models.BooleanField(default=False)),
+                ('is_expected_work_day', models.BooleanField(default=False)),
+                ('is_absent', models.BooleanField(default=False)),
+                ('worked_seconds', models.FloatField(default=0)),
+                ('early_overtime_seconds', models.FloatField(default=0)),
+                ('late_overtime_seconds', models.FloatField(default=0)),
+                ('late_seconds', models.FloatField(default=0)),
+                ('early_leave_seconds', models.FloatField(default=0)),
+                ('validated_overtime_seconds', models.FloatField(default=0)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', to='rh.employee', verbose_name='Employé')),
+            ],
+            options={
+                'verbose_name': 'Résumé journalier de présence',
+                'verbose_name_plural': 'Résumés journaliers de présence',
+                'indexes': [models.Index(fields=['date'], name='rh_dailyatt_date_904b2d_idx')],
+                'unique_together': {('employee', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rh', '0002_daily_attendance_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='anvizconfiguration',
+            name='last_page_start',
+            field=models.PositiveIntegerField(default=0, verbose_name='Début de la dernière page lue'),
+        ),
+        migrations.AddField(
+            model_name='anvizconfiguration',
+            name='last_record_time',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Dernier pointage importé'),
+        ),
+        migrations.AddField(
+            model_name='anvizconfiguration',
+            name='last_synced_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Dernière synchronisation'),
+        ),
+        migrations.AddField(
+            model_name='anvizconfiguration',
+            name='port',
+            field=models.PositiveIntegerField(default=80, verbose_name='Port HTTP'),
+        ),
+        migrations.AddField(
+            model_name='anvizconfiguration',
+            name='sync_from_date',
+            field=models.DateField(blank=True, null=True, verbose_name='Début de la fenêtre de synchronisation'),
+        ),
+    ]
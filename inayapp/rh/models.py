@@ -301,9 +301,24 @@ class AnvizConfiguration(models.Model):
     session_timeout = models.PositiveIntegerField(
         "Délai de session (secondes)", default=1800
     )
+    port = models.PositiveIntegerField("Port HTTP", default=80)
     is_active = models.BooleanField("Actif", default=True)
     last_modified = models.DateTimeField("Dernière modification", auto_now=True)
 
+    # Curseur de synchronisation propre à chaque pointeuse
+    last_record_time = models.DateTimeField(
+        "Dernier pointage importé", null=True, blank=True
+    )
+    sync_from_date = models.DateField(
+        "Début de la fenêtre de synchronisation", null=True, blank=True
+    )
+    last_page_start = models.PositiveIntegerField(
+        "Début de la dernière page lue", default=0
+    )
+    last_synced_at = models.DateTimeField(
+        "Dernière synchronisation", null=True, blank=True
+    )
+
     class Meta:
         verbose_name = "Configuration Pointeuse"
         verbose_name_plural = "Configuration Pointeuse"
@@ -394,6 +409,58 @@ class JourFerie(models.Model):
     def __str__(self):
         return f"{self.name} ({self.date})"
 
+
+class DailyAttendanceSummary(models.Model):
+    """
+    Résultat matérialisé du calcul de présence d'un employé pour un jour.
+
+    Maintenu par `rh.attendance_summary` : recalculé pour les seuls jours
+    concernés lors d'un import de pointages, d'une modification de jour férié
+    ou de la validation d'une demande d'heures supplémentaires.
+    """
+
+    employee = models.ForeignKey(
+        "Employee",
+        on_delete=models.CASCADE,
+        related_name="daily_summaries",
+        verbose_name="Employé",
+    )
+    date = models.DateField(verbose_name="Date")
+
+    # [[entrée ISO, sortie ISO, sortie réelle], ...]
+    pairs = models.JSONField(default=list, blank=True)
+    entries = models.JSONField(default=list, blank=True)
+    exits = models.JSONField(default=list, blank=True)
+    punch_count = models.PositiveIntegerField(default=0)
+
+    shift_start = models.TimeField(null=True, blank=True)
+    shift_end = models.TimeField(null=True, blank=True)
+    is_holiday = models.BooleanField(default=False)
+    is_weekend = models.BooleanField(default=False)
+    is_expected_work_day = models.BooleanField(default=False)
+    is_absent = models.BooleanField(default=False)
+
+    worked_seconds = models.FloatField(default=0)
+    early_overtime_seconds = models.FloatField(default=0)
+    late_overtime_seconds = models.FloatField(default=0)
+    late_seconds = models.FloatField(default=0)
+    early_leave_seconds = models.FloatField(default=0)
+    validated_overtime_seconds = models.FloatField(default=0)
+
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ["employee", "date"]
+        verbose_name = "Résumé journalier de présence"
+        verbose_name_plural = "Résumés journaliers de présence"
+        indexes = [
+            models.Index(fields=["date"]),
+        ]
+
+    def __str__(self):
+        return f"{self.employee} - {self.date}"
+
+
 def validate_work_days(value):
     if value:
         days = value.split(',')
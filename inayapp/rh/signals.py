@@ -5,12 +5,21 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Permission, User
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.text import slugify
 from medical.models import Service
 
-from .models import Personnel
+from . import attendance_summary
+from .models import (
+    DemandeHeuresSupplementaires,
+    Employee,
+    JourFerie,
+    Personnel,
+    ShiftType,
+)
 
 User = get_user_model()
 
@@ -54,3 +63,101 @@ def create_user_for_personnel(sender, instance, created, **kwargs):
             raise ValidationError(f"Une erreur est survenue lors de la création de l'utilisateur: {str(e)}")
 
 
+# ─── Résumés journaliers de présence ─────────────────────────────────────────
+@receiver(pre_save, sender=JourFerie)
+def remember_jour_ferie_date(sender, instance, **kwargs):
+    instance._previous_date = (
+        sender.objects.filter(pk=instance.pk).values_list("date", flat=True).first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=JourFerie)
+@receiver(post_delete, sender=JourFerie)
+def recompute_summaries_for_jour_ferie(sender, instance, **kwargs):
+    dates = {instance.date}
+    previous_date = getattr(instance, "_previous_date", None)
+    if previous_date:
+        dates.add(previous_date)
+    transaction.on_commit(
+        lambda: attendance_summary.recompute_existing_for_dates(dates)
+    )
+
+
+def _demande_keys(demande):
+    employee_id = getattr(demande.personnel_demandeur, "employee_id", None)
+    if not employee_id or not demande.date_debut or not demande.date_fin:
+        return set()
+    return {
+        (employee_id, day)
+        for day in attendance_summary.date_range(
+            timezone.localtime(demande.date_debut).date(),
+            timezone.localtime(demande.date_fin).date(),
+        )
+    }
+
+
+@receiver(pre_save, sender=DemandeHeuresSupplementaires)
+def remember_demande_heures_sup(sender, instance, **kwargs):
+    previous = (
+        sender.objects.select_related("personnel_demandeur")
+        .filter(pk=instance.pk)
+        .first()
+        if instance.pk
+        else None
+    )
+    instance._previous_summary_keys = _demande_keys(previous) if previous else set()
+
+
+@receiver(post_save, sender=DemandeHeuresSupplementaires)
+@receiver(post_delete, sender=DemandeHeuresSupplementaires)
+def recompute_summaries_for_demande(sender, instance, **kwargs):
+    """Les heures sup. validées d'un jour dépendent des demandes approuvées."""
+    keys = _demande_keys(instance) | getattr(
+        instance, "_previous_summary_keys", set()
+    )
+    if keys:
+        transaction.on_commit(lambda: attendance_summary.recompute_days(keys))
+
+
+# Champs de l'employé lus par `compute_day` (horaires et cycle de rotation)
+EMPLOYEE_SHIFT_FIELDS = ("shift_type_id", "reference_start", "reference_end", "cycle_start_date")
+
+
+@receiver(pre_save, sender=Employee)
+def remember_employee_shift(sender, instance, **kwargs):
+    instance._previous_shift = (
+        sender.objects.filter(pk=instance.pk).values_list(*EMPLOYEE_SHIFT_FIELDS).first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=Employee)
+def invalidate_summaries_for_employee(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous_shift", None)
+    current = tuple(getattr(instance, field) for field in EMPLOYEE_SHIFT_FIELDS)
+    if created or previous is None or previous == current:
+        return
+    transaction.on_commit(lambda: attendance_summary.invalidate_employee(instance.pk))
+
+
+@receiver(post_save, sender=ShiftType)
+def invalidate_summaries_for_shift_type(sender, instance, created, **kwargs):
+    """Les horaires et options du type de contrat changent tous les jours calculés."""
+    if created:
+        return
+    employee_ids = list(
+        Employee.objects.filter(shift_type=instance).values_list("pk", flat=True)
+    )
+    if employee_ids:
+        transaction.on_commit(
+            lambda: attendance_summary.invalidate_employees(employee_ids)
+        )
+
+
+@receiver(pre_delete, sender=ShiftType)
+def invalidate_summaries_for_deleted_shift_type(sender, instance, **kwargs):
+    # Les employés passent à shift_type=NULL par une requête, sans signal
+    invalidate_summaries_for_shift_type(sender, instance, created=False)
@@ -3,7 +3,6 @@ import logging
 from collections import defaultdict
 from datetime import date, datetime, timedelta
 from decimal import Decimal
-from io import BytesIO
 from urllib.parse import urlencode
 
 from accueil.models import ConfigDate
@@ -19,8 +18,8 @@ from django.urls import reverse
 from django.utils import timezone
 from django.views.decorators.http import require_POST
 from medical.models import Service
+from utils import pdf
 from utils.utils import services_autorises
-from xhtml2pdf import pisa
 
 from ..models import (HonorairesActe, Personnel, Planning, PointagesActes,
                       Poste, Shift, Tarif_Gardes)
@@ -636,16 +635,20 @@ def print_planning(request):
         },
     ).content.decode("utf-8")
 
-    pdf_stream = BytesIO()
-    pisa_status = pisa.CreatePDF(rendered_html, dest=pdf_stream)
-    if pisa_status.err:
+    # Grand planning : « préparer puis télécharger » sans bloquer le worker
+    if request.GET.get("preparer"):
+        cle = pdf.preparer(
+            "planning_rh", (rendered_html,), "planning.pdf",
+            pdf.html_en_pdf, rendered_html, utilisateur_id=request.user.pk,
+        )
+        return pdf.reponse_preparation(cle)
+
+    try:
+        contenu = pdf.document("planning_rh", (rendered_html,), pdf.html_en_pdf, rendered_html)
+    except pdf.ErreurPdf:
         logger.error("Erreur lors de la création du PDF")
         return HttpResponse("Erreur lors de la création du PDF", status=500)
-
-    pdf_stream.seek(0)
-    response = HttpResponse(pdf_stream, content_type="application/pdf")
-    response["Content-Disposition"] = "attachment; filename=planning.pdf"
-    return response
+    return pdf.reponse_pdf(contenu, "planning.pdf")
 
 
 @transaction.atomic
@@ -1,32 +1,31 @@
 import hashlib
-import json
 import logging
 from datetime import date, datetime
 from datetime import time
-from datetime import time as datetime_time
 from datetime import timedelta
 from decimal import Decimal
-from types import SimpleNamespace
 
 from accueil.models import ConfigDate
 from django.contrib import messages
-from django.contrib.auth.decorators import login_required, permission_required
+from django.contrib.auth.decorators import login_required
 from django.core.cache import cache
 from django.core.management import call_command
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
 from django.db import transaction
-from django.db.models import ExpressionWrapper, F, Prefetch, Q, Sum, Value
+from django.db.models import Sum
 from django.http import HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render, reverse
 from django.urls import reverse
-from django.utils import timezone
-from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from utils.utils import get_date_range
 
-from ..models import (DemandeHeuresSupplementaires, Employee,
-                      GlobalSalaryConfig, IRGBracket, JourFerie, Personnel,
-                      Pointage, SalaryAdvanceRequest, ShiftType)
+from ..attendance_engine import (AttendanceEngine, format_duration,
+                                 needs_tomorrow, pair_attendances,
+                                 validate_overtime)
+from ..attendance_summary import invalidate_employee, load_days
+from ..models import (DemandeHeuresSupplementaires, GlobalSalaryConfig,
+                      IRGBracket, JourFerie, Personnel, Pointage,
+                      SalaryAdvanceRequest)
 
 logger = logging.getLogger(__name__)
 
@@ -79,6 +78,8 @@ def save_reference_hours(request):
             ).time()
             employee.reference_end = datetime.strptime(reference_end, "%H:%M").time()
             employee.save()
+            # Les horaires de référence changent tout le calcul des jours
+            invalidate_employee(employee.pk)
 
             return redirect(reverse("attendance_report"))
 
@@ -148,21 +149,6 @@ def handle_config_save(request):
     return redirect("salary_config")
 
 
-def format_duration(seconds):
-    """Formate une durée (en secondes) au format 'XhYY'. Retourne '-' si la durée est négative ou nulle."""
-    if seconds <= 0:
-        return "-"
-    hours = int(seconds / 3600)
-    minutes = int((seconds % 3600) / 60)
-    return f"{hours}h {minutes:02d}m"
-
-
-def format_minutes(seconds):
-    """Formate une durée (en secondes) en minutes suivie de ' min'."""
-    minutes = int(seconds / 60)
-    return f"{minutes} min" if minutes > 0 else "-"
-
-
 @login_required
 def rapport_pointage(request):
     # Récupération ou création de la configuration liée à l'utilisateur
@@ -203,21 +189,12 @@ def rapport_pointage(request):
         page_number = 1
 
     # === OPTIMISATION: REQUÊTE PAGINÉE ===
-    # Prefetch optimisé pour les pointages
-    employee_prefetch = Prefetch(
-        "employee__attendances",
-        queryset=Pointage.objects.filter(check_time__date__range=(start_date, end_date))
-        .select_related()
-        .order_by("check_time"),
-    )
-
-    # Queryset de base avec optimisations
+    # Les pointages sont chargés en bloc par AttendanceEngine pour la page courante
     base_queryset = (
         Personnel.objects.filter(
             employee__attendances__check_time__date__range=(start_date, end_date)
         )
-        .select_related("service", "poste", "employee")
-        .prefetch_related(employee_prefetch)
+        .select_related("service", "poste", "employee__shift_type")
         .distinct()
         .order_by("nom_prenom")  # Ordre cohérent pour la pagination
     )
@@ -248,24 +225,42 @@ def rapport_pointage(request):
         cache.set(cache_key, holidays, 5)  # Cache 1 heure
 
     # === TRAITEMENT UNIQUEMENT DES DONNÉES DE LA PAGE COURANTE ===
-    report = []
-    for personnel in page_obj.object_list:
-        # Génération d'une clé de cache pour chaque employé
-        cache_key = generate_employee_cache_key(
-            personnel.id_personnel, start_date, end_date
+    page_personnels = list(page_obj.object_list)
+    cache_keys = {
+        personnel.pk: generate_employee_cache_key(personnel.pk, start_date, end_date)
+        for personnel in page_personnels
+    }
+    cached = cache.get_many(list(cache_keys.values()))
+
+    # Un seul moteur pour tous les employés absents du cache
+    missing = [p for p in page_personnels if cache_keys[p.pk] not in cached]
+    engine = salary_config = None
+    if missing:
+        salary_config = GlobalSalaryConfig.get_latest_config()
+        engine = AttendanceEngine.for_personnels(
+            missing, start_date, end_date, holidays
         )
+        engine.load_salary_data(salary_config)
+        # Jours lus depuis DailyAttendanceSummary (calculés si absents)
+        days_by_employee = load_days(engine)
 
-        # Tentative de récupération depuis le cache
-        emp_data = cache.get(cache_key)
+    report = []
+    for personnel in page_personnels:
+        emp_data = cached.get(cache_keys[personnel.pk])
         if emp_data is None:
-            emp_data = initialiser_emp_data(personnel, start_date, end_date, holidays)
+            emp_data = initialiser_emp_data(
+                personnel,
+                start_date,
+                end_date,
+                holidays,
+                engine=engine,
+                config=salary_config,
+                days=days_by_employee.get(personnel.employee_id),
+            )
             # Ajouter les avances
-            month = start_date.month
-            year = start_date.year
-            emp_data["salaire"]["avances"] = personnel.get_monthly_advances(month, year)
+            emp_data["salaire"]["avances"] = engine.monthly_advances_for(personnel)
 
-            # Cache pour 30 minutes
-            cache.set(cache_key, emp_data, 5)
+            cache.set(cache_keys[personnel.pk], emp_data, 5)
 
         report.append(emp_data)
 
@@ -283,18 +278,11 @@ def rapport_pointage(request):
             .only("id_personnel", "nom_prenom", "service__name", "poste__label")
         )
 
-    employee_prefetch = Prefetch(
-        "employee__attendances",
-        queryset=Pointage.objects.filter(check_time__date__range=(start_date, end_date))
-        .select_related()
-        .order_by("check_time"),
-    )
+    # La liste déroulante n'affiche que l'identifiant et le nom
     personnels_all = (
         Personnel.objects.filter(
             employee__attendances__check_time__date__range=(start_date, end_date)
         )
-        .select_related("service", "poste", "employee")
-        .prefetch_related(employee_prefetch)
         .distinct()
         .order_by("nom_prenom")  # Ordre cohérent pour la pagination
     )
@@ -338,298 +326,6 @@ def generate_employee_cache_key(personnel_id, start_date, end_date):
     return f"emp_data_{hashlib.md5(data.encode()).hexdigest()}"
 
 
-def classify_and_pair(attendances_qs, employee, current_date):
-    """
-    Version améliorée qui gère tous les types de shifts dynamiquement.
-
-    1) Récupère pointages du current_date ET du lendemain si nécessaire
-    2) Classe automatiquement selon le type de shift (FIXED/ROTATING/FLEXIBLE/CUSTOM)
-    3) Filtre le bruit et construit les paires (entry, exit)
-    4) Gère les shifts qui traversent minuit
-    """
-
-    attendances_today = list(attendances_qs)
-
-    if not employee.shift_type:
-        return [], [], []
-
-    shift_type = employee.shift_type
-
-    # Obtenir les horaires pour aujourd'hui
-    hs, he = shift_type.get_hours_for_date(current_date, employee)
-
-    if hs is None or he is None:
-        return [], [], []  # Jour de repos
-
-    # Override avec les horaires de référence manuels si définis
-    ref_start = getattr(employee, "reference_start", None) or hs
-    ref_end = getattr(employee, "reference_end", None) or he
-
-    # Déterminer si le shift traverse minuit
-    crosses_midnight = shift_type.is_cross_midnight_shift()
-    is_night = shift_type.is_night_shift or crosses_midnight
-
-    # Charger les pointages de demain si nécessaire
-    next_date = current_date + timedelta(days=1)
-    attendances_tomorrow = []
-
-    load_tomorrow = should_load_tomorrow_attendances(
-        shift_type, employee, current_date, next_date, is_night
-    )
-
-    if load_tomorrow:
-        from ..models import Pointage  # Ajustez l'import selon votre structure
-
-        attendances_tomorrow = list(
-            Pointage.objects.filter(employee=employee, check_time__date=next_date)
-        )
-
-    # Fusionner et trier tous les pointages
-    all_recs = sorted(
-        attendances_today + attendances_tomorrow, key=lambda x: x.check_time
-    )
-
-    if not all_recs:
-        return [], [], []
-
-    # Filtrage global des rebonds
-    all_recs = filter_bounces_global(all_recs, min_interval_minutes=120)
-
-    if not all_recs:
-        return [], [], []
-
-    # Classification selon le type de shift
-    entries, exits = classify_attendances_by_shift_type(
-        all_recs, shift_type, employee, current_date, ref_start, ref_end
-    )
-
-    # Appliquer le filtrage spécifique des rebonds
-    entry_tolerance = shift_type.entry_tolerance_minutes
-    exit_tolerance = shift_type.exit_tolerance_minutes
-
-    entries = filter_bounces(entries, entry_tolerance)
-    exits = filter_bounces(exits, exit_tolerance)
-
-    # Appariage des entrées et sorties
-    pairs = create_entry_exit_pairs(
-        entries, exits, employee, current_date, ref_start, ref_end, is_night
-    )
-
-    return pairs, entries, exits
-
-
-def should_load_tomorrow_attendances(
-    shift_type, employee, current_date, next_date, is_night
-):
-    """Détermine s'il faut charger les pointages du lendemain"""
-    if is_night or shift_type.is_cross_midnight_shift():
-        return True
-
-    if shift_type.category == ShiftType.ROTATING:
-        # Vérifier si demain est aussi un jour travaillé
-        hs_tomorrow, he_tomorrow = shift_type.get_hours_for_date(next_date, employee)
-        return hs_tomorrow is not None and he_tomorrow is not None
-
-    if shift_type.category == ShiftType.FLEXIBLE:
-        return True  # Pour les horaires flexibles, toujours charger
-
-    return False
-
-
-def classify_attendances_by_shift_type(
-    all_recs, shift_type, employee, current_date, ref_start, ref_end
-):
-    """Classifie les pointages selon le type de shift"""
-    entries = []
-    exits = []
-
-    if (
-        shift_type.category == ShiftType.FIXED
-        and not shift_type.is_night_shift
-        and not shift_type.is_cross_midnight_shift()
-    ):
-        # FIXED jour classique → alternance simple
-        for i, rec in enumerate(all_recs):
-            if i % 2 == 0:
-                entries.append(rec)
-            else:
-                exits.append(rec)
-
-    else:
-        # Classification par fenêtres temporelles (pour ROTATING, FLEXIBLE, CUSTOM, et shifts de nuit)
-        entries, exits = classify_by_time_windows(
-            all_recs, shift_type, current_date, ref_start, ref_end
-        )
-
-    return entries, exits
-
-
-def classify_by_time_windows(all_recs, shift_type, current_date, ref_start, ref_end):
-    """Classification par fenêtres temporelles"""
-    entries = []
-    exits = []
-
-    next_date = current_date + timedelta(days=1)
-    is_night = shift_type.is_night_shift or shift_type.is_cross_midnight_shift()
-
-    # Définir les bornes de temps de référence
-    start_dt = timezone.make_aware(datetime.combine(current_date, ref_start))
-
-    if is_night or shift_type.is_cross_midnight_shift():
-        end_dt = timezone.make_aware(datetime.combine(next_date, ref_end))
-    else:
-        end_dt = timezone.make_aware(datetime.combine(current_date, ref_end))
-
-    # Tolérance personnalisable
-    entry_tolerance = timedelta(minutes=shift_type.entry_tolerance_minutes)
-    exit_tolerance = timedelta(minutes=shift_type.exit_tolerance_minutes)
-
-    # Point milieu pour la classification temporelle
-    mid_time = start_dt + (end_dt - start_dt) / 2
-
-    for rec in all_recs:
-        # Fenêtres de tolérance
-        in_entry_window = (
-            (start_dt - entry_tolerance)
-            <= rec.check_time
-            <= (start_dt + entry_tolerance)
-        )
-        in_exit_window = (
-            (end_dt - exit_tolerance) <= rec.check_time <= (end_dt + exit_tolerance)
-        )
-
-        if in_entry_window and not in_exit_window:
-            entries.append(rec)
-        elif in_exit_window and not in_entry_window:
-            exits.append(rec)
-        elif in_entry_window and in_exit_window:
-            # Dans les deux fenêtres, choisir la plus proche
-            time_to_start = abs((rec.check_time - start_dt).total_seconds())
-            time_to_end = abs((rec.check_time - end_dt).total_seconds())
-
-            if time_to_start <= time_to_end:
-                entries.append(rec)
-            else:
-                exits.append(rec)
-        else:
-            # Classification temporelle basique
-            if rec.check_time < mid_time:
-                entries.append(rec)
-            else:
-                exits.append(rec)
-
-    return entries, exits
-
-
-def filter_bounces_global(pointages_list, min_interval_minutes=240):
-    """Filtre les pointages successifs trop rapprochés sur tous les pointages"""
-    if not pointages_list:
-        return []
-
-    sorted_pointages = sorted(pointages_list, key=lambda x: x.check_time)
-    filtered = [sorted_pointages[0]]
-
-    for pointage in sorted_pointages[1:]:
-        last_time = filtered[-1].check_time
-        time_diff = (pointage.check_time - last_time).total_seconds() / 60
-
-        if time_diff >= min_interval_minutes:
-            filtered.append(pointage)
-
-    return filtered
-
-
-def filter_bounces(pointages_list, min_interval_minutes):
-    """Filtre les pointages successifs trop rapprochés"""
-    if not pointages_list:
-        return []
-
-    sorted_pointages = sorted(pointages_list, key=lambda x: x.check_time)
-    filtered = [sorted_pointages[0]]
-
-    for pointage in sorted_pointages[1:]:
-        last_time = filtered[-1].check_time
-        time_diff = (pointage.check_time - last_time).total_seconds() / 60
-
-        if time_diff >= min_interval_minutes:
-            filtered.append(pointage)
-
-
-    return filtered
-
-
-def create_entry_exit_pairs(
-    entries, exits, employee, current_date, ref_start, ref_end, is_night
-):
-    """Crée les paires entrée/sortie"""
-    pairs = []
-    used_exits = set()
-
-    next_date = current_date + timedelta(days=1)
-
-    # Cutoff pour les postes de nuit
-    cutoff_next_day = (
-        timezone.make_aware(datetime.combine(next_date, ref_start))
-        if is_night
-        else None
-    )
-
-    for entry in entries:
-        matched_exit = None
-
-        # Chercher une sortie après cette entrée
-        for exit_rec in exits:
-            if exit_rec.check_time > entry.check_time and exit_rec.id not in used_exits:
-
-                # Pour les postes de nuit, vérifier le cutoff
-                if (
-                    is_night
-                    and cutoff_next_day
-                    and exit_rec.check_time > cutoff_next_day
-                ):
-                    continue
-
-                matched_exit = exit_rec
-                break
-
-        # Si pas de sortie trouvée, créer une sortie factice
-        if not matched_exit:
-            theoretical_exit_time = calculate_theoretical_exit_time(
-                entry, ref_end, current_date, next_date, is_night
-            )
-
-            matched_exit = SimpleNamespace(
-                check_time=theoretical_exit_time,
-                id=None,
-                employee=employee,
-            )
-
-        pairs.append((entry, matched_exit))
-        if hasattr(matched_exit, "id") and matched_exit.id:
-            used_exits.add(matched_exit.id)
-
-    return pairs
-
-
-def calculate_theoretical_exit_time(entry, ref_end, current_date, next_date, is_night):
-    """Calcule l'heure de sortie théorique"""
-    theoretical_exit_time = entry.check_time.replace(
-        hour=ref_end.hour, minute=ref_end.minute, second=0, microsecond=0
-    )
-
-    # Pour les postes de nuit ou shifts qui traversent minuit
-    if is_night:
-        if entry.check_time.date() == current_date:
-            theoretical_exit_time = theoretical_exit_time.replace(
-                year=next_date.year, month=next_date.month, day=next_date.day
-            )
-
-    # Ajuster si nécessaire (par exemple, retirer du temps pour éviter les chevauchements)
-    theoretical_exit_time -= timedelta(hours=4)
-
-    return theoretical_exit_time
-
-
 def initialiser_totals():
     """Initialise le dictionnaire des totaux"""
     return {
@@ -680,10 +376,22 @@ def initialiser_salaire():
     }
 
 
-def initialiser_emp_data(personnel, start_date, end_date, holidays):
-    """Initialise les données d'un employé pour le rapport."""
+def initialiser_emp_data(
+    personnel, start_date, end_date, holidays, engine=None, config=None, days=None
+):
+    """
+    Initialise les données d'un employé pour le rapport.
+
+    `engine` est un `AttendanceEngine` partagé par la page ; sans lui, un
+    moteur dédié à cet employé est construit. `days` sont les jours déjà lus
+    depuis `DailyAttendanceSummary` ; à défaut ils sont recalculés.
+    """
     employee = personnel.employee
-    config = GlobalSalaryConfig.get_latest_config()
+    if config is None:
+        config = GlobalSalaryConfig.get_latest_config()
+    if engine is None:
+        engine = AttendanceEngine([employee], start_date, end_date, holidays)
+        engine.load().load_salary_data(config)
 
     emp_data = {
         "personnel": personnel,
@@ -694,134 +402,17 @@ def initialiser_emp_data(personnel, start_date, end_date, holidays):
         "end_date": end_date,
     }
 
-    current_date = start_date
-    while current_date <= end_date:
-        jour_data = traiter_jour(current_date, employee, holidays)
+    if days is None:
+        days = engine.compute_days(employee)
+
+    for jour_data in days:
         emp_data["days"].append(jour_data)
         mettre_a_jour_totaux(emp_data["totals"], jour_data)
-        current_date += timedelta(days=1)
 
-    calculer_salaires(emp_data, config)
+    calculer_salaires(emp_data, config, engine=engine)
     return emp_data
 
 
-def get_employee_schedule(employee, date):
-    """
-    Récupère les horaires de travail pour un employé à une date donnée.
-    Prend en compte le ShiftType s'il existe, sinon utilise les horaires de référence.
-    """
-    if employee.shift_type:
-        start_time, end_time = employee.shift_type.get_hours_for_date(date, employee)
-        if start_time and end_time:
-            return start_time, end_time
-
-    # Fallback vers les horaires de référence de l'employé
-    ref_start = employee.reference_start or datetime_time(8, 0)
-    ref_end = employee.reference_end or datetime_time(16, 0)
-    return ref_start, ref_end
-
-
-def is_working_day(employee, date, holidays):
-    """
-    Détermine si un employé doit travailler un jour donné selon son ShiftType.
-    """
-    is_holiday = date in holidays
-    is_weekend = date.weekday() in [4, 5]  # Samedi=5, Dimanche=6
-
-    if employee.shift_type:
-
-        # Vérifier d'abord si l'employé a des horaires définis pour ce jour
-        start_time, end_time = employee.shift_type.get_hours_for_date(date, employee)
-        has_schedule = start_time is not None and end_time is not None
-
-        # Si pas d'horaires définis pour ce jour, pas de travail
-        if not has_schedule:
-            return False
-
-        # Si le ShiftType ne considère PAS les week-ends et jours fériés comme travaillables
-        if employee.shift_type.considers_weekends_holidays and (
-            is_holiday or is_weekend
-        ):
-            return False
-
-        # Si on arrive ici, l'employé a des horaires et le jour est potentiellement travaillable
-        return True
-
-    # Logique par défaut : pas de travail les week-ends et jours fériés
-    return not (is_holiday or is_weekend)
-
-
-def calculer_heures_reference(pairs, employee, current_date, ref_start, ref_end):
-    """Calcule le temps de travail effectif dans les heures de référence"""
-    # Création des datetime objects pour la plage de référence
-    ref_start_naive = datetime.combine(current_date, ref_start)
-    ref_end_naive = datetime.combine(current_date, ref_end)
-
-    # Gestion des horaires de nuit (fin avant début)
-    if ref_end < ref_start:
-        ref_end_naive += timedelta(days=1)
-
-    # Conversion en objets conscients du fuseau horaire
-    ref_start_dt = timezone.make_aware(ref_start_naive)
-    ref_end_dt = timezone.make_aware(ref_end_naive)
-
-    total_seconds_w = 0
-
-    for entry, exit_time in pairs:
-        if not exit_time:
-            continue
-
-        # Déterminer les limites effectives
-        debut_effectif = max(entry.check_time, ref_start_dt)
-        fin_effective = min(exit_time.check_time, ref_end_dt)
-
-        # Calculer la durée dans la plage de référence
-        if fin_effective > debut_effectif:
-            duree = (fin_effective - debut_effectif).total_seconds()
-            total_seconds_w += duree
-
-    return total_seconds_w
-
-
-def calculer_retard(pairs, employee, date, is_holiday, is_weekend, ref_start):
-    """Calcule le retard en secondes sur la première entrée"""
-    if not pairs or not ref_start:
-        return 0
-
-    if is_holiday or is_weekend:
-        return 0
-
-    ref_entry = timezone.make_aware(datetime.combine(date, ref_start))
-    first_entry = pairs[0][0].check_time
-
-    return (
-        max((first_entry - ref_entry).total_seconds(), 0)
-        if first_entry > ref_entry
-        else 0
-    )
-
-
-def calculer_depart_anticipe(pairs, employee, date, ref_end):
-    """Calcule le départ anticipé en secondes sur la dernière sortie"""
-    if not pairs or not ref_end:
-        return 0
-
-    # Gestion des horaires de nuit
-    ref_exit_date = date
-    if ref_end < (employee.reference_start or datetime_time(8, 0)):
-        ref_exit_date = date + timedelta(days=1)
-
-    ref_exit = timezone.make_aware(datetime.combine(ref_exit_date, ref_end))
-    last_exit = pairs[-1][1].check_time
-
-    if hasattr(last_exit, "check_time"):
-        last_time = last_exit
-    else:
-        last_time = last_exit  # c'est déjà un datetime
-
-    return max((ref_exit - last_time).total_seconds(), 0) if last_time < ref_exit else 0
-
-
 def mettre_a_jour_totaux(totals, jour_data):
     """Met à jour les totaux avec les données journalières"""
     # Mise à jour des indicateurs temporels
@@ -853,6 +444,25 @@ def mettre_a_jour_totaux(totals, jour_data):
         totals["validated_regular"] += Decimal(jour_data["validated_overtime"]) / 3600
 
 
+def classify_and_pair(attendances_qs, employee, current_date):
+    """
+    Classe et apparie les pointages d'un seul jour.
+
+    Les pointages du lendemain sont chargés si le shift l'exige. Pour un
+    rapport sur plusieurs employés/jours, utiliser `AttendanceEngine`.
+    """
+    attendances_tomorrow = []
+    if needs_tomorrow(employee, current_date):
+        attendances_tomorrow = list(
+            Pointage.objects.filter(
+                employee=employee, check_time__date=current_date + timedelta(days=1)
+            )
+        )
+    return pair_attendances(
+        attendances_qs, attendances_tomorrow, employee, current_date
+    )
+
+
 def check_approved_overtime(personnel, date_travail, overtime_seconds):
     """Vérifie si les heures supplémentaires sont couvertes par une demande approuvée"""
     if overtime_seconds <= 0:
@@ -866,175 +476,16 @@ def check_approved_overtime(personnel, date_travail, overtime_seconds):
         date_fin__date__gte=date_travail,
     ).first()
 
-    if demande:
-        # Convertir les heures approuvées en secondes
-        heures_approuvees_sec = float(demande.nombre_heures) * 3600
-        validated = min(overtime_seconds, heures_approuvees_sec)
-
-        return validated
-
-    return 0
+    return validate_overtime(demande, overtime_seconds)
 
 
 def traiter_jour(current_date, employee, holidays):
-    """Calcule les données pour un jour spécifique en tenant compte du ShiftType."""
-    is_holiday = current_date in holidays
-    is_weekend = current_date.weekday() in [4, 5]  # Samedi=5, Dimanche=6
-    is_expected_work_day = is_working_day(employee, current_date, holidays)
-
-    # Récupérer les horaires pour ce jour
-    ref_start, ref_end = get_employee_schedule(employee, current_date)
-
-    # Initialisation des variables
-    early_overtime = 0
-    late_overtime = 0
-    validated_overtime = 0
-
-    attendances = Pointage.objects.filter(
-        employee=employee, check_time__date=current_date
-    ).order_by("check_time")
-
-    # Classification des pointages
-    pairs, entries, exits = classify_and_pair(attendances, employee, current_date)
-
-    # Calcul des heures supplémentaires pour chaque paire entrée/sortie
-    for entry, exit_point in pairs:
-        entry_time = entry.check_time.time()
-
-        # Heures supplémentaires en début de journée
-        if entry_time < ref_start:
-            entry_dt = datetime.combine(current_date, entry_time)
-            ref_start_dt = datetime.combine(current_date, ref_start)
-            early_duration = (ref_start_dt - entry_dt).total_seconds()
-            early_overtime += early_duration
-
-        # Heures supplémentaires en fin de journée (seulement pour les vrais objets Pointage)
-        if isinstance(exit_point, Pointage):
-            exit_time = exit_point.check_time.time()
-            exit_date = exit_point.check_time.date()
-
-            # Gérer les horaires de nuit qui s'étendent sur le jour suivant
-            if ref_end < ref_start:  # Horaire de nuit
-                if exit_date == current_date:
-                    # Si la sortie est le même jour et avant minuit
-                    if exit_time > ref_start:  # Après l'heure de début
-                        ref_end_dt = datetime.combine(
-                            current_date + timedelta(days=1), ref_end
-                        )
-                        exit_dt = datetime.combine(
-                            current_date + timedelta(days=1), exit_time
-                        )
-                    else:
-                        ref_end_dt = datetime.combine(current_date, ref_end)
-                        exit_dt = datetime.combine(current_date, exit_time)
-                else:
-                    # Sortie le jour suivant
-                    ref_end_dt = datetime.combine(exit_date, ref_end)
-                    exit_dt = datetime.combine(exit_date, exit_time)
-            else:
-                # Horaire normal
-                ref_end_dt = datetime.combine(current_date, ref_end)
-                if exit_date == current_date:
-                    exit_dt = datetime.combine(current_date, exit_time)
-                else:
-                    exit_dt = datetime.combine(exit_date, exit_time)
-
-            if exit_dt > ref_end_dt:
-                late_duration = (exit_dt - ref_end_dt).total_seconds()
-                late_overtime += late_duration
-
-    overtime_seconds = early_overtime + late_overtime
-
-    # Calcul des indicateurs spéciaux
-    is_holiday_worked = False
-    if is_holiday and not is_weekend and attendances.exists():
-        is_holiday_worked = True
-
-    # Récupérer le personnel pour vérifier les demandes approuvées
-    personnel = getattr(employee, "personnel", None)
-    if employee.shift_type:
-        # Calcul du temps de travail selon le type de jour
-        if employee.shift_type.considers_weekends_holidays and (
-                is_holiday or is_weekend or not is_expected_work_day
-            ):
-            # Pour les jours non-travaillés normalement, toutes les heures sont supplémentaires
-            total_seconds_w = 0
-            total_overtime = 0
-
-            for entry, exit_point in pairs:
-                if exit_point:
-                    duration = (exit_point.check_time - entry.check_time).total_seconds()
-                    if isinstance(exit_point, Pointage):
-                        total_overtime += duration
-
-            # Vérifier les heures supplémentaires approuvées
-            if personnel:
-                validated_overtime = check_approved_overtime(
-                    personnel, current_date, total_overtime
-                )
-            else:
-                validated_overtime = 0
-
-        else:
-            # Jour de travail normal
-            total_seconds_w = calculer_heures_reference(
-                pairs, employee, current_date, ref_start, ref_end
-            )
+    """Calcule les données d'un jour isolé (voir `AttendanceEngine` pour les rapports)."""
+    engine = AttendanceEngine([employee], current_date, current_date, holidays)
+    return engine.compute_day(employee, current_date)
 
-            # Vérifier les heures supplémentaires approuvées
-            if personnel:
-                validated_overtime = check_approved_overtime(
-                    personnel, current_date, overtime_seconds
-                )
-            else:
-                validated_overtime = 0
-    else:
-        total_seconds_w = 0
-        total_overtime = 0
-        validated_overtime = 0
 
-    return {
-        "date": current_date,
-        "is_holiday": is_holiday,
-        "is_holiday_worked": is_holiday_worked,
-        "is_holiday_weekday": is_holiday and not is_weekend,
-        "is_weekend": is_weekend,
-        "is_expected_work_day": is_expected_work_day,
-        "shift_start": ref_start,
-        "shift_end": ref_end,
-        "pairs": pairs,
-        "total_seconds_w": total_seconds_w,
-        "pointages": list(attendances),
-        "total": format_duration(total_seconds_w),
-        "overtime_seconds": overtime_seconds,
-        "overtime": format_duration(overtime_seconds),
-        "early_overtime": format_duration(early_overtime),
-        "late_overtime": format_duration(late_overtime),
-        "early_overtime_seconds": early_overtime / 3600,
-        "late_overtime_seconds": late_overtime / 3600,
-        "late_seconds": calculer_retard(
-            pairs, employee, current_date, is_holiday, is_weekend, ref_start
-        ),
-        "late_minutes": format_minutes(
-            calculer_retard(
-                pairs, employee, current_date, is_holiday, is_weekend, ref_start
-            )
-        ),
-        "early_leave_seconds": calculer_depart_anticipe(
-            pairs, employee, current_date, ref_end
-        ),
-        "early_leave_minutes": format_minutes(
-            calculer_depart_anticipe(pairs, employee, current_date, ref_end)
-        ),
-        "is_absent": not attendances.exists() and is_expected_work_day,
-        "entries": [e.check_time.time().strftime("%H:%M") for e in entries],
-        "exits": [x.check_time.time().strftime("%H:%M") for x in exits],
-        "validated_overtime": validated_overtime,
-
-    }
-
-
-def calculer_salaires(emp_data, config):
+def calculer_salaires(emp_data, config, engine=None):
     """Effectue tous les calculs salariaux."""
 
     totals = emp_data["totals"]
@@ -1147,8 +598,13 @@ def calculer_salaires(emp_data, config):
     )
 
     # 7. Déductions
-    salaire["deductions"]["irg"] = calculer_irg(salaire["salaire_brut"])
-    salaire["deductions"]["cnas"] = calculer_cnas_employee(salaire["salaire_brut"])
+    salaire["deductions"]["irg"] = calculer_irg(
+        salaire["salaire_brut"],
+        brackets=engine.irg_brackets if engine is not None else None,
+    )
+    salaire["deductions"]["cnas"] = calculer_cnas_employee(
+        salaire["salaire_brut"], config=config if engine is not None else None
+    )
 
     # 8. Salaire net
     salaire["salaire_net"] = (
@@ -1162,12 +618,15 @@ def calculer_salaires(emp_data, config):
         - penalty
     )
     # Récupérer les avances approuvées pour la période
-    advances = SalaryAdvanceRequest.objects.filter(
-        personnel=personnel,
-        status=SalaryAdvanceRequest.RequestStatus.APPROVED,
-        payment_date__gte=emp_data["start_date"],
-        payment_date__lte=emp_data["end_date"],
-    ).aggregate(total_advances=Sum("amount"))["total_advances"] or Decimal(0)
+    if engine is not None:
+        advances = engine.advances_for(personnel)
+    else:
+        advances = SalaryAdvanceRequest.objects.filter(
+            personnel=personnel,
+            status=SalaryAdvanceRequest.RequestStatus.APPROVED,
+            payment_date__gte=emp_data["start_date"],
+            payment_date__lte=emp_data["end_date"],
+        ).aggregate(total_advances=Sum("amount"))["total_advances"] or Decimal(0)
 
     # Mettre à jour les données salariales
     salaire["avances"] = advances
@@ -1215,10 +674,11 @@ def calculer_salaires(emp_data, config):
     )
 
 
-def calculer_irg(gross_salary):
+def calculer_irg(gross_salary, brackets=None):
     try:
-        config = GlobalSalaryConfig.get_latest_config()
-        brackets = IRGBracket.objects.filter(config=config).order_by("min_amount")
+        if brackets is None:
+            config = GlobalSalaryConfig.get_latest_config()
+            brackets = IRGBracket.objects.filter(config=config).order_by("min_amount")
         remaining_income = Decimal(gross_salary)
         total_tax = Decimal(0)
 
@@ -1269,9 +729,10 @@ def calculer_cnas_employer(gross_salary):
         return Decimal(0)
 
 
-def calculer_cnas_employee(gross_salary):
+def calculer_cnas_employee(gross_salary, config=None):
     try:
-        config = GlobalSalaryConfig.get_latest_config()
+        if config is None:
+            config = GlobalSalaryConfig.get_latest_config()
         return round(
             Decimal(gross_salary) * (config.cnas_employee_rate / Decimal(100)), 2
         )
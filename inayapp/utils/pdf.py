@@ -1,19 +1,252 @@
 # utils/pdf.py
+"""
+Rendu des PDF : cache adressé par contenu et pool de processus.
+
+Un document est rangé dans le cache `longterm` sous son type et l'empreinte
+SHA-256 de ses données source (le HTML rendu pour xhtml2pdf, les valeurs des
+objets affichés pour ReportLab) : tant que la source ne change pas, le PDF
+est relu sans être régénéré, quel que soit le worker qui l'a produit.
+
+Le rendu passe par un pool de processus (`PDF_WORKERS`, 0 pour rendre dans
+le processus courant). Les fonctions soumises doivent être importables au
+niveau module et ne recevoir que des valeurs simples (identifiants, dates,
+HTML) : elles relisent leurs données dans le processus du pool.
+`preparer()` lance un rendu sans l'attendre, pour les gros exports : le
+client interroge ensuite `export_data:telecharger_pdf`.
+"""
+import hashlib
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from io import BytesIO
-from django.http import HttpResponse
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
 from django.template.loader import get_template
+from django.urls import reverse
 from xhtml2pdf import pisa
 
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = "longterm"
+# Durée maximale d'une préparation avant de la considérer perdue
+DUREE_PREPARATION = 600
+
+_lock = threading.Lock()
+_executeur = None
+
+
+class ErreurPdf(Exception):
+    pass
+
+
+def empreinte(*sources):
+    """SHA-256 de la représentation des données source"""
+    return hashlib.sha256(repr(sources).encode("utf-8")).hexdigest()
+
+
+def valeurs(instance):
+    """Valeurs des champs concrets d'une instance, pour `empreinte()`"""
+    if instance is None:
+        return None
+    return (instance._meta.label,) + tuple(
+        getattr(instance, champ.attname) for champ in instance._meta.concrete_fields
+    )
+
+
+def cle_document(type_document, *sources):
+    return f"pdf:{type_document}:{empreinte(*sources)}"
+
+
+def html_en_pdf(html):
+    """Conversion xhtml2pdf d'un document HTML complet"""
+    resultat = BytesIO()
+    statut = pisa.CreatePDF(BytesIO(html.encode("UTF-8")), dest=resultat, encoding="UTF-8")
+    if statut.err:
+        raise ErreurPdf("Erreur lors de la création du PDF")
+    return resultat.getvalue()
+
+
+# ── Pool de processus ───────────────────────────────────────────────────────
+
+def _initialiser():
+    import django
+
+    django.setup()
+
+
+def executeur():
+    """Pool partagé du processus, créé au premier rendu ; None si désactivé"""
+    global _executeur
+    nombre = getattr(settings, "PDF_WORKERS", 0)
+    if nombre <= 0:
+        return None
+    if _executeur is None:
+        with _lock:
+            if _executeur is None:
+                # spawn : un fork copierait les connexions à la base du worker web
+                _executeur = ProcessPoolExecutor(
+                    max_workers=nombre,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_initialiser,
+                )
+    return _executeur
+
+
+def _abandonner(pool):
+    # Un processus du pool est mort : nouveau pool au prochain rendu
+    global _executeur
+    with _lock:
+        if _executeur is pool:
+            _executeur = None
+    pool.shutdown(wait=False, cancel_futures=True)
+    logger.warning("Pool PDF interrompu, rendu dans le processus courant")
+
+
+def _soumettre(fonction, *args):
+    pool = executeur()
+    if pool is None:
+        return None
+    try:
+        return pool.submit(fonction, *args)
+    except BrokenProcessPool:
+        _abandonner(pool)
+        return None
+
+
+def executer(fonction, *args):
+    """Exécute `fonction(*args)` dans le pool et attend son résultat."""
+    pool = executeur()
+    future = _soumettre(fonction, *args)
+    if future is None:
+        return fonction(*args)
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        _abandonner(pool)
+        return fonction(*args)
+
+
+# ── Documents ───────────────────────────────────────────────────────────────
+
+def document(type_document, sources, fonction, *args):
+    """
+    PDF (bytes) du document `type_document` dont les données sont `sources` :
+    relu dans le cache, sinon produit par `fonction(*args)` dans le pool.
+    """
+    cache = caches[CACHE_ALIAS]
+    cle = cle_document(type_document, *sources)
+    pdf = cache.get(cle)
+    if pdf is None:
+        pdf = executer(fonction, *args)
+        cache.set(cle, pdf)
+    return pdf
+
+
+def _enregistrer_etat(cle, statut, nom_fichier, timeout=None):
+    cache = caches[CACHE_ALIAS]
+    etat_document = {"statut": statut, "nom": nom_fichier}
+    if timeout is None:
+        cache.set(f"{cle}:etat", etat_document)
+    else:
+        cache.set(f"{cle}:etat", etat_document, timeout)
+
+
+def _terminer(cle, nom_fichier, future):
+    cache = caches[CACHE_ALIAS]
+    try:
+        pdf = future.result()
+    except Exception:
+        logger.exception("Échec de la préparation du PDF %s", cle)
+        _enregistrer_etat(cle, "echec", nom_fichier, DUREE_PREPARATION)
+    else:
+        cache.set(cle, pdf)
+        _enregistrer_etat(cle, "pret", nom_fichier)
+    cache.delete(f"{cle}:lancement")
+
+
+def preparer(type_document, sources, nom_fichier, fonction, *args, utilisateur_id=None):
+    """
+    Lance le rendu sans l'attendre et retourne la clé du document. Un
+    document déjà en cache ou en préparation n'est pas relancé. Seuls les
+    utilisateurs qui l'ont demandé peuvent ensuite le télécharger.
+    """
+    cache = caches[CACHE_ALIAS]
+    cle = cle_document(type_document, *sources)
+    if utilisateur_id is not None:
+        # Une clé par utilisateur : deux demandes simultanées ne s'écrasent pas
+        cache.set(f"{cle}:utilisateur:{utilisateur_id}", True)
+    if cache.get(cle) is not None:
+        _enregistrer_etat(cle, "pret", nom_fichier)
+        return cle
+    # Un seul worker lance le rendu : `add` échoue si la clé existe déjà
+    if not cache.add(f"{cle}:lancement", True, DUREE_PREPARATION):
+        return cle
+    _enregistrer_etat(cle, "en_cours", nom_fichier, DUREE_PREPARATION)
+    future = _soumettre(fonction, *args)
+    if future is None:
+        # Sans pool, la préparation est synchrone
+        future = Future()
+        try:
+            future.set_result(fonction(*args))
+        except Exception as exc:
+            future.set_exception(exc)
+    future.add_done_callback(lambda f: _terminer(cle, nom_fichier, f))
+    return cle
+
+
+def autorise(cle, utilisateur_id):
+    """Vrai si `utilisateur_id` a demandé la préparation du document `cle`"""
+    return caches[CACHE_ALIAS].get(f"{cle}:utilisateur:{utilisateur_id}", False)
+
+
+def etat(cle):
+    """{"statut": "en_cours" | "pret" | "echec", "nom"} ou None"""
+    cache = caches[CACHE_ALIAS]
+    etat_document = cache.get(f"{cle}:etat")
+    if not etat_document:
+        return None
+    if cache.has_key(cle):
+        return {**etat_document, "statut": "pret"}
+    if etat_document["statut"] == "pret":
+        return None
+    return etat_document
+
+
+def reponse_preparation(cle):
+    """Réponse JSON d'une demande « préparer puis télécharger »"""
+    return JsonResponse(
+        {
+            "cle": cle,
+            "statut": (etat(cle) or {}).get("statut", "en_cours"),
+            "url": reverse("export_data:telecharger_pdf", args=[cle]),
+        },
+        status=202,
+    )
+
+
+def contenu(cle):
+    return caches[CACHE_ALIAS].get(cle)
+
+
+def reponse_pdf(contenu_pdf, nom_fichier, inline=False):
+    response = HttpResponse(contenu_pdf, content_type="application/pdf")
+    disposition = "inline" if inline else "attachment"
+    response["Content-Disposition"] = f'{disposition}; filename="{nom_fichier}"'
+    return response
+
 
 def render_to_pdf(template_src, context_dict={}):
     """
     Rendu d'un template HTML en PDF.
     Renvoie un HttpResponse contenant le PDF ou None en cas d'erreur.
     """
-    template = get_template(template_src)
-    html = template.render(context_dict)
-    result = BytesIO()
-    pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result)
-    if not pdf.err:
-        return HttpResponse(result.getvalue(), content_type="application/pdf")
-    return None
+    html = get_template(template_src).render(context_dict)
+    try:
+        pdf = document("html", (html,), html_en_pdf, html)
+    except ErreurPdf:
+        return None
+    return HttpResponse(pdf, content_type="application/pdf")